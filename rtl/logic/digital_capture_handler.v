@@ -10,6 +10,17 @@
 //   - Real-time streaming upload with ZERO-LATENCY pipeline
 //   - 8 channels packed into 1 byte per sample
 //   - Maximum sampling rate: 60 MHz (limited by system clock)
+//   - Optional sequence markers (START payload byte 2, bit 0): samples are
+//     sent in packets with a header carrying the index of their first
+//     sample, so the host can tell exactly where and how many samples were
+//     dropped when the internal FIFO overflowed
+//
+// Marker packet (marker mode only):
+//   A5 5A LEN_H LEN_L IDX[39:32] IDX[31:24] IDX[23:16] IDX[15:8] IDX[7:0] CHK
+//   followed by LEN samples (1..MARK_MAX_LEN). IDX counts sample ticks since
+//   START, including dropped ones; CHK = (LEN_H + LEN_L + IDX bytes) & 0xFF.
+//   A packet never spans a drop: the first sample after a drop starts a new
+//   packet whose IDX jumps by the number of samples lost.
 //
 // OPTIMIZATION: Simplified upload state machine for maximum throughput
 // ============================================================================
@@ -71,6 +82,10 @@ module digital_capture_handler(
     // Command data receive buffer
     reg [7:0] divider_high_byte;   // Stores high byte of divider
     reg [7:0] divider_low_byte;    // Stores low byte of divider
+    reg [7:0] start_flags;         // Optional third START byte (bit 0: markers)
+
+    reg        marker_mode;        // Upload in marker packets
+    reg        capture_restart;    // One-cycle pulse when a capture starts
 
     // ========================================================================
     // Sampling clock divider
@@ -131,8 +146,34 @@ module digital_capture_handler(
     wire samp_full     = (samp_count == SAMP_FIFO_DEPTH);
     wire samp_empty    = (samp_count == 0);
     wire samp_can_read = !samp_empty && !fifo_almost_full;
-    wire samp_push     = capture_enable && sample_tick && !samp_full;
-    wire samp_pop      = !samp_empty && upload_valid && upload_ready;
+    wire mk_hold;                  // Marker mode: drop kept open, gap FIFO full
+    wire samp_push     = capture_enable && sample_tick && !samp_full && !mk_hold;
+    wire samp_drop     = capture_enable && sample_tick && (samp_full || mk_hold);
+    wire mk_pop;                   // Marker mode: sample loaded into upload_data
+    wire samp_pop      = marker_mode ? mk_pop : (!samp_empty && upload_valid && upload_ready);
+
+    // Marker mode bookkeeping: tick_index numbers every sample tick (pushed or
+    // dropped). The first sample pushed after a drop gets an entry in the gap
+    // FIFO holding its FIFO slot and tick index. While the gap FIFO is full
+    // no such entry can be made, so samples keep being dropped (mk_hold)
+    // until one is free: every pushed sample keeps its exact index.
+    localparam integer GAP_DEPTH = 16;
+    localparam integer GAP_AW = $clog2(GAP_DEPTH);
+    reg [SAMP_AW-1:0] gap_ptr_mem [0:GAP_DEPTH-1];
+    reg [39:0]        gap_idx_mem [0:GAP_DEPTH-1];
+    reg [GAP_AW-1:0]  gap_wr_ptr;
+    reg [GAP_AW-1:0]  gap_rd_ptr;
+    reg [GAP_AW:0]    gap_count;
+    reg [39:0]        tick_index;      // Index of the next sample tick
+    reg               drop_pending;    // Samples dropped since the last gap entry
+
+    wire gap_full  = (gap_count == GAP_DEPTH);
+    wire gap_empty = (gap_count == 0);
+    wire gap_head  = !gap_empty && (gap_ptr_mem[gap_rd_ptr] == samp_rd_ptr);
+    wire gap_push  = marker_mode && samp_push && drop_pending;
+
+    assign mk_hold = marker_mode && drop_pending && gap_full;
+    wire gap_pop;                  // Driven by the marker upload state machine
 
     // Write on every sampling tick when enabled
     always @(posedge clk or negedge rst_n) begin
@@ -140,12 +181,17 @@ module digital_capture_handler(
             samp_wr_ptr <= {SAMP_AW{1'b0}};
             samp_rd_ptr <= {SAMP_AW{1'b0}};
             samp_count  <= {SAMP_AW+1{1'b0}};
+        end else if (capture_restart) begin
+            // New capture: samples left over from the previous one are dropped
+            samp_wr_ptr <= {SAMP_AW{1'b0}};
+            samp_rd_ptr <= {SAMP_AW{1'b0}};
+            samp_count  <= {SAMP_AW+1{1'b0}};
         end else begin
             if (samp_push) begin
                 samp_mem[samp_wr_ptr] <= dc_sync2;  // store synchronized inputs
                 samp_wr_ptr <= (samp_wr_ptr == SAMP_FIFO_DEPTH-1) ? {SAMP_AW{1'b0}} : samp_wr_ptr + 1'b1;
-            end else if (capture_enable && sample_tick && samp_full) begin
-                // FIFO full: drop newest sample (overflow). Consider exposing a counter if needed.
+            end else if (samp_drop) begin
+                // FIFO full (or marker gap FIFO full): drop newest sample (overflow)
             end
 
             if (samp_pop) begin
@@ -159,15 +205,176 @@ module digital_capture_handler(
             endcase
         end
     end
+
+    always @(posedge clk or negedge rst_n) begin
+        if (!rst_n) begin
+            gap_wr_ptr   <= {GAP_AW{1'b0}};
+            gap_rd_ptr   <= {GAP_AW{1'b0}};
+            gap_count    <= {GAP_AW+1{1'b0}};
+            tick_index   <= 40'd0;
+            drop_pending <= 1'b0;
+        end else if (capture_restart) begin
+            gap_wr_ptr   <= {GAP_AW{1'b0}};
+            gap_rd_ptr   <= {GAP_AW{1'b0}};
+            gap_count    <= {GAP_AW+1{1'b0}};
+            tick_index   <= 40'd0;
+            drop_pending <= 1'b0;
+        end else begin
+            if (capture_enable && sample_tick) begin
+                tick_index <= tick_index + 1'b1;
+            end
+
+            if (gap_push) begin
+                gap_ptr_mem[gap_wr_ptr] <= samp_wr_ptr;
+                gap_idx_mem[gap_wr_ptr] <= tick_index;
+                gap_wr_ptr <= gap_wr_ptr + 1'b1;
+            end
+            if (gap_pop) begin
+                gap_rd_ptr <= gap_rd_ptr + 1'b1;
+            end
+
+            case ({gap_push, gap_pop})
+                2'b10: gap_count <= gap_count + 1'b1;
+                2'b01: gap_count <= gap_count - 1'b1;
+                default: gap_count <= gap_count;
+            endcase
+
+            if (marker_mode && samp_drop) begin
+                drop_pending <= 1'b1;
+            end else if (gap_push) begin
+                drop_pending <= 1'b0;
+            end
+        end
+    end
+    // ========================================================================
+    // Marker packet state machine
+    // A packet starts when MARK_MAX_LEN samples are waiting, when a drop
+    // boundary is queued (the samples before it are final), when the oldest
+    // sample has waited MARK_TIMEOUT cycles, or after capture stopped.
+    // Its length is limited to the samples before the next gap entry.
+    // ========================================================================
+    localparam integer MARK_MAX_LEN = 1024;
+    localparam integer MARK_TIMEOUT = 60000;   // 1 ms @ 60 MHz
+
+    localparam MK_IDLE = 2'd0;  // Waiting for enough samples
+    localparam MK_LEN  = 2'd1;  // Computing the packet length
+    localparam MK_HEAD = 2'd2;  // Sending the 10 header bytes
+    localparam MK_DATA = 2'd3;  // Sending the samples
+
+    reg [1:0]  mk_state;
+    reg [39:0] mk_index;        // Index of the first sample of the packet
+    reg [10:0] mk_len;          // Samples in the packet
+    reg [10:0] mk_left;         // Samples still to send
+    reg [3:0]  mk_hdr_cnt;      // Header byte being sent
+    reg [39:0] next_index;      // Index of the next sample without a gap entry
+    reg [16:0] mk_timer;
+
+    wire [SAMP_AW-1:0] gap_distance = gap_ptr_mem[gap_rd_ptr] - samp_rd_ptr;
+    wire [SAMP_AW:0]   mk_run       = gap_empty ? samp_count : {1'b0, gap_distance};
+    wire mk_start = marker_mode && (mk_state == MK_IDLE) && !samp_empty &&
+                    ((samp_count >= MARK_MAX_LEN) || !gap_empty ||
+                     (mk_timer >= MARK_TIMEOUT) || !capture_enable);
+    wire mk_out_ready = (!upload_valid || upload_ready) && !fifo_almost_full;
+    wire [7:0] mk_checksum = {5'd0, mk_len[10:8]} + mk_len[7:0] +
+                             mk_index[39:32] + mk_index[31:24] + mk_index[23:16] +
+                             mk_index[15:8] + mk_index[7:0];
+
+    assign gap_pop = mk_start && gap_head;
+    assign mk_pop  = (mk_state == MK_DATA) && mk_out_ready;
+
+    reg [7:0] mk_header_byte;
+    always @(*) begin
+        case (mk_hdr_cnt)
+            4'd0:    mk_header_byte = 8'hA5;
+            4'd1:    mk_header_byte = 8'h5A;
+            4'd2:    mk_header_byte = {5'd0, mk_len[10:8]};
+            4'd3:    mk_header_byte = mk_len[7:0];
+            4'd4:    mk_header_byte = mk_index[39:32];
+            4'd5:    mk_header_byte = mk_index[31:24];
+            4'd6:    mk_header_byte = mk_index[23:16];
+            4'd7:    mk_header_byte = mk_index[15:8];
+            4'd8:    mk_header_byte = mk_index[7:0];
+            default: mk_header_byte = mk_checksum;
+        endcase
+    end
+
+    always @(posedge clk or negedge rst_n) begin
+        if (!rst_n) begin
+            mk_state   <= MK_IDLE;
+            mk_index   <= 40'd0;
+            mk_len     <= 11'd0;
+            mk_left    <= 11'd0;
+            mk_hdr_cnt <= 4'd0;
+            next_index <= 40'd0;
+            mk_timer   <= 17'd0;
+        end else begin
+            if (capture_restart) begin
+                // New capture: indices restart at 0, a partial packet is abandoned
+                next_index <= 40'd0;
+                mk_timer   <= 17'd0;
+                mk_state   <= MK_IDLE;
+            end else case (mk_state)
+                MK_IDLE: begin
+                    if (mk_start) begin
+                        mk_index <= gap_head ? gap_idx_mem[gap_rd_ptr] : next_index;
+                        mk_timer <= 17'd0;
+                        mk_state <= MK_LEN;
+                    end else if (!samp_empty && mk_timer < MARK_TIMEOUT) begin
+                        mk_timer <= mk_timer + 1'b1;
+                    end
+                end
+
+                MK_LEN: begin
+                    // gap_rd_ptr now points past the head entry (if any)
+                    mk_len     <= (mk_run >= MARK_MAX_LEN) ? 11'd1024 : mk_run[10:0];
+                    mk_hdr_cnt <= 4'd0;
+                    mk_state   <= MK_HEAD;
+                end
+
+                MK_HEAD: begin
+                    if (mk_out_ready) begin
+                        mk_hdr_cnt <= mk_hdr_cnt + 1'b1;
+                        if (mk_hdr_cnt == 4'd9) begin
+                            mk_left  <= mk_len;
+                            mk_state <= MK_DATA;
+                        end
+                    end
+                end
+
+                MK_DATA: begin
+                    if (mk_out_ready) begin
+                        mk_left <= mk_left - 1'b1;
+                        if (mk_left == 11'd1) begin
+                            next_index <= mk_index + mk_len;
+                            mk_state <= MK_IDLE;
+                        end
+                    end
+                end
+            endcase
+        end
+    end
+
     // ========================================================================
     // Upload logic - stream from internal sample FIFO when USB path can accept
     // One byte per sample. We keep upload_req low (0) to mark no packet boundaries,
     // so upload_arbiter can preempt DC at any time.
+    // In marker mode the bytes come from the marker state machine instead.
     always @(posedge clk or negedge rst_n) begin
         if (!rst_n) begin
             upload_data  <= 8'h00;
             upload_valid <= 1'b0;
             upload_req   <= 1'b0;
+        end else if (marker_mode) begin
+            upload_req <= 1'b0;
+            if (mk_out_ready && mk_state == MK_HEAD) begin
+                upload_data  <= mk_header_byte;
+                upload_valid <= 1'b1;
+            end else if (mk_pop) begin
+                upload_data  <= samp_mem[samp_rd_ptr];
+                upload_valid <= 1'b1;
+            end else if (!upload_valid || upload_ready) begin
+                upload_valid <= 1'b0;
+            end
         end else begin
             upload_valid <= 1'b0; // default
             upload_req   <= 1'b0;
@@ -195,6 +402,9 @@ module digital_capture_handler(
             sample_divider <= 16'd60;  // Default: 60MHz/60 = 1MHz
             divider_high_byte <= 8'h00;
             divider_low_byte <= 8'h00;
+            start_flags <= 8'h00;
+            marker_mode <= 1'b0;
+            capture_restart <= 1'b0;
             capture_enable <= 1'b0;
             reset_sample_counter <= 1'b0;
 
@@ -203,6 +413,7 @@ module digital_capture_handler(
         end else begin
             // Default: clear reset flag
             reset_sample_counter <= 1'b0;
+            capture_restart <= 1'b0;
             // ================================================================
             // Handler state machine
             // ================================================================
@@ -212,6 +423,7 @@ module digital_capture_handler(
                         if (cmd_type == CMD_DC_START) begin
                             divider_high_byte <= 8'h00;
                             divider_low_byte <= 8'h00;
+                            start_flags <= 8'h00;
                             handler_state <= H_RX_CMD;
                         end else if (cmd_type == CMD_DC_STOP) begin
                             capture_enable <= 1'b0;
@@ -221,12 +433,14 @@ module digital_capture_handler(
                 end
 
                 H_RX_CMD: begin
-                    // Receive 2-byte divider value (big-endian)
+                    // Receive 2-byte divider value (big-endian) and optional flags
                     if (cmd_data_valid) begin
                         if (cmd_data_index == 0) begin
                             divider_high_byte <= cmd_data;  // High byte
                         end else if (cmd_data_index == 1) begin
                             divider_low_byte <= cmd_data;   // Low byte
+                        end else if (cmd_data_index == 2) begin
+                            start_flags <= cmd_data;        // Flags
                         end
                     end
 
@@ -237,7 +451,13 @@ module digital_capture_handler(
                         end else begin
                             sample_divider <= {divider_high_byte, divider_low_byte};
                         end
+                        if (cmd_data_valid && (cmd_data_index == 16'd2)) begin
+                            marker_mode <= cmd_data[0];
+                        end else begin
+                            marker_mode <= start_flags[0];
+                        end
                         reset_sample_counter <= 1'b1;  // Signal to reset sample_counter
+                        capture_restart <= 1'b1;
                         capture_enable <= 1'b1;
                         handler_state <= H_CAPTURING;
                     end
@@ -254,6 +474,7 @@ module digital_capture_handler(
                             capture_enable <= 1'b0;
                             divider_high_byte <= 8'h00;
                             divider_low_byte <= 8'h00;
+                            start_flags <= 8'h00;
                             handler_state <= H_RX_CMD;
                         end
                     end
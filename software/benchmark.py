@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+FPGA2025 Benchmark Harness
+==========================
+
+Named, repeatable throughput and latency scenarios that run unchanged against
+the board or the emulator (any transport spec, see transport.create_transport):
+
+    dc_stream       DC streaming at every rate in SAMPLE_RATE_OPTIONS
+    roundtrip       command -> upload frame latency per peripheral
+    bulk_spi        14-byte SPI writes (the handler's buffer), each confirmed
+    bulk_i2c        EEPROM page writes over I2C, each read back and compared
+    waveform        custom waveform (0xFC) packet upload
+
+Bulk scenarios count only bytes the device confirmed (a matching response);
+mismatches and missing responses are errors and show up in loss_pct.
+
+Each result records wall time, bytes moved, throughput, latency percentiles
+(per command; per read call for dc_stream), bytes lost and process CPU usage
+(all threads, so with the emulator the device model is included). Results are written as JSON; a previous JSON file
+can be given as baseline to flag regressions.
+
+Usage:
+    python benchmark.py --transport emu
+    python benchmark.py --transport COM3 --scenario dc_stream --json run.json
+    python benchmark.py --transport usb --baseline run.json --tolerance 0.15
+    python benchmark.py --list
+"""
+
+import argparse
+import json
+import os
+import platform
+import struct
+import sys
+import time
+
+import numpy as np
+
+from command_engine import CommandEngine
+from dc_commands import DC_STOP_FRAME, SAMPLE_RATE_OPTIONS, actual_rate, dc_start_frame, rate_divider
+from device_session import DeviceSession
+from frame_codec import (
+    SOURCE_DSM, SOURCE_I2C, SOURCE_I2C_SLAVE, SOURCE_ONEWIRE, SOURCE_SPI, SOURCE_UART, encode_frame,
+)
+
+SCENARIOS = {}
+
+SPI_MAX_WRITE = 14          # spi_handler BUFFER_SIZE (16) minus write_len/read_len
+CONFIRM_RETRIES = 5         # Check transactions per bulk step before it counts as an error
+EEPROM_WRITE_TIME = 0.005   # 24LC64 write cycle; the EEPROM NACKs until it ends
+
+# Metrics compared against a baseline: name -> True if higher is better
+BASELINE_METRICS = {
+    'throughput_bps': True,
+    'latency_p50_ms': False,
+    'latency_p99_ms': False,
+    'loss_pct': False,
+}
+
+
+def scenario(name, description):
+    """Register a scenario function under a name."""
+    def register(func):
+        SCENARIOS[name] = (func, description)
+        return func
+    return register
+
+
+# ============================================================================
+# Measurement helpers
+# ============================================================================
+class Measurement:
+    """Wall clock, CPU time and latency samples for one result."""
+
+    def __init__(self, name, **params):
+        self.name = name
+        self.params = params
+        self.latencies = []
+        self.bytes = 0
+        self.expected_bytes = None
+        self.errors = 0
+        self._wall = self._cpu = None
+        self.wall_s = self.cpu_s = 0.0
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall_s = time.perf_counter() - self._wall
+        self.cpu_s = time.process_time() - self._cpu
+        return False
+
+    def result(self):
+        """Summarize as a JSON-serializable dict."""
+        out = {
+            'name': self.name,
+            'params': self.params,
+            'wall_s': round(self.wall_s, 6),
+            'bytes': self.bytes,
+            'throughput_bps': round(self.bytes / self.wall_s, 1) if self.wall_s > 0 else 0.0,
+            'cpu_pct': round(100.0 * self.cpu_s / self.wall_s, 1) if self.wall_s > 0 else 0.0,
+            'errors': self.errors,
+        }
+        if self.latencies:
+            ms = np.asarray(self.latencies) * 1000.0
+            p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+            out.update(count=len(ms), latency_p50_ms=round(p50, 4), latency_p90_ms=round(p90, 4),
+                       latency_p99_ms=round(p99, 4), latency_max_ms=round(float(ms.max()), 4))
+        if self.expected_bytes is not None:
+            lost = max(0, self.expected_bytes - self.bytes)
+            out.update(expected_bytes=self.expected_bytes, bytes_lost=lost,
+                       loss_pct=round(100.0 * lost / self.expected_bytes, 3) if self.expected_bytes else 0.0)
+        return out
+
+
+def result_key(result):
+    """Identity of a result across runs (name plus parameters)."""
+    params = ','.join(f"{k}={result['params'][k]}" for k in sorted(result['params']))
+    return f"{result['name']}[{params}]"
+
+
+# ============================================================================
+# Scenarios
+# ============================================================================
+@scenario('dc_stream', 'DC streaming at each rate in SAMPLE_RATE_OPTIONS')
+def bench_dc_stream(session, options):
+    link = session.transport
+    rates = options.rates or [rate for _, rate in SAMPLE_RATE_OPTIONS]
+    results = []
+    for rate in rates:
+        link.write(DC_STOP_FRAME)
+        time.sleep(0.05)
+        link.reset_input()
+
+        m = Measurement('dc_stream', rate=rate)
+        with m:
+            link.write(dc_start_frame(rate))
+            start = time.perf_counter()
+            deadline = start + options.duration
+            while time.perf_counter() < deadline:
+                t0 = time.perf_counter()
+                chunk = link.read_stream(options.read_size, timeout=0.05)
+                if chunk:
+                    m.bytes += len(chunk)
+                    m.latencies.append(time.perf_counter() - t0)
+            link.write(DC_STOP_FRAME)
+            stopped = time.perf_counter()
+            # Samples already in flight when STOP was sent still count
+            while True:
+                chunk = link.read_stream(options.read_size, timeout=0.1)
+                if not chunk:
+                    break
+                m.bytes += len(chunk)
+        m.expected_bytes = int((stopped - start) * actual_rate(rate_divider(rate)))
+        results.append(m.result())
+    return results
+
+
+def _roundtrip_commands():
+    # (peripheral, setup frames, command frame, response source)
+    return [
+        ('i2c_slave', [encode_frame(0x35, bytes([0, 4, 1, 2, 3, 4]))],
+         encode_frame(0x36, bytes([0, 4])), SOURCE_I2C_SLAVE),
+        ('i2c', [encode_frame(0x04, bytes([0x50, 1, 0x02]))],
+         encode_frame(0x06, struct.pack('>HH', 0, 4)), SOURCE_I2C),
+        ('spi', [], encode_frame(0x11, bytes([1, 4, 0x9F])), SOURCE_SPI),
+        ('onewire', [encode_frame(0x20)],
+         encode_frame(0x23, bytes([1, 8, 0x33])), SOURCE_ONEWIRE),
+        ('dsm', [], encode_frame(0x0A, bytes([0x01])), SOURCE_DSM),
+        ('uart', [encode_frame(0x08, b'ping')], encode_frame(0x09), SOURCE_UART),
+    ]
+
+
+@scenario('roundtrip', 'Command round-trip latency per peripheral')
+def bench_roundtrip(session, options):
+    results = []
+    with CommandEngine(session, max_in_flight=1, default_timeout=options.timeout) as engine:
+        for name, setup, frame, source in _roundtrip_commands():
+            if options.peripherals and name not in options.peripherals:
+                continue
+            m = Measurement('roundtrip', peripheral=name)
+            with m:
+                for _ in range(options.iterations):
+                    for setup_frame in setup:
+                        engine.send(setup_frame)
+                    t0 = time.perf_counter()
+                    try:
+                        response = engine.transact(frame, source)
+                    except TimeoutError:
+                        m.errors += 1
+                        continue
+                    m.latencies.append(time.perf_counter() - t0)
+                    m.bytes += len(frame) + len(response.payload)
+            results.append(m.result())
+    return results
+
+
+def _confirm(engine, check, source, expected):
+    """Transact `check` until its response equals `expected` (CONFIRM_RETRIES tries)."""
+    for _ in range(CONFIRM_RETRIES):
+        try:
+            response = engine.transact(check, source)
+        except TimeoutError:
+            continue
+        if bytes(response.payload) == expected:
+            return True
+    return False
+
+
+def _bulk(session, options, name, steps, setup=()):
+    """
+    Run (write, checks, size) steps one at a time: send `write` (may be
+    None), then each (frame, source, expected) check until its response
+    matches. Only the `size` bytes of fully confirmed steps count; a
+    mismatch or a missing response is an error. The handlers drop commands
+    while busy, so each step waits for its responses before the next one.
+    """
+    m = Measurement(name, frames=len(steps))
+    m.expected_bytes = sum(size for _, _, size in steps)
+    with CommandEngine(session, max_in_flight=1, default_timeout=options.timeout) as engine, m:
+        for frame in setup:
+            engine.send(frame)
+        for write, checks, size in steps:
+            t0 = time.perf_counter()
+            if write is not None:
+                engine.send(write)
+                time.sleep(options.write_time)
+            if all(_confirm(engine, *check) for check in checks):
+                m.latencies.append(time.perf_counter() - t0)
+                m.bytes += size
+            else:
+                m.errors += 1
+    return [m.result()]
+
+
+@scenario('bulk_spi', f'SPI writes of {SPI_MAX_WRITE} bytes, one per response')
+def bench_bulk_spi(session, options):
+    # spi_handler captures MISO only in the read phase, where it clocks
+    # 0x00; with MOSI looped to MISO the read byte is that 0x00. The data
+    # written cannot be read back, but the response proves the handler ran
+    # the whole frame.
+    steps = []
+    for index in range(options.bulk_frames):
+        data = bytes((index + offset) & 0xFF for offset in range(SPI_MAX_WRITE))
+        check = encode_frame(0x11, bytes([SPI_MAX_WRITE, 1]), data)
+        steps.append((None, [(check, SOURCE_SPI, b'\x00')], SPI_MAX_WRITE))
+    return _bulk(session, options, 'bulk_spi', steps)
+
+
+@scenario('bulk_i2c', 'I2C EEPROM page writes (32 bytes each), each read back')
+def bench_bulk_i2c(session, options):
+    steps = []
+    for page in range(options.bulk_frames):
+        address = (page * 32) % 8192
+        data = bytes((page + offset) & 0xFF for offset in range(32))
+        write = encode_frame(0x05, struct.pack('>H', address), data)
+        # Read back in halves: a response carries at most 31 bytes per frame
+        checks = [(encode_frame(0x06, struct.pack('>HH', address + half, 16)), SOURCE_I2C,
+                   data[half:half + 16]) for half in (0, 16)]
+        steps.append((write, checks, len(data)))
+    return _bulk(session, options, 'bulk_i2c', steps, setup=[encode_frame(0x04, bytes([0x50, 1, 0x02]))])
+
+
+@scenario('waveform', 'Custom waveform packet upload (256 samples)')
+def bench_waveform(session, options):
+    # Same layout as custom_waveform_tool.build_single_packet, which cannot
+    # be imported without PySide6
+    samples = (np.sin(np.linspace(0, 2 * np.pi, 256, endpoint=False)) * 0x1FFF + 0x2000).astype('<u2')
+    packet = encode_frame(0xFC, struct.pack('>BHI', 0x04, len(samples), 0x10000), samples)
+    m = Measurement('waveform', samples=len(samples))
+    with m:
+        for _ in range(options.iterations):
+            t0 = time.perf_counter()
+            session.write(packet)
+            m.latencies.append(time.perf_counter() - t0)
+            m.bytes += len(packet)
+    return [m.result()]
+
+
+# ============================================================================
+# Baseline comparison
+# ============================================================================
+def compare(results, baseline, tolerance):
+    """
+    Compare results with a baseline run.
+
+    Returns:
+        list: (key, metric, baseline value, current value, change) for every
+            metric that got worse by more than tolerance (fraction)
+    """
+    previous = {result_key(r): r for r in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        for metric, higher_is_better in BASELINE_METRICS.items():
+            if metric not in result or metric not in old:
+                continue
+            before, now = old[metric], result[metric]
+            if metric == 'loss_pct':
+                # Absolute percentage points; 0 -> 0.1 % is a regression
+                worse = now - before > tolerance * 100
+                change = now - before
+            elif before == 0:
+                continue
+            else:
+                change = (now - before) / before
+                worse = -change > tolerance if higher_is_better else change > tolerance
+            if worse:
+                regressions.append((result_key(result), metric, before, now, change))
+    return regressions
+
+
+def print_results(results):
+    print(f"{'result':<40} {'MB/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'lost %':>8} {'CPU %':>7} {'err':>4}")
+    print("-" * 92)
+    for r in results:
+        print(f"{result_key(r):<40} {r['throughput_bps'] / 1e6:9.3f} "
+              f"{r.get('latency_p50_ms', float('nan')):9.3f} {r.get('latency_p99_ms', float('nan')):9.3f} "
+              f"{r.get('loss_pct', float('nan')):8.2f} {r['cpu_pct']:7.1f} {r['errors']:4d}")
+
+
+# ============================================================================
+# Main
+# ============================================================================
+def run(spec, names, options):
+    """Run scenarios on a transport spec and return the JSON document."""
+    session = DeviceSession(spec, timeout=options.timeout)
+    results = []
+    with session:
+        for name in names:
+            func, _ = SCENARIOS[name]
+            print(f"Running {name}...", file=sys.stderr)
+            results.extend(func(session, options))
+    return {
+        'meta': {
+            'transport': session.port,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'host': platform.node(),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'options': {k: v for k, v in vars(options).items() if k not in ('json', 'baseline')},
+        },
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FPGA2025 benchmark harness')
+    parser.add_argument('-t', '--transport', default='emu',
+                        help="Transport spec: COM3, usb, emu, ... (default: emu)")
+    parser.add_argument('-s', '--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Scenario to run (repeatable, default: all)')
+    parser.add_argument('--list', action='store_true', help='List scenarios and exit')
+    parser.add_argument('--duration', type=float, default=1.0, help='Seconds per DC rate')
+    parser.add_argument('--rate', dest='rates', type=int, action='append',
+                        help='DC sample rate in Hz (repeatable, default: all options)')
+    parser.add_argument('--read-size', type=int, default=65536, help='DC read request size')
+    parser.add_argument('--iterations', type=int, default=200, help='Round trips per peripheral')
+    parser.add_argument('--peripheral', dest='peripherals', action='append',
+                        help='Limit roundtrip to these peripherals')
+    parser.add_argument('--bulk-frames', type=int, default=256, help='Frames per bulk scenario')
+    parser.add_argument('--write-time', type=float, default=EEPROM_WRITE_TIME,
+                        help='Wait after each bulk_i2c page write before reading it back (s)')
+    parser.add_argument('--timeout', type=float, default=1.0, help='Response timeout (s)')
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--baseline', help='Compare against a previous JSON result file')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Allowed relative regression (default 0.10)')
+    args = parser.parse_args()
+
+    if args.list:
+        for name, (_, description) in SCENARIOS.items():
+            print(f"{name:<12} {description}")
+        return 0
+
+    document = run(args.transport, args.scenario or list(SCENARIOS), args)
+    print_results(document['results'])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(document, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(document['results'], baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) vs {args.baseline}:")
+            for key, metric, before, now, change in regressions:
+                print(f"  {key} {metric}: {before} -> {now} ({change:+.1%})"
+                      if metric != 'loss_pct' else f"  {key} {metric}: {before} -> {now}")
+            return 1
+        print(f"\nNo regressions vs {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Memory-Mapped Capture Files for FPGA2025
+========================================
+
+Records the Digital Capture stream to disk in fixed-size memory-mapped
+segments, so capture length is bounded by disk space instead of RAM, and
+opens recordings again as a zero-copy NumPy view.
+
+File layout (.dcap, little-endian):
+    [0, HEADER_SIZE)         header (see HEADER_FORMAT), rest zero
+    [HEADER_SIZE, +N)        N samples, one byte per sample (bit n = CH n)
+    [drop_offset, ...)       drop table: (sample_index u64, bytes u64) pairs
+
+    A drop marker says that `bytes` samples were lost before sample
+    `sample_index`. sample_count and the drop table are written by close();
+    a recording that was not closed is still readable (complete=False) and
+    its length is taken from the file size, including the preallocated,
+    zero-filled rest of the last segment.
+
+Writing:
+    The USB reader reads straight into the mapped file with write_view() /
+    commit(). Each finished segment is handed to a background thread that
+    flushes it to disk and unmaps it, so disk writes overlap with the next
+    USB reads and only the current segment stays mapped.
+
+Typical usage:
+    from capture_file import CaptureWriter, CaptureFile
+
+    with CaptureWriter('run.dcap', sample_rate=actual_rate(divider)) as rec:
+        view = rec.write_view(65536)
+        rec.commit(link.read_stream_into(view, timeout=0.01))
+
+    with CaptureFile('run.dcap') as cap:
+        print(cap.sample_rate, len(cap), cap.drops)
+        ch3 = (cap.samples >> 3) & 1
+"""
+
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+
+import numpy as np
+
+MAGIC = b'DCAP\r\n\x1a\n'
+VERSION = 1
+HEADER_SIZE = 4096
+# magic, version, channel_mask, header_size, divider, sample_rate,
+# start_time, sample_count, drop_count, drop_offset, segment_size
+HEADER_FORMAT = '<8sHB x I I d d Q I Q I'
+DROP_FORMAT = '<QQ'
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024   # Bytes mapped and flushed at a time
+
+_HEADER = struct.Struct(HEADER_FORMAT)
+_DROP = struct.Struct(DROP_FORMAT)
+
+
+# ============================================================================
+# Writer
+# ============================================================================
+class CaptureWriter:
+    """
+    Streams samples into a preallocated, memory-mapped capture file.
+
+    Args:
+        path (str): Output file (overwritten)
+        sample_rate (float): Actual sample rate in Hz
+        divider (int): DC divider used for the capture (0 if unknown)
+        channel_mask (int): Channels that carry signals (bit n = CH n)
+        start_time (float): Unix time of the first sample (default: now)
+        segment_size (int): Bytes per mapped segment; rounded up to the
+            mmap allocation granularity
+        max_write (int): Largest size passed to write_view()
+    """
+
+    def __init__(self, path, sample_rate, divider=0, channel_mask=0xFF, start_time=None,
+                 segment_size=DEFAULT_SEGMENT_SIZE, max_write=1024 * 1024):
+        granularity = mmap.ALLOCATIONGRANULARITY
+        self.segment_size = -(-segment_size // granularity) * granularity
+        if max_write > self.segment_size:
+            raise ValueError(f"max_write ({max_write}) exceeds segment_size ({self.segment_size})")
+        self.path = path
+        self.sample_rate = float(sample_rate)
+        self.divider = divider
+        self.channel_mask = channel_mask
+        self.start_time = time.time() if start_time is None else start_time
+        self.max_write = max_write
+
+        self.sample_count = 0
+        self.drops = []             # (sample_index, bytes) markers
+        self.dropped_bytes = 0
+
+        self._file = open(path, 'w+b')
+        self._write_header()
+        self._segment = None        # mmap of the current segment
+        self._segment_index = -1
+        self._scratch = bytearray(max_write)
+        self._pending = None        # 'map' or 'scratch' for the last write_view()
+        self._flush_queue = queue.Queue()
+        self._flush_thread = threading.Thread(target=self._flusher, name='CaptureWriter',
+                                              daemon=True)
+        self._flush_thread.start()
+        self._closed = False
+
+    def __len__(self):
+        return self.sample_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    # ------------------------------------------------------------------
+    # Segments
+    # ------------------------------------------------------------------
+    def _write_header(self, drop_offset=0):
+        header = _HEADER.pack(MAGIC, VERSION, self.channel_mask, HEADER_SIZE, self.divider,
+                              self.sample_rate, self.start_time, self.sample_count,
+                              len(self.drops), drop_offset, self.segment_size)
+        self._file.seek(0)
+        self._file.write(header.ljust(HEADER_SIZE, b'\0'))
+        self._file.flush()
+
+    def _map_segment(self, index):
+        # Segments start at HEADER_SIZE + index * segment_size; the mapping
+        # starts at the aligned offset below that
+        start = HEADER_SIZE + index * self.segment_size
+        offset = start - start % mmap.ALLOCATIONGRANULARITY
+        end = start + self.segment_size
+        if os.fstat(self._file.fileno()).st_size < end:
+            self._file.truncate(end)
+        mapping = mmap.mmap(self._file.fileno(), end - offset, offset=offset)
+        return mapping, start - offset
+
+    def _segment_view(self, position, size):
+        index = position // self.segment_size
+        if index != self._segment_index:
+            if self._segment is not None:
+                self._flush_queue.put(self._segment[0])
+            self._segment = self._map_segment(index)
+            self._segment_index = index
+        mapping, delta = self._segment
+        start = delta + position % self.segment_size
+        return memoryview(mapping)[start:start + size]
+
+    def _flusher(self):
+        while True:
+            mapping = self._flush_queue.get()
+            if mapping is None:
+                return
+            mapping.flush()
+            try:
+                mapping.close()
+            except BufferError:
+                pass    # A caller still holds a view; unmapped when it is released
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def write_view(self, size):
+        """
+        Return a writable view for up to `size` samples at the end of the file.
+
+        The view maps the file directly unless it would cross a segment
+        boundary; then it is a scratch buffer that commit() copies in.
+        """
+        if self._closed:
+            raise RuntimeError("Capture file is closed")
+        if not 0 < size <= self.max_write:
+            raise ValueError(f"size must be in 1..{self.max_write}, got {size}")
+        if self.sample_count % self.segment_size + size > self.segment_size:
+            self._pending = 'scratch'
+            return memoryview(self._scratch)[:size]
+        self._pending = 'map'
+        return self._segment_view(self.sample_count, size)
+
+    def commit(self, count):
+        """Append `count` samples written into the last write_view()."""
+        if count <= 0:
+            return
+        if self._pending is None:
+            raise RuntimeError("commit() without write_view()")
+        if self._pending == 'scratch':
+            self._copy_in(memoryview(self._scratch)[:count])
+        else:
+            self.sample_count += count
+        self._pending = None
+
+    def _copy_in(self, data):
+        done = 0
+        while done < len(data):
+            room = self.segment_size - self.sample_count % self.segment_size
+            step = min(room, len(data) - done)
+            view = self._segment_view(self.sample_count, step)
+            view[:] = data[done:done + step]
+            view.release()
+            self.sample_count += step
+            done += step
+
+    def write(self, data):
+        """Append a bytes-like object."""
+        if self._closed:
+            raise RuntimeError("Capture file is closed")
+        self._copy_in(memoryview(data).cast('B'))
+
+    def mark_drop(self, count):
+        """Record that `count` samples were lost at the current position."""
+        if count > 0:
+            self.drops.append((self.sample_count, count))
+            self.dropped_bytes += count
+
+    # ------------------------------------------------------------------
+    # Finishing
+    # ------------------------------------------------------------------
+    def close(self):
+        """Flush all segments, write the drop table and trim the file."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._segment is not None:
+            self._flush_queue.put(self._segment[0])
+            self._segment = None
+        self._flush_queue.put(None)
+        self._flush_thread.join()
+
+        drop_offset = HEADER_SIZE + self.sample_count
+        self._file.truncate(drop_offset)
+        self._file.seek(drop_offset)
+        for marker in self.drops:
+            self._file.write(_DROP.pack(*marker))
+        self._write_header(drop_offset)
+        self._file.close()
+
+
+# ============================================================================
+# Reader
+# ============================================================================
+class CaptureFile:
+    """
+    Read-only, memory-mapped view of a recording.
+
+    Files without the DCAP header (raw .bin dumps) are opened as plain
+    samples with sample_rate 0.
+
+    Attributes:
+        samples (numpy.ndarray): uint8 samples, mapped from the file
+        sample_rate (float): Hz (0 if unknown)
+        start_time (float): Unix time of the first sample
+        channel_mask (int): Channels that carry signals
+        drops (list): (sample_index, bytes) markers
+        complete (bool): False if the recording was not closed properly
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.drops = []
+
+        head = self._map[:_HEADER.size] if self._map is not None else b''
+        if len(head) == _HEADER.size and head[:len(MAGIC)] == MAGIC:
+            (_, self.version, self.channel_mask, header_size, self.divider, self.sample_rate,
+             self.start_time, count, drop_count, drop_offset, self.segment_size) = _HEADER.unpack(head)
+            self.complete = drop_offset != 0
+            if not self.complete:
+                count = size - header_size
+            for i in range(drop_count):
+                start = drop_offset + i * _DROP.size
+                self.drops.append(_DROP.unpack(self._map[start:start + _DROP.size]))
+        else:
+            self.version = 0
+            self.channel_mask = 0xFF
+            self.divider = 0
+            self.sample_rate = 0.0
+            self.start_time = os.path.getmtime(path)
+            self.segment_size = 0
+            self.complete = True
+            header_size, count = 0, size
+        self.header_size = header_size
+        self.samples = (np.frombuffer(self._map, dtype=np.uint8, count=count, offset=header_size)
+                        if count else np.zeros(0, dtype=np.uint8))
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    @property
+    def duration(self):
+        """Seconds covered by the samples (0 if the rate is unknown)."""
+        return len(self.samples) / self.sample_rate if self.sample_rate else 0.0
+
+    @property
+    def dropped_bytes(self):
+        return sum(count for _, count in self.drops)
+
+    def channel(self, ch, start=0, stop=None):
+        """Return channel `ch` as a 0/1 uint8 array for samples [start, stop)."""
+        return (self.samples[start:stop] >> ch) & 1
+
+    def close(self):
+        """Release the mapping; arrays taken from `samples` must be dropped first."""
+        self.samples = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass    # Views still alive; unmapped when they are released
+            self._map = None
+        self._file.close()
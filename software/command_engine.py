@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Pipelined Command Engine for FPGA2025
+=====================================
+
+Replaces fixed sleeps between a command and its response with futures. Each
+command that produces an upload frame gets a concurrent.futures.Future that
+resolves as soon as the matching frame arrives, so several commands can be in
+flight at once and round-trip time is set by the device, not by the
+worst-case sleep.
+
+Matching rules:
+    - A response is matched by its upload source ID (see frame_codec.SOURCE_*).
+    - Responses from one source come back in command order, so the oldest
+      outstanding command for that source gets the frame.
+    - A command that times out keeps its place in the queue for one more
+      timeout period; a late frame in that window is dropped instead of being
+      handed to the next command.
+    - Frames nobody is waiting for are kept in `unsolicited` (or passed to
+      on_unsolicited).
+
+Typical usage:
+    from device_session import DeviceSession
+    from command_engine import CommandEngine
+    from frame_codec import SOURCE_I2C_SLAVE
+    from i2c_slave_cdc_test import i2c_slave_read_registers
+
+    with DeviceSession('COM3') as session, CommandEngine(session) as engine:
+        futures = [engine.submit(i2c_slave_read_registers(reg, 1), SOURCE_I2C_SLAVE)
+                   for reg in range(4)]
+        values = [f.result().payload[0] for f in futures]
+"""
+
+import collections
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+DEFAULT_TIMEOUT = 1.0
+DEFAULT_MAX_IN_FLIGHT = 8
+POLL_INTERVAL = 0.01  # Reader wake-up period for timeout checks (s)
+
+
+class _Pending:
+    __slots__ = ('future', 'deadline', 'timeout', 'expired_at')
+
+    def __init__(self, future, timeout):
+        self.future = future
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout
+        self.expired_at = None
+
+
+class CommandEngine:
+    """
+    Background reader that resolves command futures from upload frames.
+
+    Args:
+        session (DeviceSession): Session used for all I/O; the engine enters
+            it while running, so an already open session stays open
+        max_in_flight (int): Outstanding commands with responses; submit()
+            blocks while the limit is reached
+        default_timeout (float): Per-command timeout when none is given
+        on_unsolicited (callable): Called with each UploadFrame nobody waits
+            for; if None such frames are stored in self.unsolicited
+    """
+
+    def __init__(self, session, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                 default_timeout=DEFAULT_TIMEOUT, on_unsolicited=None):
+        self.session = session
+        self.default_timeout = default_timeout
+        self.on_unsolicited = on_unsolicited
+        self.unsolicited = collections.deque(maxlen=1024)
+
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._queues = collections.defaultdict(collections.deque)  # source -> [_Pending]
+        self._thread = None
+        self._running = threading.Event()
+
+        # Statistics
+        self.completed = 0
+        self.timeouts = 0
+        self.late_frames = 0
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def start(self):
+        """Start the reader thread (opens the session if needed)."""
+        if self._thread is not None:
+            return self
+        self.session.__enter__()
+        self._running.set()
+        self._thread = threading.Thread(target=self._reader, name='CommandEngine', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the reader thread and fail every outstanding command."""
+        if self._thread is None:
+            return
+        self._running.clear()
+        self._thread.join()
+        self._thread = None
+        self._fail_all(RuntimeError("Command engine stopped"))
+        self.session.__exit__(None, None, None)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    # ------------------------------------------------------------------
+    # Commands
+    # ------------------------------------------------------------------
+    def send(self, frame):
+        """Write a command that produces no upload frame."""
+        return self.session.write(frame)
+
+    def submit(self, frame, source, timeout=None):
+        """
+        Write a command and return a future for its upload frame.
+
+        Args:
+            frame (bytes-like): Encoded command frame
+            source (int): Upload source ID the response will carry
+            timeout (float): Seconds until the future fails with TimeoutError
+
+        Returns:
+            Future: Resolves to frame_codec.UploadFrame
+        """
+        if not self._running.is_set():
+            raise RuntimeError("Command engine is not running")
+        if timeout is None:
+            timeout = self.default_timeout
+
+        self._slots.acquire()
+        future = Future()
+        future.set_running_or_notify_cancel()
+        entry = _Pending(future, timeout)
+        # Register before writing so a fast response cannot overtake us
+        with self._lock:
+            self._queues[source].append(entry)
+        try:
+            self.session.write(frame)
+        except Exception as e:
+            with self._lock:
+                self._queues[source].remove(entry)
+            self._finish(entry, error=e)
+        return future
+
+    def transact(self, frame, source, timeout=None):
+        """Submit a command and wait for its upload frame (raises TimeoutError)."""
+        return self.submit(frame, source, timeout).result()
+
+    def pending(self):
+        """Number of commands still waiting for a response."""
+        with self._lock:
+            return sum(1 for queue in self._queues.values()
+                       for entry in queue if entry.expired_at is None)
+
+    # ------------------------------------------------------------------
+    # Reader thread
+    # ------------------------------------------------------------------
+    def _finish(self, entry, frame=None, error=None):
+        # Called without self._lock so future callbacks may submit again
+        self._slots.release()
+        try:
+            if error is not None:
+                entry.future.set_exception(error)
+            else:
+                entry.future.set_result(frame)
+        except InvalidStateError:
+            pass
+
+    def _dispatch(self, frame):
+        with self._lock:
+            queue = self._queues.get(frame.source)
+            entry = queue.popleft() if queue else None
+            if entry is not None:
+                if entry.expired_at is not None:
+                    self.late_frames += 1
+                    return
+                self.completed += 1
+        if entry is not None:
+            self._finish(entry, frame)
+        elif self.on_unsolicited is not None:
+            self.on_unsolicited(frame)
+        else:
+            self.unsolicited.append(frame)
+
+    def _expire(self, now):
+        expired = []
+        with self._lock:
+            for queue in self._queues.values():
+                for entry in queue:
+                    if entry.expired_at is None and now >= entry.deadline:
+                        entry.expired_at = now
+                        expired.append(entry)
+                # Forget expired commands once their grace period is over
+                while queue and queue[0].expired_at is not None \
+                        and now >= queue[0].expired_at + queue[0].timeout:
+                    queue.popleft()
+            self.timeouts += len(expired)
+        for entry in expired:
+            self._finish(entry, error=TimeoutError(f"No response within {entry.timeout:.3f} s"))
+
+    def _fail_all(self, error):
+        with self._lock:
+            waiting = [entry for queue in self._queues.values()
+                       for entry in queue if entry.expired_at is None]
+            self._queues.clear()
+        for entry in waiting:
+            self._finish(entry, error=error)
+
+    def _reader(self):
+        session = self.session
+        decoder = session.decoder
+        try:
+            while self._running.is_set():
+                data = session.read(timeout=POLL_INTERVAL)
+                if data:
+                    for frame in decoder.feed(data):
+                        self._dispatch(frame)
+                self._expire(time.monotonic())
+        except Exception as e:
+            # Port gone (unplugged, closed under us): nothing will resolve anymore
+            self._running.clear()
+            self._fail_all(e)
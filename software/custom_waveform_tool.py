@@ -10,9 +10,11 @@ import numpy as np
 import serial
 from PySide6 import QtCore, QtGui, QtWidgets
 
+from frame_codec import encode_frame, checksum
+from device_session import DeviceSession
+
 
 CUSTOM_WAVEFORM_CMD = 0xFC
-FRAME_HEADER = [0xAA, 0x55]
 DAC_CLOCK_FREQ = 120_000_000  # 120MHz DAC clock
 
 LOOP_ENABLE = 0x04
@@ -30,7 +32,7 @@ DEFAULT_SAMPLE_RATE_HZ = DEFAULT_FREQ_HZ * DEFAULT_GUI_SAMPLES
 
 
 def calculate_checksum(data):
-    return sum(data) & 0xFF
+    return checksum(data)
 
 
 def calculate_sample_rate_word(waveform_length, output_freq_hz, dac_clock_hz=DAC_CLOCK_FREQ):
@@ -55,34 +57,16 @@ def normalize_to_dac(samples):
     return np.clip(dac_values, DAC_MIN, DAC_MAX).astype(np.uint16)
 
 
-def pack_sample_to_bytes(sample_value):
-    sample_value = int(sample_value) & 0x3FFF
-    low_byte = sample_value & 0xFF
-    high_byte = (sample_value >> 8) & 0xFF
-    return [low_byte, high_byte]
+def pack_samples(waveform_data):
+    # 14-bit samples, little-endian uint16 each, packed in one pass
+    samples = np.asarray(waveform_data).astype(np.int64) & 0x3FFF
+    return samples.astype('<u2')
 
 
 def generate_waveform_frame(control_byte, waveform_length, sample_rate_word, waveform_data):
-    frame = []
-    frame.extend(FRAME_HEADER)
-    frame.append(CUSTOM_WAVEFORM_CMD)
-
-    data_len = 7 + waveform_length * 2
-    frame.append((data_len >> 8) & 0xFF)
-    frame.append(data_len & 0xFF)
-
-    frame.append(control_byte)
-    frame.append((waveform_length >> 8) & 0xFF)
-    frame.append(waveform_length & 0xFF)
-    frame.extend(struct.pack('>I', sample_rate_word))
-
-    for sample in waveform_data:
-        frame.extend(pack_sample_to_bytes(sample))
-
-    checksum = calculate_checksum(frame[2:])
-    frame.append(checksum)
-
-    return frame
+    # Payload: control(1) + waveform_length(2) + sample_rate_word(4) + samples(2 * N)
+    params = struct.pack('>BHI', control_byte, waveform_length, sample_rate_word)
+    return encode_frame(CUSTOM_WAVEFORM_CMD, params, pack_samples(waveform_data))
 
 
 def build_single_packet(waveform_data, sample_rate_word, loop_mode=False, channel='A'):
@@ -124,11 +108,16 @@ def load_waveform_from_file(file_path):
         raise ValueError(f"Failed to load waveform from {file_path}: {exc}") from exc
 
 
-def send_packet_via_serial(packet, port, baudrate=115200):
+def send_packet_via_serial(packet, port, baudrate=115200, session=None):
+    # Reuse an open DeviceSession when given; otherwise open the port just for this packet
+    owns_session = session is None
+    if owns_session:
+        session = DeviceSession(port, baudrate, timeout=2, flush_on_open=False)
     try:
-        with serial.Serial(port, baudrate, timeout=2) as ser:
-            time.sleep(0.1)
-            ser.write(bytes(packet))
+        with session:
+            if owns_session:
+                time.sleep(0.1)
+            session.write(packet)
         print("Successfully sent waveform packet")
     except serial.SerialException as exc:
         raise RuntimeError(f"Serial communication error: {exc}") from exc
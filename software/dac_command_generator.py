@@ -14,10 +14,13 @@ import argparse
 import struct
 import math
 
+from frame_codec import FrameTemplate, checksum
+
 # Protocol constants
 DAC_CMD = 0xFD
-FRAME_HEADER = [0xAA, 0x55]
-DATA_LENGTH = 10  # Channel (1) + Wave type (1) + Frequency word (4) + Phase word (4)
+# Channel (1) + Wave type (1) + Frequency word (4) + Phase word (4), big-endian
+DAC_CONFIG_FRAME = FrameTemplate(DAC_CMD, 'BBII')
+DATA_LENGTH = DAC_CONFIG_FRAME.length
 
 # DAC clock frequency in Hz
 DAC_CLOCK_FREQ = 120_000_000  # 120MHz
@@ -84,7 +87,7 @@ def calculate_checksum(data):
     Returns:
         8-bit checksum
     """
-    return sum(data) & 0xFF
+    return checksum(data)
 
 def generate_dac_command(wave_type, frequency_hz, phase_degrees=0, channel='A'):
     """
@@ -97,7 +100,7 @@ def generate_dac_command(wave_type, frequency_hz, phase_degrees=0, channel='A'):
         channel: DAC channel 'A' or 'B' (default: 'A')
 
     Returns:
-        List of bytes representing the complete command frame
+        bytes: The complete command frame
     """
     # Validate wave type
     if wave_type.lower() not in WAVE_TYPES:
@@ -114,37 +117,7 @@ def generate_dac_command(wave_type, frequency_hz, phase_degrees=0, channel='A'):
     freq_word = calculate_frequency_word(frequency_hz)
     phase_word = calculate_phase_word(phase_degrees)
 
-    # Build command frame
-    frame = []
-
-    # Header
-    frame.extend(FRAME_HEADER)  # [0xAA, 0x55]
-
-    # Command
-    frame.append(DAC_CMD)  # 0xFD
-
-    # Data length (big-endian)
-    frame.append(0x00)  # Length high byte
-    frame.append(DATA_LENGTH)  # Length low byte (10 bytes)
-
-    # Data payload
-    frame.append(channel_code)    # Channel selection (1 byte)
-    frame.append(wave_type_code)  # Wave type (1 byte)
-
-    # Frequency word (32-bit, big-endian)
-    freq_bytes = struct.pack('>I', freq_word)  # Big-endian 32-bit unsigned int
-    frame.extend(freq_bytes)
-
-    # Phase word (32-bit, big-endian)
-    phase_bytes = struct.pack('>I', phase_word)  # Big-endian 32-bit unsigned int
-    frame.extend(phase_bytes)
-
-    # Calculate and append checksum
-    checksum_data = [DAC_CMD, 0x00, DATA_LENGTH] + frame[5:]  # CMD + LEN + DATA
-    checksum = calculate_checksum(checksum_data)
-    frame.append(checksum)
-
-    return frame
+    return DAC_CONFIG_FRAME.pack(channel_code, wave_type_code, freq_word, phase_word)
 
 def format_command_output(command_bytes, wave_type, frequency_hz, phase_degrees, channel='A'):
     """
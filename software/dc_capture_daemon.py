@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+DC Capture Daemon
+=================
+
+Owns the Digital Capture stream (EP 0x83) and publishes it into a
+shared-memory ring (shared_ring.py), so the viewer, the recorder and
+decoders can consume one capture at the same time. Each reader has its own
+cursor: a reader that falls behind loses only its own data, and the USB
+reader never waits for anyone.
+
+The daemon reads straight into the ring, so samples are not copied on the
+way from the transport to the readers. In marker mode (--markers) it
+strips the sequence-marker packets itself and publishes the exact gaps in
+the ring's gap table; readers then see plain samples. Without markers,
+overruns the transport reports are published as gaps instead.
+
+Commands:
+    Readers post command frames through the ring's mailbox (writes on the
+    'shm' transport) and the daemon forwards them to the board, so the
+    existing tools start and stop captures as before. DC START frames are
+    rewritten to the daemon's own marker setting. --locked ignores reader
+    commands and keeps the stream the daemon started.
+
+Usage:
+    python dc_capture_daemon.py usb-async --rate 1000000
+    python dc_capture_daemon.py usb --rate 500000 --markers --size 256
+    python dc_realtime_viewer.py shm          # in other terminals
+    python dc_timed_capture.py                # transport 'shm:fpga2025-dc'
+"""
+
+import argparse
+import sys
+import time
+
+from dc_commands import (CMD_DC_START, CMD_DC_STOP, DC_STOP_FRAME, actual_rate,
+                         dc_start_payload, rate_divider)
+from dc_markers import MarkerStripper
+from frame_codec import FRAME_HEADER, FRAME_OVERHEAD, FRAME_PREFIX_LEN, encode_frame
+from shared_ring import DEFAULT_MAX_WRITE, DEFAULT_NAME, READER_TIMEOUT, SharedRing
+
+DEFAULT_SIZE_MB = 64
+POLL_TIMEOUT = 0.01        # Longest wait in read_stream; bounds command latency
+STATUS_INTERVAL = 2.0
+
+
+class CaptureDaemon:
+    """
+    Reads the DC stream from one transport and publishes it to a SharedRing.
+
+    Args:
+        link: Open transport that owns the DC endpoint
+        ring (SharedRing): Ring to publish into
+        markers (bool): Capture in sequence-marker mode and strip the markers
+        locked (bool): Ignore commands posted by readers
+    """
+
+    def __init__(self, link, ring, markers=False, locked=False):
+        self.link = link
+        self.ring = ring
+        self.markers = markers
+        self.locked = locked
+        self.stripper = MarkerStripper() if markers else None
+        self.sample_rate = 0.0
+        self.running = False
+        self.commands = 0
+        self._overruns = getattr(link, 'stream_overruns', 0)
+        self._buffer = bytearray(ring.max_write) if markers else None
+
+    # ------------------------------------------------------------------
+    # Stream control
+    # ------------------------------------------------------------------
+    def start(self, sample_rate, markers=None):
+        """
+        Send DC START at `sample_rate` and announce the new stream.
+
+        Args:
+            markers (bool): Switch marker mode for this and later captures
+                (None keeps the current setting)
+        """
+        if markers is not None and markers != self.markers:
+            self.markers = markers
+            self.stripper = MarkerStripper() if markers else None
+            self._buffer = bytearray(self.ring.max_write) if markers else None
+        self._send_start(rate_divider(sample_rate))
+
+    def stop(self):
+        self.link.write(DC_STOP_FRAME)
+        self._stopped()
+
+    def _send_start(self, divider):
+        self.link.write(DC_STOP_FRAME)
+        time.sleep(0.05)
+        self.link.reset_input()
+        self._overruns = getattr(self.link, 'stream_overruns', 0)
+        if self.stripper is not None:
+            self.stripper.reset()
+        self.link.write(encode_frame(CMD_DC_START, dc_start_payload(divider, self.markers)))
+        self.sample_rate = actual_rate(divider)
+        self.running = True
+        self.ring.set_stream(self.sample_rate, True, self.markers)
+
+    def _stopped(self):
+        self.running = False
+        self.ring.set_stream(self.sample_rate, False, self.markers)
+
+    def forward(self, data):
+        """
+        Pass command bytes posted by a reader on to the board.
+
+        DC START/STOP frames also update the stream state; a START gets the
+        daemon's marker flag whatever the reader asked for.
+        """
+        self.commands += 1
+        while data:
+            if data[:2] != FRAME_HEADER or len(data) < FRAME_OVERHEAD:
+                self.link.write(data)
+                return
+            size = FRAME_OVERHEAD + int.from_bytes(data[3:5], 'big')
+            frame, data = data[:size], data[size:]
+            if frame[2] == CMD_DC_START and len(frame) >= FRAME_PREFIX_LEN + 3:
+                self._send_start(int.from_bytes(frame[FRAME_PREFIX_LEN:FRAME_PREFIX_LEN + 2], 'big'))
+            elif frame[2] == CMD_DC_STOP:
+                self.stop()
+            else:
+                self.link.write(frame)
+
+    # ------------------------------------------------------------------
+    # Main loop
+    # ------------------------------------------------------------------
+    def poll(self, timeout=POLL_TIMEOUT):
+        """
+        One step: forward a pending command, then move what the transport
+        has into the ring.
+
+        Returns:
+            int: Samples published
+        """
+        command = self.ring.take_command()
+        if command is not None and not self.locked:
+            self.forward(command)
+        self.ring.heartbeat()
+
+        if self.stripper is None:
+            position = self.ring.write_pos
+            count = self.link.read_stream_into(self.ring.write_view(self.ring.max_write), timeout)
+            self.ring.commit(count)
+            overruns = getattr(self.link, 'stream_overruns', 0)
+            if overruns != self._overruns:
+                self.ring.add_gap(position, overruns - self._overruns)
+                self._overruns = overruns
+            return count
+
+        count = self.link.read_stream_into(self._buffer, timeout)
+        if count:
+            samples, gaps = self.stripper.feed(memoryview(self._buffer)[:count])
+        elif not self.running:
+            # Stream stopped and drained: the held-back last packet is final
+            samples, gaps = self.stripper.finish()
+        else:
+            return 0
+        # gap.position counts samples output before the gap; this block
+        # starts at stripper.samples - len(samples)
+        base = self.ring.write_pos - (self.stripper.samples - len(samples))
+        for gap in gaps:
+            self.ring.add_gap(base + gap.position, gap.lost)
+        self.ring.write(samples)
+        return len(samples)
+
+    def run(self, duration=None, status_interval=STATUS_INTERVAL, status=None):
+        """
+        Poll until `duration` seconds passed (forever if None) or Ctrl+C.
+
+        Args:
+            status (callable): Called with the daemon every status_interval
+        """
+        deadline = None if duration is None else time.perf_counter() + duration
+        next_status = time.perf_counter() + status_interval
+        try:
+            while deadline is None or time.perf_counter() < deadline:
+                self.poll()
+                now = time.perf_counter()
+                if now >= next_status:
+                    next_status = now + status_interval
+                    self.ring.reap(READER_TIMEOUT)
+                    if status is not None:
+                        status(self)
+        except KeyboardInterrupt:
+            pass
+
+
+# ============================================================================
+# Main
+# ============================================================================
+def print_status(daemon):
+    ring = daemon.ring
+    state = f"{daemon.sample_rate / 1e6:.4f} MHz" if daemon.running else "stopped"
+    print(f"[{time.strftime('%H:%M:%S')}] {state}  published {ring.write_pos:,} B  "
+          f"device lost {ring.device_lost:,}  commands {daemon.commands}")
+    for reader in ring.readers():
+        print(f"    #{reader.slot} {reader.name or '-':<16} pid {reader.pid:<7} "
+              f"lag {reader.lag:>12,} B  lost {reader.lost:>12,} B  read {reader.bytes:>14,} B")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish the DC stream to shared memory for several readers")
+    parser.add_argument('transport', nargs='?', default='usb',
+                        help="Transport spec that owns EP 0x83 (usb, usb-async[:DEPTH[:SIZE]], COM3, emu)")
+    parser.add_argument('--rate', type=float, help="Start a capture at this rate (Hz); "
+                                                    "otherwise wait for a reader to start one")
+    parser.add_argument('--markers', action='store_true', help="Capture in sequence-marker mode")
+    parser.add_argument('--locked', action='store_true', help="Ignore commands from readers")
+    parser.add_argument('--name', default=DEFAULT_NAME, help=f"Shared memory name (default {DEFAULT_NAME})")
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE_MB, help="Ring size in MB")
+    parser.add_argument('--read-size', type=int, default=DEFAULT_MAX_WRITE, help="Bytes per transport read")
+    parser.add_argument('--duration', type=float, help="Stop after this many seconds")
+    args = parser.parse_args()
+
+    from transport import create_transport
+
+    with create_transport(args.transport) as link, \
+            SharedRing(args.name, args.size * 1024 * 1024, args.read_size) as ring:
+        daemon = CaptureDaemon(link, ring, args.markers, args.locked)
+        print(f"Publishing {link.name} to shared memory {ring.name!r} "
+              f"({args.size} MB{', markers' if args.markers else ''}); Ctrl+C to quit")
+        if args.rate:
+            daemon.start(args.rate)
+        daemon.run(args.duration, status=print_status)
+        link.write(DC_STOP_FRAME)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,711 @@
+#!/usr/bin/env python3
+"""
+Headless DC Capture Service
+===========================
+
+A long-running process that keeps the board open and serves a small
+JSON/HTTP API on localhost (or a Unix socket), so lab automation can start
+and stop captures, change the rate, arm triggers, record, read statistics
+and fetch samples without reopening USB or re-running backend discovery
+for every capture.
+
+The device side is dc_capture_daemon.CaptureDaemon: the stream goes into a
+shared-memory ring, so the 'shm' tools (viewer, timed capture) can join the
+same capture. Inside the service one analysis reader feeds the live
+statistics (logic_stats), the armed trigger (trigger.TriggerEngine) and an
+optional recording (capture_file), and every /capture or /stream request
+reads with a cursor of its own, so a slow client only loses its own data.
+
+API (JSON bodies and replies unless noted):
+    GET    /status                  stream, ring, readers, trigger, recording
+    POST   /start    {"rate": Hz, "markers": bool}   start or restart
+    POST   /rate     {"rate": Hz}                     restart at a new rate
+    POST   /stop
+    GET    /stats                   per-channel logic statistics since START
+    POST   /trigger  {"spec": "rise:0", "mode": "normal", "pre": 1024, "post": 3072}
+    POST   /trigger/arm             re-arm a single-shot trigger
+    DELETE /trigger
+    GET    /trigger/windows?since=ID        window list (id, trigger, start, forced, length)
+    GET    /trigger/window?id=ID            samples of one window (default: latest),
+                                            application/octet-stream
+    POST   /record   {"path": "run1.dcap"}   record everything from now on
+    POST   /record/stop
+    GET    /capture?samples=N&timeout=S     the next N samples, application/octet-stream;
+                                            X-Lost-Bytes / X-Sample-Rate headers
+    GET    /stream?seconds=S&bytes=N        raw samples as a chunked stream
+
+    Errors are {"error": message} with status 400 (bad request), 404 or
+    409 (not possible in the current state).
+
+Usage:
+    python dc_capture_service.py usb-async --port 8765
+    python dc_capture_service.py usb --unix /tmp/fpga2025-dc.sock --markers
+
+    curl -X POST localhost:8765/start -d '{"rate": 1000000}'
+    curl localhost:8765/capture?samples=1000000 -o burst.bin
+
+    from dc_capture_service import ServiceClient
+    client = ServiceClient('localhost:8765')     # or ServiceClient(unix='/tmp/...sock')
+    client.start(1_000_000)
+    samples = client.capture(1_000_000)
+"""
+
+import argparse
+import http.client
+import json
+import os
+import queue
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from capture_file import CaptureWriter
+from dc_capture_daemon import DEFAULT_SIZE_MB, CaptureDaemon
+from dc_commands import SYSTEM_CLK, rate_divider
+from logic_stats import LogicStatistics
+from shared_ring import DEFAULT_MAX_WRITE, DEFAULT_NAME, READER_TIMEOUT, SharedRing, SharedRingReader
+from trigger import MODES, TriggerEngine, parse_trigger
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_WINDOWS = 64               # Trigger windows kept for /trigger/window
+CONTROL_TIMEOUT = 5.0
+MAX_CAPTURE = 256 * 1024 * 1024
+STREAM_CHUNK = 256 * 1024
+
+
+class ServiceError(Exception):
+    """Request that cannot be served; carries the HTTP status."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# ============================================================================
+# Service
+# ============================================================================
+class CaptureService:
+    """
+    Device, shared ring and analysis threads behind the HTTP API.
+
+    Args:
+        spec (str): Transport spec of the board
+        ring_name (str): Shared memory name for 'shm' readers
+        size_mb (int): Ring size in MB
+        read_size (int): Bytes per transport read
+        markers (bool): Default marker mode for /start
+    """
+
+    def __init__(self, spec, ring_name=DEFAULT_NAME, size_mb=DEFAULT_SIZE_MB,
+                 read_size=DEFAULT_MAX_WRITE, markers=False):
+        self.spec = spec
+        self.ring_name = ring_name
+        self.size = size_mb * 1024 * 1024
+        self.read_size = read_size
+        self.markers = markers
+        self.link = None
+        self.ring = None
+        self.daemon = None
+        self.started_at = time.time()
+
+        self._controls = queue.Queue()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()          # Analysis state below
+        self._generation = None
+        self.stats = LogicStatistics()
+        self.trigger = None
+        self.trigger_spec = None
+        self.windows = deque(maxlen=MAX_WINDOWS)
+        self.window_ids = 0
+        self.writer = None
+        self.analysis_lost = 0
+
+    def open(self):
+        from transport import create_transport
+        self.link = create_transport(self.spec).open()
+        self.ring = SharedRing(self.ring_name, self.size, self.read_size)
+        self.daemon = CaptureDaemon(self.link, self.ring, self.markers)
+        for target, name in ((self._device_loop, 'dc-device'), (self._analysis_loop, 'dc-analysis')):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def close(self):
+        if self.daemon is None:
+            return
+        if self.daemon.running:
+            self.call(self.daemon.stop)
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        with self._lock:
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+        self.ring.close()
+        self.link.close()
+        self.daemon = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    # ------------------------------------------------------------------
+    # Device thread: the only thread that touches the transport
+    # ------------------------------------------------------------------
+    def call(self, function, *args, timeout=CONTROL_TIMEOUT):
+        """Run `function(*args)` on the device thread and return its result."""
+        done = threading.Event()
+        result = {}
+        self._controls.put((function, args, done, result))
+        if not done.wait(timeout):
+            raise ServiceError("Device thread did not respond", 409)
+        if 'error' in result:
+            raise result['error']
+        return result.get('value')
+
+    def _device_loop(self):
+        next_reap = time.perf_counter()
+        while not self._stop.is_set():
+            while True:
+                try:
+                    function, args, done, result = self._controls.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    result['value'] = function(*args)
+                except Exception as exc:
+                    result['error'] = exc
+                done.set()
+            self.daemon.poll()
+            if time.perf_counter() >= next_reap:
+                next_reap = time.perf_counter() + 1.0
+                self.ring.reap(READER_TIMEOUT)
+
+    def start(self, rate, markers=None):
+        if not 0 < rate <= SYSTEM_CLK:
+            raise ServiceError(f"rate must be in 1..{SYSTEM_CLK} Hz, got {rate}")
+        self.call(self.daemon.start, rate, markers)
+        return self.status()
+
+    def stop(self):
+        self.call(self.daemon.stop)
+        return self.status()
+
+    # ------------------------------------------------------------------
+    # Analysis thread: statistics, trigger and recording
+    # ------------------------------------------------------------------
+    def _analysis_loop(self):
+        reader = SharedRingReader(self.ring_name, 'service')
+        gaps, gap_count = deque(), 0
+        try:
+            while not self._stop.is_set():
+                generation = self.ring.generation
+                if generation != self._generation:
+                    # Bytes of the previous capture first, then start over
+                    self._process(reader, gaps, self.ring.stream_start)
+                    with self._lock:
+                        self._new_capture(generation)
+                    gaps.clear()
+                    gap_count = self.ring.gaps(gap_count)[1]
+                found, gap_count = self.ring.gaps(gap_count)
+                gaps.extend(found)
+                if not reader.wait(0.05):
+                    continue
+                self._process(reader, gaps)
+        finally:
+            reader.close()
+
+    def _new_capture(self, generation):
+        self._generation = generation
+        self.stats = LogicStatistics(self.ring.sample_rate)
+        if self.trigger is not None:
+            self.trigger.reset()
+
+    def _process(self, reader, gaps, stop=None):
+        """Feed what the reader has (up to stream position `stop`) to the consumers."""
+        limit = None if stop is None else stop - reader.position
+        if limit is not None and limit <= 0:
+            return
+        lost = reader.lost
+        for view in reader.read_views(limit):
+            position = reader.position
+            data = np.frombuffer(view, dtype=np.uint8)
+            with self._lock:
+                lost_now = reader.lost - lost
+                if lost_now:
+                    self._mark_drop(lost_now)
+                    lost = reader.lost
+                self.stats.update(data)
+                if self.trigger is not None:
+                    for window in self.trigger.feed(data):
+                        self.windows.append((self.window_ids, window))
+                        self.window_ids += 1
+                self._record(data, position, gaps)
+            del data
+            reader.consume(len(view))
+            del view
+        with self._lock:
+            if reader.lost != lost:
+                self._mark_drop(reader.lost - lost)
+        self.analysis_lost = reader.lost
+
+    def _mark_drop(self, count):
+        if self.writer is not None:
+            self.writer.mark_drop(count)
+
+    def _record(self, data, position, gaps):
+        # Device-side gaps inside this block become drop markers at their place
+        done = 0
+        while gaps and gaps[0].position < position + len(data):
+            gap = gaps.popleft()
+            if self.writer is not None:
+                split = max(0, gap.position - position)
+                self.writer.write(data[done:split])
+                self.writer.mark_drop(gap.lost)
+                done = split
+        if self.writer is not None:
+            self.writer.write(data[done:])
+
+    def arm_trigger(self, spec, mode='normal', pre=1024, post=3072):
+        if mode not in MODES:
+            raise ServiceError(f"mode must be one of {MODES}")
+        engine = TriggerEngine(parse_trigger(spec), pre=int(pre), post=int(post), mode=mode)
+        with self._lock:
+            self.trigger = engine
+            self.trigger_spec = spec
+            self.windows.clear()
+        return self._trigger_status()
+
+    def rearm_trigger(self):
+        with self._lock:
+            if self.trigger is None:
+                raise ServiceError("No trigger armed", 409)
+            self.trigger.arm()
+        return self._trigger_status()
+
+    def disarm_trigger(self):
+        with self._lock:
+            self.trigger = None
+            self.trigger_spec = None
+        return self._trigger_status()
+
+    def window_list(self, since=0):
+        with self._lock:
+            return [{'id': wid, 'trigger': w.trigger, 'start': w.start, 'forced': w.forced,
+                     'length': len(w.samples)} for wid, w in self.windows if wid >= since]
+
+    def window(self, wid=None):
+        with self._lock:
+            for current, window in reversed(self.windows):
+                if wid is None or current == wid:
+                    return current, window
+        raise ServiceError("No such trigger window", 404)
+
+    def start_recording(self, path):
+        with self._lock:
+            if self.writer is not None:
+                raise ServiceError(f"Already recording to {self.writer.path}", 409)
+            self.writer = CaptureWriter(path, self.ring.sample_rate or 1.0,
+                                        rate_divider(self.ring.sample_rate) if self.ring.sample_rate else 0)
+        return self._recording_status()
+
+    def stop_recording(self):
+        with self._lock:
+            if self.writer is None:
+                raise ServiceError("Not recording", 409)
+            status = self._recording_status()
+            self.writer.close()
+            self.writer = None
+        return status
+
+    # ------------------------------------------------------------------
+    # Client readers
+    # ------------------------------------------------------------------
+    def capture(self, samples, timeout=10.0, name='capture'):
+        """
+        The next `samples` samples from a reader of its own.
+
+        Returns:
+            tuple: (bytes, bytes lost by this reader)
+        """
+        if not 0 < samples <= MAX_CAPTURE:
+            raise ServiceError(f"samples must be in 1..{MAX_CAPTURE}")
+        out = bytearray(samples)
+        filled = 0
+        deadline = time.perf_counter() + timeout
+        with SharedRingReader(self.ring_name, name) as reader:
+            while filled < samples and time.perf_counter() < deadline:
+                if reader.wait(0.05):
+                    filled += reader.read_into(memoryview(out)[filled:])
+            return bytes(out[:filled]), reader.lost
+
+    def stream(self, seconds=None, max_bytes=None, name='stream'):
+        """Yield raw sample chunks for `seconds` or until `max_bytes` were sent."""
+        deadline = None if seconds is None else time.perf_counter() + seconds
+        sent = 0
+        with SharedRingReader(self.ring_name, name) as reader:
+            buffer = bytearray(STREAM_CHUNK)
+            while deadline is None or time.perf_counter() < deadline:
+                if max_bytes is not None and sent >= max_bytes:
+                    break
+                if not reader.wait(0.05):
+                    continue
+                size = STREAM_CHUNK if max_bytes is None else min(STREAM_CHUNK, max_bytes - sent)
+                count = reader.read_into(memoryview(buffer)[:size])
+                sent += count
+                yield bytes(buffer[:count])
+
+    # ------------------------------------------------------------------
+    # Reports
+    # ------------------------------------------------------------------
+    def _trigger_status(self):
+        engine = self.trigger
+        if engine is None:
+            return {'armed': False}
+        return {'armed': not engine.stopped, 'spec': self.trigger_spec, 'mode': engine.mode,
+                'pre': engine.pre, 'post': engine.post, 'windows': engine.triggers,
+                'forced': engine.forced, 'latest': self.window_ids - 1 if self.windows else None}
+
+    def _recording_status(self):
+        if self.writer is None:
+            return {'recording': False}
+        return {'recording': True, 'path': self.writer.path, 'samples': self.writer.sample_count,
+                'dropped': self.writer.dropped_bytes}
+
+    def status(self):
+        ring = self.ring
+        with self._lock:
+            trigger = self._trigger_status()
+            recording = self._recording_status()
+        return {
+            'transport': self.link.name,
+            'running': ring.running,
+            'sample_rate': ring.sample_rate,
+            'markers': ring.markers,
+            'capture': ring.generation,
+            'published': ring.write_pos,
+            'capture_bytes': ring.write_pos - ring.stream_start,
+            'device_lost': ring.device_lost,
+            'gaps': ring.gap_count,
+            'ring': {'name': ring.name, 'capacity': ring.capacity},
+            'readers': [r._asdict() for r in ring.readers()],
+            'analysis_lost': self.analysis_lost,
+            'trigger': trigger,
+            'recording': recording,
+            'uptime': time.time() - self.started_at,
+        }
+
+    def statistics(self):
+        with self._lock:
+            return {'samples': self.stats.samples, 'sample_rate': self.stats.sample_rate,
+                    'channels': [ch._asdict() for ch in self.stats.result()]}
+
+
+# ============================================================================
+# HTTP front end
+# ============================================================================
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'FPGA2025-DC/1'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def address_string(self):
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    # Plumbing ------------------------------------------------------------
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise ServiceError("Body is not valid JSON") from None
+        if not isinstance(body, dict):
+            raise ServiceError("Body must be a JSON object")
+        return body
+
+    def _send(self, status, body, content_type='application/json', headers=None):
+        if content_type == 'application/json':
+            body = json.dumps(body, default=_json_default).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        route = self.ROUTES.get((method, url.path.rstrip('/') or '/'))
+        try:
+            if route is None:
+                raise ServiceError(f"No route {method} {url.path}", 404)
+            body = self._body() if method == 'POST' else {}
+            route(self, query, body)
+        except ServiceError as exc:
+            self._send(exc.status, {'error': str(exc)})
+        except (ValueError, TypeError, KeyError) as exc:
+            self._send(400, {'error': str(exc)})
+        except (RuntimeError, OSError) as exc:
+            self._send(409, {'error': str(exc)})
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    # Routes ----------------------------------------------------------------
+    def _status(self, query, body):
+        self._send(200, self.service.status())
+
+    def _start(self, query, body):
+        markers = body.get('markers')
+        self._send(200, self.service.start(float(body['rate']), None if markers is None else bool(markers)))
+
+    def _rate(self, query, body):
+        self._send(200, self.service.start(float(body['rate'])))
+
+    def _stop_capture(self, query, body):
+        self._send(200, self.service.stop())
+
+    def _stats(self, query, body):
+        self._send(200, self.service.statistics())
+
+    def _arm(self, query, body):
+        self._send(200, self.service.arm_trigger(body['spec'], body.get('mode', 'normal'),
+                                                 body.get('pre', 1024), body.get('post', 3072)))
+
+    def _rearm(self, query, body):
+        self._send(200, self.service.rearm_trigger())
+
+    def _disarm(self, query, body):
+        self._send(200, self.service.disarm_trigger())
+
+    def _windows(self, query, body):
+        self._send(200, self.service.window_list(int(query.get('since', 0))))
+
+    def _window(self, query, body):
+        wid, window = self.service.window(int(query['id']) if 'id' in query else None)
+        self._send(200, window.samples.tobytes(), 'application/octet-stream',
+                   {'X-Window-Id': wid, 'X-Trigger': window.trigger, 'X-Start': window.start,
+                    'X-Forced': int(window.forced)})
+
+    def _record(self, query, body):
+        self._send(200, self.service.start_recording(body['path']))
+
+    def _record_stop(self, query, body):
+        self._send(200, self.service.stop_recording())
+
+    def _capture(self, query, body):
+        data, lost = self.service.capture(int(query['samples']), float(query.get('timeout', 10.0)))
+        self._send(200, data, 'application/octet-stream',
+                   {'X-Lost-Bytes': lost, 'X-Sample-Rate': self.service.ring.sample_rate})
+
+    def _stream(self, query, body):
+        seconds = float(query['seconds']) if 'seconds' in query else None
+        max_bytes = int(query['bytes']) if 'bytes' in query else None
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('X-Sample-Rate', str(self.service.ring.sample_rate))
+        self.end_headers()
+        try:
+            for chunk in self.service.stream(seconds, max_bytes):
+                if chunk:
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    ROUTES = {
+        ('GET', '/status'): _status,
+        ('POST', '/start'): _start,
+        ('POST', '/rate'): _rate,
+        ('POST', '/stop'): _stop_capture,
+        ('GET', '/stats'): _stats,
+        ('POST', '/trigger'): _arm,
+        ('POST', '/trigger/arm'): _rearm,
+        ('DELETE', '/trigger'): _disarm,
+        ('GET', '/trigger/windows'): _windows,
+        ('GET', '/trigger/window'): _window,
+        ('POST', '/record'): _record,
+        ('POST', '/record/stop'): _record_stop,
+        ('GET', '/capture'): _capture,
+        ('GET', '/stream'): _stream,
+    }
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class _TcpServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, unix=None, verbose=False):
+    """
+    HTTP server for a CaptureService, on host:port or on a Unix socket path.
+
+    Only bind to localhost: the API has no authentication.
+    """
+    if unix is not None:
+        if os.path.exists(unix):
+            os.unlink(unix)
+        server = _UnixServer(unix, _Handler)
+    else:
+        server = _TcpServer((host, port), _Handler)
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+# ============================================================================
+# Client
+# ============================================================================
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class ServiceClient:
+    """
+    Minimal client for lab scripts.
+
+    Args:
+        address (str): 'host:port' of the service
+        unix (str): Unix socket path instead of address
+        timeout (float): Socket timeout in seconds
+    """
+
+    def __init__(self, address=f'{DEFAULT_HOST}:{DEFAULT_PORT}', unix=None, timeout=30.0):
+        self.address = address
+        self.unix = unix
+        self.timeout = timeout
+
+    def _connection(self):
+        if self.unix is not None:
+            return _UnixConnection(self.unix, self.timeout)
+        return http.client.HTTPConnection(self.address, timeout=self.timeout)
+
+    def request(self, method, path, body=None):
+        """
+        Returns:
+            tuple: (decoded JSON or raw bytes, response headers)
+
+        Raises:
+            RuntimeError: With the service's error message
+        """
+        connection = self._connection()
+        try:
+            payload = json.dumps(body).encode() if body is not None else None
+            headers = {'Content-Type': 'application/json'} if payload is not None else {}
+            connection.request(method, path, payload, headers)
+            response = connection.getresponse()
+            data = response.read()
+            if response.getheader('Content-Type') == 'application/json':
+                data = json.loads(data)
+            if response.status != 200:
+                raise RuntimeError(data.get('error') if isinstance(data, dict) else response.reason)
+            return data, dict(response.getheaders())
+        finally:
+            connection.close()
+
+    def status(self):
+        return self.request('GET', '/status')[0]
+
+    def start(self, rate, markers=None):
+        return self.request('POST', '/start', {'rate': rate, 'markers': markers})[0]
+
+    def stop(self):
+        return self.request('POST', '/stop', {})[0]
+
+    def statistics(self):
+        return self.request('GET', '/stats')[0]
+
+    def arm_trigger(self, spec, mode='normal', pre=1024, post=3072):
+        return self.request('POST', '/trigger', {'spec': spec, 'mode': mode, 'pre': pre, 'post': post})[0]
+
+    def capture(self, samples, timeout=10.0):
+        """Next `samples` samples as a uint8 array (fewer on timeout)."""
+        data, headers = self.request('GET', f'/capture?samples={int(samples)}&timeout={timeout}')
+        return np.frombuffer(data, dtype=np.uint8)
+
+
+# ============================================================================
+# Main
+# ============================================================================
+def main():
+    parser = argparse.ArgumentParser(description="Headless DC capture service with a local HTTP API")
+    parser.add_argument('transport', nargs='?', default='usb',
+                        help="Transport spec (usb, usb-async[:DEPTH[:SIZE]], COM3, emu)")
+    parser.add_argument('--host', default=DEFAULT_HOST, help="Address to bind (keep it local)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', help="Serve on this Unix socket path instead of TCP")
+    parser.add_argument('--rate', type=float, help="Start a capture at this rate (Hz) right away")
+    parser.add_argument('--markers', action='store_true', help="Capture in sequence-marker mode")
+    parser.add_argument('--name', default=DEFAULT_NAME, help="Shared memory name for 'shm' readers")
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE_MB, help="Ring size in MB")
+    parser.add_argument('--verbose', action='store_true', help="Log every request")
+    args = parser.parse_args()
+
+    with CaptureService(args.transport, args.name, args.size, markers=args.markers) as service:
+        if args.rate:
+            service.start(args.rate)
+        server = make_server(service, args.host, args.port, args.unix, args.verbose)
+        where = args.unix or f"http://{args.host}:{args.port}"
+        print(f"Serving {service.link.name} on {where} (shared memory {args.name!r}); Ctrl+C to quit")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if args.unix:
+                os.unlink(args.unix)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
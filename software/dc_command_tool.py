@@ -4,8 +4,6 @@ Digital Capture Command Generator & Waveform Plotter
 生成DC模块控制命令并实时绘制8通道波形的工具
 """
 
-import serial
-import serial.tools.list_ports
 import time
 import numpy as np
 import matplotlib.pyplot as plt
@@ -14,6 +12,8 @@ from collections import deque
 import threading
 import sys
 
+from transport import create_transport, list_transports
+
 def calculate_checksum(data):
     """计算校验和（从功能码开始的所有字节累加，取低8位）"""
     return sum(data) & 0xFF
@@ -140,7 +140,7 @@ class DigitalCaptureWaveform:
         初始化波形绘制器
 
         Args:
-            port: 串口名称，例如 'COM3' 或 '/dev/ttyUSB0'
+            port: 串口名称，例如 'COM3' 或 '/dev/ttyUSB0'；'usb' 直连 EP3，'loop' 为回环
             baudrate: 波特率，默认115200
             buffer_size: 每个通道的缓冲区大小（显示点数）
         """
@@ -148,7 +148,7 @@ class DigitalCaptureWaveform:
         self.baudrate = baudrate
         self.buffer_size = buffer_size
         self.running = False
-        self.serial_port = None
+        self.link = None
 
         # 8通道数据缓冲区（使用deque实现循环缓冲）
         self.channels = [deque(maxlen=buffer_size) for _ in range(8)]
@@ -160,40 +160,36 @@ class DigitalCaptureWaveform:
         self.start_time = None
 
     def list_ports(self):
-        """列出所有可用串口"""
-        ports = serial.tools.list_ports.comports()
-        print("\n可用串口:")
-        for i, port in enumerate(ports, 1):
-            print(f"{i}. {port.device} - {port.description}")
-        return [port.device for port in ports]
+        """列出所有可用连接 (USB 直连 + 串口)"""
+        links = list_transports()
+        print("\n可用连接:")
+        for i, (spec, description) in enumerate(links, 1):
+            print(f"{i}. {spec} - {description}")
+        return [spec for spec, _ in links]
 
     def connect(self):
-        """连接串口"""
+        """连接设备"""
         try:
-            self.serial_port = serial.Serial(
-                port=self.port,
-                baudrate=self.baudrate,
-                timeout=0.1
-            )
-            print(f"✅ 已连接到 {self.port}, 波特率 {self.baudrate}")
+            self.link = create_transport(self.port, self.baudrate, timeout=0.1).open()
+            print(f"✅ 已连接到 {self.link.name}, 波特率 {self.baudrate}")
             return True
         except Exception as e:
             print(f"❌ 连接失败: {e}")
             return False
 
     def disconnect(self):
-        """断开串口"""
-        if self.serial_port and self.serial_port.is_open:
-            self.serial_port.close()
-            print("串口已关闭")
+        """断开连接"""
+        if self.link and self.link.is_open:
+            self.link.close()
+            print("连接已关闭")
 
     def send_command(self, command_bytes):
         """发送命令"""
-        if self.serial_port and self.serial_port.is_open:
-            self.serial_port.write(command_bytes)
+        if self.link and self.link.is_open:
+            self.link.write(command_bytes)
             print(f"✅ 已发送命令: {' '.join([f'{b:02X}' for b in command_bytes])}")
         else:
-            print("❌ 串口未打开")
+            print("❌ 连接未打开")
 
     def start_capture(self, sample_rate_hz):
         """启动数字捕获"""
@@ -212,24 +208,25 @@ class DigitalCaptureWaveform:
         print("✅ 已停止捕获")
 
     def read_data_thread(self):
-        """后台线程：读取串口数据"""
+        """后台线程：读取采样数据"""
         while self.running:
-            if self.serial_port and self.serial_port.in_waiting > 0:
+            if self.link and self.link.is_open:
                 try:
-                    # 读取一个字节
-                    data = self.serial_port.read(1)
-                    if len(data) == 1:
-                        byte_val = data[0]
-                        self.total_bytes += 1
-
+                    # 批量读取, 超时返回空
+                    data = self.link.read_stream(4096, timeout=0.1)
+                    # 只有最后 buffer_size 个采样会被显示
+                    self.total_bytes += len(data)
+                    self.sample_count += len(data)
+                    data = data[-self.buffer_size:]
+                    first = self.sample_count - len(data)
+                    for i, byte_val in enumerate(data):
                         # 解析8个通道
                         for ch in range(8):
                             bit_val = (byte_val >> ch) & 0x01
                             self.channels[ch].append(bit_val)
 
                         # 时间轴（采样序号）
-                        self.time_axis.append(self.sample_count)
-                        self.sample_count += 1
+                        self.time_axis.append(first + i)
 
                 except Exception as e:
                     print(f"读取错误: {e}")
@@ -352,7 +349,7 @@ def interactive_mode():
     ports = plotter.list_ports()
 
     if not ports:
-        print("❌ 未找到可用串口")
+        print("❌ 未找到可用连接")
         return
 
     # 选择串口
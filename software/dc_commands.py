@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Digital Capture Commands
+========================
+
+Command frames and sample-rate arithmetic for digital_capture_handler, shared
+by the DC tools, the benchmark and the emulator.
+
+    0x0B  START  payload: divider (uint16, big-endian), rate = 60 MHz / divider,
+                 optionally followed by a flags byte (DC_FLAG_MARKERS: send
+                 samples in sequence-marker packets, see dc_markers.py)
+    0x0C  STOP   no payload
+
+Typical usage:
+    from dc_commands import dc_start_frame, DC_STOP_FRAME
+
+    link.write(DC_STOP_FRAME)
+    link.write(dc_start_frame(1_000_000))
+"""
+
+from frame_codec import encode_frame
+
+SYSTEM_CLK = 60_000_000  # 60MHz
+CMD_DC_START = 0x0B
+CMD_DC_STOP = 0x0C
+DC_FLAG_MARKERS = 0x01
+
+SAMPLE_RATE_OPTIONS = [
+    ("1 kHz", 1_000),
+    ("2 kHz", 2_000),
+    ("5 kHz", 5_000),
+    ("10 kHz", 10_000),
+    ("20 kHz", 20_000),
+    ("50 kHz", 50_000),
+    ("100 kHz", 100_000),
+    ("200 kHz", 200_000),
+    ("400 kHz", 400_000),
+    ("500 kHz", 500_000),
+    ("600 kHz", 600_000),
+    ("1 MHz", 1_000_000),
+    ("2 MHz", 2_000_000),
+    ("5 MHz", 5_000_000),
+    ("10 MHz", 10_000_000),
+    ("20 MHz", 20_000_000),
+    ("30 MHz", 30_000_000),
+]
+
+DC_STOP_FRAME = bytes(encode_frame(CMD_DC_STOP))
+
+
+def rate_divider(sample_rate_hz):
+    """Divider for the requested rate, clamped to the 16-bit register."""
+    return min(max(SYSTEM_CLK // max(int(sample_rate_hz), 1), 1), 0xFFFF)
+
+
+def actual_rate(divider):
+    """Sample rate in Hz produced by a divider."""
+    return SYSTEM_CLK / divider
+
+
+def dc_start_payload(divider, markers=False):
+    """START payload for a divider; the flags byte is only sent when needed."""
+    payload = divider.to_bytes(2, 'big')
+    return payload + bytes([DC_FLAG_MARKERS]) if markers else payload
+
+
+def dc_start_frame(sample_rate_hz, markers=False):
+    """
+    Build the START frame for a sample rate.
+
+    >>> dc_start_frame(1_000_000).hex(' ')
+    'aa 55 0b 00 02 00 3c 49'
+    >>> dc_start_frame(1_000_000, markers=True).hex(' ')
+    'aa 55 0b 00 03 00 3c 01 4b'
+    """
+    return encode_frame(CMD_DC_START, dc_start_payload(rate_divider(sample_rate_hz), markers))
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Deep-Memory Capture Viewer
+--------------------------
+Browses recorded Digital Capture files (.dcap from dc_timed_capture, or raw
+.bin dumps) that can be far larger than RAM. The capture is memory-mapped
+(capture_file.CaptureFile), and a min/max decimation index (decimation.py)
+is built once and stored next to it as <file>.dmmx. Every redraw asks the
+index for at most MAX_BINS bins, so any zoom level costs the same; only when
+the visible range is that short are the raw samples read, which touches only
+the pages of the visible range.
+
+Controls (on the Matplotlib figure):
+    - Mouse wheel: zoom in/out around the cursor
+    - Left-button drag: pan
+    - Left/Right keys: pan by half a screen; +/- keys: zoom
+    - Home key or "全部": show the whole capture
+    - Lost data (drop markers in .dcap files) is marked with red lines
+
+Usage:
+    python dc_file_viewer.py capture.dcap [--rebuild]
+
+Requirements:
+    pip install matplotlib numpy
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+import matplotlib.pyplot as plt
+from matplotlib.widgets import Button
+
+from capture_file import CaptureFile
+from decimation import DEFAULT_BASE, DEFAULT_FACTOR, MinMaxPyramid, envelope
+
+MAX_BINS = 4000           # bins (or raw samples) drawn per channel
+ZOOM_STEP = 1.25
+MIN_SPAN = 16             # samples visible at maximum zoom
+
+
+def index_path(path: str) -> str:
+    return path + ".dmmx"
+
+
+def index_levels(total: int) -> int:
+    """Levels needed so the top level shows the whole capture in MAX_BINS bins."""
+    levels = 1
+    while DEFAULT_BASE * DEFAULT_FACTOR ** (levels - 1) * MAX_BINS < total:
+        levels += 1
+    return levels
+
+
+def load_index(capture: CaptureFile, rebuild: bool = False) -> MinMaxPyramid:
+    """Open the cached decimation index, (re)building it if needed."""
+    path = index_path(capture.path)
+    if not rebuild and os.path.exists(path) \
+            and os.path.getmtime(path) >= os.path.getmtime(capture.path):
+        try:
+            pyramid = MinMaxPyramid.load(path)
+            if pyramid.samples == len(capture):
+                return pyramid
+        except ValueError:
+            pass
+
+    total = len(capture)
+    started = time.time()
+
+    def _progress(done: int):
+        print(f"\r建立索引: {done / max(total, 1) * 100:5.1f}%", end="", flush=True)
+
+    pyramid = MinMaxPyramid.from_samples(capture.samples, progress=_progress,
+                                         levels=index_levels(total))
+    print(f"\r索引完成: {total:,} 个采样, {time.time() - started:.1f} 秒")
+    try:
+        pyramid.save(path)
+        return MinMaxPyramid.load(path)
+    except OSError as exc:
+        print(f"⚠️  无法保存索引 ({exc}), 仅在内存中使用")
+        return pyramid
+
+
+class DeepCaptureViewer:
+    """Zoom/pan viewer for recorded captures of any size."""
+
+    def __init__(self, path: str, rebuild: bool = False):
+        self.capture = CaptureFile(path)
+        self.total = len(self.capture)
+        if not self.total:
+            raise ValueError(f"{path} contains no samples")
+        self.rate = self.capture.sample_rate
+        self.pyramid = load_index(self.capture, rebuild)
+        self.drop_positions = np.array([index for index, _ in self.capture.drops], dtype=np.int64)
+
+        self.start = 0
+        self.stop = self.total
+        self._drag_x = None
+        self._drag_range = None
+
+        self.fig, self.ax = plt.subplots(figsize=(12, 6))
+        plt.subplots_adjust(left=0.08, right=0.95, bottom=0.15, top=0.92)
+        self.ax.set_title(os.path.basename(path))
+        self.ax.set_xlabel("Time (s)" if self.rate else "Sample Index")
+        self.ax.set_ylabel("Logic Level")
+        self.ax.set_ylim(-1, 8)
+        self.ax.set_yticks(range(8))
+        self.ax.grid(True, alpha=0.3)
+
+        self.lines = [
+            self.ax.plot([], [], drawstyle="steps-post", linewidth=1.0)[0]
+            for _ in range(8)
+        ]
+        self.drop_lines = None
+        self.status_text = self.ax.text(0.01, 0.96, "", transform=self.ax.transAxes,
+                                        fontsize=10, color="tab:gray")
+
+        ax_all = plt.axes([0.85, 0.02, 0.10, 0.06])
+        self.btn_all = Button(ax_all, "全部")
+        self.btn_all.on_clicked(lambda _: self.show_range(0, self.total))
+
+        canvas = self.fig.canvas
+        canvas.mpl_connect("scroll_event", self._on_scroll)
+        canvas.mpl_connect("button_press_event", self._on_press)
+        canvas.mpl_connect("motion_notify_event", self._on_motion)
+        canvas.mpl_connect("button_release_event", self._on_release)
+        canvas.mpl_connect("key_press_event", self._on_key)
+        canvas.mpl_connect("close_event", lambda _: self.capture.close())
+
+        self.redraw()
+
+    # ------------------------------------------------------------------
+    # Coordinates
+    # ------------------------------------------------------------------
+    def _to_x(self, samples):
+        return samples / self.rate if self.rate else samples
+
+    def _to_sample(self, x: float) -> float:
+        return x * self.rate if self.rate else x
+
+    def show_range(self, start: float, stop: float):
+        span = max(int(stop - start), MIN_SPAN)
+        span = min(span, self.total)
+        start = int(min(max(start, 0), self.total - span))
+        self.start, self.stop = start, start + span
+        self.redraw()
+
+    # ------------------------------------------------------------------
+    # Drawing
+    # ------------------------------------------------------------------
+    def redraw(self):
+        start, stop = self.start, self.stop
+        if stop - start <= MAX_BINS:
+            # Short range: raw samples, reading only these pages of the file
+            raw = np.asarray(self.capture.samples[start:stop])
+            xs = self._to_x(np.arange(start, stop + 1, dtype=np.float64))
+            for idx in range(8):
+                ys = (raw >> idx) & 1
+                self.lines[idx].set_data(xs, np.append(ys, ys[-1:]) + idx)
+            detail = "原始采样"
+        else:
+            level, bin_size, first, any_high, all_high = self.pyramid.query(start, stop, MAX_BINS)
+            xs, ys = envelope(first, bin_size, any_high, all_high)
+            xs = self._to_x(xs)
+            for idx in range(8):
+                self.lines[idx].set_data(xs, ys[idx] + idx)
+            detail = f"1 bin = {bin_size} 点 (L{level})"
+
+        if self.drop_lines is not None:
+            self.drop_lines.remove()
+            self.drop_lines = None
+        visible = self.drop_positions[(self.drop_positions >= start) & (self.drop_positions < stop)]
+        if len(visible):
+            self.drop_lines = self.ax.vlines(self._to_x(visible[:MAX_BINS]), -1, 8,
+                                             colors="tab:red", linewidth=0.8)
+
+        self.ax.set_xlim(self._to_x(start), self._to_x(stop))
+        span = stop - start
+        span_text = f"{span / self.rate:.6g} s" if self.rate else f"{span:,} 点"
+        self.status_text.set_text(f"{start:,} .. {stop:,} / {self.total:,}  ({span_text}, {detail})")
+        self.fig.canvas.draw_idle()
+
+    # ------------------------------------------------------------------
+    # Interaction
+    # ------------------------------------------------------------------
+    def _zoom(self, factor: float, center: float):
+        start = center - (center - self.start) * factor
+        stop = center + (self.stop - center) * factor
+        self.show_range(start, stop)
+
+    def _on_scroll(self, event):
+        if event.inaxes != self.ax or event.xdata is None:
+            return
+        factor = 1 / ZOOM_STEP if event.button == "up" else ZOOM_STEP
+        self._zoom(factor, self._to_sample(event.xdata))
+
+    def _on_press(self, event):
+        if event.inaxes == self.ax and event.button == 1:
+            self._drag_x = event.x
+            self._drag_range = (self.start, self.stop)
+
+    def _on_motion(self, event):
+        if self._drag_x is None or event.x is None:
+            return
+        # Pixel distance from the press point, scaled by the range at press time
+        start, stop = self._drag_range
+        width = self.ax.get_window_extent().width
+        shift = (event.x - self._drag_x) / width * (stop - start)
+        self.show_range(start - shift, stop - shift)
+
+    def _on_release(self, _event):
+        self._drag_x = None
+
+    def _on_key(self, event):
+        span = self.stop - self.start
+        center = (self.start + self.stop) / 2
+        if event.key == "left":
+            self.show_range(self.start - span / 2, self.stop - span / 2)
+        elif event.key == "right":
+            self.show_range(self.start + span / 2, self.stop + span / 2)
+        elif event.key in ("+", "="):
+            self._zoom(1 / ZOOM_STEP, center)
+        elif event.key in ("-", "_"):
+            self._zoom(ZOOM_STEP, center)
+        elif event.key == "home":
+            self.show_range(0, self.total)
+
+    def show(self):
+        plt.show()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deep-memory viewer for recorded DC captures")
+    parser.add_argument("path", help=".dcap recording or raw .bin dump")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the decimation index")
+    args = parser.parse_args()
+
+    try:
+        viewer = DeepCaptureViewer(args.path, args.rebuild)
+    except (OSError, ValueError) as exc:
+        print(f"无法打开文件: {exc}")
+        sys.exit(1)
+    viewer.show()
+
+
+if __name__ == "__main__":
+    main()
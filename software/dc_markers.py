@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+DC Sequence Markers
+===================
+
+Host side of the optional marker mode of digital_capture_handler (START
+payload flag DC_FLAG_MARKERS). In this mode the handler sends samples in
+packets, each with a header carrying the device-side index of its first
+sample:
+
+    A5 5A LEN_H LEN_L IDX[39:32] .. IDX[7:0] CHK    then LEN samples
+
+    LEN  1..MARKER_MAX_SAMPLES samples (big-endian)
+    IDX  sample ticks since START, counting the ticks the handler had to
+         drop because its FIFO was full (40 bits, big-endian)
+    CHK  (LEN_H + LEN_L + IDX bytes) & 0xFF
+
+A packet never spans a drop, so a jump in IDX says exactly how many samples
+were lost and where: between the last sample before the packet and its
+first sample.
+
+MarkerStripper turns the packet stream back into plain samples and reports
+every gap as Gap(position, index, lost), where `position` is the number of
+samples output before the gap. Packets are parsed by their length field;
+full-length runs are checked and copied with NumPy in one step. A packet is
+only output once the header after it checks out, so bytes lost on the host
+side (ring or transport overruns) never leak into the samples: the packet
+they hit is dropped, the stripper scans for the next header whose checksum
+matches and whose successor header also does, and the index jump reports
+everything in between as one gap. The lost count stays exact either way.
+A checked header whose index goes back is the first packet of a new
+capture (the handler restarts at index 0): counting restarts from it, and
+the samples before its index are reported as lost. The last packet of the
+old capture has no header confirming it and is dropped.
+
+Typical usage:
+    from dc_commands import dc_start_frame
+    from dc_markers import MarkerStripper
+
+    link.write(dc_start_frame(rate, markers=True))
+    stripper = MarkerStripper()
+    samples, gaps = stripper.feed(link.read_stream(65536))
+    for gap in gaps:
+        print(f"{gap.lost} samples lost before sample {gap.position}")
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+MARKER_SYNC = b'\xA5\x5A'
+MARKER_HEADER_SIZE = 10
+MARKER_MAX_SAMPLES = 1024           # MARK_MAX_LEN in digital_capture_handler
+
+_STRIDE = MARKER_HEADER_SIZE + MARKER_MAX_SAMPLES
+_RUN_CHECK = 1024                   # Most packets checked per vectorised step
+_INDEX_SHIFTS = np.array([32, 24, 16, 8, 0], dtype=np.int64)
+_RUN_STEPS = np.arange(_RUN_CHECK, dtype=np.int64) * MARKER_MAX_SAMPLES
+
+Gap = namedtuple('Gap', [
+    'position',     # Samples output before the gap
+    'index',        # Device index of the first sample after the gap
+    'lost',         # Samples lost in the gap
+])
+
+
+def header_checksum(length, index):
+    """CHK byte of a packet header."""
+    return (sum(length.to_bytes(2, 'big')) + sum(index.to_bytes(5, 'big'))) & 0xFF
+
+
+def encode_packets(samples, first_index=0, max_samples=MARKER_MAX_SAMPLES):
+    """
+    Wrap consecutive samples in marker packets (device side, for the
+    emulator and tests).
+
+    Args:
+        samples: uint8 samples (bytes-like or numpy array)
+        first_index (int): Device index of samples[0]
+        max_samples (int): Samples per full packet
+
+    Returns:
+        np.ndarray: uint8 packet stream
+    """
+    data = np.frombuffer(samples, dtype=np.uint8) if not isinstance(samples, np.ndarray) else samples
+    count = len(data)
+    packets = -(-count // max_samples)
+    out = np.empty(count + packets * MARKER_HEADER_SIZE, dtype=np.uint8)
+    if not count:
+        return out
+    lengths = np.full(packets, max_samples, dtype=np.int64)
+    lengths[-1] = count - (packets - 1) * max_samples
+    indices = first_index + np.arange(packets, dtype=np.int64) * max_samples
+
+    headers = np.empty((packets, MARKER_HEADER_SIZE), dtype=np.uint8)
+    headers[:, 0] = MARKER_SYNC[0]
+    headers[:, 1] = MARKER_SYNC[1]
+    headers[:, 2] = lengths >> 8
+    headers[:, 3] = lengths & 0xFF
+    headers[:, 4:9] = (indices[:, None] >> _INDEX_SHIFTS) & 0xFF
+    headers[:, 9] = headers[:, 2:9].sum(axis=1, dtype=np.int64) & 0xFF
+
+    full = packets - 1 if lengths[-1] != max_samples else packets
+    body = out[:full * (max_samples + MARKER_HEADER_SIZE)].reshape(full, max_samples + MARKER_HEADER_SIZE)
+    body[:, :MARKER_HEADER_SIZE] = headers[:full]
+    body[:, MARKER_HEADER_SIZE:] = data[:full * max_samples].reshape(full, max_samples)
+    if full < packets:
+        tail = full * (max_samples + MARKER_HEADER_SIZE)
+        out[tail:tail + MARKER_HEADER_SIZE] = headers[-1]
+        out[tail + MARKER_HEADER_SIZE:] = data[full * max_samples:]
+    return out
+
+
+def _parse_header(buf, pos):
+    """(length, index) of a valid header at pos, or None."""
+    if buf[pos] != MARKER_SYNC[0] or buf[pos + 1] != MARKER_SYNC[1]:
+        return None
+    length = (int(buf[pos + 2]) << 8) | int(buf[pos + 3])
+    if not 1 <= length <= MARKER_MAX_SAMPLES:
+        return None
+    index = int.from_bytes(bytes(buf[pos + 4:pos + 9]), 'big')
+    if header_checksum(length, index) != buf[pos + 9]:
+        return None
+    return length, index
+
+
+class MarkerStripper:
+    """
+    Streaming parser for marker packets.
+
+    Attributes:
+        samples (int): Samples output since reset()
+        next_index (int): Device index expected for the next sample (None
+            until the first header after reset(aligned=False))
+        lost (int): Samples reported lost
+        gaps (int): Gaps reported
+        resyncs (int): Times the stream had to be searched for a header
+        discarded (int): Bytes skipped while searching
+        restarts (int): Captures that started again at a lower index
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self, aligned=True):
+        """
+        Start over.
+
+        Args:
+            aligned (bool): True at the start of a capture (the stream
+                begins with the header of index 0). False when joining a
+                stream part-way, e.g. after skipping buffered data: the
+                bytes before the next good header are skipped and counting
+                starts at its index, without reporting a gap.
+        """
+        self.samples = 0
+        self.next_index = 0 if aligned else None
+        self.lost = 0
+        self.gaps = 0
+        self.resyncs = 0
+        self.discarded = 0
+        self.restarts = 0
+        self._pending = b''             # Unparsed tail of the last feed()
+        self._searching = not aligned
+        self._run_check = 16            # Packets the next vectorised step checks
+
+    def _follows(self, index):
+        """True if a header index may come next without a restart."""
+        return self.next_index is None or index >= self.next_index
+
+    def _accept(self, length, index, gaps):
+        if not self._follows(index):
+            # Checked header going back: the device started a new capture
+            self.restarts += 1
+            self.next_index = 0
+        if self.next_index is not None and index > self.next_index:
+            lost = index - self.next_index
+            gaps.append(Gap(self.samples, index, lost))
+            self.lost += lost
+            self.gaps += 1
+        self.next_index = index + length
+
+    def _full_run(self, buf, pos):
+        """
+        Number of consecutive full-length, gap-free packets at pos.
+
+        The step size doubles while runs continue and shrinks after a break,
+        so streams with a short packet every few packets (the handler's
+        timeout at low rates) are not checked far ahead in vain.
+        """
+        count = min((len(buf) - pos) // _STRIDE, self._run_check)
+        if count < 2 or self.next_index is None:
+            return 0
+        if buf[pos + 2] != MARKER_MAX_SAMPLES >> 8 or buf[pos + 3] != MARKER_MAX_SAMPLES & 0xFF:
+            return 0            # Short packet next: not worth a vectorised check
+        heads = buf[pos:pos + count * _STRIDE].reshape(count, _STRIDE)[:, :MARKER_HEADER_SIZE]
+        index = (heads[:, 4:9].astype(np.int64) << _INDEX_SHIFTS).sum(axis=1)
+        good = ((heads[:, 0] == MARKER_SYNC[0]) & (heads[:, 1] == MARKER_SYNC[1])
+                & (heads[:, 2] == MARKER_MAX_SAMPLES >> 8) & (heads[:, 3] == MARKER_MAX_SAMPLES & 0xFF)
+                & (heads[:, 2:9].sum(axis=1, dtype=np.int64) & 0xFF == heads[:, 9])
+                & (index == self.next_index + _RUN_STEPS[:count]))
+        if good.all():
+            self._run_check = min(2 * self._run_check, _RUN_CHECK)
+            return count
+        run = int(np.argmin(good))
+        self._run_check = max(2 * run, 16)
+        return run
+
+    def _search(self, buf, pos):
+        """
+        Position of the next trustworthy header at or after pos: valid and
+        followed by another valid header that continues its index.
+
+        Returns:
+            tuple: (position or None, position to keep from if more data is
+                needed, else None)
+        """
+        raw = buf.tobytes()
+        while True:
+            pos = raw.find(MARKER_SYNC, pos)
+            if pos < 0:
+                # A trailing A5 may be the first half of the next sync
+                keep = len(raw) - 1 if raw.endswith(MARKER_SYNC[:1]) else None
+                return None, keep
+            if pos + MARKER_HEADER_SIZE > len(raw):
+                return None, pos
+            header = _parse_header(buf, pos)
+            if header is not None:
+                following = pos + MARKER_HEADER_SIZE + header[0]
+                if following + MARKER_HEADER_SIZE > len(raw):
+                    return None, pos
+                successor = _parse_header(buf, following)
+                if successor is not None and successor[1] >= header[1] + header[0]:
+                    return pos, None
+            pos += 1
+
+    def feed(self, data):
+        """
+        Parse the next chunk of the packet stream.
+
+        A packet is output once the header that follows it has been checked,
+        so the newest packet is held back until more data arrives (see
+        finish()).
+
+        Args:
+            data: Bytes read from the DC endpoint (bytes-like or uint8 array)
+
+        Returns:
+            tuple: (samples uint8 array, list of Gap)
+        """
+        if self._pending:
+            data = self._pending + bytes(data)
+            self._pending = b''
+        buf = np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) else data
+        end = len(buf)
+        pieces = []
+        gaps = []
+        pos = 0
+        while True:
+            if self._searching:
+                found, keep = self._search(buf, pos)
+                if found is None:
+                    stop = keep if keep is not None else end
+                    self.discarded += stop - pos
+                    pos = stop
+                    break
+                self.discarded += found - pos
+                self._searching = False
+                pos = found
+
+            # Packet i of a run is confirmed by the header of packet i + 1
+            run = self._full_run(buf, pos) - 1
+            if run > 0:
+                block = buf[pos:pos + run * _STRIDE].reshape(run, _STRIDE)
+                pieces.append(block[:, MARKER_HEADER_SIZE:].reshape(-1))
+                pos += run * _STRIDE
+                self.next_index += run * MARKER_MAX_SAMPLES
+                self.samples += run * MARKER_MAX_SAMPLES
+                continue
+
+            if end - pos < MARKER_HEADER_SIZE:
+                break
+            header = _parse_header(buf, pos)
+            if header is None:
+                self._searching = True
+                self.resyncs += 1
+                continue
+            following = pos + MARKER_HEADER_SIZE + header[0]
+            if following + MARKER_HEADER_SIZE > end:
+                break
+            successor = _parse_header(buf, following)
+            if successor is None or successor[1] < header[1] + header[0]:
+                # Bytes of this packet went missing on the host side; its
+                # samples are counted lost by the next good header
+                self._searching = True
+                self.resyncs += 1
+                pos += 1
+                continue
+            self._accept(header[0], header[1], gaps)
+            pieces.append(buf[pos + MARKER_HEADER_SIZE:following])
+            self.samples += header[0]
+            pos = following
+
+        self._pending = buf[pos:].tobytes()
+        if not pieces:
+            return np.zeros(0, dtype=np.uint8), gaps
+        return np.concatenate(pieces), gaps
+
+    def finish(self):
+        """
+        End of the stream: output the last packet, which no header follows.
+        With no successor to check it against, it is dropped if its index
+        goes back.
+
+        Returns:
+            tuple: (samples uint8 array, list of Gap)
+        """
+        buf = np.frombuffer(self._pending, dtype=np.uint8)
+        self._pending = b''
+        gaps = []
+        header = _parse_header(buf, 0) if len(buf) >= MARKER_HEADER_SIZE and not self._searching else None
+        if header is None or not self._follows(header[1]) or len(buf) < MARKER_HEADER_SIZE + header[0]:
+            return np.zeros(0, dtype=np.uint8), gaps
+        self._accept(header[0], header[1], gaps)
+        self.samples += header[0]
+        return buf[MARKER_HEADER_SIZE:MARKER_HEADER_SIZE + header[0]].copy(), gaps
+
+
+def strip_markers(data):
+    """
+    Strip a complete marker stream in one call.
+
+    Returns:
+        tuple: (samples uint8 array, list of Gap)
+    """
+    stripper = MarkerStripper()
+    samples, gaps = stripper.feed(data)
+    last, more = stripper.finish()
+    return np.concatenate((samples, last)), gaps + more
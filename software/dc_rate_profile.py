@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Loss-Free DC Rate Calibration
+=============================
+
+Finds the highest Digital Capture sample rate a host sustains without
+losing samples, for one transport spec (which includes the queue depth of
+'usb-async:DEPTH:SIZE') and read size, and stores it in a per-host profile.
+The DC tools look the profile up before starting a capture and warn about
+(or clamp) rates above the calibrated limit.
+
+Search:
+    Each trial streams for `duration` seconds at one divider, with the host
+    doing nothing but reading. Samples received (including those in flight
+    after STOP) are compared with 60 MHz / divider times the streaming
+    time; a trial is loss-free when the shortfall stays within the start-up
+    slack and LOSS_TOLERANCE and the transport reports no overruns.
+
+    The fastest rate is tried first; otherwise the divider is bisected on a
+    log scale between the fastest failing and slowest passing divider until
+    they are within `precision` of each other, and the result is confirmed
+    with a longer run (stepping down on failure).
+
+Profile file (JSON, default ~/.fpga2025/dc_rate_profile.json, or the path in
+$FPGA2025_RATE_PROFILE):
+    {"version": 1, "hosts": {HOST: {"SPEC|READ_SIZE": entry, ...}}}
+
+    entry: spec, read_size, max_rate (Hz), divider, calibrated (ISO time),
+           duration, trials ([rate, loss_pct, lossless], ...)
+
+Typical usage:
+    from dc_rate_profile import rate_limit
+
+    limit = rate_limit('usb-async', read_size=262144)
+    if limit is not None and rate > limit:
+        print(f"{rate} Hz exceeds the calibrated loss-free rate {limit:.0f} Hz")
+
+Command line:
+    python dc_rate_profile.py usb-async:8:262144
+    python dc_rate_profile.py COM3 --read-size 8192 --duration 5
+    python dc_rate_profile.py --show
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from dc_commands import CMD_DC_START, DC_STOP_FRAME, SYSTEM_CLK, actual_rate, rate_divider
+from frame_codec import encode_frame
+
+PROFILE_VERSION = 1
+PROFILE_ENV = 'FPGA2025_RATE_PROFILE'
+DEFAULT_PROFILE_PATH = os.path.join(os.path.expanduser('~'), '.fpga2025', 'dc_rate_profile.json')
+
+DEFAULT_READ_SIZE = 65536
+DEFAULT_DURATION = 2.0          # Seconds per trial
+CONFIRM_FACTOR = 3              # Confirmation run is this many trials long
+DEFAULT_PRECISION = 0.05        # Stop when pass/fail rates are within 5%
+MIN_RATE = 1_000
+MAX_RATE = SYSTEM_CLK // 2      # Divider 2: fastest rate of the handler
+LOSS_TOLERANCE = 0.001          # Shortfall fraction still counted as loss-free
+START_SLACK_S = 0.02            # Start-up latency allowed for in the shortfall
+
+Trial = namedtuple('Trial', [
+    'rate',          # Actual sample rate in Hz (60 MHz / divider)
+    'divider',
+    'received',      # Samples received
+    'expected',      # Samples the device produced while streaming
+    'overruns',      # Bytes the transport dropped
+    'lossless',      # True if the trial counts as loss-free
+])
+
+Calibration = namedtuple('Calibration', [
+    'max_rate',      # Highest loss-free rate in Hz (0: none found)
+    'divider',       # Divider of max_rate
+    'trials',        # Trial records in the order they ran
+])
+
+
+# ============================================================================
+# Profile storage
+# ============================================================================
+def profile_path(path=None):
+    """Profile file to use: `path`, $FPGA2025_RATE_PROFILE or the default."""
+    return path or os.environ.get(PROFILE_ENV) or DEFAULT_PROFILE_PATH
+
+
+def host_name():
+    return platform.node() or 'unknown'
+
+
+def _key(spec, read_size):
+    return f"{str(spec).lower()}|{int(read_size)}"
+
+
+def load_profiles(path=None):
+    """
+    Read the profile file.
+
+    Returns:
+        dict: {host: {key: entry}}; empty if the file is missing or invalid
+    """
+    try:
+        with open(profile_path(path), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get('version') != PROFILE_VERSION:
+        return {}
+    return data.get('hosts', {})
+
+
+def save_entry(entry, path=None, host=None):
+    """Store (or replace) one calibration entry for this host."""
+    path = profile_path(path)
+    hosts = load_profiles(path)
+    hosts.setdefault(host or host_name(), {})[_key(entry['spec'], entry['read_size'])] = entry
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp = path + '.tmp'
+    with open(temp, 'w', encoding='utf-8') as f:
+        json.dump({'version': PROFILE_VERSION, 'hosts': hosts}, f, indent=2)
+    os.replace(temp, path)
+
+
+def lookup(spec, read_size=None, path=None, host=None):
+    """
+    Calibration entry for a transport spec on this host.
+
+    The entry for `read_size` is preferred; otherwise the most conservative
+    entry for the spec is returned.
+
+    Returns:
+        dict or None
+    """
+    entries = load_profiles(path).get(host or host_name(), {})
+    if read_size is not None:
+        entry = entries.get(_key(spec, read_size))
+        if entry is not None:
+            return entry
+    matching = [e for e in entries.values() if str(e.get('spec', '')).lower() == str(spec).lower()]
+    return min(matching, key=lambda e: e['max_rate']) if matching else None
+
+
+def rate_limit(spec, read_size=None, path=None):
+    """Calibrated loss-free rate in Hz for spec on this host, or None."""
+    entry = lookup(spec, read_size, path)
+    return float(entry['max_rate']) if entry is not None else None
+
+
+def clamp_rate(rate, limit):
+    """
+    `rate` if it is within `limit` (or no limit is known), otherwise the
+    highest rate not above the limit that a divider produces, in whole Hz.
+    """
+    if limit is None or actual_rate(rate_divider(rate)) <= limit:
+        return rate
+    return SYSTEM_CLK // min(math.ceil(SYSTEM_CLK / limit), 0xFFFF)
+
+
+# ============================================================================
+# Measurement
+# ============================================================================
+def run_trial(link, divider, duration=DEFAULT_DURATION, read_size=DEFAULT_READ_SIZE):
+    """
+    Stream at one divider and count what arrives.
+
+    Args:
+        link: Open transport
+        divider (int): DC divider (rate = 60 MHz / divider)
+        duration (float): Seconds to stream
+        read_size (int): Bytes per read call
+
+    Returns:
+        Trial
+    """
+    rate = actual_rate(divider)
+    buffer = bytearray(read_size)
+    link.write(DC_STOP_FRAME)
+    time.sleep(0.05)
+    link.reset_input()
+    overruns = getattr(link, 'stream_overruns', 0)
+
+    received = 0
+    link.write(encode_frame(CMD_DC_START, divider.to_bytes(2, 'big')))
+    start = time.perf_counter()
+    deadline = start + duration
+    while time.perf_counter() < deadline:
+        received += link.read_stream_into(buffer, timeout=0.05)
+    link.write(DC_STOP_FRAME)
+    stopped = time.perf_counter()
+    # Samples already in flight when STOP was sent still count
+    while True:
+        count = link.read_stream_into(buffer, timeout=0.1)
+        if not count:
+            break
+        received += count
+
+    expected = int((stopped - start) * rate)
+    overruns = getattr(link, 'stream_overruns', 0) - overruns
+    shortfall = expected - received
+    lossless = not overruns and shortfall <= max(expected * LOSS_TOLERANCE, rate * START_SLACK_S)
+    return Trial(rate, divider, received, expected, overruns, lossless)
+
+
+def loss_pct(trial):
+    """Share of the expected samples that did not arrive, in percent."""
+    if not trial.expected:
+        return 0.0
+    return max(trial.expected - trial.received, trial.overruns, 0) / trial.expected * 100
+
+
+def calibrate(link, read_size=DEFAULT_READ_SIZE, duration=DEFAULT_DURATION,
+              precision=DEFAULT_PRECISION, min_rate=MIN_RATE, max_rate=MAX_RATE, progress=None):
+    """
+    Binary-search the highest loss-free rate.
+
+    Args:
+        link: Open transport
+        read_size (int): Bytes per read call
+        duration (float): Seconds per trial
+        precision (float): Relative gap between passing and failing rate
+            at which the search stops
+        min_rate, max_rate (float): Search range in Hz
+        progress (callable): Called with every Trial
+
+    Returns:
+        Calibration
+    """
+    trials = []
+
+    def passes(divider, seconds=duration):
+        trial = run_trial(link, divider, seconds, read_size)
+        trials.append(trial)
+        if progress is not None:
+            progress(trial)
+        return trial.lossless
+
+    fast, slow = rate_divider(max_rate), rate_divider(min_rate)
+    if passes(fast):
+        found = fast
+    elif not passes(slow):
+        return Calibration(0.0, 0, trials)
+    else:
+        # fast fails, slow passes; bisect on a log scale
+        while slow - fast > 1 and slow / fast > 1 + precision:
+            middle = min(max(int(round(math.sqrt(fast * slow))), fast + 1), slow - 1)
+            if passes(middle):
+                slow = middle
+            else:
+                fast = middle
+        found = slow
+
+    # Confirm with a longer run, stepping down until it holds
+    while not passes(found, duration * CONFIRM_FACTOR):
+        if found >= 0xFFFF:
+            return Calibration(0.0, 0, trials)
+        found = min(max(found + 1, int(math.ceil(found * (1 + precision)))), 0xFFFF)
+    return Calibration(actual_rate(found), found, trials)
+
+
+def make_entry(spec, read_size, duration, result):
+    """Profile entry for a Calibration."""
+    return {
+        'spec': str(spec).lower(),
+        'read_size': int(read_size),
+        'max_rate': result.max_rate,
+        'divider': result.divider,
+        'calibrated': datetime.now().isoformat(timespec='seconds'),
+        'duration': duration,
+        'trials': [[t.rate, round(loss_pct(t), 3), t.lossless] for t in result.trials],
+    }
+
+
+# ============================================================================
+# Main
+# ============================================================================
+def main():
+    parser = argparse.ArgumentParser(description="Find and store the loss-free DC sample rate")
+    parser.add_argument('transport', nargs='?', default='usb',
+                        help="Transport spec (usb, usb-async[:DEPTH[:SIZE]], COM3, emu)")
+    parser.add_argument('--read-size', type=int, default=DEFAULT_READ_SIZE)
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION,
+                        help="Seconds per trial")
+    parser.add_argument('--precision', type=float, default=DEFAULT_PRECISION)
+    parser.add_argument('--min-rate', type=float, default=MIN_RATE)
+    parser.add_argument('--max-rate', type=float, default=MAX_RATE)
+    parser.add_argument('--profile', help=f"Profile file (default ${PROFILE_ENV} or {DEFAULT_PROFILE_PATH})")
+    parser.add_argument('--no-save', action='store_true', help="Only print the result")
+    parser.add_argument('--show', action='store_true', help="Print the stored profiles and exit")
+    args = parser.parse_args()
+
+    if args.show:
+        hosts = load_profiles(args.profile)
+        if not hosts:
+            print(f"No profiles in {profile_path(args.profile)}")
+        for host, entries in hosts.items():
+            print(host)
+            for entry in entries.values():
+                print(f"  {entry['spec']:<24} read {entry['read_size']:>8}  "
+                      f"{entry['max_rate'] / 1e6:8.3f} MHz  ({entry['calibrated']})")
+        return 0
+
+    from transport import create_transport
+
+    def _progress(trial):
+        state = "OK" if trial.lossless else "LOSS"
+        print(f"  {trial.rate / 1e6:9.4f} MHz (div {trial.divider:5d})  "
+              f"{trial.received:>12,} / {trial.expected:>12,}  loss {loss_pct(trial):6.2f}%  {state}")
+
+    with create_transport(args.transport) as link:
+        print(f"Calibrating {link.name}, read size {args.read_size}, {args.duration:g} s per trial")
+        result = calibrate(link, args.read_size, args.duration, args.precision,
+                           args.min_rate, args.max_rate, _progress)
+        link.write(DC_STOP_FRAME)
+
+    if not result.max_rate:
+        print("No loss-free rate found")
+        return 1
+    print(f"Loss-free up to {result.max_rate:,.0f} Hz (divider {result.divider})")
+    if not args.no_save:
+        save_entry(make_entry(args.transport, args.read_size, args.duration, result), args.profile)
+        print(f"Saved to {profile_path(args.profile)} for host {host_name()}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,6 +11,46 @@ Controls (on the Matplotlib figure):
     - "开始": start streaming with the selected sample rate
     - "停止": stop streaming immediately
     - Sample-rate radio buttons: choose the divider used in the START command
+    - History radio buttons: last 4096 samples, or 10 ms .. 60 s drawn from a
+      min/max decimation pyramid (decimation.py) at screen resolution
+
+Usage:
+    python dc_realtime_viewer.py [usb | usb-async | COM3 | loop | shm] [TRIGGER [normal|single|auto]]
+                                 [--markers] [--overlay] [--metrics=FILE]
+
+    TRIGGER examples: rise:0, fall:3, pattern:0x0F=0x05, pulse:2:1:100-200,
+    rise:0;rise:1 (sequence). With a trigger only the 4096-sample windows
+    around trigger points are shown (red line = trigger point).
+
+    --markers starts the capture in sequence-marker mode (dc_markers.py): the
+    exact number of lost samples is shown and every gap is marked with a
+    solid red line.
+
+    --overlay shows the pipeline metrics (pipeline_metrics.py) in the lower
+    right corner ("m" toggles it); --metrics=FILE appends a JSON snapshot
+    of them every 10 s, for soak tests.
+
+    shm reads the stream dc_capture_daemon.py publishes, so the viewer can
+    run next to the recorder and decoders on one capture.
+
+Rendering:
+    Frames are drawn from a canvas timer at RENDER_FPS, independent of how
+    often data arrives. Traces are polylines built from the transitions of
+    each channel (transitions.step_points), so quiet channels cost a few
+    points whatever the sample rate, and they are only rebuilt when new data
+    came in. With a blitting backend (TkAgg, QtAgg, ...) the axes, grid and
+    widgets are drawn once into a cached background and each frame only
+    redraws the traces and the status line (BlitRenderer); other backends
+    fall back to draw_idle().
+
+Backpressure:
+    When drawing cannot keep up with the stream, the USB worker first reads
+    in larger blocks and then decimates: each group of samples becomes an
+    AND/OR byte pair, so pulses stay visible while the data rate drops by
+    the ratio. The status line shows "DEC 1:N" while a ratio is in effect,
+    and the ratio is relaxed again once the display keeps up. Triggers and
+    --markers need every sample and turn decimation off; samples lost
+    anyway are counted in drops=.
 
 Requirements:
     pip install pyusb matplotlib numpy
@@ -19,248 +59,376 @@ Requirements:
 import sys
 import time
 import threading
-import queue
 from collections import deque
 from typing import List
 
 import numpy as np
-import usb.core
-import usb.util
 
 import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
+from matplotlib.collections import LineCollection
 from matplotlib.widgets import Button, RadioButtons
 
+from dc_commands import DC_STOP_FRAME, SAMPLE_RATE_OPTIONS, actual_rate, dc_start_frame, rate_divider
+from dc_markers import MarkerStripper
+from dc_rate_profile import rate_limit
+from decimation import MinMaxPyramid, and_or_pairs, envelope
+from pipeline_metrics import MetricsFile, PipelineMetrics
+from ring_buffer import RingBuffer
+from transitions import channel_edges, encode_transitions, step_points
+from trigger import TriggerEngine, parse_trigger
+from transport import create_transport
 
-USB_VID = 0x33AA
-USB_PID = 0x0000
-
-EP_CTRL_OUT = 0x02
-EP_DC_IN = 0x83
-
-STOP_CMD = bytes([0xAA, 0x55, 0x0C, 0x00, 0x00, 0x0C])
-
-SAMPLE_RATE_OPTIONS = [
-    ("1 kHz", 1_000),
-    ("2 kHz", 2_000),
-    ("5 kHz", 5_000),
-    ("10 kHz", 10_000),
-    ("20 kHz", 20_000),
-    ("50 kHz", 50_000),
-    ("100 kHz", 100_000),
-    ("200 kHz", 200_000),
-    ("400 kHz", 400_000),
-    ("500 kHz", 500_000),
-    ("600 kHz", 600_000),
-    ("1 MHz", 1_000_000),
-    ("2 MHz", 2_000_000),
-    ("5 MHz", 5_000_000),
-    ("10 MHz", 10_000_000),
-    ("20 MHz", 20_000_000),
-    ("30 MHz", 30_000_000),
-]
 DEFAULT_SAMPLE_RATE = 100_000
 
 WINDOW_SAMPLES = 4096  # samples per channel displayed
 READ_SIZE = 32768
-QUEUE_MAX = 8192
+RING_SIZE = 64 * 1024 * 1024  # bytes buffered between USB thread and display
+
+# History spans (seconds); 0 = last WINDOW_SAMPLES samples
+HISTORY_OPTIONS = [
+    ("4096 点", 0),
+    ("10 ms", 0.01),
+    ("100 ms", 0.1),
+    ("1 s", 1.0),
+    ("10 s", 10.0),
+    ("60 s", 60.0),
+]
+HISTORY_BINS = 2000           # min/max bins drawn per channel (about 2 per pixel)
+PYRAMID_CAPACITY = 1 << 20    # bins kept per pyramid level
 
-try:
-    LOOKUP_TABLE = np.unpackbits(
-        np.arange(256, dtype=np.uint8)[:, None], axis=1, bitorder="little"
-    )
-except TypeError:
-    LOOKUP_TABLE = np.unpackbits(
-        np.arange(256, dtype=np.uint8)[:, None], axis=1
-    )[:, ::-1]
+TRIGGER_PRE = WINDOW_SAMPLES // 4          # samples shown before the trigger point
+TRIGGER_AUTO_TIMEOUT_S = 0.2               # 'auto' mode forces a window after this
 
+MAX_GAPS = 10000              # marker mode: gap positions kept for drawing
 
-def generate_start_frame(sample_rate_hz: int) -> bytes:
-    divider = 60_000_000 // max(sample_rate_hz, 1)
-    div_h = (divider >> 8) & 0xFF
-    div_l = divider & 0xFF
-    cmd = 0x0B
-    checksum = (cmd + 0x00 + 0x02 + div_h + div_l) & 0xFF
-    return bytes([0xAA, 0x55, cmd, 0x00, 0x02, div_h, div_l, checksum])
+# Backpressure (UsbStreamWorker)
+MAX_READ_SIZE = 1024 * 1024   # largest adaptive read (ring slack)
+MIN_FLUSH_S = 0.01            # read timeout / input per read when the display keeps up
+MAX_FLUSH_S = 0.05            # ... and while it lags
+ADAPT_INTERVAL = 0.1          # seconds between rate measurements
+RATE_WINDOW = 1.0             # smoothing time of the measured rates
+DECIMATE_HIGH_S = 0.25        # backlog (seconds of input) that starts or raises decimation
+DECIMATE_LOW_S = 0.05         # backlog below which it is relaxed ...
+RELAX_TIME_S = 1.0            # ... one step per this many calm seconds
+MAX_RATIO = 32                # pairs still fill whole pyramid bins (base 64)
 
+RENDER_FPS = 60               # frame cadence, independent of data arrival
+STATUS_INTERVAL = 0.25        # seconds between status line updates
 
-class DcUsbInterface:
-    """USB transport identical to diagnose_dc.py (STOP->START sequencing)."""
 
-    def __init__(self):
-        self.dev = None
-
-    def _get_backends(self):
-        backends = []
-        try:
-            import usb.backend.libusb1  # type: ignore  # noqa
-
-            backend = usb.backend.libusb1.get_backend()
-            if backend:
-                backends.append(backend)
-        except Exception:
-            pass
-        try:
-            import usb.backend.libusb0  # type: ignore  # noqa
-
-            backend = usb.backend.libusb0.get_backend()
-            if backend:
-                backends.append(backend)
-        except Exception:
-            pass
-        try:
-            import usb.backend.openusb  # type: ignore  # noqa
+class DcUsbInterface:
+    """DC streaming on top of a transport (STOP->START sequencing as in diagnose_dc.py).
 
-            backend = usb.backend.openusb.get_backend()
-            if backend:
-                backends.append(backend)
-        except Exception:
-            pass
+    The default 'usb' spec reads EP3 directly; 'usb-async' keeps several
+    bulk transfers queued on EP3 so the FIFO is drained between reads; any
+    other transport spec (serial port, 'loop') streams over that link instead.
+    """
 
-        if not backends:
-            backends.append(None)
-        return backends
+    def __init__(self, spec="usb"):
+        self.spec = spec
+        self.link = None
 
     def open(self):
-        for backend in self._get_backends():
-            try:
-                dev = usb.core.find(idVendor=USB_VID, idProduct=USB_PID, backend=backend)
-                if dev:
-                    self.dev = dev
-                    break
-            except Exception:
-                continue
-
-        if not self.dev:
-            raise RuntimeError("Unable to locate FPGA USB device")
-
-        if hasattr(self.dev, "is_kernel_driver_active"):
-            try:
-                if self.dev.is_kernel_driver_active(0):
-                    self.dev.detach_kernel_driver(0)
-            except (NotImplementedError, AttributeError, usb.core.USBError):
-                pass
-
-        try:
-            self.dev.set_configuration()
-        except usb.core.USBError:
-            pass
+        self.link = create_transport(self.spec).open()
 
-    def start_capture(self, sample_rate_hz: int):
-        if not self.dev:
+    def start_capture(self, sample_rate_hz: int, markers: bool = False):
+        if not self.link:
             raise RuntimeError("Device not opened")
 
-        self.dev.write(EP_CTRL_OUT, STOP_CMD)
+        self.link.write(DC_STOP_FRAME)
         time.sleep(0.05)
-        self.dev.write(EP_CTRL_OUT, generate_start_frame(sample_rate_hz))
+        self.link.write(dc_start_frame(sample_rate_hz, markers))
 
     def stop_capture(self):
-        if self.dev:
+        if self.link:
             try:
-                self.dev.write(EP_CTRL_OUT, STOP_CMD)
-            except usb.core.USBError:
+                self.link.write(DC_STOP_FRAME)
+            except Exception:
                 pass
 
     def read(self, size: int, timeout_ms: int = 10) -> bytes:
-        if not self.dev:
+        if not self.link:
             raise RuntimeError("Device not opened")
-        try:
-            data = self.dev.read(EP_DC_IN, size, timeout=timeout_ms)
-            return bytes(data)
-        except usb.core.USBError as exc:
-            errno = getattr(exc, "errno", None)
-            if errno in (110, 116, None) or "timed out" in str(exc).lower():
-                return b""
-            raise
+        return self.link.read_stream(size, timeout_ms / 1000)
+
+    def read_into(self, buffer, timeout_ms: int = 10) -> int:
+        if not self.link:
+            raise RuntimeError("Device not opened")
+        return self.link.read_stream_into(buffer, timeout_ms / 1000)
+
+    @property
+    def read_size(self) -> int:
+        # Async links complete whole transfers; read at least one per call
+        return max(READ_SIZE, getattr(self.link, 'transfer_size', 0))
 
     def close(self):
         self.stop_capture()
-        if self.dev:
-            usb.util.dispose_resources(self.dev)
-            self.dev = None
+        if self.link:
+            self.link.close()
+            self.link = None
 
 
 class UsbStreamWorker(threading.Thread):
-    """Continuously drains EP3 into a queue when running_flag is set.
-    Coalesces small USB reads into larger buffers to reduce queue pressure,
-    and tracks dropped-chunk count for diagnostics.
+    """Continuously drains EP3 into a RingBuffer when running_flag is set.
+    USB reads land directly in the ring's free space; overruns (consumer too
+    slow) are counted in bytes by the ring, read errors are kept in last_error.
+
+    Backpressure: every ADAPT_INTERVAL the worker measures the USB input
+    rate, the rate the consumer drains the ring and the backlog. Reads
+    are sized to about flush_interval of input, and flush_interval grows
+    while the consumer lags (fewer, larger commits) and shrinks back when
+    it keeps up. When the backlog passes DECIMATE_HIGH_S the worker decimates
+    instead of letting the ring overrun: each group of 2 * ratio samples
+    becomes an (AND, OR) pair (decimation.and_or_pairs), so glitches stay
+    visible. The ratio follows input rate / drain rate (powers of two up to
+    max_ratio) and halves again once the backlog stays below DECIMATE_LOW_S.
+    A new ratio takes effect only where the samples in the ring fill whole
+    pairs of both ratios, so every byte stands for exactly `ratio` samples
+    and consumers' sample counts stay exact. `segments` holds (ring
+    position, ratio) where each ratio starts; consumers look it up with
+    segment_at().
     """
 
-    def __init__(self, iface: DcUsbInterface, data_queue: queue.Queue):
+    def __init__(self, iface: DcUsbInterface, ring: RingBuffer, metrics: PipelineMetrics = None):
         super().__init__(daemon=True)
         self.iface = iface
-        self.data_queue = data_queue
+        self.ring = ring
+        self.metrics = metrics if metrics is not None else PipelineMetrics()
         self.running_flag = threading.Event()
         self.stop_flag = threading.Event()
-        # Diagnostics / flow control stats
-        self.drop_count = 0
-        self.bytes_pushed = 0
-        # Coalescing parameters: try to push ~256KB at a time or every 10ms
-        self._coal_target = 256 * 1024
-        self._coal_time_s = 0.010
+        self.idle = threading.Event()   # set once the loop has seen running_flag cleared
+        self.idle.set()
+        # Diagnostics
+        self.last_error = None
+        self.error_count = 0
+        # Backpressure
+        self.max_ratio = MAX_RATIO   # 1 disables decimation
+        self.ratio = 1               # ratio of the bytes being written
+        self.next_ratio = 1          # ratio to switch to at the next pair boundary
+        self.segments = deque([(0, 1)])
+        self.read_size = iface.read_size
+        self.flush_interval = MIN_FLUSH_S
+        self.input_rate = 0.0        # samples/s from USB
+        self.drain_rate = 0.0        # ring bytes/s taken by the consumer
+        self.dropped_samples = 0     # samples lost to ring overruns
+        self._carry = np.zeros(0, dtype=np.uint8)
+        self._samples = 0            # samples in the ring since start_stream()
+        self._received = 0
+        self._mark = (time.perf_counter(), 0, 0)
+        self._overruns = 0
+        self._calm_since = None
+
+    @property
+    def drop_bytes(self) -> int:
+        return self.ring.overruns
+
+    @property
+    def bytes_pushed(self) -> int:
+        return self.ring.write_pos
 
     def start_stream(self):
+        # The loop must not be mid-read while its state is reset
+        if not self.stop_stream():
+            raise RuntimeError("USB worker did not stop")
+        self.last_error = None
+        # The ring is flushed afterwards
+        self.ratio = self.next_ratio = 1
+        self.segments = deque([(self.ring.write_pos, 1)])
+        self._carry = np.zeros(0, dtype=np.uint8)
+        self._samples = 0
+        self.flush_interval = MIN_FLUSH_S
+        self.read_size = self.iface.read_size
         self.running_flag.set()
         if not self.is_alive():
             self.start()
 
-    def stop_stream(self):
+    def stop_stream(self, timeout: float = MAX_FLUSH_S + 1.0) -> bool:
+        """Stop streaming and wait until the loop has finished its current read."""
         self.running_flag.clear()
+        if not self.is_alive():
+            return True
+        # Only a loop pass that saw running_flag cleared sets idle again
+        self.idle.clear()
+        return self.idle.wait(timeout)
 
     def stop_worker(self):
         self.stop_flag.set()
         self.running_flag.clear()
 
+    def segment_at(self, position: int):
+        """Consumer side: (ratio in effect at ring position, bytes until the next change or None)."""
+        segments = self.segments
+        while len(segments) > 1 and segments[1][0] <= position:
+            segments.popleft()
+        if len(segments) > 1:
+            return segments[0][1], segments[1][0] - position
+        return segments[0][1], None
+
+    def _set_ratio(self, ratio: int):
+        # Takes effect in _commit_decimated(), at the next pair boundary
+        self.next_ratio = ratio
+
+    def _adapt(self):
+        now = time.perf_counter()
+        then, received, consumed = self._mark
+        elapsed = now - then
+        if elapsed < ADAPT_INTERVAL:
+            return
+        self._mark = (now, self._received, self.ring.read_pos)
+        # The consumer drains in bursts: smooth over about RATE_WINDOW
+        weight = min(1.0, elapsed / RATE_WINDOW)
+        self.input_rate += weight * ((self._received - received) / elapsed - self.input_rate)
+        self.drain_rate += weight * ((self.ring.read_pos - consumed) / elapsed - self.drain_rate)
+        # Seconds of input waiting in the ring
+        backlog = len(self.ring) * self.ratio / max(self.input_rate, 1.0)
+
+        if backlog > DECIMATE_HIGH_S:
+            self._calm_since = None
+            self.flush_interval = min(self.flush_interval * 2, MAX_FLUSH_S)
+            if self.next_ratio < self.max_ratio:
+                # The consumer's cost is per byte: aim for input / ratio <= drain
+                need = self.input_rate / self.drain_rate if self.drain_rate else self.max_ratio
+                ratio = max(self.next_ratio * 2, 1 << max(0, int(np.ceil(np.log2(max(need, 1.0))))))
+                self._set_ratio(min(ratio, self.max_ratio))
+        elif backlog < DECIMATE_LOW_S:
+            self.flush_interval = max(self.flush_interval / 2, MIN_FLUSH_S)
+            if self._calm_since is None:
+                self._calm_since = now
+            elif self.next_ratio > 1 and now - self._calm_since >= RELAX_TIME_S:
+                self._calm_since = now
+                self._set_ratio(self.next_ratio // 2)
+        if self.next_ratio > self.max_ratio:
+            self._set_ratio(self.max_ratio)
+
+        # Read about flush_interval worth of input per call
+        target = int(self.input_rate * self.flush_interval) // 4096 * 4096
+        self.read_size = min(max(target, self.iface.read_size), self.ring.max_write)
+
+    def _commit_decimated(self, buffer, count: int):
+        data = np.frombuffer(buffer, dtype=np.uint8, count=count)
+        while self.next_ratio != self.ratio:
+            # Finish the old ratio where the ring holds whole pairs of both
+            align = 2 * max(self.ratio, self.next_ratio)
+            need = -(self._samples + len(self._carry)) % align
+            if need > len(data):
+                break
+            self._write_samples(data[:need])
+            data = data[need:]
+            self.ratio = self.next_ratio
+            self.segments.append((self.ring.write_pos, self.ratio))
+        self._write_samples(data)
+
+    def _write_samples(self, data):
+        """Write samples at the current ratio, keeping a partial group for later."""
+        if len(self._carry):
+            data = np.concatenate((self._carry, data))
+        if self.ratio == 1:
+            block, self._carry = data, data[:0]
+        else:
+            group = 2 * self.ratio
+            full = len(data) // group * group
+            block, self._carry = and_or_pairs(data[:full], group), data[full:].copy()
+        if len(block):
+            start = self.ring.write_pos
+            self.ring.write(block)
+            # Overrun blocks never reach the ring
+            self._samples += (self.ring.write_pos - start) * self.ratio
+
     def run(self):
-        buf = bytearray()
-        last_flush = time.time()
+        ring = self.ring
+        scratch = bytearray(ring.max_write)
         while not self.stop_flag.is_set():
             if not self.running_flag.is_set():
+                self.idle.set()
                 time.sleep(0.05)
-                # Reset coalescer between runs to reduce latency on restart
-                if buf:
-                    try:
-                        self.data_queue.put(bytes(buf), timeout=0.1)
-                        self.bytes_pushed += len(buf)
-                    except queue.Full:
-                        self.drop_count += 1
-                    buf.clear()
-                last_flush = time.time()
                 continue
 
+            self._adapt()
+            timeout_ms = max(1, int(self.flush_interval * 1000))
             try:
-                chunk = self.iface.read(READ_SIZE, timeout_ms=10)
+                started = time.perf_counter()
+                if self.ratio == self.next_ratio == 1:
+                    count = self.iface.read_into(ring.write_view(self.read_size), timeout_ms=timeout_ms)
+                    done = self.metrics.record_read(count, started)
+                    start = ring.write_pos
+                    ring.commit(count)
+                    self._samples += ring.write_pos - start
+                else:
+                    count = self.iface.read_into(memoryview(scratch)[:self.read_size], timeout_ms=timeout_ms)
+                    done = self.metrics.record_read(count, started)
+                    self._commit_decimated(scratch, count)
+                if count:
+                    self.metrics.record_commit(ring.write_pos, done)
             except Exception as exc:
-                # Push exception downstream for status display
-                try:
-                    self.data_queue.put(exc, timeout=0.1)
-                except queue.Full:
-                    self.drop_count += 1
+                # Keep the error for the status display
+                self.last_error = exc
+                self.error_count += 1
                 time.sleep(0.02)
                 continue
+            self._received += count
+            if ring.overruns != self._overruns:
+                self.dropped_samples += (ring.overruns - self._overruns) * self.ratio
+                self._overruns = ring.overruns
+
+
+class BlitRenderer:
+    """Redraws a fixed set of animated artists over a cached background.
+
+    The figure is drawn in full only when something static changes (axes
+    limits, widgets, window size); the background is cached on that
+    draw_event, and update() restores it and draws just the animated
+    artists. Backends without blitting get draw_idle() instead.
+    """
+
+    def __init__(self, canvas, artists):
+        self.canvas = canvas
+        self.artists = list(artists)
+        self.background = None
+        self.supported = bool(getattr(canvas, "supports_blit", False))
+        if self.supported:
+            # Animated artists are left out of full draws and drawn per frame
+            for artist in self.artists:
+                artist.set_animated(True)
+            canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _on_draw(self, _event):
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        figure = self.canvas.figure
+        for artist in self.artists:
+            figure.draw_artist(artist)
+
+    def invalidate(self):
+        """Static content changed: redraw everything and cache it again."""
+        self.background = None
+        self.canvas.draw_idle()
+
+    def update(self):
+        """Returns True if the frame was blitted now, False if a full draw was scheduled."""
+        if not self.supported or self.background is None:
+            self.canvas.draw_idle()
+            return False
+        self.canvas.restore_region(self.background)
+        self._draw_artists()
+        self.canvas.blit(self.canvas.figure.bbox)
+        return True
+
 
-            if chunk:
-                buf.extend(chunk)
-
-            now = time.time()
-            if len(buf) >= self._coal_target or (buf and (now - last_flush) >= self._coal_time_s):
-                try:
-                    self.data_queue.put(bytes(buf), timeout=0.02)
-                    self.bytes_pushed += len(buf)
-                except queue.Full:
-                    # Drop coalesced data if GUI cannot keep up
-                    self.drop_count += 1
-                buf.clear()
-                last_flush = now
 class DigitalCaptureViewer:
     """Matplotlib oscilloscope-style display for eight digital channels."""
 
-    def __init__(self):
-        self.iface = DcUsbInterface()
+    def __init__(self, spec: str = "usb", trigger: str = None, trigger_mode: str = "auto",
+                 markers: bool = False, metrics_path: str = None, overlay: bool = False):
+        self.iface = DcUsbInterface(spec)
         self.iface.open()
 
-        self.data_queue: queue.Queue = queue.Queue(maxsize=QUEUE_MAX)
-        self.worker = UsbStreamWorker(self.iface, self.data_queue)
+        self.ring = RingBuffer(RING_SIZE, max_write=max(self.iface.read_size, MAX_READ_SIZE))
+        self.worker = UsbStreamWorker(self.iface, self.ring)
+        # Stage latencies, throughput and backlog (pipeline_metrics.py)
+        self.metrics = self.worker.metrics
+        self.metrics_file = MetricsFile(metrics_path, self.metrics) if metrics_path else None
 
         self.default_rate_index = next(
             (idx for idx, (_, value) in enumerate(SAMPLE_RATE_OPTIONS) if value == DEFAULT_SAMPLE_RATE),
@@ -270,12 +438,37 @@ class DigitalCaptureViewer:
         self.capture_active = False
         self.last_error = None
         self.last_data_time = 0.0
+        self.rate_warning = None     # Set when the rate exceeds the calibrated limit
 
-        self.buffer = np.zeros((8, WINDOW_SAMPLES), dtype=np.uint8)
+        # Last WINDOW_SAMPLES raw samples (circular, write_pos = next slot)
+        self.window = np.zeros(WINDOW_SAMPLES, dtype=np.uint8)
         self.valid_samples = 0
         self.total_samples = 0
         self.write_pos = 0
 
+        # Optional trigger: only windows around trigger points are displayed
+        self.trigger = None
+        if trigger:
+            self.trigger = TriggerEngine(parse_trigger(trigger), pre=TRIGGER_PRE,
+                                         post=WINDOW_SAMPLES - TRIGGER_PRE, mode=trigger_mode)
+
+        # Min/max summary of everything received, for the history spans
+        self.pyramid = MinMaxPyramid(capacity=PYRAMID_CAPACITY)
+        self.history_span = 0.0
+        self.history_bin = None      # (bin size, pyramid level) last drawn
+
+        # Marker mode: packets are stripped on the display side; gap
+        # positions are sample counts since _clear_buffers (like the pyramid).
+        # Behind dc_capture_daemon.py ('shm') the daemon strips them instead.
+        self.stripper = MarkerStripper() if markers and self.iface.link.kind != 'shm' else None
+        self.gaps = deque(maxlen=MAX_GAPS)
+        self.display_start = 0       # sample count at x = 0 of the window view
+
+        # Triggers and marker stripping need every sample: never decimate
+        if self.trigger is not None or self.stripper is not None:
+            self.worker.max_ratio = 1
+        self.ratio = 1               # decimation ratio of the data last drawn
+
         self.fig, self.ax = plt.subplots(figsize=(12, 6))
         self.ax.set_title("Digital Capture Waveforms")
         self.ax.set_xlabel("Sample Index")
@@ -285,10 +478,12 @@ class DigitalCaptureViewer:
         self.ax.set_yticks(range(8))
         self.ax.grid(True, alpha=0.3)
 
-        self.lines = [
-            self.ax.plot([], [], drawstyle="steps-post", linewidth=1.0)[0]
-            for _ in range(8)
-        ]
+        # Plain polylines: the steps are explicit points (step_points)
+        self.lines = [self.ax.plot([], [], linewidth=1.0)[0] for _ in range(8)]
+        self.trigger_line = self.ax.axvline(TRIGGER_PRE, color="tab:red", linestyle="--",
+                                            linewidth=0.8, visible=False)
+        self.gap_lines = LineCollection([], colors="tab:red", linewidths=1.0)
+        self.ax.add_collection(self.gap_lines)
 
         self.status_text = self.ax.text(
             0.01,
@@ -298,11 +493,37 @@ class DigitalCaptureViewer:
             fontsize=10,
             color="tab:gray",
         )
+        # Metrics overlay, toggled with the "m" key
+        self.metrics_text = self.ax.text(
+            0.99,
+            0.02,
+            "",
+            transform=self.ax.transAxes,
+            fontsize=8,
+            family="monospace",
+            ha="right",
+            va="bottom",
+            visible=overlay,
+            bbox={"facecolor": "white", "alpha": 0.8, "edgecolor": "none"},
+        )
 
         self._build_controls()
-        self.animation = FuncAnimation(self.fig, self._update_plot, interval=50, blit=False)
+
+        # Rendering runs on its own timer; data only marks the traces dirty
+        self.dirty = False
+        self.status_due = 0.0
+        self.frame_times = deque(maxlen=RENDER_FPS)
+        self.render_started = None   # start of a frame waiting for its full draw
+        self.renderer = BlitRenderer(
+            self.fig.canvas,
+            self.lines + [self.trigger_line, self.gap_lines, self.status_text, self.metrics_text])
+        self.timer = self.fig.canvas.new_timer(interval=int(1000 / RENDER_FPS))
+        self.timer.add_callback(self._on_frame)
+        self.timer.start()
 
         self.fig.canvas.mpl_connect("close_event", self._handle_close)
+        self.fig.canvas.mpl_connect("key_press_event", self._handle_key)
+        self.fig.canvas.mpl_connect("draw_event", self._handle_draw)
 
     def _build_controls(self):
         plt.subplots_adjust(left=0.08, right=0.82, bottom=0.18, top=0.92)
@@ -329,17 +550,40 @@ class DigitalCaptureViewer:
 
         self.radio_rates.on_clicked(_on_rate)
 
+        ax_span = plt.axes([0.84, 0.04, 0.12, 0.22])
+        self.radio_span = RadioButtons(ax_span, [name for name, _ in HISTORY_OPTIONS], active=0)
+
+        def _on_span(label: str):
+            self.history_span = dict(HISTORY_OPTIONS)[label]
+            if self.history_span:
+                self.ax.set_xlabel("Time (s)")
+                self.ax.set_xlim(-self.history_span, 0)
+            else:
+                self.ax.set_xlabel("Sample Index")
+                self.ax.set_xlim(0, WINDOW_SAMPLES)
+            self.dirty = True
+            self.renderer.invalidate()
+
+        self.radio_span.on_clicked(_on_span)
+
     def start_stream(self):
         try:
             self.capture_active = False
             self.worker.stop_stream()
             self.iface.stop_capture()
             time.sleep(0.05)
-            self._flush_queue()
+            self._flush_ring()
             self._clear_buffers()
 
+            # Warn when the rate is above this host's calibrated loss-free rate
+            limit = rate_limit(self.iface.spec, self.iface.read_size)
+            self.rate_warning = None
+            if limit is not None and actual_rate(rate_divider(self.current_rate)) > limit:
+                self.rate_warning = f"超过无损速率 {limit/1000:.0f} kHz"
+                print(f"⚠️  {self.current_rate/1000:.0f} kHz 超过本机标定的无损速率 {limit/1000:.0f} kHz")
+
             self.worker.start_stream()
-            self.iface.start_capture(self.current_rate)
+            self.iface.start_capture(self.current_rate, self.stripper is not None)
 
             if self.current_rate > 200_000:
                 settle_time = 1.5
@@ -350,11 +594,12 @@ class DigitalCaptureViewer:
 
             settle_deadline = time.time() + settle_time
             while time.time() < settle_deadline:
-                self._flush_queue()
+                self._flush_ring()
                 time.sleep(flush_interval)
 
             self._clear_buffers()
-            self._flush_queue()
+            self._flush_ring()
+            self.metrics.reset()
             self.last_error = None
             self.last_data_time = time.time()
             self.capture_active = True
@@ -369,115 +614,244 @@ class DigitalCaptureViewer:
         self.capture_active = False
         self.worker.stop_stream()
         self.iface.stop_capture()
-        self._flush_queue()
+        self._flush_ring()
         self.status_text.set_text("停止")
         self.status_text.set_color("tab:gray")
 
     def _clear_buffers(self):
-        self.buffer.fill(0)
+        self.window.fill(0)
         self.valid_samples = 0
         self.total_samples = 0
         self.write_pos = 0
+        self.ratio = 1
+        self.pyramid.reset()
+        if self.stripper is not None:
+            # The ring is flushed right after this, mid-packet
+            self.stripper.reset(aligned=False)
+            self.gaps.clear()
+        if self.trigger is not None:
+            self.trigger.reset()
+            rate = actual_rate(rate_divider(self.current_rate))
+            self.trigger.auto_timeout = max(1, int(TRIGGER_AUTO_TIMEOUT_S * rate))
+            self.trigger_line.set_visible(False)
         self.last_data_time = 0.0
         for line in self.lines:
             line.set_data([], [])
-
-    def _update_plot(self, _):
-        self._drain_queue()
-
-        if self.capture_active and self.last_error:
+        self._draw_gaps(0, 0)
+        self.dirty = False
+
+    def _on_frame(self):
+        # Timer callback: take whatever arrived, then draw one frame
+        self._drain_ring()
+        if self.worker.last_error is not None:
+            self.last_error = self.worker.last_error
+        if self.metrics_file is not None:
+            self.metrics_file.poll()
+
+        now = time.perf_counter()
+        status_changed = now >= self.status_due
+        if status_changed:
+            self.status_due = now + STATUS_INTERVAL
+            self._update_status()
+            if self.metrics_text.get_visible():
+                self.metrics_text.set_text(self.metrics.summary())
+        if not (self.dirty or status_changed):
+            return
+        started = time.perf_counter()
+        if self.dirty:
+            self.dirty = False
+            if self.history_span:
+                self._draw_history()
+            elif self.valid_samples:
+                self._draw_window()
+        if self.render_started is None:
+            # A full draw (now or from the event loop) is timed up to its draw_event
+            self.render_started = started
+        if self.renderer.update():
+            self.metrics.record_render(started)
+            self.render_started = None
+        self.frame_times.append(now)
+
+    def _handle_draw(self, _event):
+        if self.render_started is not None:
+            self.metrics.record_render(self.render_started)
+            self.render_started = None
+
+    def _frame_rate(self):
+        if len(self.frame_times) < 2:
+            return 0.0
+        return (len(self.frame_times) - 1) / (self.frame_times[-1] - self.frame_times[0])
+
+    def _update_status(self):
+        # While stopped the text set by start/stop/rate selection stays
+        if not self.capture_active:
+            return
+        if self.last_error:
             self.status_text.set_text(f"USB错误: {self.last_error}")
             self.status_text.set_color("tab:red")
-        elif self.capture_active and (time.time() - self.last_data_time > 0.6):
+        elif time.time() - self.last_data_time > 0.6:
             self.status_text.set_text("等待数据…")
             self.status_text.set_color("tab:orange")
-        elif not self.capture_active and self.valid_samples == 0:
-            self.status_text.set_text("停止")
-            self.status_text.set_color("tab:gray")
-
-        if self.valid_samples == 0:
-            return self.lines
-
+        else:
+            status = f"RUN: {self.total_samples} pts  {self._loss_text()}"
+            if self.ratio > 1:
+                status += f"  DEC 1:{self.ratio}"
+            if self.history_span and self.history_bin is not None:
+                status += "  1 bin = {} pts (L{})".format(*self.history_bin)
+            if self.trigger is not None:
+                status += f"  TRIG {self.trigger.triggers} (auto {self.trigger.forced})"
+            status += f"  {self._frame_rate():.0f} fps"
+            if self.rate_warning:
+                status += f"  ⚠ {self.rate_warning}"
+            self.status_text.set_text(status)
+            self.status_text.set_color("tab:orange" if self.rate_warning else "tab:green")
+
+    def _draw_window(self):
         samples = self.valid_samples
-        x = np.arange(samples)
-
         if samples < WINDOW_SAMPLES:
-            ordered = self.buffer[:, :samples]
+            ordered = self.window[:samples]
         else:
-            start = self.write_pos % WINDOW_SAMPLES
-            ordered = np.concatenate(
-                (self.buffer[:, start:], self.buffer[:, :start]), axis=1
-            )
+            ordered = np.roll(self.window, -self.write_pos)
+        # One record per change of the 8-bit value; each channel's trace
+        # is built from its own edges among them
+        starts, values = encode_transitions(ordered)
         for idx in range(8):
-            y = ordered[idx, :samples] + idx
-            self.lines[idx].set_data(x, y)
-
-        if self.capture_active:
-            self.ax.set_xlim(0, max(samples, WINDOW_SAMPLES))
-        if self.capture_active and self.last_error is None:
-            self.status_text.set_text(f"RUN: {self.total_samples} pts  drops={self.worker.drop_count}")
-            self.status_text.set_color("tab:green")
-        elif not self.capture_active and self.valid_samples > 0:
-            self.status_text.set_text("停止")
-            self.status_text.set_color("tab:gray")
-        return self.lines
-
-    def _drain_queue(self):
-        while True:
-            try:
-                item = self.data_queue.get_nowait()
-            except queue.Empty:
-                break
-
-            if isinstance(item, Exception):
-                self.last_error = item
-                continue
-
-            self._append_samples(item)
-
-    def _append_samples(self, chunk: bytes):
-        byte_array = np.frombuffer(chunk, dtype=np.uint8)
-        bits = LOOKUP_TABLE[byte_array]  # shape (N, 8)
-        num_samples = bits.shape[0]
+            edges, levels = channel_edges(starts, values, idx)
+            xs, ys = step_points(edges, levels, samples)
+            self.lines[idx].set_data(xs, ys + idx)
+        if self.trigger is None:
+            self.display_start = self.total_samples - samples
+        self._draw_gaps(self.display_start, self.display_start + samples)
+
+    def _draw_history(self):
+        # Draw the last history_span seconds from the min/max pyramid: cost
+        # depends on HISTORY_BINS, not on the number of samples
+        rate = actual_rate(rate_divider(self.current_rate))
+        end = self.pyramid.samples
+        view = self.pyramid.query(end - int(self.history_span * rate), end, HISTORY_BINS)
+        if view is None:
+            return
+        level, bin_size, first, any_high, all_high = view
+        self.history_bin = (bin_size, level)
+        xs, ys = envelope(first - end, bin_size, any_high, all_high)
+        xs /= rate
+        stop = xs[-1] + bin_size / 2 / rate
+        for idx in range(8):
+            row = ys[idx]
+            keep = np.empty(len(row), dtype=bool)
+            keep[0] = True
+            np.not_equal(row[1:], row[:-1], out=keep[1:])
+            trace_x, trace_y = step_points(xs[keep], row[keep], stop)
+            self.lines[idx].set_data(trace_x, trace_y + idx)
+        self._draw_gaps(end - self.history_span * rate, end, origin=end, scale=1 / rate)
+
+    def _loss_text(self):
+        if self.stripper is None:
+            return f"drops={self.worker.dropped_samples} pts"
+        # Exact device-side count from the sequence markers
+        return f"lost={self.stripper.lost} pts in {self.stripper.gaps} gaps"
+
+    def _draw_gaps(self, start, stop, origin=None, scale=1.0):
+        """Red lines at the gaps in samples [start, stop], drawn at (position - origin) * scale."""
+        visible = np.zeros(0, dtype=np.int64)
+        if self.gaps and stop > start:
+            positions = np.fromiter(self.gaps, dtype=np.int64, count=len(self.gaps))
+            visible = positions[(positions >= start) & (positions <= stop)]
+        segments = np.empty((len(visible), 2, 2))
+        segments[:, :, 0] = ((visible - (start if origin is None else origin)) * scale)[:, None]
+        segments[:, 0, 1] = -1
+        segments[:, 1, 1] = 8
+        self.gap_lines.set_segments(segments)
+
+    def _drain_ring(self):
+        # Under backpressure the worker may hand over AND/OR pairs; each
+        # ring segment is taken with the ratio it was written at. Segments
+        # start on whole pairs of both ratios, so the pyramid bins stay on
+        # their sample grid
+        ring = self.ring
+        end = ring.write_pos
+        if ring.read_pos < end:
+            self.metrics.record_dequeue(end, end - ring.read_pos)
+        while ring.read_pos < end:
+            ratio, limit = self.worker.segment_at(ring.read_pos)
+            size = end - ring.read_pos
+            view = ring.read_view(size if limit is None else min(limit, size))
+            samples = view
+            if self.stripper is not None:
+                samples, gaps = self.stripper.feed(view)
+                self.gaps.extend(gap.position for gap in gaps)
+            self.pyramid.append(samples, span=ratio)
+            if self.trigger is None:
+                self._append_samples(samples)
+            else:
+                for window in self.trigger.feed(samples):
+                    self._show_window(window)
+            self.total_samples += len(samples) * ratio
+            self.ratio = ratio
+            self.last_data_time = time.time()
+            self.dirty = True
+            ring.consume(len(view))
 
-        if num_samples >= WINDOW_SAMPLES:
-            self.buffer[:] = bits[-WINDOW_SAMPLES:].T
-            self.valid_samples = WINDOW_SAMPLES
-            self.write_pos = 0
+    def _show_window(self, window):
+        # A trigger window replaces the display; the marker shows the trigger point
+        self.display_start = window.start
+        self.write_pos = 0
+        self.valid_samples = 0
+        self._append_samples(window.samples)
+        position = window.trigger - window.start
+        self.trigger_line.set_xdata([position, position])
+        self.trigger_line.set_visible(True)
+
+    def _append_samples(self, chunk):
+        data = np.frombuffer(chunk, dtype=np.uint8)[-WINDOW_SAMPLES:]
+        # Only the last window can ever be shown
+        count = len(data)
+        end_pos = self.write_pos + count
+        if end_pos <= WINDOW_SAMPLES:
+            self.window[self.write_pos:end_pos] = data
         else:
-            end_pos = self.write_pos + num_samples
-            if end_pos <= WINDOW_SAMPLES:
-                self.buffer[:, self.write_pos:end_pos] = bits.T
-            else:
-                first = WINDOW_SAMPLES - self.write_pos
-                self.buffer[:, self.write_pos:] = bits[:first].T
-                remainder = num_samples - first
-                self.buffer[:, :remainder] = bits[first:].T
-            self.write_pos = (self.write_pos + num_samples) % WINDOW_SAMPLES
-            self.valid_samples = min(WINDOW_SAMPLES, self.valid_samples + num_samples)
-
-        self.total_samples += num_samples
-        self.last_data_time = time.time()
-
-    def _flush_queue(self):
-        while True:
-            try:
-                self.data_queue.get_nowait()
-            except queue.Empty:
-                break
+            first = WINDOW_SAMPLES - self.write_pos
+            self.window[self.write_pos:] = data[:first]
+            self.window[:count - first] = data[first:]
+        self.write_pos = end_pos % WINDOW_SAMPLES
+        self.valid_samples = min(WINDOW_SAMPLES, self.valid_samples + count)
+
+    def _flush_ring(self):
+        self.ring.skip()
+        self.metrics.discard(self.ring.read_pos)
+
+    def _handle_key(self, event):
+        if event.key == "m":
+            self.metrics_text.set_visible(not self.metrics_text.get_visible())
+            self.metrics_text.set_text(self.metrics.summary())
+            self.renderer.update()
 
     def _handle_close(self, _event):
+        self.timer.stop()
         self.stop_stream()
         self.worker.stop_worker()
         self.iface.close()
+        if self.metrics_file is not None:
+            self.metrics_file.close()
 
     def show(self):
         plt.show()
 
 
 def main():
+    # Optional arguments: transport spec (default 'usb' = EP3 direct),
+    # trigger spec (see trigger.parse_trigger), trigger mode and the flags
+    # --markers, --metrics=FILE and --overlay
+    flags = [arg for arg in sys.argv[1:] if arg.startswith("--")]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    markers = "--markers" in flags
+    overlay = "--overlay" in flags
+    metrics_path = next((flag.split("=", 1)[1] for flag in flags if flag.startswith("--metrics=")), None)
+    spec = args[0] if len(args) > 0 else "usb"
+    trigger = args[1] if len(args) > 1 else None
+    trigger_mode = args[2] if len(args) > 2 else "auto"
     try:
-        viewer = DigitalCaptureViewer()
+        viewer = DigitalCaptureViewer(spec, trigger, trigger_mode, markers, metrics_path, overlay)
     except Exception as exc:
         print(f"初始化失败: {exc}")
         sys.exit(1)
@@ -4,110 +4,192 @@ DC 定时捕获和统计工具（无 GUI 版本）
 用于诊断定时捕获问题
 """
 
-import serial
-import serial.tools.list_ports
 import time
 import threading
 from collections import deque
 
-def calculate_checksum(data):
-    """计算校验和"""
-    return sum(data) & 0xFF
-
-def generate_dc_start_command(sample_rate_hz):
-    """生成 DC 启动命令"""
-    SYSTEM_CLK = 60_000_000
-    divider = SYSTEM_CLK // sample_rate_hz
-
-    cmd = 0x0B
-    len_h = 0x00
-    len_l = 0x02
-    div_h = (divider >> 8) & 0xFF
-    div_l = divider & 0xFF
-
-    checksum = calculate_checksum([cmd, len_h, len_l, div_h, div_l])
-    full_cmd = bytes([0xAA, 0x55, cmd, len_h, len_l, div_h, div_l, checksum])
-
-    actual_rate = SYSTEM_CLK / divider
-    print(f"目标采样率: {sample_rate_hz} Hz")
-    print(f"分频系数: {divider} (0x{divider:04X})")
-    print(f"实际采样率: {actual_rate:.2f} Hz")
-    print(f"完整命令: {' '.join([f'{b:02X}' for b in full_cmd])}")
-
-    return full_cmd
-
-def generate_dc_stop_command():
-    """生成 DC 停止命令"""
-    cmd = 0x0C
-    len_h = 0x00
-    len_l = 0x00
-    checksum = calculate_checksum([cmd, len_h, len_l])
-    full_cmd = bytes([0xAA, 0x55, cmd, len_h, len_l, checksum])
-    return full_cmd
+from capture_file import CaptureFile, CaptureWriter
+from dc_commands import DC_STOP_FRAME, actual_rate, dc_start_frame, rate_divider
+from dc_markers import Gap, MarkerStripper
+from dc_rate_profile import clamp_rate, rate_limit
+from logic_stats import analyze
+from transport import create_transport, list_transports
+from trigger import TriggerEngine, WindowRecorder, parse_trigger
+
+READ_SIZE = 65536
+
+
+class MemoryWriter:
+    """trigger.WindowRecorder 的内存写入端: 窗口存入 bytearray, 窗口之间记为丢失标记"""
+
+    def __init__(self, data):
+        self.data = data
+        self.drops = []             # (采样位置, 跳过的采样数), 与 CaptureFile.drops 相同
+
+    def write(self, samples):
+        self.data.extend(samples)
+
+    def mark_drop(self, count):
+        self.drops.append((len(self.data), count))
+
 
 class TimedCapture:
     """定时捕获类（无 GUI）"""
 
-    def __init__(self, port, baudrate=115200):
+    def __init__(self, port, baudrate=115200, record_path=None, trigger=None, clamp=False,
+                 markers=False):
         self.port = port
         self.baudrate = baudrate
-        self.serial_port = None
+        self.link = None
         self.running = False
 
+        # 录制模式: 数据直接写入内存映射文件, 不占用内存
+        self.record_path = record_path
+        self.recorder = None
+
+        # 触发模式: 只保留触发点前后的窗口 (trigger.parse_trigger 格式)
+        self.trigger_spec = trigger
+        self.trigger = None
+        self.window_sink = None
+
+        # 超过本机标定的无损速率时: clamp=True 降低采样率, 否则只警告
+        self.clamp = clamp
+
+        # 序号标记模式: FPGA 分包发送并带采样序号, 可精确统计丢失的位置和数量
+        self.markers = markers
+        self.stripper = None
+        self.gaps = []              # 未录制时的丢失记录 dc_markers.Gap
+
         # 数据缓冲（只保留所有数据用于统计）
-        self.all_data = []
+        self.all_data = bytearray()
+        self.breaks = []            # all_data 中不连续的位置 (触发窗口/丢失), 统计在此分段
         self.total_bytes = 0
         self.start_time = None
+        self.stream_rate = 0
 
     def connect(self):
-        """连接串口"""
+        """连接设备 (串口名, 'usb' 直连 EP3, 或 'loop')"""
         try:
-            self.serial_port = serial.Serial(
-                port=self.port,
-                baudrate=self.baudrate,
-                timeout=0.1
-            )
-            print(f"✅ 已连接到 {self.port}")
+            self.link = create_transport(self.port, self.baudrate, timeout=0.1).open()
+            print(f"✅ 已连接到 {self.link.name}")
             return True
         except Exception as e:
             print(f"❌ 连接失败: {e}")
             return False
 
     def disconnect(self):
-        """断开串口"""
-        if self.serial_port and self.serial_port.is_open:
-            self.serial_port.close()
-            print("串口已关闭")
+        """断开连接"""
+        if self.link and self.link.is_open:
+            self.link.close()
+            print("连接已关闭")
+
+    def check_rate(self, sample_rate_hz):
+        """对照本机速率标定 (dc_rate_profile.py) 检查采样率, 返回实际使用的采样率"""
+        limit = rate_limit(self.port, READ_SIZE)
+        if limit is None:
+            print(f"ℹ️  {self.port} 尚未标定无损速率 (python dc_rate_profile.py {self.port} --read-size {READ_SIZE})")
+            return sample_rate_hz
+        if actual_rate(rate_divider(sample_rate_hz)) <= limit:
+            return sample_rate_hz
+        print(f"⚠️  采样率 {sample_rate_hz/1000:.0f} kHz 超过本机标定的无损速率 {limit/1000:.0f} kHz")
+        if not self.clamp:
+            print("    将丢失数据, 统计结果不完整")
+            return sample_rate_hz
+        clamped = clamp_rate(sample_rate_hz, limit)
+        print(f"    已降低到 {clamped/1000:.0f} kHz")
+        return clamped
 
     def start_capture(self, sample_rate_hz):
         """启动捕获"""
-        cmd = generate_dc_start_command(sample_rate_hz)
-        self.serial_port.write(cmd)
+        divider = rate_divider(sample_rate_hz)
+        self.stream_rate = actual_rate(divider)
+        markers = self.markers and self.link.kind != 'shm'
+        cmd = dc_start_frame(sample_rate_hz, markers=markers)
+        print(f"目标采样率: {sample_rate_hz} Hz")
+        print(f"分频系数: {divider} (0x{divider:04X})")
+        print(f"实际采样率: {self.stream_rate:.2f} Hz")
+        print(f"完整命令: {cmd.hex(' ').upper()}")
+        if self.markers and not markers:
+            # 守护进程 (dc_capture_daemon.py) 自己去掉包头, 这里收到的是纯采样
+            print("🔢 序号标记由采集守护进程处理")
+        elif markers:
+            self.stripper = MarkerStripper()
+            self.gaps = []
+            print("🔢 序号标记模式")
+        # 先停止上一次捕获并丢弃残留数据, 否则旧数据会混入本次捕获
+        self.link.write(DC_STOP_FRAME)
+        time.sleep(0.05)
+        self.link.reset_input()
+        if self.stripper is not None:
+            # 丢弃前可能有半个包已读入, 从下一个有效包头开始计数
+            self.stripper.reset(aligned=False)
+        self.link.write(cmd)
         self.running = True
         self.start_time = time.time()
         self.total_bytes = 0
-        self.all_data = []
+        self.all_data = bytearray()
+        if self.record_path:
+            self.recorder = CaptureWriter(self.record_path, self.stream_rate, divider,
+                                          start_time=self.start_time, max_write=READ_SIZE)
+            print(f"💾 录制到文件: {self.record_path}")
+        if self.trigger_spec:
+            self.trigger = TriggerEngine(parse_trigger(self.trigger_spec), mode='normal')
+            if self.recorder is not None:
+                self.window_sink = WindowRecorder(self.recorder)
+            else:
+                # 与录制模式相同: 重叠的预触发部分只保留一次, 窗口之间记为丢失标记
+                self.window_sink = WindowRecorder(MemoryWriter(self.all_data))
+            print(f"🎯 触发条件: {self.trigger_spec} (每个窗口 {self.trigger.pre}+{self.trigger.post} 点)")
         print(f"✅ 开始捕获，采样率: {sample_rate_hz} Hz\n")
 
     def stop_capture(self):
         """停止捕获"""
         self.running = False
-        stop_cmd = generate_dc_stop_command()
-        self.serial_port.write(stop_cmd)
+        self.link.write(DC_STOP_FRAME)
         print("\n✅ 已发送 STOP 命令")
 
     def read_data_thread(self):
         """后台线程：读取数据"""
         print("🔄 数据读取线程已启动\n")
         last_print = time.time()
+        overruns = getattr(self.link, 'stream_overruns', 0)
 
         while self.running:
-            if self.serial_port and self.serial_port.in_waiting > 0:
+            if self.link:
                 try:
-                    # 批量读取
-                    chunk = self.serial_port.read(min(self.serial_port.in_waiting, 4096))
-                    self.all_data.extend(chunk)
-                    self.total_bytes += len(chunk)
+                    if self.stripper is not None:
+                        # 序号标记模式: 去掉包头, 在丢失处写入精确的丢失标记
+                        chunk = self.link.read_stream(READ_SIZE, timeout=0.01)
+                        if not chunk:
+                            continue
+                        self.store_marked(*self.stripper.feed(chunk))
+                    elif self.trigger is not None:
+                        # 触发模式: 所有数据都经过触发引擎, 只保存窗口
+                        chunk = self.link.read_stream(READ_SIZE, timeout=0.01)
+                        if not chunk:
+                            continue
+                        for window in self.trigger.feed(chunk):
+                            self.window_sink(window)
+                        self.total_bytes += len(chunk)
+                    elif self.recorder is not None:
+                        # 直接读入映射文件 (超时返回 0)
+                        count = self.link.read_stream_into(self.recorder.write_view(READ_SIZE),
+                                                           timeout=0.01)
+                        self.recorder.commit(count)
+                        # 传输层丢弃的数据记为丢失标记
+                        now_overruns = getattr(self.link, 'stream_overruns', 0)
+                        self.recorder.mark_drop(now_overruns - overruns)
+                        overruns = now_overruns
+                        if not count:
+                            continue
+                        self.total_bytes += count
+                    else:
+                        # 批量读取 (超时返回空)
+                        chunk = self.link.read_stream(READ_SIZE, timeout=0.01)
+                        if not chunk:
+                            continue
+                        self.all_data.extend(chunk)
+                        self.total_bytes += len(chunk)
 
                     # 每秒打印一次进度
                     now = time.time()
@@ -125,6 +207,27 @@ class TimedCapture:
 
         print(f"\n🛑 数据读取线程已停止 (总接收: {self.total_bytes} bytes)")
 
+    def store_marked(self, samples, gaps):
+        """保存去掉包头的采样; 丢失处在录制文件中写入丢失标记"""
+        self.total_bytes += len(samples)
+        if self.trigger is not None:
+            for window in self.trigger.feed(samples):
+                self.window_sink(window)
+            return
+        if self.recorder is None:
+            self.all_data.extend(samples)
+            self.gaps.extend(gaps)
+            return
+        # gap.position 是丢失前已输出的采样数, 本块从 stripper.samples - len(samples) 开始
+        done = self.stripper.samples - len(samples)
+        start = 0
+        for gap in gaps:
+            split = gap.position - done
+            self.recorder.write(samples[start:split])
+            self.recorder.mark_drop(gap.lost)
+            start = split
+        self.recorder.write(samples[start:])
+
     def calculate_statistics(self, sample_rate_hz):
         """计算统计信息"""
         print("\n" + "=" * 60)
@@ -143,55 +246,53 @@ class TimedCapture:
         print(f"采集时长: {elapsed:.2f} 秒")
         print(f"实际采样率: {actual_rate:.1f} samples/s")
         print(f"理论采样率: {sample_rate_hz:.1f} samples/s")
-        print(f"接收效率: {efficiency:.1f}%")
-
-        # 分析每个通道
-        print(f"\n{'通道':<6} {'高电平':<10} {'低电平':<10} {'占空比':<10} {'翻转次数':<10} {'估计频率':<12}")
-        print("-" * 60)
-
-        # 解析每个字节到 8 个通道
-        channels = [[] for _ in range(8)]
-        for byte_val in self.all_data:
-            for ch in range(8):
-                bit_val = (byte_val >> ch) & 0x01
-                channels[ch].append(bit_val)
-
-        for ch in range(8):
-            ch_data = channels[ch]
-            if len(ch_data) == 0:
-                continue
-
-            total_samples = len(ch_data)
-            high_count = sum(ch_data)
-            low_count = total_samples - high_count
-            duty_cycle = (high_count / total_samples * 100) if total_samples > 0 else 0
-
-            # 计算翻转次数
-            transitions = 0
-            for i in range(1, len(ch_data)):
-                if ch_data[i] != ch_data[i-1]:
-                    transitions += 1
-
-            # 估计频率
-            est_freq = (transitions / 2 / elapsed) if elapsed > 0 and transitions > 0 else 0
-
-            ch_name = f"CH{ch}"
+        if self.stripper is not None:
+            # 序号标记给出精确丢失数, 不再按时长估算
+            lost = self.stripper.lost
+            produced = self.stripper.samples + lost
+            print(f"FPGA 采样数: {produced:,} (丢失 {lost:,} 个, "
+                  f"{lost / produced * 100 if produced else 0:.3f}%, 共 {self.stripper.gaps} 处)")
+            if self.stripper.resyncs:
+                print(f"⚠️  主机侧数据损坏 {self.stripper.resyncs} 次, 跳过 {self.stripper.discarded:,} 字节")
+            for gap in self.gaps[:10]:
+                print(f"    采样 {gap.position:,} 之前丢失 {gap.lost:,} 个 (FPGA 序号 {gap.index:,})")
+            if len(self.gaps) > 10:
+                print(f"    ... 另有 {len(self.gaps) - 10} 处")
+        else:
+            print(f"接收效率: {efficiency:.1f}%")
+        if self.trigger is not None:
+            print(f"触发次数: {self.trigger.triggers} (统计只包含触发窗口内的 {len(self.all_data):,} 个采样, "
+                  f"按窗口分段, 不计跨窗口的翻转和脉宽)")
+
+        # 分析每个通道 (NumPy 分块统计, 映射文件也不会整体读入内存)
+        print(f"\n{'通道':<6} {'高电平':<10} {'低电平':<10} {'占空比':<10} {'翻转次数':<10} {'估计频率':<12} {'高脉宽 min/avg/max':<20}")
+        print("-" * 80)
+
+        for stats in analyze(self.all_data, self.stream_rate, breaks=self.breaks):
+            duty_cycle = stats.duty_cycle * 100
+
+            ch_name = f"CH{stats.channel}"
             high_pct = f"{duty_cycle:.1f}%"
             low_pct = f"{100-duty_cycle:.1f}%"
             duty_str = f"{duty_cycle:.1f}%"
-            trans_str = f"{transitions}"
-            freq_str = f"{est_freq:.2f} Hz" if est_freq > 0 else "静态"
+            trans_str = f"{stats.transitions}"
+            freq_str = f"{stats.frequency:.2f} Hz" if stats.transitions > 0 else "静态"
+            if stats.high_mean is not None:
+                width_str = f"{stats.high_min}/{stats.high_mean:.1f}/{stats.high_max}"
+            else:
+                width_str = "-"
 
-            print(f"{ch_name:<6} {high_pct:<10} {low_pct:<10} {duty_str:<10} {trans_str:<10} {freq_str:<12}")
+            print(f"{ch_name:<6} {high_pct:<10} {low_pct:<10} {duty_str:<10} {trans_str:<10} {freq_str:<12} {width_str:<20}")
 
-        print("=" * 60 + "\n")
+        print("=" * 80 + "\n")
 
     def run(self, sample_rate_hz, duration_sec):
         """运行定时捕获"""
         if not self.connect():
             return
 
-        # 启动捕获
+        # 启动捕获 (先对照速率标定)
+        sample_rate_hz = self.check_rate(sample_rate_hz)
         self.start_capture(sample_rate_hz)
 
         # 启动后台读取线程
@@ -205,21 +306,49 @@ class TimedCapture:
         # 停止捕获
         self.stop_capture()
         time.sleep(0.5)
+        read_thread.join()
+        if self.stripper is not None:
+            # 最后一个包后面没有包头确认, 读取结束时单独取出
+            self.store_marked(*self.stripper.finish())
+
+        # 录制模式: 关闭文件后从映射文件做统计
+        capture = None
+        if self.recorder is not None:
+            self.recorder.close()
+            print(f"💾 已保存 {self.recorder.sample_count:,} 个采样到 {self.record_path}"
+                  f" (丢失标记: {len(self.recorder.drops)})")
+            if self.stripper is not None:
+                lost = 0
+                self.gaps = []
+                for index, count in self.recorder.drops:
+                    lost += count
+                    self.gaps.append(Gap(index, index + lost, count))
+            self.recorder = None
+            capture = CaptureFile(self.record_path)
+            self.all_data = capture.samples
+            self.breaks = [index for index, _ in capture.drops]
+        elif self.trigger is not None:
+            self.breaks = [index for index, _ in self.window_sink.writer.drops]
+        else:
+            self.breaks = [gap.position for gap in self.gaps]
 
         # 显示统计
         self.calculate_statistics(sample_rate_hz)
+        if capture is not None:
+            self.all_data = bytearray()
+            capture.close()
 
         # 断开连接
         self.disconnect()
 
 
 def list_ports():
-    """列出可用串口"""
-    ports = serial.tools.list_ports.comports()
-    print("\n可用串口:")
-    for i, port in enumerate(ports, 1):
-        print(f"{i}. {port.device} - {port.description}")
-    return [port.device for port in ports]
+    """列出可用连接 (USB 直连 + 串口)"""
+    links = list_transports()
+    print("\n可用连接:")
+    for i, (spec, description) in enumerate(links, 1):
+        print(f"{i}. {spec} - {description}")
+    return [spec for spec, _ in links]
 
 
 if __name__ == "__main__":
@@ -230,7 +359,7 @@ if __name__ == "__main__":
     # 列出串口
     ports = list_ports()
     if not ports:
-        print("❌ 未找到可用串口")
+        print("❌ 未找到可用连接")
         exit(1)
 
     # 选择串口
@@ -286,10 +415,37 @@ if __name__ == "__main__":
         print("❌ 无效输入")
         exit(1)
 
+    # 超过标定的无损速率时询问是否降低
+    clamp = False
+    limit = rate_limit(selected_port, READ_SIZE)
+    if limit is not None and actual_rate(rate_divider(selected_rate)) > limit:
+        print(f"\n⚠️  {selected_rate/1000:.0f} kHz 超过本机标定的无损速率 {limit/1000:.0f} kHz")
+        print("是否降低到无损速率? (y/N):", end=" ")
+        clamp = input().strip().lower() == 'y'
+
+    # 序号标记模式 (需要支持标记的 FPGA 比特流)
+    print("\n启用序号标记, 精确统计丢失? (y/N):", end=" ")
+    markers = input().strip().lower() == 'y'
+
+    # 录制到文件 (可选)
+    print("\n录制文件路径 (.dcap, 留空则不保存):", end=" ")
+    record_path = input().strip() or None
+
+    # 触发条件 (可选)
+    print("\n触发条件 (留空=不触发, 例如 rise:0, pattern:0x0F=0x05):", end=" ")
+    trigger = input().strip() or None
+    if trigger:
+        try:
+            parse_trigger(trigger)
+        except ValueError as e:
+            print(f"❌ 无效触发条件: {e}")
+            exit(1)
+
     print("\n" + "=" * 60 + "\n")
 
     # 运行捕获
-    capture = TimedCapture(selected_port)
+    capture = TimedCapture(selected_port, record_path=record_path, trigger=trigger, clamp=clamp,
+                           markers=markers)
     capture.run(selected_rate, selected_duration)
 
     print("\n✅ 测试完成！")
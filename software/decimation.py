@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Min/Max Decimation Pyramid for FPGA2025 Logic Captures
+======================================================
+
+Summarises 8-channel samples (bit n = CH n) at several resolutions so a
+display can draw any time span at screen resolution: drawing cost depends
+on the number of pixels, not on the number of samples.
+
+Each bin stores two bytes:
+    any_high   OR of all samples in the bin  (bit set: channel was high)
+    all_high   AND of all samples in the bin (bit clear: channel was low)
+
+A channel is constant in a bin when both bits agree, and toggled inside it
+otherwise, so even a single-sample glitch stays visible at every zoom level.
+
+Level 0 bins cover `base` samples; every level above combines `factor` bins
+of the one below. Bins are produced incrementally as samples arrive, with
+NumPy reductions over whole blocks. Each level keeps its newest `capacity`
+bins (None: keep all), so coarse levels reach much further back than fine
+ones for the same memory.
+
+Decimated streams:
+    and_or_pairs() reduces a block to one (all_high, any_high) byte pair per
+    group of samples, the same summary a bin holds. Such a stream still
+    shows every glitch and can be appended to a pyramid with span=group/2
+    (each byte standing for that many samples).
+
+Typical usage:
+    pyramid = MinMaxPyramid(base=64, factor=8, levels=6, capacity=1 << 20)
+    pyramid.append(samples)                         # as data arrives
+    view = pyramid.query(start, stop, max_bins=2000)
+    if view is not None:
+        level, bin_size, first, any_high, all_high = view
+"""
+
+import struct
+
+import numpy as np
+
+DEFAULT_BASE = 64
+DEFAULT_FACTOR = 8
+DEFAULT_LEVELS = 6
+
+# Saved pyramids: header, one bin count (u64) per level, then per level the
+# any_high bytes followed by the all_high bytes
+INDEX_MAGIC = b'DMMX'
+INDEX_VERSION = 1
+INDEX_HEADER_FORMAT = '<4sHIIIQ'   # magic, version, base, factor, levels, samples
+
+_INDEX_HEADER = struct.Struct(INDEX_HEADER_FORMAT)
+
+
+def and_or_pairs(block, group):
+    """
+    Reduce samples to one (all_high, any_high) byte pair per `group` samples.
+
+    Args:
+        block: uint8 samples; a length that is not a multiple of `group`
+            leaves the tail out
+        group (int): Samples per pair (even, so each byte stands for
+            group / 2 samples)
+
+    Returns:
+        numpy.ndarray: uint8, AND and OR of each group interleaved
+    """
+    data = np.frombuffer(block, dtype=np.uint8) if not isinstance(block, np.ndarray) else block
+    groups = data[:len(data) // group * group].reshape(-1, group)
+    pairs = np.empty((len(groups), 2), dtype=np.uint8)
+    np.bitwise_and.reduce(groups, axis=1, out=pairs[:, 0])
+    np.bitwise_or.reduce(groups, axis=1, out=pairs[:, 1])
+    return pairs.reshape(-1)
+
+
+def envelope(first, bin_size, any_high, all_high, channels=8):
+    """
+    Drawing points for summary bins: two points per bin, at its start (all
+    high level) and middle (any high level). Drawn with steps-post, constant
+    bins stay flat and bins with edges become full-height bars.
+
+    Returns:
+        tuple: (x sample positions float64, y levels uint8 of shape
+            (channels, 2 * bins))
+    """
+    count = len(any_high)
+    xs = np.repeat(first + np.arange(count, dtype=np.float64) * bin_size, 2)
+    xs[1::2] += bin_size / 2
+    shifts = np.arange(channels, dtype=np.uint8)[:, None]
+    ys = np.empty((channels, 2 * count), dtype=np.uint8)
+    ys[:, 0::2] = (all_high[None, :] >> shifts) & 1
+    ys[:, 1::2] = (any_high[None, :] >> shifts) & 1
+    return xs, ys
+
+
+class _Level:
+    """Bins of one level plus the partial bin still being filled."""
+
+    def __init__(self, group, capacity):
+        self.group = group              # Inputs per bin
+        self.capacity = capacity
+        size = capacity if capacity is not None else 1024
+        self.any_high = np.zeros(size, dtype=np.uint8)
+        self.all_high = np.zeros(size, dtype=np.uint8)
+        self.count = 0                  # Bins produced so far (absolute)
+        self._partial_or = 0
+        self._partial_and = 0xFF
+        self._partial_n = 0
+
+    def reset(self):
+        self.count = 0
+        self._partial_or, self._partial_and, self._partial_n = 0, 0xFF, 0
+
+    @property
+    def oldest(self):
+        """Absolute index of the oldest bin still stored."""
+        if self.capacity is None:
+            return 0
+        return max(0, self.count - self.capacity)
+
+    def feed(self, ors, ands, span=1):
+        """
+        Combine input bins (or samples) into bins of this level.
+
+        Args:
+            span (int): Group units each input stands for (a divisor of
+                group); the partial bin is counted in these units, so a
+                span change mid-bin rounds that bin up by less than a span
+
+        Returns:
+            tuple: (any_high, all_high) arrays of the completed bins
+        """
+        group = self.group // span
+        # Finish the partial bin first
+        if self._partial_n:
+            take = min(-(-(self.group - self._partial_n) // span), len(ors))
+            self._partial_or |= int(np.bitwise_or.reduce(ors[:take]))
+            self._partial_and &= int(np.bitwise_and.reduce(ands[:take]))
+            self._partial_n += take * span
+            ors, ands = ors[take:], ands[take:]
+            if self._partial_n < self.group:
+                return ors[:0], ands[:0]
+            head_or = np.array([self._partial_or], dtype=np.uint8)
+            head_and = np.array([self._partial_and], dtype=np.uint8)
+            self._partial_or, self._partial_and, self._partial_n = 0, 0xFF, 0
+        else:
+            head_or = head_and = None
+
+        full = len(ors) // group * group
+        new_or = np.bitwise_or.reduce(ors[:full].reshape(-1, group), axis=1)
+        new_and = np.bitwise_and.reduce(ands[:full].reshape(-1, group), axis=1)
+        if full < len(ors):
+            self._partial_or = int(np.bitwise_or.reduce(ors[full:]))
+            self._partial_and = int(np.bitwise_and.reduce(ands[full:]))
+            self._partial_n = (len(ors) - full) * span
+        if head_or is not None:
+            new_or = np.concatenate((head_or, new_or))
+            new_and = np.concatenate((head_and, new_and))
+        self._store(new_or, new_and)
+        return new_or, new_and
+
+    def _store(self, ors, ands):
+        n = len(ors)
+        if not n:
+            return
+        if self.capacity is None:
+            if self.count + n > len(self.any_high):
+                size = max(2 * len(self.any_high), self.count + n)
+                self.any_high = np.resize(self.any_high, size)
+                self.all_high = np.resize(self.all_high, size)
+            self.any_high[self.count:self.count + n] = ors
+            self.all_high[self.count:self.count + n] = ands
+        else:
+            if n > self.capacity:
+                self.count += n - self.capacity
+                ors, ands = ors[-self.capacity:], ands[-self.capacity:]
+                n = self.capacity
+            start = self.count % self.capacity
+            first = min(n, self.capacity - start)
+            self.any_high[start:start + first] = ors[:first]
+            self.all_high[start:start + first] = ands[:first]
+            self.any_high[:n - first] = ors[first:]
+            self.all_high[:n - first] = ands[first:]
+        self.count += n
+
+    def finish(self, ors, ands):
+        """Like feed(), but also emits the partial bin (end of data)."""
+        new_or, new_and = self.feed(ors, ands)
+        if self._partial_n:
+            tail_or = np.array([self._partial_or], dtype=np.uint8)
+            tail_and = np.array([self._partial_and], dtype=np.uint8)
+            self._partial_or, self._partial_and, self._partial_n = 0, 0xFF, 0
+            self._store(tail_or, tail_and)
+            new_or = np.concatenate((new_or, tail_or))
+            new_and = np.concatenate((new_and, tail_and))
+        return new_or, new_and
+
+    def get(self, first, last):
+        """Bins [first, last) as (any_high, all_high) copies."""
+        if self.capacity is None:
+            return self.any_high[first:last].copy(), self.all_high[first:last].copy()
+        index = np.arange(first, last) % self.capacity
+        return self.any_high[index], self.all_high[index]
+
+
+class MinMaxPyramid:
+    """
+    Incrementally maintained any-high/all-high summary at several levels.
+
+    Args:
+        base (int): Samples per level-0 bin
+        factor (int): Bins of one level combined into a bin of the next
+        levels (int): Number of levels
+        capacity (int): Bins kept per level (None: unbounded)
+    """
+
+    def __init__(self, base=DEFAULT_BASE, factor=DEFAULT_FACTOR, levels=DEFAULT_LEVELS,
+                 capacity=None):
+        if base < 1 or factor < 2 or levels < 1:
+            raise ValueError("base must be >= 1, factor >= 2 and levels >= 1")
+        self.base = base
+        self.factor = factor
+        self.levels = [_Level(base if i == 0 else factor, capacity) for i in range(levels)]
+        self.samples = 0
+
+    def bin_size(self, level):
+        """Samples per bin at `level`."""
+        return self.base * self.factor ** level
+
+    def reset(self):
+        for level in self.levels:
+            level.reset()
+        self.samples = 0
+
+    def append(self, block, span=1):
+        """
+        Add uint8 samples (bytes-like or numpy array).
+
+        Args:
+            span (int): Samples each byte stands for: 1 for raw samples,
+                group / 2 for and_or_pairs() output; must divide `base`.
+                Change it only where `samples` is a multiple of the new
+                span: otherwise the partial bins are rounded up and the
+                bin grid drifts from the sample count by up to a span.
+        """
+        if self.base % span:
+            raise ValueError(f"span {span} does not divide the bin size {self.base}")
+        data = np.frombuffer(block, dtype=np.uint8) if not isinstance(block, np.ndarray) else block
+        if not len(data):
+            return
+        self.samples += len(data) * span
+        ors = ands = data
+        for index, level in enumerate(self.levels):
+            ors, ands = level.feed(ors, ands, span if index == 0 else 1)
+            if not len(ors):
+                break
+
+    def finish(self):
+        """
+        Close the partial bins at every level (end of a recording).
+
+        The last bin of each level then covers fewer samples than bin_size;
+        no more samples may be appended afterwards.
+        """
+        ors = ands = np.zeros(0, dtype=np.uint8)
+        for level in self.levels:
+            ors, ands = level.finish(ors, ands)
+
+    @classmethod
+    def from_samples(cls, samples, block_size=16 * 1024 * 1024, progress=None, **kwargs):
+        """
+        Build a finished pyramid over a whole (possibly memory-mapped) array.
+
+        Args:
+            samples: uint8 samples
+            block_size (int): Samples reduced per step
+            progress (callable): Called with the samples done after each step
+            **kwargs: MinMaxPyramid arguments
+        """
+        pyramid = cls(**kwargs)
+        data = np.frombuffer(samples, dtype=np.uint8) if not isinstance(samples, np.ndarray) else samples
+        for start in range(0, len(data), block_size):
+            pyramid.append(data[start:start + block_size])
+            if progress is not None:
+                progress(min(start + block_size, len(data)))
+        pyramid.finish()
+        return pyramid
+
+    # ------------------------------------------------------------------
+    # Index files
+    # ------------------------------------------------------------------
+    def save(self, path):
+        """Write all stored bins to an index file (unbounded pyramids only)."""
+        if any(level.capacity is not None for level in self.levels):
+            raise ValueError("Only pyramids without a capacity limit can be saved")
+        with open(path, 'wb') as f:
+            f.write(_INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, self.base, self.factor,
+                                       len(self.levels), self.samples))
+            f.write(np.array([level.count for level in self.levels], dtype='<u8').tobytes())
+            for level in self.levels:
+                f.write(level.any_high[:level.count].tobytes())
+                f.write(level.all_high[:level.count].tobytes())
+
+    @classmethod
+    def load(cls, path):
+        """
+        Open an index file written by save().
+
+        The bins are memory-mapped, so only the pages a query touches are
+        read. The returned pyramid is read-only.
+        """
+        with open(path, 'rb') as f:
+            header = f.read(_INDEX_HEADER.size)
+        if len(header) < _INDEX_HEADER.size or header[:4] != INDEX_MAGIC:
+            raise ValueError(f"{path} is not a decimation index")
+        _, version, base, factor, levels, samples = _INDEX_HEADER.unpack(header)
+        pyramid = cls(base, factor, levels)
+        pyramid.samples = samples
+        counts = np.fromfile(path, dtype='<u8', count=levels, offset=_INDEX_HEADER.size)
+        offset = _INDEX_HEADER.size + 8 * levels
+        for level, count in zip(pyramid.levels, counts.tolist()):
+            if count:
+                data = np.memmap(path, dtype=np.uint8, mode='r', offset=offset, shape=(2 * count,))
+                level.any_high, level.all_high = data[:count], data[count:]
+            level.count = count
+            offset += 2 * count
+        return pyramid
+
+    def query(self, start, stop, max_bins):
+        """
+        Summary of samples [start, stop) with at most about max_bins bins.
+
+        Picks the finest level that needs no more than max_bins bins and
+        still holds bins back to `start`; the coarsest level is used (and
+        clipped to what it holds) if none does.
+
+        Returns:
+            tuple: (level, bin_size, first_sample, any_high, all_high), or
+                None if no completed bin overlaps the range
+        """
+        stop = min(stop, self.samples)
+        if stop <= start:
+            return None
+        top = len(self.levels) - 1
+        for index, level in enumerate(self.levels):
+            size = self.bin_size(index)
+            if index < top and ((stop - start) / size > max_bins or level.oldest * size > start):
+                continue
+            first = max(start // size, level.oldest)
+            last = min(-(-stop // size), level.count)
+            if last <= first:
+                return None
+            any_high, all_high = level.get(first, last)
+            return index, size, first * size, any_high, all_high
+        return None
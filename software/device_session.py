@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Device Session for FPGA2025 USB-CDC Link
+========================================
+
+A long-lived connection to the FPGA that tools share instead of opening and
+closing serial.Serial for every command. Opening a CDC port costs tens of
+milliseconds, so scripts that send many commands should open one session and
+pass it to each tool function.
+
+The bytes travel over a transport.Transport, so the same session works on the
+CDC port, on raw USB bulk endpoints ('usb') or on an in-memory loopback
+('loop'); see transport.create_transport for the accepted specs.
+
+Lifecycle:
+    session = DeviceSession('COM3')     # nothing opened yet
+    session.open()                      # port opened, input flushed once
+    ...
+    session.close()
+
+or, preferably, as a context manager. Contexts nest: only the outermost
+`with` opens and closes the port, so library functions can wrap their work in
+`with session:` whether or not the caller already holds it open.
+
+Typical usage:
+    from device_session import DeviceSession
+    from frame_codec import SOURCE_I2C_SLAVE
+    from i2c_slave_cdc_test import i2c_slave_read_registers
+
+    with DeviceSession('COM3') as session:
+        for reg in range(256):
+            session.write(i2c_slave_read_registers(reg, 1))
+            frame = session.read_frame(SOURCE_I2C_SLAVE, timeout=0.5)
+"""
+
+import collections
+import time
+
+from frame_codec import UploadDecoder
+from transport import DEFAULT_BAUDRATE, DEFAULT_TIMEOUT, create_transport
+
+
+class DeviceSession:
+    """
+    Persistent connection to the FPGA with upload frame decoding.
+
+    Args:
+        port (str or Transport): Serial port name (e.g., 'COM3' or
+            '/dev/ttyACM0'), pyserial URL, transport spec ('usb', 'loop',
+            'auto') or an existing Transport
+        baudrate (int): Baud rate passed to serial.Serial
+        timeout (float): Default read timeout in seconds
+        flush_on_open (bool): Discard stale input once when the port opens
+    """
+
+    def __init__(self, port, baudrate=DEFAULT_BAUDRATE, timeout=DEFAULT_TIMEOUT, flush_on_open=True):
+        self.transport = create_transport(port, baudrate, timeout)
+        self.port = self.transport.name
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.flush_on_open = flush_on_open
+
+        self._depth = 0
+        self._close_on_exit = False
+        self.decoder = UploadDecoder()
+        self._pending = collections.deque()   # decoded frames not yet claimed
+
+        # Statistics
+        self.open_count = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+
+    def __repr__(self):
+        state = 'open' if self.is_open else 'closed'
+        return f"DeviceSession({self.port!r}, {state})"
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    @property
+    def is_open(self):
+        return self.transport.is_open
+
+    def open(self):
+        """Open the port if it is not open yet. Returns self."""
+        if self.is_open:
+            return self
+        self.transport.open()
+        self.open_count += 1
+        if self.flush_on_open:
+            self.discard_input()
+        return self
+
+    def close(self):
+        """Close the port. Safe to call more than once."""
+        self.transport.close()
+        self._depth = 0
+        self._close_on_exit = False
+
+    def __enter__(self):
+        if self._depth == 0:
+            self._close_on_exit = not self.is_open
+            self.open()
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._depth -= 1
+        if self._depth == 0 and self._close_on_exit:
+            self.close()
+        return False
+
+    def _require_open(self):
+        if not self.is_open:
+            raise RuntimeError(f"Session on {self.port} is not open")
+        return self.transport
+
+    # ------------------------------------------------------------------
+    # Raw I/O
+    # ------------------------------------------------------------------
+    def write(self, data):
+        """Write a frame (or several back to back). Returns bytes written."""
+        written = self._require_open().write(data)
+        self.bytes_written += written
+        return written
+
+    def read(self, size=None, timeout=None):
+        """
+        Read raw bytes.
+
+        Args:
+            size (int): Bytes to read; None returns what is already waiting,
+                or waits up to timeout for at least one byte
+            timeout (float): Override the session timeout for this call
+
+        Returns:
+            bytes: Data read (may be shorter than size on timeout)
+        """
+        if timeout is None:
+            timeout = self.timeout
+        data = self._require_open().read(size, timeout)
+        self.bytes_read += len(data)
+        return data
+
+    @property
+    def in_waiting(self):
+        return self._require_open().in_waiting
+
+    def discard_input(self):
+        """Drop unread input, partially decoded frames and unclaimed frames."""
+        self._require_open().reset_input()
+        self.decoder.reset()
+        self._pending.clear()
+
+    # ------------------------------------------------------------------
+    # Upload frames
+    # ------------------------------------------------------------------
+    def _take_pending(self, source):
+        for i, frame in enumerate(self._pending):
+            if source is None or frame.source == source:
+                del self._pending[i]
+                return frame
+        return None
+
+    def poll_frames(self, timeout=0.0):
+        """
+        Decode whatever has arrived and return all unclaimed frames.
+
+        Args:
+            timeout (float): Wait up to this long for the first byte
+
+        Returns:
+            list: UploadFrame(source, payload) records in arrival order
+        """
+        data = self.read(timeout=timeout)
+        self._pending.extend(self.decoder.feed(data))
+        frames = list(self._pending)
+        self._pending.clear()
+        return frames
+
+    def read_frame(self, source=None, timeout=None):
+        """
+        Wait for the next upload frame, optionally from one source only.
+
+        Frames from other sources that arrive meanwhile are kept and returned
+        by later calls asking for them.
+
+        Args:
+            source (int): Upload source ID to wait for, None for any
+            timeout (float): Seconds to wait (default: session timeout)
+
+        Returns:
+            UploadFrame or None: The frame, or None on timeout
+        """
+        frame = self._take_pending(source)
+        if frame is not None:
+            return frame
+
+        if timeout is None:
+            timeout = self.timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            data = self.read(timeout=remaining)
+            if not data:
+                continue
+            self._pending.extend(self.decoder.feed(data))
+            frame = self._take_pending(source)
+            if frame is not None:
+                return frame
+
+    def transact(self, frame, source=None, timeout=None):
+        """Send one command frame and wait for its upload response."""
+        self.write(frame)
+        return self.read_frame(source, timeout)
@@ -2,128 +2,16 @@
 """
 DC 诊断工具 - 持续监控数据流，查看何时卡住
 使用 WinUSB 通过 EP3 独立通道读取 Digital Capture 数据
+
+用法: python diagnose_dc.py [usb | COM3 | loop]   (默认 usb)
 """
 
-import usb.core
-import usb.util
 import time
 import sys
 
-# USB 设备标识 (根据 usb_descriptor.v 配置)
-USB_VID = 0x33AA  # Gowin USB Vendor ID
-USB_PID = 0x0000  # Product ID
-
-# Endpoint 地址
-EP_CTRL_OUT = 0x02  # EP2 OUT - 命令发送
-EP_DC_IN = 0x83     # EP3 IN  - Digital Capture 数据读取
-EP_DATA_IN = 0x82   # EP2 IN  - 通用数据读取 (备用)
-
-def get_usb_backend():
-    """获取可用的 USB 后端"""
-    # 尝试多个后端，按优先级排序
-    backends_to_try = []
-
-    # 1. libusb1 (推荐，支持 WinUSB)
-    try:
-        import usb.backend.libusb1
-        backend = usb.backend.libusb1.get_backend()
-        if backend:
-            backends_to_try.append(("libusb1", backend))
-    except:
-        pass
-
-    # 2. libusb0 (备选)
-    try:
-        import usb.backend.libusb0
-        backend = usb.backend.libusb0.get_backend()
-        if backend:
-            backends_to_try.append(("libusb0", backend))
-    except:
-        pass
-
-    # 3. openusb (备选)
-    try:
-        import usb.backend.openusb
-        backend = usb.backend.openusb.get_backend()
-        if backend:
-            backends_to_try.append(("openusb", backend))
-    except:
-        pass
-
-    return backends_to_try
-
-def find_usb_device():
-    """查找 USB 设备 - 尝试多个后端"""
-    backends = get_usb_backend()
-
-    if not backends:
-        print("❌ 没有可用的 USB 后端！")
-        print("   请安装 libusb: https://github.com/libusb/libusb/releases")
-        return None, None
-
-    for backend_name, backend in backends:
-        try:
-            dev = usb.core.find(idVendor=USB_VID, idProduct=USB_PID, backend=backend)
-            if dev:
-                print(f"✅ 使用 {backend_name} 后端找到设备")
-                return dev, backend_name
-        except Exception as e:
-            continue
-
-    return None, None
-
-def list_usb_devices():
-    """列出所有匹配的 USB 设备 - 尝试多个后端"""
-    backends = get_usb_backend()
-
-    if not backends:
-        return []
-
-    all_devices = []
-    for backend_name, backend in backends:
-        try:
-            devices = list(usb.core.find(find_all=True, idVendor=USB_VID, idProduct=USB_PID, backend=backend))
-            if devices:
-                print(f"✅ 使用 {backend_name} 后端")
-                return devices
-        except:
-            continue
-
-    return all_devices
-
-def init_usb_device(dev):
-    """初始化 USB 设备"""
-    try:
-        # Windows 下不需要分离内核驱动
-        # 只在 Linux/macOS 上尝试分离
-        try:
-            if dev.is_kernel_driver_active(0):
-                dev.detach_kernel_driver(0)
-                print("✅ 已分离内核驱动")
-        except (NotImplementedError, AttributeError):
-            # Windows 不支持此操作，忽略
-            pass
-        except Exception as e:
-            # 其他错误也忽略，继续尝试配置
-            pass
-
-        # 设置配置
-        try:
-            dev.set_configuration()
-            print(f"✅ USB 设备已配置")
-        except usb.core.USBError as e:
-            # 配置可能已经设置，尝试继续
-            print(f"⚠️  设置配置时出现警告: {e}")
-            print(f"   尝试继续...")
-
-        return True
-    except usb.core.USBError as e:
-        print(f"❌ USB 初始化失败: {e}")
-        return False
-    except Exception as e:
-        print(f"❌ 初始化错误: {e}")
-        return False
-
+from dc_rate_profile import rate_limit
+from transport import (EP_DC_IN, USB_PID, USB_VID, UsbTransport, create_transport,
+                       list_usb_devices, usb_device_strings)
 
 def generate_dc_start_command(sample_rate_hz):
     """生成 DC 启动命令"""
@@ -144,18 +32,18 @@ def generate_dc_start_command(sample_rate_hz):
 
     return full_cmd
 
-def diagnose(dev, sample_rate):
-    """诊断数据流 - 使用 EP3 独立通道"""
+def diagnose(link, sample_rate, spec=None):
+    """诊断数据流 - 使用 EP3 独立通道 (link: 已打开的 transport, spec: 用于查找速率标定)"""
     try:
         # ===== 修复问题2：先发送STOP命令，确保模块回到IDLE状态 =====
         stop_cmd = bytes([0xAA, 0x55, 0x0C, 0x00, 0x00, 0x0C])
-        dev.write(EP_CTRL_OUT, stop_cmd)
+        link.write(stop_cmd)
         time.sleep(0.1)
         print("✅ 已发送 STOP 命令（清理前序状态）\n")
 
         # 发送启动命令到 EP2 OUT
         cmd = generate_dc_start_command(sample_rate)
-        dev.write(EP_CTRL_OUT, cmd)
+        link.write(cmd)
         print("✅ 已发送 START 命令到 EP2 OUT\n")
 
         # ===== 修复问题1：智能等待策略，根据采样率调整 =====
@@ -171,16 +59,26 @@ def diagnose(dev, sample_rate):
             time.sleep(wait_time)
 
         # ===== 修复问题3：添加速率预警 =====
+        # 优先使用本机标定的无损速率 (dc_rate_profile.py)
         expected_rate = sample_rate  # 1 byte per sample
-        if expected_rate > 500_000:
+        limit = rate_limit(spec, 8192) if spec else None
+        if limit is not None:
+            if expected_rate > limit:
+                print(f"{'='*85}")
+                print(f"⚠️  警告：采样率 {sample_rate/1000:.0f} kHz 超过本机标定的无损速率")
+                print(f"    标定极限: {limit/1000:.0f} kHz ({limit/1024:.1f} KB/s) [{spec}]")
+                print(f"    预计丢失: ~{(expected_rate - limit) / expected_rate * 100:.0f}% 数据")
+                print(f"{'='*85}\n")
+        elif expected_rate > 500_000:
             print(f"{'='*85}")
             print(f"⚠️  警告：采样率 {sample_rate/1000:.0f} kHz 超过USB带宽限制")
             print(f"    预期速率: {expected_rate/1024:.1f} KB/s ({expected_rate/1024/1024:.2f} MB/s)")
-            print(f"    USB极限:  ~1200 KB/s (1.17 MB/s) [USB Full-Speed]")
+            print(f"    USB极限:  ~1200 KB/s (1.17 MB/s) [USB Full-Speed, 未标定]")
             loss_rate = (expected_rate - 1.2e6) / expected_rate * 100
             if loss_rate > 0:
                 print(f"    预计丢失: ~{loss_rate:.0f}% 数据")
             print(f"    建议: 降低采样率至 500 kHz 以下以避免数据丢失")
+            print(f"    标定: python dc_rate_profile.py {spec or 'usb'} --read-size 8192")
             print(f"{'='*85}\n")
 
         # 持续读取，监控数据流
@@ -207,24 +105,22 @@ def diagnose(dev, sample_rate):
         consecutive_timeouts = 0
 
         while True:
-            # 从 EP3 读取数据
+            # 从 EP3 读取数据 (超时返回空)
             try:
-                data = dev.read(EP_DC_IN, read_size, timeout=timeout_ms)
-                if data:
-                    total += len(data)
-                    timeout_count = 0  # 重置超时计数
-                    consecutive_timeouts = 0
-            except usb.core.USBError as e:
-                if e.errno == 110 or e.errno is None:  # ETIMEDOUT 或 timeout error
-                    timeout_count += 1
-                    consecutive_timeouts += 1
-                    # 连续超时时稍微延迟一下，避免 CPU 占用过高
-                    if consecutive_timeouts > 5:
-                        time.sleep(0.001)  # 1ms 延迟
-                    pass
-                else:
-                    print(f"\n❌ USB 读取错误: {e}")
-                    break
+                data = link.read_stream(read_size, timeout=timeout_ms / 1000)
+            except Exception as e:
+                print(f"\n❌ USB 读取错误: {e}")
+                break
+            if data:
+                total += len(data)
+                timeout_count = 0  # 重置超时计数
+                consecutive_timeouts = 0
+            else:
+                timeout_count += 1
+                consecutive_timeouts += 1
+                # 连续超时时稍微延迟一下，避免 CPU 占用过高
+                if consecutive_timeouts > 5:
+                    time.sleep(0.001)  # 1ms 延迟
 
             # 每秒检查一次
             now = time.time()
@@ -328,8 +224,6 @@ def diagnose(dev, sample_rate):
             print(f"\n💡 结论: USB 带宽利用率低，瓶颈不在 USB")
         print("="*85)
 
-    except usb.core.USBError as e:
-        print(f"\n❌ USB 错误: {e}")
     except Exception as e:
         print(f"\n❌ 错误: {e}")
         import traceback
@@ -338,7 +232,7 @@ def diagnose(dev, sample_rate):
         # 发送停止命令
         try:
             stop_cmd = bytes([0xAA, 0x55, 0x0C, 0x00, 0x00, 0x0C])
-            dev.write(EP_CTRL_OUT, stop_cmd)
+            link.write(stop_cmd)
             print("\n✅ 已发送 STOP 命令")
         except:
             pass
@@ -348,53 +242,54 @@ if __name__ == "__main__":
     print("🔬 DC 数据流诊断工具 (WinUSB版本)")
     print("=" * 70)
 
-    # 查找 USB 设备
-    print("\n正在查找 USB 设备...")
-    devices = list_usb_devices()
-
-    if not devices:
-        print(f"❌ 未找到 USB 设备 (VID: 0x{USB_VID:04X}, PID: 0x{USB_PID:04X})")
-        print("\n请检查:")
-        print("  1. FPGA 是否正确连接到 PC")
-        print("  2. USB 设备是否已枚举")
-        print("  3. Windows 是否已安装 WinUSB 驱动")
-        print("\n提示: 可使用 Zadig 工具安装 WinUSB 驱动")
-        sys.exit(1)
+    spec = sys.argv[1] if len(sys.argv) > 1 else "usb"
 
-    print(f"\n找到 {len(devices)} 个匹配的设备:")
-    for i, dev in enumerate(devices, 1):
-        try:
-            manufacturer = usb.util.get_string(dev, dev.iManufacturer) if dev.iManufacturer else "N/A"
-            product = usb.util.get_string(dev, dev.iProduct) if dev.iProduct else "N/A"
-            serial = usb.util.get_string(dev, dev.iSerialNumber) if dev.iSerialNumber else "N/A"
-        except:
-            manufacturer = "N/A"
-            product = "N/A"
-            serial = "N/A"
-
-        print(f"{i}. Bus {dev.bus} Device {dev.address}")
-        print(f"   制造商: {manufacturer}")
-        print(f"   产品:   {product}")
-        print(f"   序列号: {serial}")
-
-    # 选择设备
-    selected_dev = None
-    if len(devices) == 1:
-        selected_dev = devices[0]
-        print(f"\n自动选择设备 1")
-    else:
-        print("\n请输入设备编号:", end=" ")
-        try:
-            dev_idx = int(input()) - 1
-            selected_dev = devices[dev_idx]
-        except:
-            print("❌ 无效输入")
+    if spec == "usb":
+        # 查找 USB 设备
+        print("\n正在查找 USB 设备...")
+        devices, backend_name = list_usb_devices()
+
+        if not devices:
+            print(f"❌ 未找到 USB 设备 (VID: 0x{USB_VID:04X}, PID: 0x{USB_PID:04X})")
+            print("\n请检查:")
+            print("  1. FPGA 是否正确连接到 PC")
+            print("  2. USB 设备是否已枚举")
+            print("  3. Windows 是否已安装 WinUSB 驱动")
+            print("\n提示: 可使用 Zadig 工具安装 WinUSB 驱动")
             sys.exit(1)
 
+        print(f"✅ 使用 {backend_name} 后端")
+        print(f"\n找到 {len(devices)} 个匹配的设备:")
+        for i, dev in enumerate(devices, 1):
+            manufacturer, product, serial = usb_device_strings(dev)
+            print(f"{i}. Bus {dev.bus} Device {dev.address}")
+            print(f"   制造商: {manufacturer}")
+            print(f"   产品:   {product}")
+            print(f"   序列号: {serial}")
+
+        # 选择设备
+        selected_dev = None
+        if len(devices) == 1:
+            selected_dev = devices[0]
+            print(f"\n自动选择设备 1")
+        else:
+            print("\n请输入设备编号:", end=" ")
+            try:
+                dev_idx = int(input()) - 1
+                selected_dev = devices[dev_idx]
+            except:
+                print("❌ 无效输入")
+                sys.exit(1)
+        link = UsbTransport(device=selected_dev)
+    else:
+        link = create_transport(spec)
+
     # 初始化设备
-    print(f"\n正在初始化 USB 设备...")
-    if not init_usb_device(selected_dev):
-        print("❌ USB 设备初始化失败")
+    print(f"\n正在打开 {link.name}...")
+    try:
+        link.open()
+    except Exception as e:
+        print(f"❌ 设备初始化失败: {e}")
         sys.exit(1)
 
     # 选择采样率
@@ -432,4 +327,7 @@ if __name__ == "__main__":
     print("\n" + "=" * 70 + "\n")
 
     # 运行诊断
-    diagnose(selected_dev, selected_rate)
+    try:
+        diagnose(link, selected_rate, spec)
+    finally:
+        link.close()
@@ -0,0 +1,590 @@
+#!/usr/bin/env python3
+"""
+FPGA2025 Device Emulator
+========================
+
+Behavioural model of the FPGA side of the link, for running the tools and
+benchmarks without a board. It parses command frames the way protocol_parser
+does and answers the way the handlers behind command_processor do:
+
+    0x02-0x06   I2C master      bus with the emulated I2C slave and an EEPROM
+    0x07-0x09   UART            TX looped back to RX, 0x09 uploads the RX FIFO
+    0x0A        DSM             fixed high/low times per channel
+    0x0B/0x0C   Digital Capture sample stream at 60 MHz / divider
+    0x11        SPI master      MOSI wired to MISO
+    0x20-0x23   1-Wire          one DS18B20 on the bus
+    0x34-0x36   I2C slave       4 CDC-accessible registers
+    0xFF        heartbeat       toggles the LED (no response, like the RTL)
+
+Other commands are accepted and counted in `ignored`. Responses are 0xAA44
+upload frames (frame_codec.encode_upload) of at most 31 data bytes, the size
+of the upload_packer buffer. Handlers answer immediately; only the DC stream
+is paced in real time.
+
+The emulator plugs into transport.LoopbackTransport as its device, so any
+tool that takes a transport spec can use it:
+
+    python diagnose_dc.py emu
+
+or from code:
+
+    from transport import LoopbackTransport
+    from fpga_emulator import FpgaEmulator
+
+    link = LoopbackTransport(FpgaEmulator(), stream_limit=8 * 1024 * 1024)
+
+Digital Capture:
+    The default input pattern is an 8-bit counter (channel n toggles every
+    2**n samples), generated from a precomputed buffer so the stream keeps up
+    with 60 MB/s. With realtime=False samples are produced as fast as the
+    host drains them, which is what throughput profiling wants.
+
+    START with the DC_FLAG_MARKERS flag sends the samples in sequence-marker
+    packets (dc_markers.py). Like the handler's FIFO, the model then drops
+    whole samples when the stream channel is full, so the index jump in the
+    next packet tells the host exactly how many were lost.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from dc_commands import CMD_DC_START, DC_FLAG_MARKERS, SYSTEM_CLK
+from dc_markers import MARKER_HEADER_SIZE, MARKER_MAX_SAMPLES, encode_packets
+from frame_codec import (
+    FRAME_PREFIX_LEN, SOURCE_DSM, SOURCE_I2C, SOURCE_I2C_SLAVE,
+    SOURCE_ONEWIRE, SOURCE_SPI, SOURCE_UART, checksum, encode_upload,
+)
+
+MAX_PAYLOAD_LEN = 1024          # protocol_parser instance in cdc.v
+UPLOAD_CHUNK = 31               # upload_packer data buffer per frame
+STREAM_CHUNK = 256 * 1024       # Largest single push into the stream FIFO
+STREAM_TICK = 0.001             # Pacing period of the DC generator (s)
+
+
+# ============================================================================
+# protocol_parser
+# ============================================================================
+class ProtocolParser:
+    """
+    Byte-stream model of rtl/protocol_parser.v.
+
+    Mirrors its quirks: a byte other than 0x55 after 0xAA drops back to idle
+    (so AA AA 55 is not a frame start), frames longer than max_payload and
+    frames with a bad checksum are dropped silently.
+    """
+
+    def __init__(self, max_payload=MAX_PAYLOAD_LEN):
+        self.max_payload = max_payload
+        self._buf = bytearray()
+        self.frames = 0
+        self.checksum_errors = 0
+        self.length_errors = 0
+
+    def feed(self, data):
+        """Return the (command, payload) pairs completed by data."""
+        buf = self._buf
+        buf += data
+        out = []
+        pos = 0
+        end = len(buf)
+        while True:
+            start = buf.find(0xAA, pos)
+            if start < 0:
+                pos = end
+                break
+            if start + 1 >= end:
+                pos = start
+                break
+            if buf[start + 1] != 0x55:
+                pos = start + 2       # SOF2 mismatch consumes the byte
+                continue
+            if start + FRAME_PREFIX_LEN > end:
+                pos = start
+                break
+            command = buf[start + 2]
+            length = (buf[start + 3] << 8) | buf[start + 4]
+            if length > self.max_payload:
+                self.length_errors += 1
+                pos = start + FRAME_PREFIX_LEN
+                continue
+            frame_end = start + FRAME_PREFIX_LEN + length + 1
+            if frame_end > end:
+                pos = start
+                break
+            if checksum(buf[start + 2:frame_end - 1]) != buf[frame_end - 1]:
+                self.checksum_errors += 1
+            else:
+                self.frames += 1
+                out.append((command, bytes(buf[start + FRAME_PREFIX_LEN:frame_end - 1])))
+            pos = frame_end
+        del buf[:pos]
+        return out
+
+    def reset(self):
+        self._buf.clear()
+
+
+# ============================================================================
+# Handler models
+# ============================================================================
+class UartModel:
+    """uart_handler with TX wired to RX: 0x08 data is read back by 0x09."""
+
+    COMMANDS = (0x07, 0x08, 0x09)
+
+    def __init__(self, emulator):
+        self.emulator = emulator
+        self.config = None
+        self.rx_fifo = bytearray()
+
+    def handle(self, command, payload):
+        if command == 0x07:
+            self.config = payload
+        elif command == 0x08:
+            self.rx_fifo += payload
+        elif self.rx_fifo:
+            self.emulator.upload(SOURCE_UART, self.rx_fifo)
+            self.rx_fifo = bytearray()
+
+
+class SpiModel:
+    """spi_handler [write_len, read_len, data...] with MOSI looped to MISO."""
+
+    COMMANDS = (0x11,)
+
+    def __init__(self, emulator, device=None):
+        self.emulator = emulator
+        # device(tx_bytes) -> rx_bytes; default is a wire from MOSI to MISO
+        self.device = device or bytes
+        self.transfers = 0
+
+    def handle(self, command, payload):
+        if len(payload) < 2:
+            return
+        write_len, read_len = payload[0], payload[1]
+        # The handler clocks 0x00 during the read phase
+        tx = payload[2:2 + write_len].ljust(write_len, b'\x00') + bytes(read_len)
+        rx = self.device(tx)
+        self.transfers += 1
+        if read_len:
+            self.emulator.upload(SOURCE_SPI, rx[write_len:write_len + read_len])
+
+
+class I2cSlaveModel:
+    """i2c_slave_handler: 4 registers, 0x34 address, 0x35 preload, 0x36 read."""
+
+    COMMANDS = (0x34, 0x35, 0x36)
+    NUM_REGISTERS = 4
+
+    def __init__(self, emulator, address=0x24):
+        self.emulator = emulator
+        self.address = address
+        self.registers = bytearray(self.NUM_REGISTERS)
+
+    def handle(self, command, payload):
+        if command == 0x34:
+            if payload:
+                self.address = payload[0] & 0x7F
+        elif command == 0x35:
+            if len(payload) >= 2:
+                start, length = payload[0], payload[1]
+                for i, value in enumerate(payload[2:2 + length]):
+                    if start + i < self.NUM_REGISTERS:
+                        self.registers[start + i] = value
+        elif len(payload) >= 2:
+            start, length = payload[0], payload[1]
+            data = bytes(self.registers[start + i] if start + i < self.NUM_REGISTERS else 0
+                         for i in range(length))
+            if data:
+                self.emulator.upload(SOURCE_I2C_SLAVE, data)
+
+
+class I2cMasterModel:
+    """
+    i2c_handler talking to a simulated bus.
+
+    The emulated I2C slave answers at its configured address (sharing the
+    registers with the 0x35/0x36 commands); an 8 KB EEPROM (24LC64) sits at
+    0x50. Reads from an empty address return 0xFF, the idle bus level.
+    """
+
+    COMMANDS = (0x02, 0x03, 0x04, 0x05, 0x06)
+
+    def __init__(self, emulator, slave, eeprom_address=0x50):
+        self.emulator = emulator
+        self.slave = slave
+        self.eeprom_address = eeprom_address
+        self.eeprom = bytearray(b'\xff' * 8192)
+        self.device_addr = 0x50
+        self.addr_16bit = False
+        self._pointer = 0
+
+    def _memory(self):
+        if self.device_addr == self.slave.address:
+            return self.slave.registers
+        if self.device_addr == self.eeprom_address:
+            return self.eeprom
+        return None
+
+    def _write(self, data):
+        memory = self._memory()
+        if memory is not None:
+            for value in data:
+                memory[self._pointer % len(memory)] = value
+                self._pointer += 1
+
+    def _read(self, length):
+        memory = self._memory()
+        if memory is None:
+            return b'\xff' * length
+        data = bytes(memory[(self._pointer + i) % len(memory)] for i in range(length))
+        self._pointer += length
+        return data
+
+    def handle(self, command, payload):
+        if command == 0x04:
+            if len(payload) >= 2:
+                self.device_addr = payload[0] & 0x7F
+                self.addr_16bit = payload[1] == 1
+        elif command == 0x02:
+            self._write(payload)
+        elif command == 0x05:
+            if len(payload) >= 2:
+                reg = (payload[0] << 8) | payload[1]
+                self._pointer = reg if self.addr_16bit else reg & 0xFF
+                self._write(payload[2:])
+        elif command == 0x03:
+            if len(payload) >= 2:
+                self.emulator.upload(SOURCE_I2C, self._read((payload[0] << 8) | payload[1]))
+        elif len(payload) >= 4:
+            reg = (payload[0] << 8) | payload[1]
+            self._pointer = reg if self.addr_16bit else reg & 0xFF
+            self.emulator.upload(SOURCE_I2C, self._read((payload[2] << 8) | payload[3]))
+
+
+def dallas_crc8(data):
+    """1-Wire CRC8 (polynomial x^8 + x^5 + x^4 + 1, LSB first)."""
+    crc = 0
+    for byte in data:
+        for _ in range(8):
+            mix = (crc ^ byte) & 0x01
+            crc >>= 1
+            if mix:
+                crc ^= 0x8C
+            byte >>= 1
+    return crc
+
+
+class Ds18b20:
+    """Byte-level DS18B20: ROM commands, Convert T, scratchpad read/write."""
+
+    def __init__(self, serial=b'\x01\x02\x03\x04\x05\x06', temperature=25.0625):
+        rom = b'\x28' + bytes(serial)
+        self.rom = rom + bytes([dallas_crc8(rom)])
+        self.temperature = temperature
+        self.th, self.tl, self.config = 0x4B, 0x46, 0x7F
+        self._raw = 0x0550                   # Power-on value: +85 C
+        self._state = 'rom'
+        self._out = bytearray()
+        self._collect = None                 # (target, remaining) for multi-byte writes
+
+    def reset(self):
+        self._state = 'rom'
+        self._out.clear()
+        self._collect = None
+        return True                          # presence pulse
+
+    def scratchpad(self):
+        data = bytes([self._raw & 0xFF, (self._raw >> 8) & 0xFF,
+                      self.th, self.tl, self.config, 0xFF, 0x0C, 0x10])
+        return data + bytes([dallas_crc8(data)])
+
+    def write_byte(self, value):
+        if self._collect is not None:
+            target, buf = self._collect
+            buf.append(value)
+            if target == 'match' and len(buf) == 8:
+                self._state = 'function' if bytes(buf) == self.rom else 'idle'
+                self._collect = None
+            elif target == 'scratchpad' and len(buf) == 3:
+                self.th, self.tl, self.config = buf
+                self._collect = None
+            return
+        if self._state == 'rom':
+            if value == 0x33:                # Read ROM
+                self._out += self.rom
+                self._state = 'function'
+            elif value == 0xCC:              # Skip ROM
+                self._state = 'function'
+            elif value == 0x55:              # Match ROM
+                self._collect = ('match', bytearray())
+        elif self._state == 'function':
+            if value == 0x44:                # Convert T
+                self._raw = int(round(self.temperature * 16)) & 0xFFFF
+            elif value == 0xBE:              # Read Scratchpad
+                self._out += self.scratchpad()
+            elif value == 0x4E:              # Write Scratchpad
+                self._collect = ('scratchpad', bytearray())
+
+    def read_byte(self):
+        if self._out:
+            value = self._out[0]
+            del self._out[0]
+            return value
+        return 0xFF                          # Bus released: reads as 1s
+
+
+class OneWireModel:
+    """one_wire_handler: 0x20 reset, 0x21 write, 0x22 read, 0x23 write+read."""
+
+    COMMANDS = (0x20, 0x21, 0x22, 0x23)
+
+    def __init__(self, emulator, device=None):
+        self.emulator = emulator
+        self.device = device if device is not None else Ds18b20()
+
+    def _read(self, count):
+        if count:
+            self.emulator.upload(SOURCE_ONEWIRE, bytes(self.device.read_byte() for _ in range(count)))
+
+    def handle(self, command, payload):
+        if command == 0x20:
+            self.device.reset()
+        elif command == 0x21:
+            for value in payload:
+                self.device.write_byte(value)
+        elif command == 0x22:
+            # The payload length is the byte count
+            self._read(len(payload))
+        elif len(payload) >= 2:
+            write_len, read_len = payload[0], payload[1]
+            for value in payload[2:2 + write_len]:
+                self.device.write_byte(value)
+            self._read(read_len)
+
+
+class DsmModel:
+    """dsm_multichannel_handler: [channel_mask] -> [ch, high(2), low(2)] per channel."""
+
+    COMMANDS = (0x0A,)
+
+    def __init__(self, emulator, timings=None):
+        self.emulator = emulator
+        # (high_time, low_time) in system clocks; default: channel n at
+        # 60 MHz / (200 * (n + 1)), 50 % duty cycle
+        self.timings = timings or [(100 * (n + 1), 100 * (n + 1)) for n in range(8)]
+
+    def handle(self, command, payload):
+        if not payload:
+            return
+        mask = payload[0]
+        out = bytearray()
+        for ch in range(8):
+            if mask & (1 << ch):
+                high, low = self.timings[ch]
+                out += bytes([ch, (high >> 8) & 0xFF, high & 0xFF, (low >> 8) & 0xFF, low & 0xFF])
+        if out:
+            self.emulator.upload(SOURCE_DSM, out)
+
+
+class DigitalCaptureModel:
+    """
+    digital_capture_handler: 0x0B [div_h, div_l, (flags)] starts, 0x0C stops.
+
+    Samples go to the transport's stream channel (EP 0x83). A background
+    thread produces 60 MHz / divider samples per second from a repeating
+    pattern.
+    """
+
+    COMMANDS = (0x0B, 0x0C)
+
+    def __init__(self, emulator, pattern=None, realtime=True):
+        self.emulator = emulator
+        self.realtime = realtime
+        self.divider = 60
+        self.markers = False                 # Sequence-marker packets
+        self.samples = 0                     # Samples produced since start
+        self.dropped = 0                     # Marker mode: samples dropped since start
+        self._thread = None
+        self._running = threading.Event()
+        self.set_pattern(pattern if pattern is not None else np.arange(256, dtype=np.uint8))
+
+    @property
+    def sample_rate(self):
+        return SYSTEM_CLK / self.divider
+
+    @property
+    def running(self):
+        return self._running.is_set()
+
+    def set_pattern(self, pattern):
+        """Use a repeating byte pattern (bytes-like or uint8 array) as the 8 inputs."""
+        period = np.frombuffer(bytes(pattern), dtype=np.uint8)
+        if not len(period):
+            raise ValueError("DC pattern must not be empty")
+        repeats = -(-(STREAM_CHUNK + len(period)) // len(period))
+        self._period = len(period)
+        # Every chunk is one slice of this buffer, so no copying per push
+        self._tiled = np.tile(period, repeats).tobytes()
+        self._view = memoryview(self._tiled)
+
+    def handle(self, command, payload):
+        if command == CMD_DC_START:
+            if len(payload) >= 2:
+                self.divider = max(1, (payload[0] << 8) | payload[1])
+            self.markers = len(payload) >= 3 and bool(payload[2] & DC_FLAG_MARKERS)
+            self.start()
+        else:
+            self.stop()
+
+    def start(self):
+        self.stop()
+        self.samples = 0
+        self.dropped = 0
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name='DcEmulator', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running.clear()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _emit(self, count):
+        view = self._view
+        period = self._period
+        push = self.emulator.push_stream
+        while count > 0:
+            n = min(count, STREAM_CHUNK)
+            offset = self.samples % period
+            if self.markers:
+                self._emit_packets(view[offset:offset + n])
+            else:
+                push(view[offset:offset + n])
+            self.samples += n
+            count -= n
+
+    def _emit_packets(self, samples):
+        """Marker mode: send what fits into the stream channel, drop the rest."""
+        room = self.emulator.stream_room()
+        keep = len(samples)
+        if room is not None:
+            stride = MARKER_HEADER_SIZE + MARKER_MAX_SAMPLES
+            fits = room // stride * MARKER_MAX_SAMPLES + max(room % stride - MARKER_HEADER_SIZE, 0)
+            keep = min(keep, fits)
+        if keep:
+            self.emulator.push_stream(encode_packets(samples[:keep], self.samples).data)
+        self.dropped += len(samples) - keep
+
+    def _run(self):
+        start = last = time.perf_counter()
+        while self._running.is_set():
+            now = time.perf_counter()
+            if self.realtime:
+                due = int((now - start) * self.sample_rate) - self.samples
+            else:
+                # Free-running: keep the host FIFO topped up
+                due = STREAM_CHUNK if self.emulator.stream_backlog() < 4 * STREAM_CHUNK else 0
+            if self.markers and due >= MARKER_MAX_SAMPLES:
+                # Like the handler: full packets, a short one only after a tick
+                due -= due % MARKER_MAX_SAMPLES
+            elif self.markers and now - last < STREAM_TICK:
+                due = 0
+            if due > 0:
+                self._emit(due)
+                last = now
+            else:
+                time.sleep(STREAM_TICK)
+
+
+# ============================================================================
+# Emulator
+# ============================================================================
+class FpgaEmulator:
+    """
+    Device model for transport.LoopbackTransport.
+
+    Args:
+        dc_pattern (bytes-like): Repeating Digital Capture input pattern
+        realtime (bool): Pace the DC stream at the configured sample rate;
+            False produces samples as fast as the host reads them
+        upload_chunk (int): Maximum data bytes per upload frame
+
+    Attributes:
+        parser (ProtocolParser): Frame statistics (frames, checksum_errors, ...)
+        uart, spi, i2c, i2c_slave, onewire, dsm, dc: Handler models
+        led (bool): Heartbeat LED state
+    """
+
+    def __init__(self, dc_pattern=None, realtime=True, upload_chunk=UPLOAD_CHUNK):
+        self.parser = ProtocolParser()
+        self.upload_chunk = upload_chunk
+        self.transport = None
+        self.led = False
+        self.heartbeats = 0
+        self.ignored = 0
+        self.commands = 0
+
+        self.uart = UartModel(self)
+        self.spi = SpiModel(self)
+        self.i2c_slave = I2cSlaveModel(self)
+        self.i2c = I2cMasterModel(self, self.i2c_slave)
+        self.onewire = OneWireModel(self)
+        self.dsm = DsmModel(self)
+        self.dc = DigitalCaptureModel(self, dc_pattern, realtime)
+
+        self._handlers = {}
+        for model in (self.uart, self.spi, self.i2c_slave, self.i2c, self.onewire, self.dsm, self.dc):
+            for command in model.COMMANDS:
+                self._handlers[command] = model
+        self._lock = threading.Lock()
+
+    # Transport device interface ---------------------------------------------
+    def attach(self, transport):
+        self.transport = transport
+        self.parser.reset()
+
+    def detach(self):
+        self.dc.stop()
+        self.transport = None
+
+    def receive(self, data):
+        with self._lock:
+            for command, payload in self.parser.feed(data):
+                self.execute(command, payload)
+
+    # Device side --------------------------------------------------------------
+    def execute(self, command, payload=b''):
+        """Run one parsed command (also usable without a transport)."""
+        self.commands += 1
+        if command == 0xFF:
+            self.led = not self.led
+            self.heartbeats += 1
+            return
+        model = self._handlers.get(command)
+        if model is None:
+            self.ignored += 1
+        else:
+            model.handle(command, payload)
+
+    def upload(self, source, data):
+        """Send data to the host as upload frames of at most upload_chunk bytes."""
+        if self.transport is None:
+            return
+        for i in range(0, len(data), self.upload_chunk):
+            self.transport.push(encode_upload(source, data[i:i + self.upload_chunk]))
+
+    def push_stream(self, data):
+        if self.transport is not None:
+            self.transport.push_stream(data)
+
+    def stream_backlog(self):
+        return self.transport.stream_backlog if self.transport is not None else 0
+
+    def stream_room(self):
+        """Bytes the stream channel still takes, or None if it is unbounded."""
+        limit = getattr(self.transport, 'stream_limit', None)
+        return None if limit is None else max(limit - self.transport.stream_backlog, 0)
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Frame Codec for FPGA2025 USB-CDC Protocol
+=========================================
+
+Shared encoder for 0xAA55 command frames, used by all host tools instead of
+building frames out of Python lists, and a streaming decoder for the 0xAA44
+upload frames sent back by the FPGA.
+
+Protocol Frame Format:
+    [Header(2)] [Command(1)] [Length(2)] [Payload(N)] [Checksum(1)]
+    0xAA55      CMD          Big-Endian  Data         Sum & 0xFF
+
+The checksum covers everything from the command byte to the end of the
+payload (see rtl/protocol_parser.v). Frames are written straight into a
+bytearray with struct.pack_into and slice assignment, so every payload byte
+is copied exactly once. The command/length contribution to the checksum is
+computed once per frame (or once per FrameTemplate) and only the payload is
+summed.
+
+Typical usage:
+    >>> from frame_codec import encode_frame, FrameBuilder, FrameTemplate
+    >>> encode_frame(0xFF).hex()                    # heartbeat
+    'aa55ff0000ff'
+    >>> DC_START = FrameTemplate(0x0B, 'H')         # divider, big-endian
+    >>> DC_START.pack(60).hex()
+    'aa550b0002003c49'
+    >>> builder = FrameBuilder()
+    >>> frame = builder.build(0x14, b'Hello')       # memoryview, no extra copy
+    >>> decoder = UploadDecoder()
+    >>> decoder.feed(bytes.fromhex('00 aa 44 01 00 02 41 42 74'))
+    [UploadFrame(source=1, payload=b'AB')]
+"""
+
+import struct
+from collections import namedtuple
+
+# ============================================================================
+# Protocol Constants
+# ============================================================================
+FRAME_HEADER = b'\xAA\x55'
+UPLOAD_HEADER = b'\xAA\x44'
+
+FRAME_PREFIX_LEN = 5      # header(2) + command(1) + length(2)
+FRAME_OVERHEAD = 6        # prefix + checksum(1)
+MAX_PAYLOAD_LEN = 0xFFFF  # 16-bit length field
+
+UPLOAD_PREFIX_LEN = 5     # header(2) + source(1) + length(2)
+MAX_UPLOAD_PAYLOAD = 0xFF # upload_packer.v always sends LEN_H = 0
+
+# Upload source IDs (see rtl/cdc.v and sim/SOURCE_ID_CORRECTION.md)
+SOURCE_UART = 0x01
+SOURCE_SPI = 0x03
+SOURCE_ONEWIRE = 0x04
+SOURCE_I2C = 0x05
+SOURCE_DSM = 0x0A
+SOURCE_SPI_SLAVE = 0x14
+SOURCE_I2C_SLAVE = 0x36
+
+_PREFIX = struct.Struct('>2sBH')
+
+
+# ============================================================================
+# Helper Functions
+# ============================================================================
+def frame_size(payload_len):
+    """Total frame size in bytes for a payload of payload_len bytes."""
+    return FRAME_OVERHEAD + payload_len
+
+
+def checksum(data, seed=0):
+    """
+    Calculate checksum for USB-CDC protocol.
+
+    Args:
+        data (bytes-like): Bytes to add up
+        seed (int): Partial sum of bytes already accounted for
+
+    Returns:
+        int: (seed + sum(data)) & 0xFF
+    """
+    return (seed + sum(data)) & 0xFF
+
+
+def prefix_seed(command, length):
+    """Checksum contribution of the command byte and the 16-bit length."""
+    return command + (length >> 8) + (length & 0xFF)
+
+
+def _byte_view(chunk):
+    """Return a flat unsigned-byte memoryview over any buffer object."""
+    view = memoryview(chunk)
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')
+    return view
+
+
+def payload_length(chunks):
+    """Total size in bytes of a sequence of payload chunks."""
+    return sum(_byte_view(chunk).nbytes for chunk in chunks)
+
+
+# ============================================================================
+# Encoders
+# ============================================================================
+def encode_into(buf, offset, command, *chunks):
+    """
+    Encode one command frame into an existing writable buffer.
+
+    The payload is the concatenation of chunks (bytes, bytearray, memoryview,
+    array.array, NumPy arrays, ...). Each chunk is copied once, directly into
+    its final position.
+
+    Args:
+        buf (bytearray or writable buffer): Destination buffer
+        offset (int): Position of the 0xAA header byte in buf
+        command (int): Command code (0x00-0xFF)
+        *chunks: Payload pieces in order
+
+    Returns:
+        int: Number of bytes written (frame_size(payload length))
+
+    Raises:
+        ValueError: Payload too long or buffer too small
+    """
+    views = [_byte_view(chunk) for chunk in chunks]
+    length = sum(view.nbytes for view in views)
+    if length > MAX_PAYLOAD_LEN:
+        raise ValueError(f"Payload length {length} exceeds {MAX_PAYLOAD_LEN} bytes")
+
+    end = offset + FRAME_PREFIX_LEN + length
+    with memoryview(buf) as out:
+        if end + 1 > out.nbytes:
+            raise ValueError(f"Buffer too small: need {end + 1 - offset} bytes at offset {offset}")
+
+        _PREFIX.pack_into(out, offset, FRAME_HEADER, command, length)
+        pos = offset + FRAME_PREFIX_LEN
+        for view in views:
+            out[pos:pos + view.nbytes] = view
+            pos += view.nbytes
+
+        out[end] = (prefix_seed(command, length) + sum(out[offset + FRAME_PREFIX_LEN:end])) & 0xFF
+
+    return end + 1 - offset
+
+
+def encode_frame(command, *chunks):
+    """
+    Create a complete USB-CDC command frame.
+
+    Args:
+        command (int): Command code
+        *chunks: Payload pieces (omit for commands without payload)
+
+    Returns:
+        bytearray: Complete frame ready to send. The frame is encoded in
+        place and returned without a second copy; use bytes(frame) where an
+        immutable or hashable value is needed.
+
+    Example:
+        >>> encode_frame(0x05, b'\\x00\\x3C', bytes([0xDE, 0xAD, 0xBE, 0xEF])).hex(' ')
+        'aa 55 05 00 06 00 3c de ad be ef 7f'
+    """
+    buf = bytearray(frame_size(payload_length(chunks)))
+    encode_into(buf, 0, command, *chunks)
+    return buf
+
+
+class FrameBuilder:
+    """
+    Reusable frame buffer for scripted runs that emit many frames.
+
+    build() encodes a single frame and returns a memoryview into the internal
+    buffer; the view stays valid until the next build()/reset(). append()
+    packs several frames back to back so they can be written with a single
+    write() call.
+    """
+
+    def __init__(self, capacity=4096):
+        self._buf = bytearray(capacity)
+        self._used = 0
+
+    def __len__(self):
+        return self._used
+
+    def _reserve(self, size):
+        needed = self._used + size
+        if needed > len(self._buf):
+            # Replace rather than resize so views handed out earlier stay valid
+            new_buf = bytearray(max(needed, 2 * len(self._buf)))
+            new_buf[:self._used] = memoryview(self._buf)[:self._used]
+            self._buf = new_buf
+
+    def reset(self):
+        """Discard all frames in the buffer."""
+        self._used = 0
+
+    def discard(self, count):
+        """Drop the first count bytes, keeping the rest (e.g. after a partial write)."""
+        count = min(count, self._used)
+        remaining = self._used - count
+        self._buf[:remaining] = self._buf[count:self._used]
+        self._used = remaining
+
+    def append(self, command, *chunks):
+        """Encode one frame after the frames already in the buffer."""
+        self._reserve(frame_size(payload_length(chunks)))
+        written = encode_into(self._buf, self._used, command, *chunks)
+        self._used += written
+        return written
+
+    def append_frame(self, frame):
+        """Append an already encoded frame (bytes-like) verbatim."""
+        view = _byte_view(frame)
+        self._reserve(view.nbytes)
+        self._buf[self._used:self._used + view.nbytes] = view
+        self._used += view.nbytes
+        return view.nbytes
+
+    def view(self):
+        """Memoryview over all frames currently in the buffer."""
+        return memoryview(self._buf)[:self._used]
+
+    def build(self, command, *chunks):
+        """Encode a single frame and return a memoryview of it."""
+        self.reset()
+        self.append(command, *chunks)
+        return self.view()
+
+
+class FrameTemplate:
+    """
+    Fixed-layout command frame with a precomputed header and checksum seed.
+
+    payload_format is a struct format string without byte-order prefix; the
+    payload is always packed big-endian unless the format starts with one of
+    '<', '>', '!' or '='.
+
+    Example:
+        >>> PWM_CONFIG = FrameTemplate(0xFE, 'BHH')   # channel, period, duty
+        >>> PWM_CONFIG.pack(0, 60000, 30000).hex(' ')
+        'aa 55 fe 00 05 00 ea 60 75 30 f2'
+    """
+
+    def __init__(self, command, payload_format=''):
+        if payload_format[:1] not in ('<', '>', '!', '='):
+            payload_format = '>' + payload_format
+        self.command = command
+        self.payload = struct.Struct(payload_format)
+        self.length = self.payload.size
+        self.size = frame_size(self.length)
+        self._prefix = _PREFIX.pack(FRAME_HEADER, command, self.length)
+        self._seed = prefix_seed(command, self.length)
+
+    def pack_into(self, buf, offset, *fields):
+        """Encode the frame into buf at offset; return bytes written."""
+        end = offset + FRAME_PREFIX_LEN + self.length
+        with memoryview(buf) as out:
+            out[offset:offset + FRAME_PREFIX_LEN] = self._prefix
+            self.payload.pack_into(out, offset + FRAME_PREFIX_LEN, *fields)
+            out[end] = (self._seed + sum(out[offset + FRAME_PREFIX_LEN:end])) & 0xFF
+        return self.size
+
+    def pack(self, *fields):
+        """Return the complete frame as bytes."""
+        buf = bytearray(self.size)
+        self.pack_into(buf, 0, *fields)
+        return bytes(buf)
+
+
+
+# ============================================================================
+# Upload Decoder
+# ============================================================================
+UploadFrame = namedtuple('UploadFrame', ['source', 'payload'])
+
+
+def encode_upload(source, payload, checksum_includes_header=True):
+    """
+    Build a 0xAA44 upload frame as the FPGA would send it.
+
+    Used to re-create raw responses for display and by test setups that play
+    the device side.
+
+    Args:
+        source (int): Upload source ID
+        payload (bytes-like): Frame data
+        checksum_includes_header (bool): See UploadDecoder
+
+    Returns:
+        bytes: Complete upload frame
+
+    Example:
+        >>> encode_upload(0x01, b'AB').hex(' ')
+        'aa 44 01 00 02 41 42 74'
+    """
+    view = _byte_view(payload)
+    length = view.nbytes
+    if length > MAX_PAYLOAD_LEN:
+        raise ValueError(f"Payload length {length} exceeds {MAX_PAYLOAD_LEN} bytes")
+    buf = bytearray(UPLOAD_PREFIX_LEN + length + 1)
+    _PREFIX.pack_into(buf, 0, UPLOAD_HEADER, source, length)
+    buf[UPLOAD_PREFIX_LEN:-1] = view
+    seed = sum(UPLOAD_HEADER) if checksum_includes_header else 0
+    buf[-1] = (seed + sum(buf[2:-1])) & 0xFF
+    return bytes(buf)
+
+
+class UploadDecoder:
+    """
+    Incremental, resynchronizing decoder for 0xAA44 upload frames.
+
+    Upload Frame Format:
+        [Header(2)] [Source(1)] [Length(2)] [Data(N)] [Checksum(1)]
+        0xAA44      Source ID   Big-Endian  Data      Sum & 0xFF
+
+    rtl/upload_packer.v starts the checksum at the 0xAA header byte, so the
+    header is included by default; pass checksum_includes_header=False for
+    firmware that sums from the source byte like the command frames do.
+
+    Bytes can be fed in chunks of any size. Bytes in front of a header, frames
+    with an impossible length and frames with a bad checksum are dropped, and
+    the search restarts one byte after the rejected header. A partial frame at
+    the end of a chunk is kept and completed by the next feed() without
+    scanning it again. A corrupted header whose length still looks valid holds
+    back decoding until that many bytes have arrived, so keep max_payload as
+    tight as the firmware allows.
+
+    Args:
+        max_payload (int): Largest accepted data length; longer frames are
+            treated as corruption
+        checksum_includes_header (bool): Whether 0xAA 0x44 count towards the
+            checksum
+    """
+
+    def __init__(self, max_payload=MAX_UPLOAD_PAYLOAD, checksum_includes_header=True):
+        self.max_payload = max_payload
+        self._seed = sum(UPLOAD_HEADER) if checksum_includes_header else 0
+        self._buf = bytearray()
+        self.frames = 0
+        self.discarded_bytes = 0
+        self.checksum_errors = 0
+        self.length_errors = 0
+
+    def __len__(self):
+        """Number of buffered bytes not yet decoded."""
+        return len(self._buf)
+
+    def reset(self):
+        """Drop buffered bytes (counters are kept)."""
+        del self._buf[:]
+
+    def feed(self, data):
+        """
+        Add received bytes and decode every frame that is now complete.
+
+        Args:
+            data (bytes-like): Next chunk of the byte stream
+
+        Returns:
+            list: UploadFrame(source, payload) records in stream order
+        """
+        buf = self._buf
+        buf += data
+        records = []
+        pos = 0
+        size = len(buf)
+
+        while True:
+            start = buf.find(UPLOAD_HEADER, pos)
+            if start < 0:
+                # Keep a trailing 0xAA, it may be the first half of a header
+                keep = size - 1 if size > pos and buf[-1] == UPLOAD_HEADER[0] else size
+                self.discarded_bytes += keep - pos
+                pos = keep
+                break
+            self.discarded_bytes += start - pos
+            pos = start
+
+            if size - start < UPLOAD_PREFIX_LEN:
+                break
+            length = (buf[start + 3] << 8) | buf[start + 4]
+            if length > self.max_payload:
+                self.length_errors += 1
+                self.discarded_bytes += 1
+                pos = start + 1
+                continue
+
+            end = start + UPLOAD_PREFIX_LEN + length
+            if end >= size:
+                break
+            with memoryview(buf) as view:
+                calc = (self._seed + sum(view[start + 2:end])) & 0xFF
+            if calc != buf[end]:
+                self.checksum_errors += 1
+                self.discarded_bytes += 1
+                pos = start + 1
+                continue
+
+            records.append(UploadFrame(buf[start + 2], bytes(buf[start + UPLOAD_PREFIX_LEN:end])))
+            self.frames += 1
+            pos = end + 1
+
+        # Compact once per feed instead of once per frame
+        del buf[:pos]
+        return records
+
+    def decode(self, chunks):
+        """
+        Decode an iterable of byte chunks.
+
+        Yields:
+            UploadFrame: Each valid frame, in stream order
+        """
+        for chunk in chunks:
+            yield from self.feed(chunk)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Coalescing Command Writer for FPGA2025
+======================================
+
+Packs many queued 0xAA55 command frames into a few large write() calls, so
+bulk configuration is limited by EP2 OUT bandwidth rather than per-transfer
+overhead. Frames are encoded straight into one growing buffer
+(frame_codec.FrameBuilder) and written when one of these happens:
+
+    - size:     the buffer reaches batch_size bytes
+    - deadline: the oldest queued frame has waited max_delay seconds
+    - barrier:  flush()/barrier() is called, or the writer is closed
+
+Bytes are always written in queue order, so protocol_parser sees exactly the
+same byte stream as with one write() per frame.
+
+Frame gap:
+    protocol_parser has a single payload buffer and no backpressure. Once a
+    frame is parsed, command_processor needs about 4 clocks per payload byte
+    to hand it to the handler, while USB bytes can arrive every 2 clocks. If
+    the next frame follows immediately its payload overwrites the one still
+    being handed over. With frame_gap=AUTO_GAP the writer therefore inserts
+    2 filler bytes (0x00, ignored by the parser while idle) per payload byte
+    after each frame. Handlers that stay busy after taking the payload (I2C,
+    SPI and 1-Wire transfers) need a barrier and a response before the next
+    command instead, or a delay when the command has no response (SPI
+    writes); spi_handler also takes at most 14 write bytes per frame.
+    Only commands whose handler is ready again once it has the payload,
+    such as configuration frames (I2C config 0x04), are safe to batch back
+    to back.
+
+Typical usage:
+    from device_session import DeviceSession
+    from frame_writer import CoalescingWriter
+
+    with DeviceSession('COM3') as session, CoalescingWriter(session.write) as writer:
+        for reg, value in settings:
+            writer.queue(0x35, bytes([reg, 1, value]))
+        writer.barrier()
+"""
+
+import threading
+import time
+
+from frame_codec import FrameBuilder, FRAME_PREFIX_LEN, payload_length
+
+DEFAULT_BATCH_SIZE = 16 * 1024   # Multiple of the 512-byte HS bulk packet
+DEFAULT_MAX_DELAY = 0.002        # Seconds a queued frame may wait
+AUTO_GAP = 'auto'
+FILLER_BYTE = 0x00
+
+_FILLER = bytes([FILLER_BYTE]) * 4096
+
+
+class CoalescingWriter:
+    """
+    Batches command frames into large writes.
+
+    Args:
+        write (callable): Sink taking a bytes-like object, e.g.
+            DeviceSession.write or serial.Serial.write
+        batch_size (int): Flush threshold and maximum size of a single write
+        max_delay (float): Deadline for a queued frame in seconds; None
+            disables the background flush (only size and barriers flush)
+        frame_gap (int or 'auto'): Filler bytes after each frame; 'auto' uses
+            2 per payload byte (see module docstring)
+    """
+
+    def __init__(self, write, batch_size=DEFAULT_BATCH_SIZE, max_delay=DEFAULT_MAX_DELAY,
+                 frame_gap=AUTO_GAP):
+        if batch_size <= 0:
+            raise ValueError(f"batch_size must be positive, got {batch_size}")
+        self._write = write
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.frame_gap = frame_gap
+
+        self._builder = FrameBuilder(batch_size + 1024)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._first_queued = None     # monotonic time of the oldest unflushed frame
+        self._closed = False
+        self._thread = None
+
+        # Statistics
+        self.frames = 0
+        self.writes = 0
+        self.bytes_written = 0
+
+    def __len__(self):
+        """Bytes queued but not yet written."""
+        return len(self._builder)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    # ------------------------------------------------------------------
+    # Queueing
+    # ------------------------------------------------------------------
+    def _gap_for(self, payload_len):
+        if self.frame_gap == AUTO_GAP:
+            return 2 * payload_len
+        return self.frame_gap
+
+    def _append_gap(self, gap):
+        while gap > 0:
+            step = min(gap, len(_FILLER))
+            self._builder.append_frame(_FILLER[:step])
+            gap -= step
+
+    def _queued(self):
+        # Called with the lock held after a frame was appended
+        self.frames += 1
+        if len(self._builder) >= self.batch_size:
+            self._flush_locked(full_only=True)
+        elif self._first_queued is None:
+            self._first_queued = time.monotonic()
+            if self.max_delay is not None:
+                self._ensure_thread()
+                self._wakeup.notify()
+
+    def queue(self, command, *chunks):
+        """Encode a command frame into the batch buffer."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Writer is closed")
+            self._builder.append(command, *chunks)
+            self._append_gap(self._gap_for(payload_length(chunks)))
+            self._queued()
+
+    def queue_frame(self, frame):
+        """Queue an already encoded command frame."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Writer is closed")
+            self._builder.append_frame(frame)
+            length = (frame[FRAME_PREFIX_LEN - 2] << 8) | frame[FRAME_PREFIX_LEN - 1]
+            self._append_gap(self._gap_for(length))
+            self._queued()
+
+    # ------------------------------------------------------------------
+    # Flushing
+    # ------------------------------------------------------------------
+    def _flush_locked(self, full_only=False):
+        # full_only: write whole batch_size chunks and keep the remainder
+        # queued, so size-triggered writes are all the same efficient size
+        size = len(self._builder)
+        end = size - size % self.batch_size if full_only else size
+        view = self._builder.view()
+        try:
+            for start in range(0, end, self.batch_size):
+                chunk = view[start:min(start + self.batch_size, end)]
+                self._write(chunk)
+                self.writes += 1
+                self.bytes_written += len(chunk)
+        finally:
+            view.release()
+            self._builder.discard(end)
+            if not len(self._builder):
+                self._first_queued = None
+
+    def flush(self):
+        """Write everything queued so far."""
+        with self._lock:
+            if len(self._builder):
+                self._flush_locked()
+
+    def barrier(self):
+        """
+        Flush and return once every queued byte has been handed to write().
+
+        Use before waiting for a response or before a command whose handler
+        must see all previous commands first.
+        """
+        self.flush()
+
+    def close(self):
+        """Flush remaining frames and stop the deadline thread."""
+        with self._lock:
+            if self._closed:
+                return
+            if len(self._builder):
+                self._flush_locked()
+            self._closed = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # ------------------------------------------------------------------
+    # Deadline thread
+    # ------------------------------------------------------------------
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._deadline_loop, name='CoalescingWriter',
+                                            daemon=True)
+            self._thread.start()
+
+    def _deadline_loop(self):
+        with self._lock:
+            while not self._closed:
+                if self._first_queued is None:
+                    self._wakeup.wait()
+                    continue
+                remaining = self._first_queued + self.max_delay - time.monotonic()
+                if remaining > 0:
+                    self._wakeup.wait(remaining)
+                    continue
+                self._flush_locked()
@@ -23,11 +23,11 @@ import struct
 import argparse
 import sys
 
+from frame_codec import FRAME_HEADER, FrameTemplate, encode_frame, checksum
+
 # ============================================================================
 # Protocol Constants
 # ============================================================================
-FRAME_HEADER = b'\xAA\x55'
-UPLOAD_HEADER = b'\xAA\x44'
 
 CMD_I2C_CONFIG = 0x04
 CMD_I2C_WRITE = 0x05
@@ -46,6 +46,10 @@ I2C_FREQ_MAP = {
     400000: I2C_CLK_400KHZ,
 }
 
+# Fixed-layout frames (payload packed big-endian)
+I2C_CONFIG_FRAME = FrameTemplate(CMD_I2C_CONFIG, 'BB')    # slave_addr, freq_code
+I2C_READ_FRAME = FrameTemplate(CMD_I2C_READ, 'HH')        # reg_addr, read_len
+
 
 # ============================================================================
 # Helper Functions
@@ -62,30 +66,21 @@ def calculate_checksum(data):
     Returns:
         int: Checksum value (0-255)
     """
-    return sum(data) & 0xFF
+    return checksum(data)
 
 
-def create_frame(command, payload):
+def create_frame(command, *payload):
     """
     Create a complete USB-CDC command frame.
 
     Args:
         command (int): Command code (0x04-0x06 for I2C)
-        payload (bytes): Command payload data
+        *payload: Command payload data, optionally split into several chunks
 
     Returns:
         bytes: Complete frame ready to send
     """
-    # Build frame without checksum
-    length = len(payload)
-    frame = FRAME_HEADER + struct.pack('B', command) + struct.pack('>H', length) + payload
-
-    # Calculate checksum (excluding frame header)
-    checksum_data = frame[2:]  # Skip 0xAA55
-    checksum = calculate_checksum(checksum_data)
-
-    # Append checksum
-    return frame + struct.pack('B', checksum)
+    return encode_frame(command, *payload)
 
 
 def print_frame(frame, description=""):
@@ -153,9 +148,8 @@ def i2c_config(slave_addr, freq_hz=100000):
         raise ValueError(f"Frequency must be one of {list(I2C_FREQ_MAP.keys())}, got {freq_hz}")
 
     freq_code = I2C_FREQ_MAP[freq_hz]
-    payload = struct.pack('BB', slave_addr, freq_code)
 
-    return create_frame(CMD_I2C_CONFIG, payload)
+    return I2C_CONFIG_FRAME.pack(slave_addr, freq_code)
 
 
 def i2c_write(reg_addr, data):
@@ -191,9 +185,7 @@ def i2c_write(reg_addr, data):
     if len(data) > 128:
         raise ValueError(f"Data length exceeds buffer size (128 bytes), got {len(data)} bytes")
 
-    payload = struct.pack('>H', reg_addr) + data
-
-    return create_frame(CMD_I2C_WRITE, payload)
+    return create_frame(CMD_I2C_WRITE, struct.pack('>H', reg_addr), data)
 
 
 def i2c_read(reg_addr, read_len):
@@ -231,9 +223,7 @@ def i2c_read(reg_addr, read_len):
     if read_len < 1 or read_len > 128:
         raise ValueError(f"Read length must be 1-128 bytes, got {read_len}")
 
-    payload = struct.pack('>HH', reg_addr, read_len)
-
-    return create_frame(CMD_I2C_READ, payload)
+    return I2C_READ_FRAME.pack(reg_addr, read_len)
 
 
 def i2c_write_single_byte(reg_addr, value):
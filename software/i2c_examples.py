@@ -9,7 +9,10 @@ This file demonstrates various I2C operations using the i2c_command_tool module.
 
 import time
 import serial
+from device_session import DeviceSession
+from frame_writer import CoalescingWriter
 from i2c_command_tool import (
+    CMD_I2C_WRITE, CMD_I2C_READ,
     i2c_config, i2c_write, i2c_read,
     i2c_write_single_byte, i2c_read_single_byte,
     eeprom_write, eeprom_read,
@@ -218,7 +221,16 @@ def example_single_byte_operations():
 # ============================================================================
 # Example 6: Send Commands via Serial Port
 # ============================================================================
-def send_to_fpga(frames, port='COM3', baudrate=115200, delay=0.01):
+# i2c_handler stays busy for the whole bus transfer after taking a write or
+# read frame, and a frame arriving meanwhile overwrites the payload still
+# being handed over. Only the frames between transfers (I2C config) can be
+# batched; each transfer is written on its own and followed by this wait
+# (a 32-byte transfer at 50 kHz takes about 7 ms).
+I2C_TRANSFER_COMMANDS = (CMD_I2C_WRITE, CMD_I2C_READ)
+I2C_TRANSFER_DELAY = 0.01
+
+
+def send_to_fpga(frames, port='COM3', baudrate=115200, delay=0.01, session=None):
     """
     Send command frames to FPGA via serial port.
 
@@ -226,27 +238,43 @@ def send_to_fpga(frames, port='COM3', baudrate=115200, delay=0.01):
         frames (list): List of command frames to send
         port (str): Serial port name (e.g., 'COM3', '/dev/ttyACM0')
         baudrate (int): Serial baud rate
-        delay (float): Delay between frames in seconds
+        delay (float): Delay between frames in seconds; 0 batches the
+            config frames into as few USB writes as possible and still
+            waits I2C_TRANSFER_DELAY after every write/read frame
+        session (DeviceSession): Open session to reuse across calls; if None
+            the port is opened for this call only
     """
-    try:
-        with serial.Serial(port, baudrate, timeout=1) as ser:
-            print(f"\n[OK] Connected to {port} at {baudrate} baud")
+    if session is None:
+        session = DeviceSession(port, baudrate, flush_on_open=False)
 
-            for i, frame in enumerate(frames):
-                ser.write(frame)
-                hex_str = ' '.join(f'{b:02X}' for b in frame)
-                print(f"  [{i+1}] Sent: {hex_str}")
-
-                if delay > 0:
+    try:
+        with session:
+            print(f"\n[OK] Connected to {session.port} at {session.baudrate} baud")
+
+            if delay > 0:
+                for i, frame in enumerate(frames):
+                    session.write(frame)
+                    hex_str = ' '.join(f'{b:02X}' for b in frame)
+                    print(f"  [{i+1}] Sent: {hex_str}")
                     time.sleep(delay)
+            else:
+                with CoalescingWriter(session.write) as writer:
+                    for i, frame in enumerate(frames):
+                        writer.queue_frame(frame)
+                        hex_str = ' '.join(f'{b:02X}' for b in frame)
+                        print(f"  [{i+1}] Queued: {hex_str}")
+                        if frame[2] in I2C_TRANSFER_COMMANDS:
+                            writer.barrier()
+                            time.sleep(I2C_TRANSFER_DELAY)
+                print(f"  {writer.writes} USB write(s), {writer.bytes_written} bytes")
 
             print(f"\n[OK] Successfully sent {len(frames)} frames")
 
             # Try to read response
             print("\nWaiting for response...")
             time.sleep(0.1)
-            if ser.in_waiting > 0:
-                response = ser.read(ser.in_waiting)
+            if session.in_waiting > 0:
+                response = session.read()
                 print(f"Response ({len(response)} bytes): {response.hex().upper()}")
             else:
                 print("No response received")
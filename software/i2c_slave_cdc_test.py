@@ -25,11 +25,12 @@ import sys
 import serial
 import time
 
+from frame_codec import FRAME_HEADER, UPLOAD_HEADER, UploadDecoder, encode_frame, checksum
+from device_session import DeviceSession
+
 # ============================================================================
 # Protocol Constants
 # ============================================================================
-FRAME_HEADER = b'\xAA\x55'
-UPLOAD_HEADER = b'\xAA\x44'
 
 CMD_I2C_SLAVE_SET_ADDR = 0x34  # Set I2C slave address
 CMD_I2C_SLAVE_WRITE = 0x35     # CDC write to slave registers
@@ -53,30 +54,21 @@ def calculate_checksum(data):
     Returns:
         int: Checksum value (0-255)
     """
-    return sum(data) & 0xFF
+    return checksum(data)
 
 
-def create_frame(command, payload):
+def create_frame(command, *payload):
     """
     Create a complete USB-CDC command frame.
 
     Args:
         command (int): Command code (0x34-0x36 for I2C slave)
-        payload (bytes): Command payload data
+        *payload: Command payload data, optionally split into several chunks
 
     Returns:
         bytes: Complete frame ready to send
     """
-    # Build frame without checksum
-    length = len(payload)
-    frame = FRAME_HEADER + struct.pack('B', command) + struct.pack('>H', length) + payload
-
-    # Calculate checksum (excluding frame header)
-    checksum_data = frame[2:]  # Skip 0xAA55
-    checksum = calculate_checksum(checksum_data)
-
-    # Append checksum
-    return frame + struct.pack('B', checksum)
+    return encode_frame(command, *payload)
 
 
 def print_frame(frame, description=""):
@@ -115,6 +107,9 @@ def parse_upload_response(response):
 
     Expected format: AA 44 [SOURCE] [LEN_H] [LEN_L] [DATA...] [CHECKSUM]
 
+    The first valid frame anywhere in response is returned; leading noise and
+    corrupted frames are skipped (see frame_codec.UploadDecoder).
+
     Args:
         response (bytes): Response data from FPGA
 
@@ -124,31 +119,20 @@ def parse_upload_response(response):
     if len(response) < 6:
         return {'valid': False, 'error': 'Response too short'}
 
-    if response[0:2] != UPLOAD_HEADER:
-        return {'valid': False, 'error': f'Invalid header: {response[0:2].hex()}'}
-
-    source = response[2]
-    length = struct.unpack('>H', response[3:5])[0]
-
-    expected_len = 5 + length + 1  # header(2) + source(1) + len(2) + data(N) + checksum(1)
-    if len(response) < expected_len:
-        return {'valid': False, 'error': f'Incomplete response: got {len(response)}, expected {expected_len}'}
-
-    data = response[5:5+length]
-    checksum_received = response[5+length]
-
-    # Verify checksum
-    checksum_calc = calculate_checksum(response[2:5+length])
-    if checksum_calc != checksum_received:
-        return {
-            'valid': False,
-            'error': f'Checksum mismatch: calculated 0x{checksum_calc:02X}, received 0x{checksum_received:02X}'
-        }
+    decoder = UploadDecoder()
+    records = decoder.feed(response)
+    if not records:
+        if decoder.checksum_errors:
+            return {'valid': False, 'error': f'Checksum mismatch in {decoder.checksum_errors} frame(s)'}
+        if UPLOAD_HEADER not in response:
+            return {'valid': False, 'error': f'Invalid header: {response[0:2].hex()}'}
+        return {'valid': False, 'error': f'Incomplete response: {len(decoder)} bytes of a frame pending'}
 
+    source, data = records[0]
     return {
         'valid': True,
         'source': source,
-        'length': length,
+        'length': len(data),
         'data': data
     }
 
@@ -276,7 +260,7 @@ def i2c_slave_read_registers(start_addr, read_len):
 # ============================================================================
 # Serial Communication Functions
 # ============================================================================
-def send_and_receive(port, baudrate, frame, wait_response=False, timeout=1.0):
+def send_and_receive(port, baudrate, frame, wait_response=False, timeout=1.0, session=None):
     """
     Send command frame via serial port and optionally wait for response.
 
@@ -286,45 +270,43 @@ def send_and_receive(port, baudrate, frame, wait_response=False, timeout=1.0):
         frame (bytes): Command frame to send
         wait_response (bool): Whether to wait for response
         timeout (float): Response timeout in seconds
+        session (DeviceSession): Open session to reuse; if None a session is
+            opened for this call only (port and baudrate are then used)
 
     Returns:
         bytes: Response data if wait_response=True, else None
     """
-    try:
-        with serial.Serial(port, baudrate, timeout=timeout) as ser:
-            # Flush buffers
-            ser.reset_input_buffer()
-            ser.reset_output_buffer()
+    if session is None:
+        session = DeviceSession(port, baudrate, timeout=timeout)
 
+    try:
+        with session:
             # Send command
-            print(f"\nSending {len(frame)} bytes to {port}...")
-            ser.write(frame)
+            print(f"\nSending {len(frame)} bytes to {session.port}...")
+            session.write(frame)
             print("✓ Sent successfully")
 
             if wait_response:
                 print(f"Waiting for response (timeout: {timeout}s)...")
-                time.sleep(0.05)  # Small delay for FPGA processing
 
-                # Read response header first
-                response = ser.read(5)  # Read header + source + length
-                if len(response) < 5:
-                    print(f"✗ No response or incomplete header (got {len(response)} bytes)")
+                # Read until one complete upload frame has been decoded
+                decoder = UploadDecoder()
+                response = bytearray()
+                deadline = time.monotonic() + timeout
+                while time.monotonic() < deadline:
+                    chunk = session.read(timeout=max(deadline - time.monotonic(), 0))
+                    if not chunk:
+                        continue
+                    response += chunk
+                    if decoder.feed(chunk):
+                        print(f"✓ Received {len(response)} bytes")
+                        return bytes(response)
+
+                if not response:
+                    print("✗ No response")
                     return None
-
-                # Calculate expected total length
-                data_len = struct.unpack('>H', response[3:5])[0]
-                total_len = 5 + data_len + 1  # header(2) + source(1) + len(2) + data(N) + checksum(1)
-
-                # Read remaining bytes
-                remaining = total_len - 5
-                response += ser.read(remaining)
-
-                if len(response) == total_len:
-                    print(f"✓ Received {len(response)} bytes")
-                    return response
-                else:
-                    print(f"✗ Incomplete response: got {len(response)}/{total_len} bytes")
-                    return response
+                print(f"✗ Incomplete response: got {len(response)} bytes without a valid frame")
+                return bytes(response)
 
             return None
 
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Streaming Logic Statistics for FPGA2025
+=======================================
+
+Per-channel statistics of Digital Capture samples (one byte per sample,
+bit n = CH n), computed with NumPy block by block. State is carried across
+blocks, so the same engine runs live on USB reads during a capture or over
+a memory-mapped recording larger than RAM.
+
+Per block:
+    - level counts:  np.bincount of the sample bytes (256 bins) times the
+                     bit table gives the high count of all 8 channels
+    - transitions:   XOR of each sample with the previous one; bincount of
+                     that gives the edge count per channel
+    - pulse widths:  edge positions per channel (np.flatnonzero on the XOR
+                     bit) and np.diff between consecutive edges
+
+Pulse widths only count complete pulses (between two edges); the partial
+runs at the start and end of the capture are left out. Captures with holes
+in them (trigger windows, lost samples) call split() at each hole: no edge
+or pulse is counted across it and frequencies only use the time inside the
+segments.
+
+Typical usage:
+    from logic_stats import LogicStatistics, analyze
+
+    stats = LogicStatistics(sample_rate=1_000_000)
+    for chunk in chunks:
+        stats.update(chunk)
+    for ch in stats.result():
+        print(ch.channel, ch.duty_cycle, ch.frequency)
+
+    # or in one call, 4 MB at a time, split at the recording's drop markers
+    results = analyze(capture.samples, capture.sample_rate,
+                      breaks=[index for index, _ in capture.drops])
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+CHANNELS = 8
+
+# BIT_TABLE[value, ch] = bit ch of value
+BIT_TABLE = ((np.arange(256)[:, None] >> np.arange(CHANNELS)) & 1).astype(np.int64)
+
+ChannelStats = namedtuple('ChannelStats', [
+    'channel',       # Channel number
+    'samples',       # Samples analysed
+    'high',          # Samples at logic 1
+    'duty_cycle',    # high / samples (0..1)
+    'transitions',   # Edges (rising + falling)
+    'rising',        # Rising edges
+    'high_min', 'high_max', 'high_mean',   # Complete high pulses, in samples
+    'low_min', 'low_max', 'low_mean',      # Complete low pulses, in samples
+    'frequency',     # Estimated signal frequency in Hz (0 if static)
+])
+
+
+class _PulseStats:
+    __slots__ = ('count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, widths):
+        if not len(widths):
+            return
+        self.count += len(widths)
+        self.total += int(widths.sum())
+        low, high = int(widths.min()), int(widths.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+
+class LogicStatistics:
+    """
+    Incremental 8-channel statistics.
+
+    Args:
+        sample_rate (float): Samples per second, used for frequencies
+            (0 reports frequencies per sample instead)
+        channels (int): Number of channels to report (1..8)
+    """
+
+    def __init__(self, sample_rate=0, channels=CHANNELS):
+        if not 1 <= channels <= CHANNELS:
+            raise ValueError(f"channels must be in 1..{CHANNELS}, got {channels}")
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.reset()
+
+    def reset(self):
+        """Forget all samples seen so far."""
+        self.samples = 0
+        self._last = None                               # Last sample of the previous block
+        self._high = np.zeros(CHANNELS, dtype=np.int64)
+        self._edges = np.zeros(CHANNELS, dtype=np.int64)
+        self._rising = np.zeros(CHANNELS, dtype=np.int64)
+        self._last_edge = [None] * CHANNELS             # Absolute index of the latest edge
+        self._first_rise = [None] * CHANNELS             # In the current segment
+        self._last_rise = [None] * CHANNELS
+        self._segment_rising = [0] * CHANNELS
+        self._periods = [0] * CHANNELS                   # Whole periods in finished segments
+        self._period_span = [0] * CHANNELS               # ... and the samples they cover
+        self._high_pulses = [_PulseStats() for _ in range(CHANNELS)]
+        self._low_pulses = [_PulseStats() for _ in range(CHANNELS)]
+
+    def update(self, block):
+        """
+        Add a block of samples.
+
+        Args:
+            block (bytes-like or numpy.ndarray): uint8 samples
+        """
+        data = np.frombuffer(block, dtype=np.uint8) if not isinstance(block, np.ndarray) else block
+        count = len(data)
+        if not count:
+            return
+        base = self.samples
+
+        self._high += np.bincount(data, minlength=256) @ BIT_TABLE
+
+        # diff[i] has bit ch set if CH ch changed between sample i-1 and i
+        diff = np.empty(count, dtype=np.uint8)
+        diff[0] = 0 if self._last is None else self._last ^ data[0]
+        np.bitwise_xor(data[1:], data[:-1], out=diff[1:])
+        changed = np.bincount(diff, minlength=256)
+        if changed[0] != count:
+            self._edges += changed @ BIT_TABLE
+            rising_bytes = diff & data
+            self._rising += np.bincount(rising_bytes, minlength=256) @ BIT_TABLE
+            for ch in range(self.channels):
+                mask = 1 << ch
+                edges = np.flatnonzero(diff & mask)
+                if not len(edges):
+                    continue
+                self._add_pulses(ch, edges, data)
+                rises = edges[(data[edges] & mask) != 0]
+                if len(rises):
+                    if self._first_rise[ch] is None:
+                        self._first_rise[ch] = base + int(rises[0])
+                    self._last_rise[ch] = base + int(rises[-1])
+                    self._segment_rising[ch] += len(rises)
+
+        self._last = int(data[-1])
+        self.samples += count
+
+    def split(self):
+        """
+        Mark a discontinuity: the next block does not follow the last one.
+
+        Edges and pulses are not counted across the split and the rising
+        edges on either side are not treated as one period.
+        """
+        for ch in range(CHANNELS):
+            periods, span = self._segment_periods(ch)
+            self._periods[ch] += periods
+            self._period_span[ch] += span
+            self._first_rise[ch] = self._last_rise[ch] = None
+            self._segment_rising[ch] = 0
+        self._last = None
+        self._last_edge = [None] * CHANNELS
+
+    def _segment_periods(self, ch):
+        # Whole periods between the first and last rising edge of the current segment
+        if self._segment_rising[ch] >= 2:
+            return self._segment_rising[ch] - 1, self._last_rise[ch] - self._first_rise[ch]
+        return 0, 0
+
+    def _add_pulses(self, ch, edges, data):
+        # A pulse runs from one edge to the next; its level is the value
+        # right after the first edge
+        base = self.samples
+        positions = edges.astype(np.int64) + base
+        if self._last_edge[ch] is not None:
+            positions = np.concatenate(([self._last_edge[ch]], positions))
+            levels = np.concatenate(([(self._last >> ch) & 1], (data[edges[:-1]] >> ch) & 1))
+        else:
+            levels = (data[edges[:-1]] >> ch) & 1
+        widths = np.diff(positions)
+        self._high_pulses[ch].add(widths[levels == 1])
+        self._low_pulses[ch].add(widths[levels == 0])
+        self._last_edge[ch] = int(positions[-1])
+
+    def _frequency(self, ch):
+        rate = self.sample_rate or 1
+        periods, span = self._segment_periods(ch)
+        periods += self._periods[ch]
+        span += self._period_span[ch]
+        if periods and span:
+            return periods * rate / span
+        if self._edges[ch] and self.samples:
+            return self._edges[ch] / 2 * rate / self.samples
+        return 0.0
+
+    def result(self):
+        """
+        Returns:
+            list: ChannelStats for each channel
+        """
+        results = []
+        for ch in range(self.channels):
+            high = int(self._high[ch])
+            hp, lp = self._high_pulses[ch], self._low_pulses[ch]
+            results.append(ChannelStats(
+                channel=ch,
+                samples=self.samples,
+                high=high,
+                duty_cycle=high / self.samples if self.samples else 0.0,
+                transitions=int(self._edges[ch]),
+                rising=int(self._rising[ch]),
+                high_min=hp.min, high_max=hp.max, high_mean=hp.mean,
+                low_min=lp.min, low_max=lp.max, low_mean=lp.mean,
+                frequency=self._frequency(ch),
+            ))
+        return results
+
+
+def analyze(samples, sample_rate=0, block_size=DEFAULT_BLOCK_SIZE, channels=CHANNELS, breaks=()):
+    """
+    Run LogicStatistics over a whole sample array, one block at a time.
+
+    Args:
+        samples (bytes-like or numpy.ndarray): uint8 samples; a memory-mapped
+            array is read sequentially and never copied as a whole
+        sample_rate (float): Samples per second
+        block_size (int): Samples per block
+        breaks (iterable): Sample indices where the data is discontinuous
+            (LogicStatistics.split() is called before each)
+
+    Returns:
+        list: ChannelStats for each channel
+    """
+    data = np.frombuffer(samples, dtype=np.uint8) if not isinstance(samples, np.ndarray) else samples
+    stats = LogicStatistics(sample_rate, channels)
+    start = 0
+    for stop in sorted({index for index in breaks if 0 < index < len(data)}) + [len(data)]:
+        for pos in range(start, stop, block_size):
+            stats.update(data[pos:min(pos + block_size, stop)])
+        stats.split()
+        start = stop
+    return stats.result()
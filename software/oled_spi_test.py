@@ -15,6 +15,8 @@ TIMEOUT = 2
 
 FRAME_HEADER = [0xAA, 0x55]
 CMD_SPI = 0x11
+SPI_MAX_WRITE = 14        # spi_handler BUFFER_SIZE (16) - write_len/read_len 字节
+SPI_FRAME_DELAY = 0.002   # 每帧之后等待 spi_handler 空闲 (忙时新命令会被丢弃)
 
 def calculate_checksum(data):
     """计算校验和"""
@@ -92,35 +94,38 @@ INIT_SEQUENCE = [
     ([SSD1306_DISPLAYON], "打开显示"),
 ]
 
-def clear_screen(ser):
-    """清屏：填充全0"""
-    print("\n清屏操作...")
+def send_screen_data(ser, pattern, description):
+    """把整屏数据 (1024 字节) 按 spi_handler 缓冲区大小分帧, 逐帧发送并等待
+
+    spi_handler 只有 16 字节缓冲 (write_len 最多 14), 且忙时丢弃新命令,
+    所以每帧之后都要 flush 并等待 SPI_FRAME_DELAY, 不能合并成大块写入。
+    """
     # 设置列地址范围 0-127
     send_spi_command(ser, [SSD1306_COLUMNADDR, 0x00, 0x7F], "设置列地址")
     # 设置页地址范围 0-7 (8页 x 8行 = 64行)
     send_spi_command(ser, [SSD1306_PAGEADDR, 0x00, 0x07], "设置页地址")
 
-    # 发送1024字节的0x00（128x64 / 8 = 1024）
-    # 分块发送，每次发送64字节
-    chunk_size = 64
+    # 发送1024字节（128x64 / 8 = 1024）, 每帧最多 SPI_MAX_WRITE 字节
     total_bytes = 1024
-    for i in range(0, total_bytes, chunk_size):
-        data = [0x00] * chunk_size
-        send_spi_command(ser, data, f"清屏数据块 {i//chunk_size + 1}/{total_bytes//chunk_size}")
-        time.sleep(0.02)
+    frames = 0
+    for i in range(0, total_bytes, SPI_MAX_WRITE):
+        chunk = min(SPI_MAX_WRITE, total_bytes - i)
+        ser.write(build_spi_frame([pattern] * chunk))
+        ser.flush()
+        time.sleep(SPI_FRAME_DELAY)
+        frames += 1
+    print(f"\n{description}")
+    print(f"  已发送 {frames} 帧, 共 {total_bytes} 字节")
+
+def clear_screen(ser):
+    """清屏：填充全0"""
+    print("\n清屏操作...")
+    send_screen_data(ser, 0x00, "清屏数据")
 
 def fill_screen(ser, pattern=0xFF):
     """填充屏幕"""
     print(f"\n填充屏幕（图案: 0x{pattern:02X}）...")
-    send_spi_command(ser, [SSD1306_COLUMNADDR, 0x00, 0x7F], "设置列地址")
-    send_spi_command(ser, [SSD1306_PAGEADDR, 0x00, 0x07], "设置页地址")
-
-    chunk_size = 64
-    total_bytes = 1024
-    for i in range(0, total_bytes, chunk_size):
-        data = [pattern] * chunk_size
-        send_spi_command(ser, data, f"填充数据块 {i//chunk_size + 1}/{total_bytes//chunk_size}")
-        time.sleep(0.02)
+    send_screen_data(ser, pattern, "填充数据")
 
 def main():
     print("\n" + "="*70)
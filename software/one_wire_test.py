@@ -10,11 +10,16 @@ import serial
 import time
 import sys
 
+from frame_codec import SOURCE_ONEWIRE
+from device_session import DeviceSession
+from command_engine import CommandEngine
+
 class OneWireTester:
     def __init__(self, port='COM3', baudrate=115200):
         """初始化串口连接"""
         try:
-            self.ser = serial.Serial(port, baudrate, timeout=2)
+            self.session = DeviceSession(port, baudrate, timeout=2).open()
+            self.engine = CommandEngine(self.session, default_timeout=2.0).start()
             print(f"✓ 串口 {port} 打开成功 (波特率: {baudrate})")
         except serial.SerialException as e:
             print(f"✗ 串口打开失败: {e}")
@@ -24,8 +29,8 @@ class OneWireTester:
         """计算校验和（所有字节累加取低8位）"""
         return sum(data) & 0xFF
 
-    def send_command(self, cmd_list, description=""):
-        """发送命令"""
+    def send_command(self, cmd_list, description="", source=None):
+        """发送命令; 指定 source 时返回等待该来源上传帧的 Future (不再固定延时)"""
         cmd = cmd_list.copy()
         checksum = self.calc_checksum(cmd)
         cmd.append(checksum)
@@ -34,18 +39,20 @@ class OneWireTester:
             print(f"→ {description}")
         print(f"  发送: {' '.join([f'{b:02X}' for b in cmd])}")
 
-        self.ser.write(bytes(cmd))
-        time.sleep(0.05)  # 短暂延迟
+        if source is None:
+            self.engine.send(bytes(cmd))
+            return None
+        return self.engine.submit(bytes(cmd), source)
 
-    def read_response(self, expected_len=13):
-        """读取响应数据"""
-        response = self.ser.read(expected_len)
-        if len(response) > 0:
-            print(f"  接收: {' '.join([f'{b:02X}' for b in response])}")
-            return response
-        else:
+    def read_response(self, future):
+        """等待命令对应的 1-Wire 上传帧, 返回数据部分"""
+        try:
+            payload = future.result().payload
+        except (TimeoutError, RuntimeError):
             print(f"  接收: (无数据)")
             return None
+        print(f"  接收: {' '.join([f'{b:02X}' for b in payload])}")
+        return payload
 
     def test_reset(self):
         """测试1: 1-Wire 复位"""
@@ -71,26 +78,23 @@ class OneWireTester:
 
         # 读ROM命令 (0x33) - 写1字节读8字节
         cmd = [0xAA, 0x55, 0x23, 0x00, 0x03, 0x01, 0x08, 0x33]
-        self.send_command(cmd, "步骤2: Read ROM (0x33)")
+        future = self.send_command(cmd, "步骤2: Read ROM (0x33)", SOURCE_ONEWIRE)
 
         # 读取响应
-        response = self.read_response(13)  # 帧头(2) + 源(1) + 长度(2) + 数据(8) + 校验(1)
-
-        if response and len(response) == 13:
-            if response[0] == 0xAA and response[1] == 0x44:
-                rom_id = response[5:13]
-                print(f"\n✓ ROM ID: {' '.join([f'{b:02X}' for b in rom_id])}")
-
-                # 解析ROM ID
-                family_code = rom_id[0]
-                serial_num = rom_id[1:7]
-                crc = rom_id[7]
-
-                print(f"  - 家族代码: 0x{family_code:02X}")
-                print(f"  - 序列号: {' '.join([f'{b:02X}' for b in serial_num])}")
-                print(f"  - CRC: 0x{crc:02X}")
-            else:
-                print("✗ 响应帧头错误")
+        response = self.read_response(future)  # 数据(8)
+
+        if response and len(response) == 8:
+            rom_id = response[0:8]
+            print(f"\n✓ ROM ID: {' '.join([f'{b:02X}' for b in rom_id])}")
+
+            # 解析ROM ID
+            family_code = rom_id[0]
+            serial_num = rom_id[1:7]
+            crc = rom_id[7]
+
+            print(f"  - 家族代码: 0x{family_code:02X}")
+            print(f"  - 序列号: {' '.join([f'{b:02X}' for b in serial_num])}")
+            print(f"  - CRC: 0x{crc:02X}")
         else:
             print("✗ 未收到响应或长度错误")
 
@@ -128,48 +132,45 @@ class OneWireTester:
 
         # 步骤6: Read Scratchpad (0xBE) - 写1读9
         cmd = [0xAA, 0x55, 0x23, 0x00, 0x03, 0x01, 0x09, 0xBE]
-        self.send_command(cmd, "步骤6: Read Scratchpad (0xBE)")
+        future = self.send_command(cmd, "步骤6: Read Scratchpad (0xBE)", SOURCE_ONEWIRE)
 
         # 读取响应
-        response = self.read_response(14)  # 帧头(2) + 源(1) + 长度(2) + 数据(9) + 校验(1)
+        response = self.read_response(future)  # 数据(9)
 
-        if response and len(response) >= 14:
-            if response[0] == 0xAA and response[1] == 0x44:
-                scratchpad = response[5:14]
-                print(f"\n✓ 暂存器数据: {' '.join([f'{b:02X}' for b in scratchpad])}")
+        if response and len(response) >= 9:
+            scratchpad = response[0:9]
+            print(f"\n✓ 暂存器数据: {' '.join([f'{b:02X}' for b in scratchpad])}")
 
-                # 解析温度
-                temp_lsb = scratchpad[0]
-                temp_msb = scratchpad[1]
-                temp_raw = (temp_msb << 8) | temp_lsb
+            # 解析温度
+            temp_lsb = scratchpad[0]
+            temp_msb = scratchpad[1]
+            temp_raw = (temp_msb << 8) | temp_lsb
 
-                # 处理负温度（补码）
-                if temp_raw & 0x8000:
-                    temp_raw = -(0x10000 - temp_raw)
+            # 处理负温度（补码）
+            if temp_raw & 0x8000:
+                temp_raw = -(0x10000 - temp_raw)
 
-                temperature = temp_raw / 16.0
+            temperature = temp_raw / 16.0
 
-                print(f"\n🌡️  温度: {temperature:.2f}°C")
+            print(f"\n🌡️  温度: {temperature:.2f}°C")
 
-                # 显示其他信息
-                th = scratchpad[2]
-                tl = scratchpad[3]
-                config = scratchpad[4]
-                crc = scratchpad[8]
+            # 显示其他信息
+            th = scratchpad[2]
+            tl = scratchpad[3]
+            config = scratchpad[4]
+            crc = scratchpad[8]
 
-                print(f"  - TH (高温报警): {th}°C")
-                print(f"  - TL (低温报警): {tl}°C")
-                print(f"  - 配置: 0x{config:02X}")
-                print(f"  - CRC: 0x{crc:02X}")
+            print(f"  - TH (高温报警): {th}°C")
+            print(f"  - TL (低温报警): {tl}°C")
+            print(f"  - 配置: 0x{config:02X}")
+            print(f"  - CRC: 0x{crc:02X}")
 
-                # 分辨率
-                resolution_bits = ((config >> 5) & 0x03)
-                resolution_map = {0: 9, 1: 10, 2: 11, 3: 12}
-                resolution = resolution_map.get(resolution_bits, 12)
-                print(f"  - 分辨率: {resolution}位")
+            # 分辨率
+            resolution_bits = ((config >> 5) & 0x03)
+            resolution_map = {0: 9, 1: 10, 2: 11, 3: 12}
+            resolution = resolution_map.get(resolution_bits, 12)
+            print(f"  - 分辨率: {resolution}位")
 
-            else:
-                print("✗ 响应帧头错误")
         else:
             print("✗ 未收到响应或长度错误")
 
@@ -202,8 +203,9 @@ class OneWireTester:
 
     def close(self):
         """关闭串口"""
-        if self.ser.is_open:
-            self.ser.close()
+        if self.session.is_open:
+            self.engine.stop()
+            self.session.close()
             print("✓ 串口已关闭")
 
 def main():
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+DC Pipeline Metrics for FPGA2025
+================================
+
+Low-overhead instrumentation of the Digital Capture display pipeline:
+
+    USB read ──► ring commit ──► dequeue (display) ──► frame rendered
+        usb          flush           queue                render
+
+Every stage takes a time.perf_counter() stamp (monotonic). The worker
+stamps the completion of each USB read and the ring commit of its bytes;
+the display stamps when it takes those bytes out of the ring and when the
+frame showing them is drawn. Positions in the ring tie the two sides
+together, so no per-sample bookkeeping is needed: one small record per
+read.
+
+Recorded (rolling over the last `window` seconds):
+    - latency per stage:  usb (read call), flush (completion -> commit),
+                          queue (commit -> dequeue), render (start of the
+                          frame's drawing -> frame on screen),
+                          end_to_end (completion -> frame drawn)
+    - read sizes and bytes/s of the USB reads
+    - ring occupancy (bytes waiting) at each dequeue
+
+Histograms use fixed logarithmic bins and a ring of time slots, so adding a
+value is a bisect and two integer updates, and old values fall out slot by
+slot. Percentiles are read from the bins (upper bin edge), which is plenty
+to tell a 1 ms stage from a 100 ms one.
+
+At most MAX_PENDING commit stamps wait for the display. Past that, a new
+commit is merged into the newest stamp, keeping its older completion time:
+queue and end_to_end latencies then read high, never low, and `coalesced`
+counts the merges.
+
+Each stage is recorded by one thread only (usb/flush/read sizes by the USB
+worker, the rest by the display); snapshots from any thread are
+consistent to within one value.
+
+Typical usage:
+    metrics = PipelineMetrics()
+    started = time.perf_counter()
+    count = link.read_stream_into(view)
+    done = metrics.record_read(count, started)
+    ring.commit(count)
+    metrics.record_commit(ring.write_pos, done)
+    ...
+    metrics.record_dequeue(ring.read_pos, len(ring))   # display side
+    metrics.record_render(draw_started)                 # once the frame is on screen
+    print(metrics.summary())
+
+    with MetricsFile('soak.jsonl', metrics, interval=10) as log:
+        while running:
+            ...
+            log.poll()                                  # one JSON line per interval
+"""
+
+import json
+import time
+from bisect import bisect_right
+from collections import deque, namedtuple
+
+METRICS_WINDOW = 10.0        # seconds covered by the rolling histograms
+WINDOW_SLOTS = 10
+MAX_PENDING = 4096           # commit stamps waiting for the display
+
+STAGES = ('usb', 'flush', 'queue', 'render', 'end_to_end')
+
+# 1 us .. 10 s, four bins per decade
+LATENCY_EDGES = [10 ** (exponent / 4) for exponent in range(-24, 5)]
+# 256 B .. 256 MB, one bin per power of two
+SIZE_EDGES = [float(1 << shift) for shift in range(8, 29)]
+
+HistogramStats = namedtuple('HistogramStats', [
+    'count',         # Values in the window
+    'mean',
+    'p50', 'p90', 'p99',   # Upper edge of the bin holding the percentile (at most max)
+    'max',           # Largest value in the window
+    'total',         # Sum of the values in the window
+])
+
+
+class RollingHistogram:
+    """
+    Histogram over the last `window` seconds, with fixed bin edges.
+
+    Args:
+        edges (list): Increasing bin edges; values below the first or above
+            the last edge land in the outer bins
+        window (float): Seconds kept
+        slots (int): Time slots the window is split into (values age out
+            one slot at a time)
+    """
+
+    def __init__(self, edges, window=METRICS_WINDOW, slots=WINDOW_SLOTS):
+        self.edges = list(edges)
+        self.window = window
+        self.slot_time = window / slots
+        self._ticks = [None] * slots
+        self._counts = [[0] * (len(self.edges) + 1) for _ in range(slots)]
+        self._sums = [0.0] * slots
+        self._maxima = [0.0] * slots
+
+    def reset(self):
+        self._ticks = [None] * len(self._ticks)
+
+    def add(self, value, now=None):
+        tick = int((time.perf_counter() if now is None else now) / self.slot_time)
+        slot = tick % len(self._ticks)
+        if self._ticks[slot] != tick:
+            counts = self._counts[slot]
+            for index in range(len(counts)):
+                counts[index] = 0
+            self._sums[slot] = 0.0
+            self._maxima[slot] = 0.0
+            self._ticks[slot] = tick
+        self._counts[slot][bisect_right(self.edges, value)] += 1
+        self._sums[slot] += value
+        if value > self._maxima[slot]:
+            self._maxima[slot] = value
+
+    def counts(self, now=None):
+        """Bin counts of the window (len(edges) + 1 bins)."""
+        return self._merge(now)[0]
+
+    def stats(self, now=None):
+        """
+        Returns:
+            HistogramStats: All zero when the window is empty
+        """
+        counts, total, maximum = self._merge(now)
+        count = sum(counts)
+        if not count:
+            return HistogramStats(0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+        p50, p90, p99 = (min(self._percentile(counts, count, fraction), maximum)
+                         for fraction in (0.5, 0.9, 0.99))
+        return HistogramStats(count, total / count, p50, p90, p99, maximum, total)
+
+    def _merge(self, now):
+        tick = int((time.perf_counter() if now is None else now) / self.slot_time)
+        counts = [0] * (len(self.edges) + 1)
+        total = 0.0
+        maximum = 0.0
+        for slot, slot_tick in enumerate(self._ticks):
+            if slot_tick is None or not tick - len(self._ticks) < slot_tick <= tick:
+                continue
+            for index, value in enumerate(self._counts[slot]):
+                counts[index] += value
+            total += self._sums[slot]
+            maximum = max(maximum, self._maxima[slot])
+        return counts, total, maximum
+
+    def _percentile(self, counts, count, fraction):
+        wanted = fraction * count
+        seen = 0
+        for index, value in enumerate(counts):
+            seen += value
+            if seen >= wanted:
+                return self.edges[min(index, len(self.edges) - 1)]
+        return self.edges[-1]
+
+
+class PipelineMetrics:
+    """
+    Stage stamps and rolling histograms of one DC display pipeline.
+
+    Args:
+        window (float): Seconds covered by the histograms
+    """
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self.latency = {stage: RollingHistogram(LATENCY_EDGES, window) for stage in STAGES}
+        self.read_sizes = RollingHistogram(SIZE_EDGES, window)
+        self.occupancy = RollingHistogram(SIZE_EDGES, window)
+        self.started = time.perf_counter()
+        self.reads = 0
+        self.bytes = 0
+        self.coalesced = 0           # commits merged into an earlier stamp
+        # (ring position after the commit, completion stamp), oldest first
+        self._pending = deque()
+        self._oldest_shown = None    # completion stamp of the oldest data not yet drawn
+
+    def reset(self):
+        for histogram in self.latency.values():
+            histogram.reset()
+        self.read_sizes.reset()
+        self.occupancy.reset()
+        self.started = time.perf_counter()
+        self.reads = 0
+        self.bytes = 0
+        self.coalesced = 0
+        self._pending.clear()
+        self._oldest_shown = None
+
+    # ------------------------------------------------------------------
+    # Producer side (USB worker)
+    # ------------------------------------------------------------------
+    def record_read(self, count, started):
+        """
+        A USB read that began at `started` has returned `count` bytes.
+
+        Returns:
+            float: Completion stamp, to pass on to record_commit()
+        """
+        done = time.perf_counter()
+        self.latency['usb'].add(done - started, done)
+        if count:
+            self.reads += 1
+            self.bytes += count
+            self.read_sizes.add(count, done)
+        return done
+
+    def record_commit(self, position, done):
+        """Bytes read at `done` are in the ring up to `position`."""
+        now = time.perf_counter()
+        self.latency['flush'].add(now - done, now)
+        pending = self._pending
+        if pending and pending[-1][0] == position:
+            return
+        if len(pending) >= MAX_PENDING:
+            # Display stalled: extend the newest stamp rather than lose one
+            pending[-1] = (position, pending[-1][1])
+            self.coalesced += 1
+        else:
+            pending.append((position, done))
+
+    # ------------------------------------------------------------------
+    # Consumer side (display)
+    # ------------------------------------------------------------------
+    def record_dequeue(self, position, backlog):
+        """
+        The display has taken the ring up to `position`; `backlog` bytes
+        were waiting when it started.
+        """
+        now = time.perf_counter()
+        self.occupancy.add(backlog, now)
+        pending = self._pending
+        while pending and pending[0][0] <= position:
+            _, done = pending.popleft()
+            self.latency['queue'].add(now - done, now)
+            if self._oldest_shown is None:
+                self._oldest_shown = done
+
+    def discard(self, position):
+        """Data up to `position` was skipped without being shown."""
+        pending = self._pending
+        while pending and pending[0][0] <= position:
+            pending.popleft()
+
+    def record_render(self, started):
+        """
+        A frame showing everything dequeued so far is on screen now; its
+        drawing began at `started` (after the dequeue).
+        """
+        now = time.perf_counter()
+        self.latency['render'].add(now - started, now)
+        if self._oldest_shown is not None:
+            self.latency['end_to_end'].add(now - self._oldest_shown, now)
+            self._oldest_shown = None
+
+    # ------------------------------------------------------------------
+    # Reports
+    # ------------------------------------------------------------------
+    def throughput(self, now=None):
+        """USB bytes/s over the window (or since start, if shorter)."""
+        now = time.perf_counter() if now is None else now
+        span = min(self.window, now - self.started)
+        return self.read_sizes.stats(now).total / span if span > 0 else 0.0
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: JSON-ready report (latencies in seconds, sizes in bytes)
+        """
+        now = time.perf_counter()
+        return {
+            'time': time.time(),
+            'uptime': now - self.started,
+            'window': self.window,
+            'reads': self.reads,
+            'bytes': self.bytes,
+            'bytes_per_s': self.throughput(now),
+            'coalesced': self.coalesced,
+            'latency': {stage: self.latency[stage].stats(now)._asdict() for stage in STAGES},
+            'read_size': self.read_sizes.stats(now)._asdict(),
+            'occupancy': self.occupancy.stats(now)._asdict(),
+        }
+
+    def summary(self):
+        """Short multi-line text (p50/p99/max in ms per stage), e.g. for an overlay."""
+        now = time.perf_counter()
+        lines = []
+        for stage in STAGES:
+            stats = self.latency[stage].stats(now)
+            lines.append(f"{stage:<10} p50 {stats.p50 * 1e3:8.2f}  p99 {stats.p99 * 1e3:8.2f}  "
+                         f"max {stats.max * 1e3:8.2f} ms")
+        sizes = self.read_sizes.stats(now)
+        backlog = self.occupancy.stats(now)
+        lines.append(f"USB {self.throughput(now) / 1e6:7.2f} MB/s  read p50 {sizes.p50 / 1024:.0f} KB  "
+                     f"backlog p99 {backlog.p99 / 1024:.0f} KB")
+        if self.coalesced:
+            lines.append(f"{self.coalesced} commit stamps merged (display stalled)")
+        return "\n".join(lines)
+
+
+class MetricsFile:
+    """
+    Appends one JSON snapshot per `interval` to a file (JSON lines), for
+    long soak tests. Call poll() regularly; close() writes a last line.
+
+    Args:
+        path (str): File to append to
+        metrics (PipelineMetrics): Metrics to write
+        interval (float): Seconds between lines
+    """
+
+    def __init__(self, path, metrics, interval=METRICS_WINDOW):
+        self.path = path
+        self.metrics = metrics
+        self.interval = interval
+        self.lines = 0
+        self._file = open(path, 'a', encoding='utf-8')
+        self._due = time.perf_counter() + interval
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def poll(self):
+        """Write a line if one is due. Returns True if it wrote."""
+        now = time.perf_counter()
+        if now < self._due:
+            return False
+        self._due = now + self.interval
+        self.write()
+        return True
+
+    def write(self):
+        self._file.write(json.dumps(self.metrics.snapshot()) + "\n")
+        self._file.flush()
+        self.lines += 1
+
+    def close(self):
+        if self._file is None:
+            return
+        self.write()
+        self._file.close()
+        self._file = None
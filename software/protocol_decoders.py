@@ -0,0 +1,815 @@
+#!/usr/bin/env python3
+"""
+Protocol Decoders for FPGA2025 Logic Captures
+=============================================
+
+Decodes UART, SPI, I2C and 1-Wire traffic from Digital Capture data (one
+byte per sample, bit n = CH n). The decoders never look at individual
+samples: they work on transition records (transitions.py) and the edges of
+the channels they use, so a slow bus sampled at MHz rates costs as much as
+its number of edges. Bit sampling, word assembly and error checks are NumPy
+operations over all frames of a block at once.
+
+Decoders and their tables (numpy structured arrays, one row per item;
+`start`/`end` are sample indices, see to_seconds()):
+
+    UartDecoder(rx, baudrate, ...)       UART_DTYPE     value, parity_error,
+                                                        framing_error
+    SpiDecoder(sck, mosi, miso, cs, ...) SPI_DTYPE      mosi, miso, bits
+                                                        (bits < word size:
+                                                        word cut short by CS)
+    I2cDecoder(scl, sda)                 I2C_DTYPE      kind (I2C_START, ...),
+                                                        value, ack, read
+    OneWireDecoder(line)                 ONEWIRE_DTYPE  kind (ONEWIRE_RESET,
+                                                        ...), value
+
+Defaults follow the FPGA handlers: UART 8N1 idle high, LSB first (the
+0x07 config uses the same data/stop/parity codes); SPI mode 0, MSB first,
+CS active low; 1-Wire timing classes match one_wire_master.v.
+
+Streaming and offline use the same code:
+    decoder.feed(block)                  raw samples as they arrive
+    decoder.feed_transitions(s, v, end)  transition records up to `end`
+    decoder.finish()                     end of data
+
+Each call returns the rows completed so far. The records of an unfinished
+frame are kept for the next call, so frames spanning block boundaries are
+decoded exactly once.
+
+Cross-checking against handler traffic:
+    Capture the bus pins while sending through uart_handler (0x08),
+    spi_handler (0x11), i2c_handler (0x02/0x05) or one_wire_handler
+    (0x21/0x23), then compare what was sent with the decoded bytes:
+
+        ok, index = cross_check(table['value'], sent_bytes)
+
+    The *_waveform() functions generate the same bus signals as samples,
+    e.g. as an fpga_emulator DC pattern for testing without a board.
+
+Typical usage:
+    decoder = UartDecoder(rx=0, baudrate=115200, sample_rate=capture.sample_rate)
+    table = decode_samples(decoder, capture.samples)
+    print(bytes(table['value'][~table['framing_error']]))
+
+Command line:
+    python protocol_decoders.py capture.dcap uart --rx 0 --baud 115200
+    python protocol_decoders.py bus.dtr i2c --scl 2 --sda 3 --expect "A0 00 10"
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from transitions import channel_edges, encode_transitions
+
+DEFAULT_BLOCK_SIZE = 16 * 1024 * 1024
+
+UART_DTYPE = np.dtype([('start', '<i8'), ('end', '<i8'), ('value', '<u2'),
+                       ('parity_error', '?'), ('framing_error', '?')])
+SPI_DTYPE = np.dtype([('start', '<i8'), ('end', '<i8'), ('mosi', '<u4'), ('miso', '<u4'),
+                      ('bits', 'u1')])
+I2C_DTYPE = np.dtype([('start', '<i8'), ('end', '<i8'), ('kind', 'u1'), ('value', 'u1'),
+                      ('ack', '?'), ('read', '?')])
+ONEWIRE_DTYPE = np.dtype([('start', '<i8'), ('end', '<i8'), ('kind', 'u1'), ('value', 'u1')])
+
+# I2C row kinds
+I2C_START = 0
+I2C_RESTART = 1
+I2C_STOP = 2
+I2C_ADDRESS = 3     # value = address byte (7-bit address << 1 | R/W)
+I2C_DATA = 4
+I2C_KINDS = ('START', 'RESTART', 'STOP', 'ADDR', 'DATA')
+
+# 1-Wire row kinds
+ONEWIRE_RESET = 0
+ONEWIRE_PRESENCE = 1
+ONEWIRE_BYTE = 2
+ONEWIRE_KINDS = ('RESET', 'PRESENCE', 'BYTE')
+
+# 1-Wire timing classes (us); one_wire_master.v drives 480 us resets,
+# 60 us write-0 and 6 us write-1/read slots and samples 9 us into a slot
+ONEWIRE_RESET_MIN_US = 400       # Longer low pulses are resets
+ONEWIRE_PRESENCE_WAIT_US = 80    # Presence pulse starts this soon after a reset
+ONEWIRE_ONE_MAX_US = 15          # Shorter low pulses are 1 bits
+
+UART_STOP_BITS = (1.0, 1.5, 2.0)     # 0x07 stop bit codes 0, 1, 2
+PARITY_NONE, PARITY_ODD, PARITY_EVEN = 0, 1, 2
+
+
+def _as_array(block):
+    return np.frombuffer(block, dtype=np.uint8) if not isinstance(block, np.ndarray) else block
+
+
+def _level_at(positions, levels, at):
+    """Level of a channel (positions/levels from channel_edges) at sample indices `at`."""
+    index = np.searchsorted(positions, at, side='right') - 1
+    return levels[np.maximum(index, 0)]
+
+
+def _edges(positions, levels, level):
+    """Edges (not the initial level entry) that go to `level`."""
+    return positions[1:][levels[1:] == level]
+
+
+def _segments(bounds, positions):
+    """
+    Split sorted positions at sorted bounds.
+
+    Returns:
+        tuple: (segment per position, -1 before the first bound; rank of
+            each position within its segment)
+    """
+    segment = np.searchsorted(bounds, positions, side='right') - 1
+    first = np.searchsorted(segment, segment, side='left')
+    return segment, np.arange(len(positions)) - first
+
+
+def to_seconds(table, sample_rate, start_time=0.0):
+    """Row start times in seconds (plus `start_time`, e.g. a capture's Unix time)."""
+    return start_time + table['start'] / float(sample_rate)
+
+
+def cross_check(decoded, expected):
+    """
+    Compare decoded bytes with the bytes a handler was told to send.
+
+    Returns:
+        tuple: (True if equal, index of the first difference or None)
+    """
+    decoded = np.asarray(decoded, dtype=np.int64)
+    expected = np.frombuffer(bytes(expected), dtype=np.uint8).astype(np.int64)
+    common = min(len(decoded), len(expected))
+    diff = np.flatnonzero(decoded[:common] != expected[:common])
+    if len(diff):
+        return False, int(diff[0])
+    if len(decoded) != len(expected):
+        return False, common
+    return True, None
+
+
+# ============================================================================
+# Streaming base
+# ============================================================================
+class _Decoder:
+    """
+    Keeps the transition records of the unfinished frame between calls.
+
+    Subclasses implement _decode(starts, values, end, final), returning the
+    completed rows and the sample index from which records must be kept.
+    A resume point is placed one sample before an edge, so the edge itself
+    is still an edge (not the initial level) when decoding continues.
+    """
+
+    DTYPE = None
+
+    def __init__(self, sample_rate):
+        if sample_rate <= 0:
+            raise ValueError("sample_rate must be > 0")
+        self.sample_rate = float(sample_rate)
+        self.reset()
+
+    def reset(self):
+        """Forget all pending data."""
+        self.samples = 0            # Absolute index after the last sample fed
+        self.rows = 0               # Rows produced
+        self._previous = None
+        self._starts = np.zeros(0, dtype=np.int64)
+        self._values = np.zeros(0, dtype=np.uint8)
+
+    def _us(self, microseconds):
+        return microseconds * 1e-6 * self.sample_rate
+
+    def feed(self, block):
+        """
+        Decode raw samples following the ones fed before.
+
+        Returns:
+            numpy.ndarray: Rows completed (DTYPE)
+        """
+        data = _as_array(block)
+        if not len(data):
+            return np.zeros(0, dtype=self.DTYPE)
+        starts, values = encode_transitions(data, self.samples, self._previous)
+        return self.feed_transitions(starts, values, self.samples + len(data))
+
+    def feed_transitions(self, starts, values, end):
+        """
+        Decode transition records (absolute sample indices) covering up to `end`.
+
+        Returns:
+            numpy.ndarray: Rows completed (DTYPE)
+        """
+        starts = np.concatenate((self._starts, np.asarray(starts, dtype=np.int64)))
+        values = np.concatenate((self._values, np.asarray(values, dtype=np.uint8)))
+        self.samples = end
+        if not len(starts):
+            return np.zeros(0, dtype=self.DTYPE)
+        self._previous = int(values[-1])
+        table, resume = self._decode(starts, values, end, False)
+        keep = max(int(np.searchsorted(starts, resume, side='right')) - 1, 0)
+        self._starts = starts[keep:].copy()
+        self._values = values[keep:].copy()
+        self._starts[0] = max(int(self._starts[0]), resume)
+        self.rows += len(table)
+        return table
+
+    def finish(self):
+        """
+        Decode what is left at the end of the data; partial frames are dropped.
+
+        Returns:
+            numpy.ndarray: Rows completed (DTYPE)
+        """
+        if not len(self._starts):
+            return np.zeros(0, dtype=self.DTYPE)
+        table, _ = self._decode(self._starts, self._values, self.samples, True)
+        self._starts = self._starts[-1:]
+        self._values = self._values[-1:]
+        self.rows += len(table)
+        return table
+
+    def _decode(self, starts, values, end, final):
+        raise NotImplementedError
+
+
+# ============================================================================
+# UART
+# ============================================================================
+class UartDecoder(_Decoder):
+    """
+    Asynchronous serial, idle high, LSB first.
+
+    Args:
+        rx (int): Channel of the line
+        baudrate (int): Bits per second
+        sample_rate (float): Capture rate in Hz (at least 4 samples per bit)
+        data_bits (int): 5..9
+        parity (int): PARITY_NONE, PARITY_ODD or PARITY_EVEN (0x07 codes)
+        stop_bits (int): 0 = 1, 1 = 1.5, 2 = 2 stop bits (0x07 codes)
+    """
+
+    DTYPE = UART_DTYPE
+
+    def __init__(self, rx, baudrate, sample_rate, data_bits=8, parity=PARITY_NONE, stop_bits=0):
+        if not 5 <= data_bits <= 9:
+            raise ValueError(f"data_bits must be in 5..9, got {data_bits}")
+        if parity not in (PARITY_NONE, PARITY_ODD, PARITY_EVEN):
+            raise ValueError(f"parity must be 0 (none), 1 (odd) or 2 (even), got {parity}")
+        if stop_bits not in (0, 1, 2):
+            raise ValueError(f"stop_bits must be 0, 1 or 2, got {stop_bits}")
+        if sample_rate < 4 * baudrate:
+            raise ValueError(f"{sample_rate:.0f} Hz is too slow for {baudrate} baud "
+                             f"(need >= 4 samples per bit)")
+        self.rx = rx
+        self.baudrate = baudrate
+        self.data_bits = data_bits
+        self.parity = parity
+        self.stop_bits = stop_bits
+        super().__init__(sample_rate)
+        bit = self.sample_rate / baudrate
+        slots = 1 + data_bits + (parity != PARITY_NONE) + 1
+        # Bit centres relative to the start edge: start, data, [parity], stop
+        self._offsets = ((np.arange(slots) + 0.5) * bit).astype(np.int64)
+        self._length = int(round((slots - 1 + UART_STOP_BITS[stop_bits]) * bit))
+
+    def _decode(self, starts, values, end, final):
+        positions, levels = channel_edges(starts, values, self.rx)
+        falls = _edges(positions, levels, 0)
+        stop_centre = int(self._offsets[-1])
+        candidates = falls[falls + stop_centre < end]
+
+        # Sample every bit of every candidate frame at once
+        bits = _level_at(positions, levels, candidates[:, None] + self._offsets)
+        valid = bits[:, 0] == 0
+        # Next candidate: first fall after the stop bit centre (valid start)
+        # or simply the next fall (glitch)
+        after = np.searchsorted(candidates, candidates + stop_centre, side='left')
+        following = np.where(valid, after, np.arange(1, len(candidates) + 1)).tolist()
+        valid_list = valid.tolist()
+        chosen = []
+        index, count = 0, len(candidates)
+        while index < count:               # One step per frame, not per sample
+            if valid_list[index]:
+                chosen.append(index)
+            index = following[index]
+
+        frames = bits[chosen]
+        data = frames[:, 1:1 + self.data_bits].astype(np.uint16)
+        table = np.zeros(len(chosen), dtype=UART_DTYPE)
+        table['start'] = candidates[chosen]
+        table['end'] = table['start'] + self._length
+        table['value'] = (data << np.arange(self.data_bits, dtype=np.uint16)).sum(axis=1)
+        if self.parity != PARITY_NONE:
+            ones = data.sum(axis=1) + frames[:, 1 + self.data_bits]
+            table['parity_error'] = ones % 2 != (1 if self.parity == PARITY_ODD else 0)
+        table['framing_error'] = frames[:, -1] == 0
+
+        # Keep records from the first fall that was not a candidate yet and
+        # is not inside the last frame
+        done = int(table['start'][-1]) + stop_centre if len(table) else -1
+        pending = falls[(falls + stop_centre >= end) & (falls >= done)]
+        resume = int(pending[0]) - 1 if len(pending) else end
+        return table, resume
+
+
+# ============================================================================
+# SPI
+# ============================================================================
+class SpiDecoder(_Decoder):
+    """
+    SPI with optional chip select (active low).
+
+    Without CS, words are counted from the first clock edge seen, so a
+    missed edge shifts all following words; use CS where available.
+
+    Args:
+        sck, mosi, miso, cs (int): Channels (mosi/miso/cs may be None)
+        sample_rate (float): Capture rate in Hz
+        cpol, cpha (int): SPI mode bits (spi_handler uses mode 0)
+        word_bits (int): Bits per word (1..32)
+        msb_first (bool): Bit order
+    """
+
+    DTYPE = SPI_DTYPE
+
+    def __init__(self, sck, mosi=None, miso=None, cs=None, sample_rate=1, cpol=0, cpha=0,
+                 word_bits=8, msb_first=True):
+        if not 1 <= word_bits <= 32:
+            raise ValueError(f"word_bits must be in 1..32, got {word_bits}")
+        self.sck, self.mosi, self.miso, self.cs = sck, mosi, miso, cs
+        self.cpol, self.cpha = cpol, cpha
+        self.word_bits = word_bits
+        self.msb_first = msb_first
+        super().__init__(sample_rate)
+
+    def _line(self, starts, values, ch, clocks):
+        if ch is None:
+            return np.zeros(len(clocks), dtype=np.uint32)
+        positions, levels = channel_edges(starts, values, ch)
+        return _level_at(positions, levels, clocks).astype(np.uint32)
+
+    def _decode(self, starts, values, end, final):
+        positions, levels = channel_edges(starts, values, self.sck)
+        # Modes 0 and 3 sample on the rising edge, 1 and 2 on the falling edge
+        clocks = _edges(positions, levels, 1 if self.cpol == self.cpha else 0)
+        selected = True
+        if self.cs is not None:
+            cs_positions, cs_levels = channel_edges(starts, values, self.cs)
+            clocks = clocks[_level_at(cs_positions, cs_levels, clocks) == 0]
+            # A segment starts at every CS assertion (-1: already asserted)
+            segment, rank = _segments(_edges(cs_positions, cs_levels, 0), clocks)
+            selected = cs_levels[-1] == 0
+        else:
+            segment, rank = np.zeros(len(clocks), dtype=np.int64), np.arange(len(clocks))
+
+        slot = rank % self.word_bits
+        word_first = np.flatnonzero(slot == 0)
+        word = np.cumsum(slot == 0) - 1
+        counts = np.diff(np.append(word_first, len(clocks)))
+
+        # The last word may still be receiving bits
+        resume = end
+        if len(counts) and counts[-1] < self.word_bits and selected and not final:
+            resume = int(clocks[word_first[-1]]) - 1
+            word_first, counts = word_first[:-1], counts[:-1]
+            keep = int(np.sum(counts))
+            clocks, word, slot = clocks[:keep], word[:keep], slot[:keep]
+
+        shift = (counts[word] - 1 - slot) if self.msb_first else slot
+        shift = shift.astype(np.uint32)
+        table = np.zeros(len(word_first), dtype=SPI_DTYPE)
+        if len(word_first):
+            table['start'] = clocks[word_first]
+            table['end'] = clocks[word_first + counts - 1]
+            for name, ch in (('mosi', self.mosi), ('miso', self.miso)):
+                line = self._line(starts, values, ch, clocks)
+                table[name] = np.add.reduceat(line << shift, word_first)
+            table['bits'] = counts
+        return table, resume
+
+
+# ============================================================================
+# I2C
+# ============================================================================
+class I2cDecoder(_Decoder):
+    """
+    I2C bus: START/STOP conditions, address and data bytes with ACK/NAK.
+
+    Args:
+        scl, sda (int): Channels
+        sample_rate (float): Capture rate in Hz
+    """
+
+    DTYPE = I2C_DTYPE
+
+    def __init__(self, scl, sda, sample_rate):
+        self.scl, self.sda = scl, sda
+        super().__init__(sample_rate)
+
+    def reset(self):
+        super().reset()
+        self._in_frame = False      # Inside START ... STOP at the resume point
+        self._units = 0             # Bytes already decoded since that START
+        self._read = False
+
+    def _decode(self, starts, values, end, final):
+        scl_positions, scl_levels = channel_edges(starts, values, self.scl)
+        sda_positions, sda_levels = channel_edges(starts, values, self.sda)
+
+        # START: SDA falls while SCL is high; STOP: SDA rises while SCL is high
+        sda_edges, sda_to = sda_positions[1:], sda_levels[1:]
+        conditions = _level_at(scl_positions, scl_levels, sda_edges) == 1
+        cond_at = sda_edges[conditions]
+        cond_is_start = sda_to[conditions] == 0
+        opened = np.concatenate(([self._in_frame], cond_is_start))
+
+        # Data bits: SDA sampled at every SCL rising edge, grouped 8 + ACK
+        clocks = _edges(scl_positions, scl_levels, 1)
+        sda_bits = _level_at(sda_positions, sda_levels, clocks).astype(np.int64)
+        segment, rank = _segments(cond_at, clocks)
+        in_frame = opened[segment + 1]
+        clocks, sda_bits, segment, rank = (clocks[in_frame], sda_bits[in_frame],
+                                           segment[in_frame], rank[in_frame])
+        unit = rank // 9
+        slot = rank % 9
+        unit_first = np.flatnonzero(slot == 0)
+        counts = np.diff(np.append(unit_first, len(clocks)))
+        unit_segment = segment[unit_first]
+
+        # A partial byte in the still open frame is finished next time
+        last_open = bool(opened[-1])
+        resume = end
+        if len(counts) and counts[-1] < 9 and last_open and not final \
+                and unit_segment[-1] == len(cond_at) - 1:
+            resume = int(clocks[unit_first[-1]]) - 1
+        complete = counts == 9
+        if resume != end:
+            complete[-1] = False
+        unit_first, unit_segment = unit_first[complete], unit_segment[complete]
+        unit_index = unit[unit_first] + np.where(unit_segment < 0, self._units, 0)
+
+        # value: 8 bits MSB first, then the ACK bit (0 = ACK)
+        bit_index = unit_first[:, None] + np.arange(9)
+        weights = np.array([128, 64, 32, 16, 8, 4, 2, 1, 0], dtype=np.int64)
+        byte_values = (sda_bits[bit_index] * weights).sum(axis=1) if len(unit_first) \
+            else np.zeros(0, dtype=np.int64)
+        acks = sda_bits[bit_index[:, 8]] == 0 if len(unit_first) else np.zeros(0, dtype=bool)
+        is_address = unit_index == 0
+
+        # R/W bit of each frame's address byte applies to its data bytes
+        frame_read = np.zeros(len(cond_at) + 1, dtype=bool)
+        frame_read[0] = self._read
+        frame_read[unit_segment[is_address] + 1] = (byte_values[is_address] & 1) == 1
+
+        table = np.zeros(len(cond_at) + len(unit_first), dtype=I2C_DTYPE)
+        conds, units = table[:len(cond_at)], table[len(cond_at):]
+        conds['start'] = conds['end'] = cond_at
+        conds['kind'] = np.where(cond_is_start, np.where(opened[:-1], I2C_RESTART, I2C_START),
+                                 I2C_STOP)
+        units['start'] = clocks[unit_first]
+        units['end'] = clocks[unit_first + 8] if len(unit_first) else 0
+        units['kind'] = np.where(is_address, I2C_ADDRESS, I2C_DATA)
+        units['value'] = byte_values
+        units['ack'] = acks
+        units['read'] = frame_read[unit_segment + 1]
+        table = table[np.argsort(table['start'], kind='stable')]
+
+        # State at the resume point
+        self._in_frame = last_open
+        self._read = bool(frame_read[-1])
+        if last_open:
+            in_last = unit_segment == len(cond_at) - 1
+            self._units = int(unit_index[in_last][-1]) + 1 if in_last.any() else \
+                (self._units if not len(cond_at) else 0)
+        else:
+            self._units = 0
+        return table, resume
+
+
+# ============================================================================
+# 1-Wire
+# ============================================================================
+class OneWireDecoder(_Decoder):
+    """
+    1-Wire bus, classified by the length of each low pulse: resets, presence
+    pulses and time slots (short = 1, long = 0), bytes LSB first. Slots that
+    do not make up whole bytes before the next reset are not reported.
+
+    Args:
+        line (int): Channel of the bus
+        sample_rate (float): Capture rate in Hz (at least 1 MHz recommended)
+    """
+
+    DTYPE = ONEWIRE_DTYPE
+
+    def __init__(self, line, sample_rate):
+        self.line = line
+        super().__init__(sample_rate)
+
+    def _decode(self, starts, values, end, final):
+        positions, levels = channel_edges(starts, values, self.line)
+        falls = _edges(positions, levels, 0)
+        rises = _edges(positions, levels, 1)
+        closing = np.searchsorted(rises, falls, side='right')
+        resume = end
+        low_at_end = bool(len(closing)) and closing[-1] == len(rises)
+        if low_at_end:
+            resume = int(falls[-1]) - 1
+            falls, closing = falls[:-1], closing[:-1]
+        lows = rises[closing] - falls
+
+        reset = lows >= self._us(ONEWIRE_RESET_MIN_US)
+        if len(reset) and reset[-1] and not final and (
+                low_at_end or end - int(rises[closing[-1]]) < self._us(ONEWIRE_PRESENCE_WAIT_US)):
+            # The presence pulse may still follow (or be in progress)
+            resume = int(falls[-1]) - 1
+            falls, lows, reset, closing = falls[:-1], lows[:-1], reset[:-1], closing[:-1]
+        ends = falls + lows
+        presence = np.zeros(len(falls), dtype=bool)
+        presence[1:] = reset[:-1] & (falls[1:] - ends[:-1] <= self._us(ONEWIRE_PRESENCE_WAIT_US))
+
+        slots = ~reset & ~presence
+        slot_at = falls[slots]
+        slot_bits = (lows[slots] < self._us(ONEWIRE_ONE_MAX_US)).astype(np.int64)
+        _, rank = _segments(falls[reset], slot_at)
+        unit_first = np.flatnonzero(rank % 8 == 0)
+        counts = np.diff(np.append(unit_first, len(slot_at)))
+        if len(counts) and counts[-1] < 8 and not final \
+                and (not reset.any() or slot_at[unit_first[-1]] > falls[reset][-1]):
+            # Byte still being transferred
+            resume = min(resume, int(slot_at[unit_first[-1]]) - 1)
+            unit_first, counts = unit_first[:-1], counts[:-1]
+        unit_first = unit_first[counts == 8]
+
+        bit_index = unit_first[:, None] + np.arange(8)
+        weights = 1 << np.arange(8, dtype=np.int64)
+        table = np.zeros(int(reset.sum() + presence.sum()) + len(unit_first), dtype=ONEWIRE_DTYPE)
+        marks = np.flatnonzero(reset | presence)
+        count = len(marks)
+        table['start'][:count] = falls[marks]
+        table['end'][:count] = ends[marks]
+        table['kind'][:count] = np.where(reset[marks], ONEWIRE_RESET, ONEWIRE_PRESENCE)
+        if len(unit_first):
+            slot_ends = ends[slots]
+            table['start'][count:] = slot_at[unit_first]
+            table['end'][count:] = slot_ends[unit_first + 7]
+            table['kind'][count:] = ONEWIRE_BYTE
+            table['value'][count:] = (slot_bits[bit_index] * weights).sum(axis=1)
+        table = table[np.argsort(table['start'], kind='stable')]
+        return table, resume
+
+
+# ============================================================================
+# Offline decoding
+# ============================================================================
+def decode_samples(decoder, samples, block_size=DEFAULT_BLOCK_SIZE, progress=None):
+    """
+    Decode a whole sample array (e.g. a memory-mapped CaptureFile.samples).
+
+    Returns:
+        numpy.ndarray: All rows (decoder.DTYPE)
+    """
+    data = _as_array(samples)
+    decoder.reset()
+    tables = []
+    for start in range(0, len(data), block_size):
+        tables.append(decoder.feed(data[start:start + block_size]))
+        if progress is not None:
+            progress(min(start + block_size, len(data)))
+    tables.append(decoder.finish())
+    return np.concatenate(tables)
+
+
+def decode_transition_file(decoder, dtr):
+    """
+    Decode a transitions.TransitionFile block by block, without expanding it.
+
+    Returns:
+        numpy.ndarray: All rows (decoder.DTYPE)
+    """
+    decoder.reset()
+    tables = []
+    bounds = np.append(dtr.block_starts, dtr.total)
+    for index in range(len(dtr.block_starts)):
+        starts, values = dtr.block(index)
+        tables.append(decoder.feed_transitions(starts, values, int(bounds[index + 1])))
+    tables.append(decoder.finish())
+    return np.concatenate(tables)
+
+
+# ============================================================================
+# Test signals
+# ============================================================================
+def _bus(levels, channels, idle):
+    """Pack per-channel level arrays into samples; other bits at `idle`."""
+    samples = np.full(len(levels[0]), idle, dtype=np.uint8)
+    for ch, level in zip(channels, levels):
+        samples &= np.uint8(~(1 << ch) & 0xFF)
+        samples |= (np.asarray(level, dtype=np.uint8) << ch).astype(np.uint8)
+    return samples
+
+
+def uart_waveform(data, baudrate, sample_rate, rx=0, parity=PARITY_NONE, stop_bits=0, gap=1,
+                  idle=0xFF):
+    """Samples of `data` sent as 8-bit UART frames, `gap` idle bits apart."""
+    bit = sample_rate / baudrate
+    bits = []
+    for value in data:
+        frame = [0] + [(value >> i) & 1 for i in range(8)]
+        if parity != PARITY_NONE:
+            frame.append((bin(value).count('1') + (parity == PARITY_ODD)) % 2)
+        bits.append((frame, UART_STOP_BITS[stop_bits] + gap))
+    length = int(sum((len(frame) + stop) * bit for frame, stop in bits)) + int(2 * bit)
+    line = np.ones(length, dtype=np.uint8)
+    t = bit
+    for frame, stop in bits:
+        for level in frame:
+            line[int(t):int(t + bit)] = level
+            t += bit
+        t += stop * bit
+    return _bus([line], [rx], idle)
+
+
+def spi_waveform(mosi_data, miso_data, half_period, sck=0, mosi=1, miso=2, cs=3, idle=0):
+    """Samples of one mode-0 transfer, MSB first, framed by CS."""
+    bits = [((m >> (7 - i)) & 1, (s >> (7 - i)) & 1)
+            for m, s in zip(mosi_data, miso_data) for i in range(8)]
+    length = (2 * len(bits) + 4) * half_period
+    lines = [np.zeros(length, dtype=np.uint8) for _ in range(3)]
+    select = np.ones(length, dtype=np.uint8)
+    select[half_period:length - half_period] = 0
+    t = 2 * half_period
+    for m, s in bits:
+        lines[1][t - half_period // 2:t + half_period] = m
+        lines[2][t - half_period // 2:t + half_period] = s
+        lines[0][t:t + half_period] = 1
+        t += 2 * half_period
+    return _bus(lines + [select], [sck, mosi, miso, cs], idle)
+
+
+def i2c_waveform(transactions, half_period, scl=0, sda=1, idle=0xFF):
+    """
+    Samples of I2C transactions; each is (address byte, data bytes, acks).
+
+    Consecutive transactions without STOP in between use a repeated START
+    when the transaction tuple has a fourth element True.
+    """
+    scl_line, sda_line = [1] * (2 * half_period), [1] * (2 * half_period)
+
+    def emit(c, d, n=half_period):
+        scl_line.extend([c] * n)
+        sda_line.extend([d] * n)
+
+    for index, transaction in enumerate(transactions):
+        address, data, acks = transaction[:3]
+        emit(1, 1)
+        emit(1, 0)                       # START
+        emit(0, 0)
+        for byte, ack in zip([address] + list(data), acks):
+            for i in range(8):
+                bit = (byte >> (7 - i)) & 1
+                emit(0, bit)
+                emit(1, bit)
+            emit(0, 0 if ack else 1)
+            emit(1, 0 if ack else 1)
+        following = transactions[index + 1] if index + 1 < len(transactions) else None
+        if following is not None and len(following) > 3 and following[3]:
+            emit(0, 1)                   # Release SDA for the repeated START
+            continue
+        emit(0, 0)
+        emit(1, 0)
+        emit(1, 1)                       # STOP
+    emit(1, 1, 4 * half_period)
+    return _bus([scl_line, sda_line], [scl, sda], idle)
+
+
+def onewire_waveform(sequence, sample_rate, line=0, idle=0xFF):
+    """
+    Samples of a 1-Wire sequence: 'reset' (with presence) or byte values.
+    """
+    us = sample_rate / 1e6
+    levels = [np.ones(int(100 * us), dtype=np.uint8)]
+
+    def pulse(low, high):
+        levels.append(np.zeros(int(low * us), dtype=np.uint8))
+        levels.append(np.ones(int(high * us), dtype=np.uint8))
+
+    for item in sequence:
+        if item == 'reset':
+            pulse(480, 30)
+            pulse(120, 330)
+        else:
+            for i in range(8):
+                pulse(6, 64) if (item >> i) & 1 else pulse(60, 10)
+    levels.append(np.ones(int(100 * us), dtype=np.uint8))
+    return _bus([np.concatenate(levels)], [line], idle)
+
+
+# ============================================================================
+# Main
+# ============================================================================
+def _open(path):
+    """Sample rate, start time and a decode function for a recording."""
+    if path.endswith('.dtr'):
+        from transitions import TransitionFile
+        dtr = TransitionFile(path)
+        return dtr.sample_rate, dtr.start_time, lambda decoder: decode_transition_file(decoder, dtr)
+    from capture_file import CaptureFile
+    capture = CaptureFile(path)
+    return capture.sample_rate, capture.start_time, \
+        lambda decoder: decode_samples(decoder, capture.samples)
+
+
+def format_row(row, protocol):
+    """One table row as text."""
+    if protocol == 'uart':
+        flags = ('P' if row['parity_error'] else '') + ('F' if row['framing_error'] else '')
+        return f"0x{row['value']:02X} {flags}"
+    if protocol == 'spi':
+        partial = f" ({row['bits']} bits)" if row['bits'] != 8 else ""
+        return f"MOSI 0x{row['mosi']:02X}  MISO 0x{row['miso']:02X}{partial}"
+    if protocol == 'i2c':
+        kind = I2C_KINDS[row['kind']]
+        if row['kind'] == I2C_ADDRESS:
+            return f"{kind} 0x{row['value'] >> 1:02X} {'R' if row['value'] & 1 else 'W'} " \
+                   f"{'ACK' if row['ack'] else 'NAK'}"
+        if row['kind'] == I2C_DATA:
+            return f"{kind} 0x{row['value']:02X} {'ACK' if row['ack'] else 'NAK'}"
+        return kind
+    kind = ONEWIRE_KINDS[row['kind']]
+    return f"{kind} 0x{row['value']:02X}" if row['kind'] == ONEWIRE_BYTE else kind
+
+
+def payload(table, protocol):
+    """Bytes carried by a table, for cross_check() (SPI: MOSI)."""
+    if protocol == 'uart':
+        return table['value'][~table['framing_error']]
+    if protocol == 'spi':
+        return table['mosi']
+    if protocol == 'i2c':
+        return table['value'][(table['kind'] == I2C_ADDRESS) | (table['kind'] == I2C_DATA)]
+    return table['value'][table['kind'] == ONEWIRE_BYTE]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode UART/SPI/I2C/1-Wire from DC recordings")
+    parser.add_argument('input', help=".dcap/.bin recording or .dtr file")
+    parser.add_argument('--rate', type=float, help="Sample rate in Hz (raw .bin files)")
+    parser.add_argument('--limit', type=int, default=50, help="Rows to print (0: all)")
+    parser.add_argument('--expect', help="Hex bytes the handler sent, e.g. \"A0 00 10\"")
+    sub = parser.add_subparsers(dest='protocol', required=True)
+    uart = sub.add_parser('uart')
+    uart.add_argument('--rx', type=int, default=0)
+    uart.add_argument('--baud', type=int, default=115200)
+    uart.add_argument('--data-bits', type=int, default=8)
+    uart.add_argument('--parity', type=int, default=0, choices=[0, 1, 2])
+    uart.add_argument('--stop-bits', type=int, default=0, choices=[0, 1, 2])
+    spi = sub.add_parser('spi')
+    spi.add_argument('--sck', type=int, default=0)
+    spi.add_argument('--mosi', type=int, default=1)
+    spi.add_argument('--miso', type=int)
+    spi.add_argument('--cs', type=int)
+    spi.add_argument('--mode', type=int, default=0, choices=[0, 1, 2, 3])
+    i2c = sub.add_parser('i2c')
+    i2c.add_argument('--scl', type=int, default=0)
+    i2c.add_argument('--sda', type=int, default=1)
+    onewire = sub.add_parser('onewire')
+    onewire.add_argument('--line', type=int, default=0)
+    args = parser.parse_args()
+
+    sample_rate, start_time, run = _open(args.input)
+    sample_rate = args.rate or sample_rate
+    if not sample_rate:
+        print("Unknown sample rate, use --rate")
+        return 1
+    if args.protocol == 'uart':
+        decoder = UartDecoder(args.rx, args.baud, sample_rate, args.data_bits, args.parity,
+                              args.stop_bits)
+    elif args.protocol == 'spi':
+        decoder = SpiDecoder(args.sck, args.mosi, args.miso, args.cs, sample_rate,
+                             cpol=args.mode >> 1, cpha=args.mode & 1)
+    elif args.protocol == 'i2c':
+        decoder = I2cDecoder(args.scl, args.sda, sample_rate)
+    else:
+        decoder = OneWireDecoder(args.line, sample_rate)
+
+    started = time.time()
+    table = run(decoder)
+    print(f"{len(table):,} rows in {time.time() - started:.2f} s")
+    times = to_seconds(table, sample_rate)
+    shown = table if not args.limit else table[:args.limit]
+    for row, t in zip(shown, times):
+        print(f"{t:14.6f} s  {format_row(row, args.protocol)}")
+
+    if args.expect:
+        expected = bytes.fromhex(args.expect)
+        ok, index = cross_check(payload(table, args.protocol), expected)
+        print("Cross-check: OK" if ok else f"Cross-check: mismatch at byte {index}")
+        return 0 if ok else 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
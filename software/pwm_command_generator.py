@@ -1,14 +1,17 @@
 #!/usr/bin/env python3
 import argparse
 
+from frame_codec import FrameTemplate
+
 # --- Configuration Constants ---
 # 确保这个时钟频率与您FPGA设计中的 `CLK_FREQ` 参数完全一致
 SYSTEM_CLOCK_HZ = 60_000_000
 
 # 协议中定义的常量
 CMD_PWM_CONFIG = 0xFE
-FRAME_HEADER = [0xAA, 0x55]
-PAYLOAD_LENGTH = 5
+# Payload: channel, period (16-bit), duty (16-bit), big-endian
+PWM_CONFIG_FRAME = FrameTemplate(CMD_PWM_CONFIG, 'BHH')
+PAYLOAD_LENGTH = PWM_CONFIG_FRAME.length
 
 def generate_pwm_command(channel: int, frequency: int, duty_cycle: float):
     """
@@ -65,30 +68,10 @@ def generate_pwm_command(channel: int, frequency: int, duty_cycle: float):
     if duty_val > period_val:
         duty_val = period_val
 
-    # 4. 构建 Payload
-    payload = [
-        channel,
-        (period_val >> 8) & 0xFF,  # Period High Byte
-        period_val & 0xFF,         # Period Low Byte
-        (duty_val >> 8) & 0xFF,    # Duty High Byte
-        duty_val & 0xFF            # Duty Low Byte
-    ]
-
-    # 5. 构建需要计算校验和的帧部分
-    frame_for_checksum = [
-        CMD_PWM_CONFIG,
-        (PAYLOAD_LENGTH >> 8) & 0xFF, # Length High Byte
-        PAYLOAD_LENGTH & 0xFF,        # Length Low Byte
-    ]
-    frame_for_checksum.extend(payload)
-
-    # 6. 计算校验和
-    checksum = sum(frame_for_checksum) & 0xFF
-
-    # 7. 组合成最终的完整指令
-    final_frame = FRAME_HEADER + frame_for_checksum + [checksum]
-
-    # 8. 格式化为十六进制字符串
+    # 4. 组合成最终的完整指令
+    final_frame = PWM_CONFIG_FRAME.pack(channel, period_val, duty_val)
+
+    # 5. 格式化为十六进制字符串
     hex_string = ' '.join(f"{byte:02X}" for byte in final_frame)
 
     return hex_string, final_frame
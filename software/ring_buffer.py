@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Single-Producer/Single-Consumer Ring Buffer for FPGA2025
+========================================================
+
+One preallocated byte region shared by a reader thread (producer) and a
+display/analysis thread (consumer). The producer reads USB data straight
+into free space and commits it; the consumer gets memoryview slices of the
+committed data and releases them when done. Nothing is allocated or copied
+on the way through.
+
+Cursors:
+    write_pos and read_pos count bytes since the last clear() and only grow.
+    Each is written by one side only (producer: write_pos, consumer:
+    read_pos), so no lock is needed; the other side only reads it.
+
+Overruns:
+    When the consumer falls behind and a read would not fit, the producer
+    still drains the device (into a scratch area) but the data is dropped and
+    counted in `overruns`, exactly in bytes. The samples already in the ring
+    are never overwritten while the consumer may be looking at them.
+
+Typical usage:
+    ring = RingBuffer(64 * 1024 * 1024, max_write=READ_SIZE)
+
+    # producer thread
+    view = ring.write_view(READ_SIZE)
+    ring.commit(link.read_stream_into(view, timeout=0.01))
+
+    # consumer thread
+    for view in ring.read_views():
+        process(view)
+        ring.consume(len(view))
+"""
+
+import threading
+
+import numpy as np
+
+DEFAULT_MAX_WRITE = 256 * 1024   # Largest single producer write
+
+
+class RingBuffer:
+    """
+    Preallocated SPSC byte ring with memoryview access on both sides.
+
+    Args:
+        capacity (int): Bytes held before the producer starts dropping
+        max_write (int): Largest size passed to write_view(); the region has
+            this much slack after its end so a write never has to be split
+    """
+
+    def __init__(self, capacity, max_write=DEFAULT_MAX_WRITE):
+        if capacity <= 0:
+            raise ValueError(f"capacity must be positive, got {capacity}")
+        if not 0 < max_write <= capacity:
+            raise ValueError(f"max_write must be in 1..{capacity}, got {max_write}")
+        self.capacity = capacity
+        self.max_write = max_write
+        # The slack after capacity receives the part of a write that wraps;
+        # commit() moves it to the start
+        self._data = np.zeros(capacity + max_write, dtype=np.uint8)
+        self._scratch = np.zeros(max_write, dtype=np.uint8)
+        self._pending = None        # True if the last write_view() was the scratch area
+        self._ready = threading.Event()
+
+        self.write_pos = 0
+        self.read_pos = 0
+        self.overruns = 0           # Bytes dropped because the ring was full
+
+    def __len__(self):
+        """Bytes committed but not yet consumed."""
+        return self.write_pos - self.read_pos
+
+    @property
+    def free(self):
+        return self.capacity - len(self)
+
+    @property
+    def data(self):
+        """The whole backing array (first `capacity` bytes are the ring)."""
+        return self._data[:self.capacity]
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+    def write_view(self, size):
+        """
+        Return a writable view of `size` bytes for the next write.
+
+        If the ring cannot take `size` bytes the view points at a scratch
+        area instead, and whatever is committed from it counts as overrun.
+
+        Args:
+            size (int): Bytes the producer wants to write (<= max_write)
+
+        Returns:
+            memoryview: Contiguous writable bytes
+        """
+        if not 0 < size <= self.max_write:
+            raise ValueError(f"size must be in 1..{self.max_write}, got {size}")
+        if self.free < size:
+            self._pending = True
+            return memoryview(self._scratch)[:size]
+        self._pending = False
+        start = self.write_pos % self.capacity
+        return memoryview(self._data)[start:start + size]
+
+    def commit(self, count):
+        """Publish `count` bytes written into the last write_view()."""
+        if count <= 0:
+            return
+        if self._pending is None:
+            raise RuntimeError("commit() without write_view()")
+        if self._pending:
+            self.overruns += count
+        else:
+            start = self.write_pos % self.capacity
+            wrapped = start + count - self.capacity
+            if wrapped > 0:
+                self._data[:wrapped] = self._data[self.capacity:self.capacity + wrapped]
+            self.write_pos += count
+            self._ready.set()
+        self._pending = None
+
+    def write(self, data):
+        """Copy a bytes-like object in (for producers without read_into)."""
+        data = memoryview(data).cast('B')
+        for start in range(0, len(data), self.max_write):
+            part = data[start:start + self.max_write]
+            view = self.write_view(len(part))
+            view[:] = part
+            self.commit(len(part))
+
+    # ------------------------------------------------------------------
+    # Consumer side
+    # ------------------------------------------------------------------
+    def read_view(self, max_size=None):
+        """
+        Return the oldest unconsumed bytes as one contiguous view.
+
+        The view stops at the end of the region, so it may be shorter than
+        len(self); call consume() and read again for the rest.
+
+        Returns:
+            memoryview: Read-only view (empty if nothing is available)
+        """
+        available = len(self)
+        start = self.read_pos % self.capacity
+        size = min(available, self.capacity - start)
+        if max_size is not None:
+            size = min(size, max_size)
+        return memoryview(self._data)[start:start + size].toreadonly()
+
+    def read_views(self):
+        """
+        Yield views of everything committed so far (at most two pieces).
+
+        Each view must be passed to consume() before the next one is taken.
+        """
+        end = self.write_pos
+        while self.read_pos < end:
+            yield self.read_view(end - self.read_pos)
+
+    def consume(self, count):
+        """Release `count` bytes read through read_view()."""
+        if count > len(self):
+            raise ValueError(f"Cannot consume {count} bytes, only {len(self)} available")
+        self.read_pos += count
+
+    def read(self, size=None):
+        """Copy out and consume up to `size` bytes (all if None)."""
+        available = len(self) if size is None else min(size, len(self))
+        out = bytearray(available)
+        filled = 0
+        while filled < available:
+            view = self.read_view(available - filled)
+            out[filled:filled + len(view)] = view
+            filled += len(view)
+            self.consume(len(view))
+        return bytes(out)
+
+    def wait(self, timeout=None):
+        """Block until data is available. Returns False on timeout."""
+        self._ready.clear()
+        if len(self):
+            return True
+        return self._ready.wait(timeout)
+
+    def skip(self):
+        """Consumer side: drop everything committed so far."""
+        self.read_pos = self.write_pos
+
+    def clear(self):
+        """Reset both cursors and counters (only while the producer is idle)."""
+        self.write_pos = 0
+        self.read_pos = 0
+        self.overruns = 0
+        self._pending = None
+        self._ready.clear()
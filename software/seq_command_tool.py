@@ -4,124 +4,18 @@ SEQ Command Tool - 自定义序列发生器配置工具
 用于配置 8 通道自定义序列发生器，支持 USB 发送命令和实时监控
 """
 
-import usb.core
-import usb.util
 import time
 import sys
 import argparse
+import struct
 
-# USB 设备标识 (根据 usb_descriptor.v 配置)
-USB_VID = 0x33AA  # Gowin USB Vendor ID
-USB_PID = 0x0000  # Product ID
-
-# Endpoint 地址
-EP_CTRL_OUT = 0x02  # EP2 OUT - 命令发送
-EP_DATA_IN = 0x82   # EP2 IN  - 通用数据读取
+from frame_codec import encode_frame
+from transport import (USB_PID, USB_VID, UsbTransport, create_transport,
+                       list_usb_devices, usb_device_strings)
 
 # 系统时钟频率 (Hz)
 SYSTEM_CLK = 60_000_000  # 60 MHz
 
-def get_usb_backend():
-    """获取可用的 USB 后端"""
-    backends_to_try = []
-
-    # 1. libusb1 (推荐，支持 WinUSB)
-    try:
-        import usb.backend.libusb1
-        backend = usb.backend.libusb1.get_backend()
-        if backend:
-            backends_to_try.append(("libusb1", backend))
-    except:
-        pass
-
-    # 2. libusb0 (备选)
-    try:
-        import usb.backend.libusb0
-        backend = usb.backend.libusb0.get_backend()
-        if backend:
-            backends_to_try.append(("libusb0", backend))
-    except:
-        pass
-
-    # 3. openusb (备选)
-    try:
-        import usb.backend.openusb
-        backend = usb.backend.openusb.get_backend()
-        if backend:
-            backends_to_try.append(("openusb", backend))
-    except:
-        pass
-
-    return backends_to_try
-
-def find_usb_device():
-    """查找 USB 设备 - 尝试多个后端"""
-    backends = get_usb_backend()
-
-    if not backends:
-        print("❌ 没有可用的 USB 后端！")
-        print("   请安装 libusb: https://github.com/libusb/libusb/releases")
-        return None, None
-
-    for backend_name, backend in backends:
-        try:
-            dev = usb.core.find(idVendor=USB_VID, idProduct=USB_PID, backend=backend)
-            if dev:
-                print(f"✅ 使用 {backend_name} 后端找到设备")
-                return dev, backend_name
-        except Exception as e:
-            continue
-
-    return None, None
-
-def list_usb_devices():
-    """列出所有匹配的 USB 设备"""
-    backends = get_usb_backend()
-
-    if not backends:
-        return []
-
-    all_devices = []
-    for backend_name, backend in backends:
-        try:
-            devices = list(usb.core.find(find_all=True, idVendor=USB_VID, idProduct=USB_PID, backend=backend))
-            if devices:
-                print(f"✅ 使用 {backend_name} 后端")
-                return devices
-        except:
-            continue
-
-    return all_devices
-
-def init_usb_device(dev):
-    """初始化 USB 设备"""
-    try:
-        # Windows 下不需要分离内核驱动
-        try:
-            if dev.is_kernel_driver_active(0):
-                dev.detach_kernel_driver(0)
-                print("✅ 已分离内核驱动")
-        except (NotImplementedError, AttributeError):
-            pass
-        except Exception as e:
-            pass
-
-        # 设置配置
-        try:
-            dev.set_configuration()
-            print(f"✅ USB 设备已配置")
-        except usb.core.USBError as e:
-            print(f"⚠️  设置配置时出现警告: {e}")
-            print(f"   尝试继续...")
-
-        return True
-    except usb.core.USBError as e:
-        print(f"❌ USB 初始化失败: {e}")
-        return False
-    except Exception as e:
-        print(f"❌ 初始化错误: {e}")
-        return False
-
 def generate_seq_config_command(channel, enable, base_freq_hz, seq_data, seq_length):
     """
     生成 SEQ 配置命令
@@ -163,14 +57,10 @@ def generate_seq_config_command(channel, enable, base_freq_hz, seq_data, seq_len
 
     # 命令头
     cmd_type = 0xF0  # SEQ_CONFIG
-    len_h = 0x00
-    len_l = 0x0D  # 13 bytes payload
 
     # Payload
     ch = channel & 0x07
     en = 1 if enable else 0
-    div_h = (divider >> 8) & 0xFF
-    div_l = divider & 0xFF
     length = seq_length & 0x7F
 
     # 处理序列数据
@@ -186,18 +76,10 @@ def generate_seq_config_command(channel, enable, base_freq_hz, seq_data, seq_len
         seq_int = seq_data
 
     # 将序列数据转换为 8 字节 (LSB first)
-    seq_bytes = []
-    for i in range(8):
-        seq_bytes.append((seq_int >> (i * 8)) & 0xFF)
-
-    # 构建完整payload
-    payload = [ch, en, div_h, div_l, length] + seq_bytes
-
-    # 计算校验和
-    checksum = (cmd_type + len_h + len_l + sum(payload)) & 0xFF
+    seq_bytes = (seq_int & 0xFFFFFFFFFFFFFFFF).to_bytes(8, 'little')
 
-    # 完整命令
-    full_cmd = bytes([0xAA, 0x55, cmd_type, len_h, len_l] + payload + [checksum])
+    # 完整命令 (13 bytes payload, 分频系数为大端)
+    full_cmd = encode_frame(cmd_type, struct.pack('>BBHB', ch, en, divider, length), seq_bytes)
 
     # 打印信息
     print(f"\n{'='*80}")
@@ -216,13 +98,13 @@ def generate_seq_config_command(channel, enable, base_freq_hz, seq_data, seq_len
 
     return full_cmd
 
-def send_seq_command(dev, channel, enable, base_freq_hz, seq_data, seq_length):
-    """发送 SEQ 配置命令到 USB 设备"""
+def send_seq_command(link, channel, enable, base_freq_hz, seq_data, seq_length):
+    """发送 SEQ 配置命令 (link: 已打开的 transport, USB 直连或串口)"""
     try:
         cmd = generate_seq_config_command(channel, enable, base_freq_hz, seq_data, seq_length)
 
-        # 发送命令到 EP2 OUT
-        bytes_written = dev.write(EP_CTRL_OUT, cmd)
+        # 发送命令 (USB 直连时为 EP2 OUT)
+        bytes_written = link.write(cmd)
 
         if bytes_written == len(cmd):
             print(f"✅ 命令发送成功 ({bytes_written} bytes)")
@@ -231,9 +113,6 @@ def send_seq_command(dev, channel, enable, base_freq_hz, seq_data, seq_length):
             print(f"⚠️  发送字节数不匹配: {bytes_written}/{len(cmd)}")
             return False
 
-    except usb.core.USBError as e:
-        print(f"❌ USB 发送错误: {e}")
-        return False
     except Exception as e:
         print(f"❌ 发送错误: {e}")
         import traceback
@@ -288,7 +167,7 @@ def parse_sequence_string(seq_str):
 
     return seq_data, seq_length
 
-def interactive_mode(dev):
+def interactive_mode(link):
     """交互式配置模式"""
     print("\n" + "="*80)
     print("SEQ 交互式配置模式")
@@ -354,7 +233,7 @@ def interactive_mode(dev):
                 continue
 
         # 发送命令
-        success = send_seq_command(dev, channel, enable, base_freq_hz, seq_data, seq_length)
+        success = send_seq_command(link, channel, enable, base_freq_hz, seq_data, seq_length)
 
         if success:
             print("\n✅ 配置完成")
@@ -399,6 +278,8 @@ def main():
                         help='序列数据 (二进制/十六进制/十进制)')
     parser.add_argument('-l', '--length', type=int,
                         help='序列长度 (bits, 1-64)')
+    parser.add_argument('-p', '--port', type=str, default='usb',
+                        help="连接方式: usb (默认, EP2 直连), 串口名 (如 COM3) 或 loop")
 
     args = parser.parse_args()
 
@@ -406,53 +287,52 @@ def main():
     print("SEQ Command Tool - 自定义序列发生器配置工具")
     print("=" * 80)
 
-    # 查找 USB 设备
-    print("\n正在查找 USB 设备...")
-    devices = list_usb_devices()
-
-    if not devices:
-        print(f"❌ 未找到 USB 设备 (VID: 0x{USB_VID:04X}, PID: 0x{USB_PID:04X})")
-        print("\n请检查:")
-        print("  1. FPGA 是否正确连接到 PC")
-        print("  2. USB 设备是否已枚举")
-        print("  3. Windows 是否已安装 WinUSB 驱动")
-        print("\n提示: 可使用 Zadig 工具安装 WinUSB 驱动")
-        sys.exit(1)
+    if args.port == 'usb':
+        # 查找 USB 设备
+        print("\n正在查找 USB 设备...")
+        devices, backend_name = list_usb_devices()
+
+        if not devices:
+            print(f"❌ 未找到 USB 设备 (VID: 0x{USB_VID:04X}, PID: 0x{USB_PID:04X})")
+            print("\n请检查:")
+            print("  1. FPGA 是否正确连接到 PC")
+            print("  2. USB 设备是否已枚举")
+            print("  3. Windows 是否已安装 WinUSB 驱动")
+            print("\n提示: 可使用 Zadig 工具安装 WinUSB 驱动")
+            sys.exit(1)
 
-    print(f"\n找到 {len(devices)} 个匹配的设备:")
-    for i, dev in enumerate(devices, 1):
-        try:
-            manufacturer = usb.util.get_string(dev, dev.iManufacturer) if dev.iManufacturer else "N/A"
-            product = usb.util.get_string(dev, dev.iProduct) if dev.iProduct else "N/A"
-            serial = usb.util.get_string(dev, dev.iSerialNumber) if dev.iSerialNumber else "N/A"
-        except:
-            manufacturer = "N/A"
-            product = "N/A"
-            serial = "N/A"
-
-        print(f"{i}. Bus {dev.bus} Device {dev.address}")
-        print(f"   制造商: {manufacturer}")
-        print(f"   产品:   {product}")
-        print(f"   序列号: {serial}")
-
-    # 选择设备
-    selected_dev = None
-    if len(devices) == 1:
-        selected_dev = devices[0]
-        print(f"\n自动选择设备 1")
+        print(f"✅ 使用 {backend_name} 后端")
+        print(f"\n找到 {len(devices)} 个匹配的设备:")
+        for i, dev in enumerate(devices, 1):
+            manufacturer, product, serial = usb_device_strings(dev)
+            print(f"{i}. Bus {dev.bus} Device {dev.address}")
+            print(f"   制造商: {manufacturer}")
+            print(f"   产品:   {product}")
+            print(f"   序列号: {serial}")
+
+        # 选择设备
+        selected_dev = None
+        if len(devices) == 1:
+            selected_dev = devices[0]
+            print(f"\n自动选择设备 1")
+        else:
+            print("\n请输入设备编号:", end=" ")
+            try:
+                dev_idx = int(input()) - 1
+                selected_dev = devices[dev_idx]
+            except:
+                print("❌ 无效输入")
+                sys.exit(1)
+        link = UsbTransport(device=selected_dev)
     else:
-        print("\n请输入设备编号:", end=" ")
-        try:
-            dev_idx = int(input()) - 1
-            selected_dev = devices[dev_idx]
-        except:
-            print("❌ 无效输入")
-            sys.exit(1)
+        link = create_transport(args.port)
 
     # 初始化设备
-    print(f"\n正在初始化 USB 设备...")
-    if not init_usb_device(selected_dev):
-        print("❌ USB 设备初始化失败")
+    print(f"\n正在打开 {link.name}...")
+    try:
+        link.open()
+    except Exception as e:
+        print(f"❌ 设备初始化失败: {e}")
         sys.exit(1)
 
     # 判断模式
@@ -483,7 +363,7 @@ def main():
             seq_length = args.length if args.length is not None else auto_length
 
         # 发送命令
-        success = send_seq_command(selected_dev, channel, enable, base_freq_hz, seq_data, seq_length)
+        success = send_seq_command(link, channel, enable, base_freq_hz, seq_data, seq_length)
 
         if success:
             print("✅ 配置完成")
@@ -492,7 +372,9 @@ def main():
             sys.exit(1)
     else:
         # 交互式模式
-        interactive_mode(selected_dev)
+        interactive_mode(link)
+
+    link.close()
 
     print("\n" + "="*80)
     print("程序结束")
@@ -0,0 +1,583 @@
+#!/usr/bin/env python3
+"""
+Shared-Memory Stream Ring for FPGA2025
+======================================
+
+One Digital Capture stream fanned out to several processes. A single writer
+(dc_capture_daemon.py, which owns EP 0x83) publishes samples into a
+multiprocessing.shared_memory segment; any number of readers (viewer,
+recorder, decoders) attach by name and read the same bytes through
+memoryviews, without copies and without the writer knowing about them.
+
+Cursors:
+    write_pos counts bytes since the segment was created and only grows.
+    Every reader keeps its own cursor in a slot of the reader table, so
+    readers move independently.
+
+Slow readers:
+    The writer never waits. It overwrites the oldest data, so a reader that
+    falls more than a ring's worth behind (minus max_write, the part the
+    writer may be filling) is moved forward to the oldest valid byte and the
+    skipped bytes are added to its own `lost` count. Other readers and the
+    writer are not affected. Data a reader was looking at while it got
+    overwritten is counted by consume() as well, so the count is exact.
+
+Segment layout (little-endian):
+    0       header: magic 'FPGADCR1', version, sizes, live stream fields
+    256     reader slots, SLOT_SIZE bytes each: pid, cursor, lost, bytes,
+            last update (time.time()), name
+            gap table: gap_slots x (position, lost samples), a ring of the
+            device-side losses the writer found (marker mode, FIFO overruns)
+            mailbox: commands from readers for the writer to forward
+            data: capacity + max_write bytes (the slack receives the part of
+            a write that wraps and is copied to the start on commit)
+
+Typical usage:
+    # writer (one process)
+    ring = SharedRing('fpga2025-dc', 64 * 1024 * 1024, create=True)
+    view = ring.write_view(READ_SIZE)
+    ring.commit(link.read_stream_into(view, timeout=0.01))
+
+    # readers (any number of processes)
+    reader = SharedRingReader('fpga2025-dc', 'viewer')
+    for view in reader.read_views():
+        process(view)
+        reader.consume(len(view))
+"""
+
+import os
+import struct
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+DEFAULT_NAME = 'fpga2025-dc'
+DEFAULT_CAPACITY = 64 * 1024 * 1024
+DEFAULT_MAX_WRITE = 256 * 1024
+DEFAULT_READERS = 16
+DEFAULT_GAP_SLOTS = 4096
+MAILBOX_SIZE = 256
+
+MAGIC = b'FPGADCR1'
+VERSION = 1
+HEADER_SIZE = 256
+SLOT_SIZE = 64
+GAP_SIZE = 16
+READER_TIMEOUT = 10.0      # Seconds without activity before a slot may be reaped
+
+FLAG_RUNNING = 0x01
+FLAG_MARKERS = 0x02
+
+# Static header: magic, version, max_readers, gap_slots, mailbox_size,
+# capacity, max_write
+_STATIC = struct.Struct('<8sIIII8xQQ')
+# Live fields (one 8-byte word each)
+_WRITE_POS = 64
+_GENERATION = 72
+_STREAM_START = 80     # write_pos when the current generation began
+_SAMPLE_RATE = 88      # float, Hz
+_FLAGS = 96
+_HEARTBEAT = 104       # float, time.time() of the writer's last sign of life
+_GAP_COUNT = 112
+_DEVICE_LOST = 120     # Samples the device or the writer's link dropped
+_MAIL_SEQ = 128
+_MAIL_ACK = 136
+_MAIL_LEN = 144
+_WRITER_PID = 152
+
+_created = set()       # Segments this process created (already tracked once)
+
+_Q = struct.Struct('<Q')
+_D = struct.Struct('<d')
+# pid, cursor, lost, bytes read, updated, name
+_SLOT = struct.Struct('<QQQQd24s')
+_GAP = struct.Struct('<QQ')
+
+ReaderInfo = namedtuple('ReaderInfo', [
+    'slot',
+    'pid',
+    'name',
+    'cursor',     # Stream position of the reader
+    'lag',        # Bytes committed but not read by this reader
+    'lost',       # Bytes this reader lost by falling behind
+    'bytes',      # Bytes this reader consumed
+    'idle',       # Seconds since its last read
+])
+
+StreamGap = namedtuple('StreamGap', [
+    'position',   # Stream position (write_pos) where samples are missing
+    'lost',       # Samples missing there
+])
+
+
+def segment_size(capacity, max_write, max_readers=DEFAULT_READERS, gap_slots=DEFAULT_GAP_SLOTS):
+    """Bytes of shared memory needed for a ring with these parameters."""
+    return (HEADER_SIZE + max_readers * SLOT_SIZE + gap_slots * GAP_SIZE + MAILBOX_SIZE
+            + capacity + max_write)
+
+
+def _attach(name):
+    """Attach to an existing segment without handing it to the resource tracker."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the segment, and the tracker
+        # would unlink it when this process exits, under the writer's feet
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == 'posix' and name not in _created:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class _Segment:
+    """Field access shared by the writer and reader sides."""
+
+    def __init__(self, shm):
+        self._shm = shm
+        self._buf = shm.buf
+        magic, version, readers, gap_slots, mailbox, capacity, max_write = \
+            _STATIC.unpack_from(self._buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise RuntimeError(f"Shared memory {shm.name!r} is not a DC stream ring")
+        self.name = shm.name
+        self.max_readers = readers
+        self.gap_slots = gap_slots
+        self.capacity = capacity
+        self.max_write = max_write
+        self._slots = HEADER_SIZE
+        self._gaps = self._slots + readers * SLOT_SIZE
+        self._mailbox = self._gaps + gap_slots * GAP_SIZE
+        self._data_offset = self._mailbox + mailbox
+        self._data = self._buf[self._data_offset:self._data_offset + capacity + max_write]
+
+    def _get(self, offset):
+        return _Q.unpack_from(self._buf, offset)[0]
+
+    def _set(self, offset, value):
+        _Q.pack_into(self._buf, offset, value)
+
+    def _get_float(self, offset):
+        return _D.unpack_from(self._buf, offset)[0]
+
+    def _set_float(self, offset, value):
+        _D.pack_into(self._buf, offset, value)
+
+    def _slot(self, index):
+        return _SLOT.unpack_from(self._buf, self._slots + index * SLOT_SIZE)
+
+    # ------------------------------------------------------------------
+    # Stream state
+    # ------------------------------------------------------------------
+    @property
+    def write_pos(self):
+        return self._get(_WRITE_POS)
+
+    @property
+    def generation(self):
+        """Incremented whenever the writer (re)starts or reconfigures the stream."""
+        return self._get(_GENERATION)
+
+    @property
+    def stream_start(self):
+        """write_pos at which the current generation began."""
+        return self._get(_STREAM_START)
+
+    @property
+    def sample_rate(self):
+        return self._get_float(_SAMPLE_RATE)
+
+    @property
+    def running(self):
+        return bool(self._get(_FLAGS) & FLAG_RUNNING)
+
+    @property
+    def markers(self):
+        """True if the writer strips sequence markers (gaps are then exact)."""
+        return bool(self._get(_FLAGS) & FLAG_MARKERS)
+
+    @property
+    def device_lost(self):
+        """Samples lost before reaching the ring (device FIFO or link overruns)."""
+        return self._get(_DEVICE_LOST)
+
+    @property
+    def gap_count(self):
+        """Device-side gaps recorded since the segment was created."""
+        return self._get(_GAP_COUNT)
+
+    @property
+    def heartbeat_age(self):
+        """Seconds since the writer last updated its heartbeat."""
+        return time.time() - self._get_float(_HEARTBEAT)
+
+    @property
+    def oldest(self):
+        """Oldest stream position that is still intact in the ring."""
+        return max(0, self.write_pos - (self.capacity - self.max_write))
+
+    def gaps(self, since=0):
+        """
+        Device-side gaps recorded since gap number `since`.
+
+        Returns:
+            tuple: (list of StreamGap, gap count to pass as `since` next time).
+            Gaps that were overwritten in the gap table are left out.
+        """
+        count = self.gap_count
+        since = max(since, count - self.gap_slots)
+        found = [StreamGap(*_GAP.unpack_from(self._buf, self._gaps + (n % self.gap_slots) * GAP_SIZE))
+                 for n in range(since, count)]
+        return found, count
+
+    def readers(self):
+        """ReaderInfo for every claimed slot."""
+        write_pos, now = self.write_pos, time.time()
+        found = []
+        for index in range(self.max_readers):
+            pid, cursor, lost, consumed, updated, name = self._slot(index)
+            if pid:
+                found.append(ReaderInfo(index, pid, name.rstrip(b'\0').decode('utf-8', 'replace'),
+                                        cursor, max(0, write_pos - cursor), lost, consumed,
+                                        now - updated))
+        return found
+
+
+# ============================================================================
+# Writer side
+# ============================================================================
+class SharedRing(_Segment):
+    """
+    Writer side: creates (or takes over) the segment and publishes samples.
+
+    Args:
+        name (str): Shared memory name readers attach to
+        capacity (int): Ring size in bytes
+        max_write (int): Largest size passed to write_view()
+        max_readers (int): Reader slots
+        gap_slots (int): Entries of the gap table
+        create (bool): Create the segment; False attaches to an existing one
+            (e.g. a writer restarting on a segment readers still hold)
+    """
+
+    def __init__(self, name=DEFAULT_NAME, capacity=DEFAULT_CAPACITY, max_write=DEFAULT_MAX_WRITE,
+                 max_readers=DEFAULT_READERS, gap_slots=DEFAULT_GAP_SLOTS, create=True):
+        if capacity <= 0:
+            raise ValueError(f"capacity must be positive, got {capacity}")
+        if not 0 < max_write <= capacity // 2:
+            raise ValueError(f"max_write must be in 1..{capacity // 2}, got {max_write}")
+        if create:
+            shm = shared_memory.SharedMemory(
+                name=name, create=True,
+                size=segment_size(capacity, max_write, max_readers, gap_slots))
+            _created.add(name)
+            shm.buf[:HEADER_SIZE + max_readers * SLOT_SIZE] = bytes(HEADER_SIZE + max_readers * SLOT_SIZE)
+            _STATIC.pack_into(shm.buf, 0, MAGIC, VERSION, max_readers, gap_slots, MAILBOX_SIZE,
+                              capacity, max_write)
+        else:
+            shm = _attach(name)
+        super().__init__(shm)
+        self._owner = create
+        self._set(_WRITER_PID, os.getpid())
+        self.heartbeat()
+
+    def close(self, unlink=None):
+        """
+        Detach from the segment.
+
+        Args:
+            unlink (bool): Remove the segment name (default: if this side
+                created it). Readers that are attached keep their mapping.
+        """
+        if self._shm is None:
+            return
+        self._set(_FLAGS, 0)
+        self._data.release()
+        self._data = None
+        self._buf = None
+        self._shm.close()
+        if self._owner if unlink is None else unlink:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+            _created.discard(self.name)
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    # ------------------------------------------------------------------
+    # Publishing
+    # ------------------------------------------------------------------
+    def write_view(self, size):
+        """
+        Writable view of `size` bytes at the write position.
+
+        The writer never waits for readers, so the view may cover data the
+        slowest readers have not read yet; they notice and count it as lost.
+        """
+        if size > self.max_write:
+            raise ValueError(f"write of {size} bytes exceeds max_write {self.max_write}")
+        start = self.write_pos % self.capacity
+        return self._data[start:start + size]
+
+    def commit(self, count):
+        """Publish `count` bytes written into the last write_view()."""
+        if not count:
+            return
+        write_pos = self.write_pos
+        start = write_pos % self.capacity
+        overflow = start + count - self.capacity
+        if overflow > 0:
+            self._data[:overflow] = self._data[self.capacity:self.capacity + overflow]
+        self._set(_WRITE_POS, write_pos + count)
+
+    def write(self, data):
+        """Copy `data` into the ring (in max_write pieces)."""
+        view = memoryview(data).cast('B')
+        for offset in range(0, len(view), self.max_write):
+            piece = view[offset:offset + self.max_write]
+            self.write_view(len(piece))[:] = piece
+            self.commit(len(piece))
+
+    def add_gap(self, position, lost):
+        """Record `lost` samples missing at stream position `position`."""
+        count = self._get(_GAP_COUNT)
+        _GAP.pack_into(self._buf, self._gaps + (count % self.gap_slots) * GAP_SIZE, position, lost)
+        self._set(_DEVICE_LOST, self.device_lost + lost)
+        self._set(_GAP_COUNT, count + 1)
+
+    def set_stream(self, sample_rate, running, markers=False):
+        """Announce a (re)started or stopped stream; starts a new generation."""
+        self._set_float(_SAMPLE_RATE, float(sample_rate))
+        self._set(_FLAGS, (FLAG_RUNNING if running else 0) | (FLAG_MARKERS if markers else 0))
+        self._set(_STREAM_START, self.write_pos)
+        self._set(_GENERATION, self.generation + 1)
+
+    def heartbeat(self):
+        self._set_float(_HEARTBEAT, time.time())
+
+    # ------------------------------------------------------------------
+    # Housekeeping
+    # ------------------------------------------------------------------
+    def take_command(self):
+        """Bytes a reader posted to the mailbox, or None."""
+        seq = self._get(_MAIL_SEQ)
+        if seq == self._get(_MAIL_ACK):
+            return None
+        length = min(self._get(_MAIL_LEN), MAILBOX_SIZE)
+        data = bytes(self._buf[self._mailbox:self._mailbox + length])
+        self._set(_MAIL_ACK, seq)
+        return data
+
+    def reap(self, timeout=READER_TIMEOUT):
+        """
+        Free slots of readers that exited or stayed idle longer than `timeout`.
+
+        An idle reader that comes back claims a new slot and carries on.
+
+        Returns:
+            list: ReaderInfo of the reaped slots
+        """
+        reaped = []
+        for info in self.readers():
+            if info.idle > timeout or not _pid_alive(info.pid):
+                self._set(self._slots + info.slot * SLOT_SIZE, 0)
+                reaped.append(info)
+        return reaped
+
+
+def _pid_alive(pid):
+    if os.name != 'posix':
+        return True     # Windows: rely on the idle timeout
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# ============================================================================
+# Reader side
+# ============================================================================
+class SharedRingReader(_Segment):
+    """
+    Reader side: attaches to a running ring and follows it with its own cursor.
+
+    Args:
+        name (str): Shared memory name of the ring
+        reader_name (str): Label shown in the writer's statistics
+        from_start (bool): Start at the oldest intact byte instead of the
+            current write position
+    """
+
+    def __init__(self, name=DEFAULT_NAME, reader_name='', from_start=False):
+        try:
+            shm = _attach(name)
+        except FileNotFoundError:
+            raise RuntimeError(f"No DC stream ring named {name!r}; is dc_capture_daemon.py running?") from None
+        super().__init__(shm)
+        self.reader_name = reader_name[:24]
+        self.position = self.oldest if from_start else self.write_pos
+        self.lost = 0
+        self.bytes = 0
+        self._slot_index = None
+        self._claim()
+
+    def close(self):
+        """Release the slot and detach. Safe to call more than once."""
+        if self._shm is None:
+            return
+        if self._owns_slot():
+            self._set(self._slot_offset, 0)
+        self._data.release()
+        self._data = None
+        self._buf = None
+        self._shm.close()
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    @property
+    def _slot_offset(self):
+        return self._slots + self._slot_index * SLOT_SIZE
+
+    def _owns_slot(self):
+        return self._slot_index is not None and self._get(self._slot_offset) == os.getpid()
+
+    def _claim(self):
+        pid = os.getpid()
+        for index in range(self.max_readers):
+            offset = self._slots + index * SLOT_SIZE
+            if self._get(offset):
+                continue
+            self._set(offset, pid)
+            time.sleep(0.001)   # Let a racing reader's write land, then check who won
+            if self._get(offset) == pid:
+                self._slot_index = index
+                self._publish()
+                return
+        raise RuntimeError(f"All {self.max_readers} reader slots of {self.name!r} are in use")
+
+    def _publish(self):
+        if not self._owns_slot():
+            self._claim()       # Reaped while idle
+            return
+        _SLOT.pack_into(self._buf, self._slot_offset, os.getpid(), self.position, self.lost,
+                        self.bytes, time.time(), self.reader_name.encode('utf-8')[:24])
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def __len__(self):
+        """Bytes committed and not read yet."""
+        return max(0, self.write_pos - max(self.position, self.oldest))
+
+    def _catch_up(self):
+        oldest = self.oldest
+        if self.position < oldest:
+            self.lost += oldest - self.position
+            self.position = oldest
+
+    def read_view(self, max_size=None):
+        """
+        Oldest unread bytes as one contiguous read-only view (stops at the
+        end of the region). Pass its length to consume() when done.
+        """
+        self._catch_up()
+        start = self.position % self.capacity
+        size = min(self.write_pos - self.position, self.capacity - start)
+        if max_size is not None:
+            size = min(size, max_size)
+        return self._data[start:start + size].toreadonly()
+
+    def read_views(self, max_size=None):
+        """
+        Yield views of everything committed so far (at most two pieces, more
+        if the reader fell behind while iterating). Each view must be passed
+        to consume() before the next one is taken.
+        """
+        end = self.write_pos if max_size is None else min(self.write_pos, self.position + max_size)
+        while self.position < end:
+            view = self.read_view(end - self.position)
+            if not len(view):
+                break
+            yield view
+
+    def consume(self, count):
+        """
+        Release `count` bytes taken through read_view().
+
+        Returns:
+            int: Bytes of them the writer overwrote while they were being read
+                 (already added to `lost`); their contents are unreliable
+        """
+        start = self.position
+        self.position += count
+        self.bytes += count
+        overwritten = min(max(0, self.oldest - start), count)
+        self.lost += overwritten
+        self._publish()
+        return overwritten
+
+    def read_into(self, buffer):
+        """Copy up to len(buffer) unread bytes into `buffer`. Returns the count."""
+        target = memoryview(buffer).cast('B')
+        filled = 0
+        for view in self.read_views(len(target)):
+            target[filled:filled + len(view)] = view
+            filled += len(view)
+            self.consume(len(view))
+        return filled
+
+    def read(self, size=None):
+        """Copy out and consume up to `size` bytes (all if None)."""
+        out = bytearray(len(self) if size is None else min(size, len(self)))
+        return bytes(out[:self.read_into(out)])
+
+    def wait(self, timeout=None, interval=0.002):
+        """Poll until data is available. Returns False on timeout."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while not len(self):
+            if deadline is not None and time.perf_counter() >= deadline:
+                self._publish()
+                return False
+            time.sleep(interval)
+        return True
+
+    def skip(self):
+        """Drop everything committed so far."""
+        self.position = self.write_pos
+        self._publish()
+
+    def send_command(self, data, timeout=1.0):
+        """
+        Post command bytes for the writer to forward to the device.
+
+        Raises:
+            RuntimeError: If the writer did not pick up the previous command
+        """
+        data = bytes(data)
+        if len(data) > MAILBOX_SIZE:
+            raise ValueError(f"Command of {len(data)} bytes exceeds the {MAILBOX_SIZE}-byte mailbox")
+        deadline = time.perf_counter() + timeout
+        while self._get(_MAIL_SEQ) != self._get(_MAIL_ACK):
+            if time.perf_counter() >= deadline:
+                raise RuntimeError(f"Writer of {self.name!r} is not taking commands")
+            time.sleep(0.002)
+        self._buf[self._mailbox:self._mailbox + len(data)] = data
+        self._set(_MAIL_LEN, len(data))
+        self._set(_MAIL_SEQ, self._get(_MAIL_SEQ) + 1)
+        return len(data)
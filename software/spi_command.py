@@ -2,9 +2,10 @@
 # -*- coding: utf-8 -*-
 import argparse
 
+from frame_codec import encode_frame
+
 # --- Configuration Constants ---
 CMD_SPI_WRITE = 0x11
-FRAME_HEADER = [0xAA, 0x55]
 
 def generate_spi_command(write_data: list, read_len: int):
     """
@@ -44,28 +45,14 @@ def generate_spi_command(write_data: list, read_len: int):
     if write_len > 0:
         print(f"  Write Data:   {' '.join(f'0x{b:02X}' for b in write_data)}")
 
-    # 2. Build payload
+    # 2. Build frame
     # Payload format: [write_len, read_len, data0, data1, ...]
-    payload = [write_len, read_len]
-    payload.extend(write_data)
-
-    payload_length = len(payload)  # 2 + write_len
-
-    # 3. Build frame for checksum calculation
-    frame_for_checksum = [
-        CMD_SPI_WRITE,
-        (payload_length >> 8) & 0xFF,  # Length High Byte
-        payload_length & 0xFF,         # Length Low Byte
-    ]
-    frame_for_checksum.extend(payload)
-
-    # 4. Calculate checksum
-    checksum = sum(frame_for_checksum) & 0xFF
+    final_frame = encode_frame(CMD_SPI_WRITE, bytes((write_len, read_len)), bytes(write_data))
 
-    # 5. Assemble final frame
-    final_frame = FRAME_HEADER + frame_for_checksum + [checksum]
+    payload_length = 2 + write_len
+    checksum = final_frame[-1]
 
-    # 6. Format as hex string
+    # 3. Format as hex string
     hex_string = ' '.join(f"{byte:02X}" for byte in final_frame)
 
     print(f"\n  Payload Length: {payload_length} bytes")
@@ -26,6 +26,8 @@ except ImportError:
     print("警告: pyserial 未安装，串口功能不可用")
     print("安装: pip install pyserial")
 
+from device_session import DeviceSession
+
 
 class SPISlaveCommandGenerator:
     """SPI从机命令生成器"""
@@ -238,22 +240,25 @@ def print_command_details(cmd):
     print("="*70 + "\n")
 
 
-def send_via_serial(port, baudrate, cmd, verbose=True):
-    """通过串口发送命令"""
+def send_via_serial(port, baudrate, cmd, verbose=True, session=None):
+    """通过串口发送命令 (传入已打开的 DeviceSession 可避免每条命令重新打开串口)"""
     if not SERIAL_AVAILABLE:
         print("错误: pyserial未安装")
         return False
 
+    if session is None:
+        session = DeviceSession(port, baudrate, flush_on_open=False)
+
     try:
-        with serial.Serial(port, baudrate, timeout=1) as ser:
+        with session:
             if verbose:
-                print(f"串口已打开: {port} @ {baudrate} baud")
-            ser.write(cmd)
+                print(f"串口已打开: {session.port} @ {session.baudrate} baud")
+            session.write(cmd)
             if verbose:
                 print(f"已发送 {len(cmd)} 字节")
             time.sleep(0.1)
-            if ser.in_waiting > 0:
-                response = ser.read(ser.in_waiting)
+            if session.in_waiting > 0:
+                response = session.read()
                 if verbose:
                     print(f"收到响应 ({len(response)} 字节): {response.hex(' ')}")
             return True
@@ -2,6 +2,7 @@
 """
 CDC极限速率测试工具
 通过逐步提高采样率，找到CDC的真正传输极限
+可复现的基准测试 (JSON 输出, 基线对比) 请使用 benchmark.py
 """
 
 import serial
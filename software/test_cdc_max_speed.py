@@ -2,6 +2,7 @@
 """
 CDC最大速率测试工具
 测试USB CDC的真实吞吐能力，排查瓶颈
+可复现的基准测试 (JSON 输出, 基线对比) 请使用 benchmark.py
 """
 
 import serial
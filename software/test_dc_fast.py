@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """
 优化版 DC 测试脚本 - 使用大缓冲区提高接收速率
+可复现的基准测试 (JSON 输出, 基线对比) 请使用 benchmark.py
 """
 
 import serial
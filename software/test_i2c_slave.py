@@ -16,15 +16,29 @@ Usage:
 
 import sys
 import serial
-import time
 from i2c_slave_cdc_test import (
     i2c_slave_write_registers,
     i2c_slave_read_registers,
-    parse_upload_response,
-    print_frame
+    UPLOAD_SOURCE_I2C_SLAVE
 )
+from device_session import DeviceSession
+from command_engine import CommandEngine
 
-def test_full_register_write_read(ser):
+
+def read_registers(engine, read_frame, timeout=2.0):
+    """
+    Send a register read and wait for its upload frame.
+
+    Returns:
+        bytes: The register data of the response, or None on timeout
+    """
+    try:
+        frame = engine.transact(read_frame, UPLOAD_SOURCE_I2C_SLAVE, timeout)
+    except TimeoutError:
+        return None
+    return frame.payload
+
+def test_full_register_write_read(engine):
     """
     Test Case 1: Full Register Write-Read Cycle
     Write all 4 registers and read them back
@@ -33,10 +47,6 @@ def test_full_register_write_read(ser):
     print("TEST CASE 1: Full Register Write-Read Cycle")
     print("="*70)
 
-    # Clear buffers
-    ser.reset_input_buffer()
-    ser.reset_output_buffer()
-
     # Write test data to all registers
     test_data = [0xAA, 0xBB, 0xCC, 0xDD]
     print(f"\nStep 1: Writing test data to Reg[0:3]")
@@ -44,36 +54,26 @@ def test_full_register_write_read(ser):
 
     write_frame = i2c_slave_write_registers(0, test_data)
     print(f"  Command: {write_frame.hex().upper()}")
-    ser.write(write_frame)
-    time.sleep(0.1)
+    engine.send(write_frame)
     print("  ✓ Write command sent")
 
     # Read back all registers
     print(f"\nStep 2: Reading back Reg[0:3]")
     read_frame = i2c_slave_read_registers(0, 4)
     print(f"  Command: {read_frame.hex().upper()}")
-    ser.write(read_frame)
-    time.sleep(0.15)
-
-    # Parse response
-    response = ser.read(100)
-    if not response:
+    data = read_registers(engine, read_frame)
+    if data is None:
         print("  ✗ ERROR: No response received")
         return False
 
-    print(f"  Received: {response.hex().upper()}")
-
-    parsed = parse_upload_response(response)
-    if not parsed['valid']:
-        print(f"  ✗ ERROR: Invalid response - {parsed['error']}")
-        return False
+    print(f"  Received: {data.hex().upper()}")
 
     print(f"  ✓ Valid response received")
     print(f"\nStep 3: Verifying data")
 
     # Verify each register
     all_match = True
-    for i, byte in enumerate(parsed['data']):
+    for i, byte in enumerate(data):
         expected = test_data[i]
         match = byte == expected
         status = "✓" if match else "✗"
@@ -88,7 +88,7 @@ def test_full_register_write_read(ser):
         return False
 
 
-def test_partial_register_write_read(ser):
+def test_partial_register_write_read(engine):
     """
     Test Case 2: Partial Register Write-Read
     Write only Reg[2:3] and read them back
@@ -97,9 +97,6 @@ def test_partial_register_write_read(ser):
     print("TEST CASE 2: Partial Register Write-Read")
     print("="*70)
 
-    ser.reset_input_buffer()
-    ser.reset_output_buffer()
-
     # Write to registers 2 and 3
     test_data = [0x11, 0x22]
     print(f"\nStep 1: Writing test data to Reg[2:3]")
@@ -107,34 +104,25 @@ def test_partial_register_write_read(ser):
 
     write_frame = i2c_slave_write_registers(2, test_data)
     print(f"  Command: {write_frame.hex().upper()}")
-    ser.write(write_frame)
-    time.sleep(0.1)
+    engine.send(write_frame)
     print("  ✓ Write command sent")
 
     # Read back registers 2 and 3
     print(f"\nStep 2: Reading back Reg[2:3]")
     read_frame = i2c_slave_read_registers(2, 2)
     print(f"  Command: {read_frame.hex().upper()}")
-    ser.write(read_frame)
-    time.sleep(0.15)
-
-    response = ser.read(100)
-    if not response:
+    data = read_registers(engine, read_frame)
+    if data is None:
         print("  ✗ ERROR: No response received")
         return False
 
-    print(f"  Received: {response.hex().upper()}")
-
-    parsed = parse_upload_response(response)
-    if not parsed['valid']:
-        print(f"  ✗ ERROR: Invalid response - {parsed['error']}")
-        return False
+    print(f"  Received: {data.hex().upper()}")
 
     print(f"  ✓ Valid response received")
     print(f"\nStep 3: Verifying data")
 
     all_match = True
-    for i, byte in enumerate(parsed['data']):
+    for i, byte in enumerate(data):
         reg_addr = 2 + i
         expected = test_data[i]
         match = byte == expected
@@ -150,7 +138,7 @@ def test_partial_register_write_read(ser):
         return False
 
 
-def test_single_register_operations(ser):
+def test_single_register_operations(engine):
     """
     Test Case 3: Single Register Operations
     Test writing and reading individual registers
@@ -163,8 +151,6 @@ def test_single_register_operations(ser):
     all_passed = True
 
     for reg_addr in range(4):
-        ser.reset_input_buffer()
-        ser.reset_output_buffer()
 
         test_value = test_values[reg_addr]
         print(f"\nTesting Reg[{reg_addr}]")
@@ -172,27 +158,17 @@ def test_single_register_operations(ser):
 
         # Write single register
         write_frame = i2c_slave_write_registers(reg_addr, [test_value])
-        ser.write(write_frame)
-        time.sleep(0.1)
+        engine.send(write_frame)
 
         # Read single register
         read_frame = i2c_slave_read_registers(reg_addr, 1)
-        ser.write(read_frame)
-        time.sleep(0.15)
-
-        response = ser.read(100)
-        if not response:
+        data = read_registers(engine, read_frame)
+        if data is None:
             print(f"  ✗ ERROR: No response")
             all_passed = False
             continue
 
-        parsed = parse_upload_response(response)
-        if not parsed['valid']:
-            print(f"  ✗ ERROR: Invalid response - {parsed['error']}")
-            all_passed = False
-            continue
-
-        read_value = parsed['data'][0]
+        read_value = data[0]
         match = read_value == test_value
         status = "✓" if match else "✗"
         print(f"  {status} Read: 0x{read_value:02X} {'(OK)' if match else f'(Expected 0x{test_value:02X})'}")
@@ -208,7 +184,7 @@ def test_single_register_operations(ser):
         return False
 
 
-def test_boundary_conditions(ser):
+def test_boundary_conditions(engine):
     """
     Test Case 4: Boundary Conditions
     Test edge cases and limits
@@ -221,23 +197,16 @@ def test_boundary_conditions(ser):
 
     # Test 4a: Write maximum values
     print(f"\nTest 4a: Write maximum values (0xFF) to all registers")
-    ser.reset_input_buffer()
-    ser.reset_output_buffer()
 
     max_data = [0xFF, 0xFF, 0xFF, 0xFF]
     write_frame = i2c_slave_write_registers(0, max_data)
-    ser.write(write_frame)
-    time.sleep(0.1)
+    engine.send(write_frame)
 
     read_frame = i2c_slave_read_registers(0, 4)
-    ser.write(read_frame)
-    time.sleep(0.15)
-
-    response = ser.read(100)
-    if response:
-        parsed = parse_upload_response(response)
-        if parsed['valid'] and list(parsed['data']) == max_data:
-            print(f"  ✓ Maximum values OK: {parsed['data'].hex().upper()}")
+    data = read_registers(engine, read_frame)
+    if data is not None:
+        if list(data) == max_data:
+            print(f"  ✓ Maximum values OK: {data.hex().upper()}")
         else:
             print(f"  ✗ Maximum values failed")
             all_passed = False
@@ -247,23 +216,16 @@ def test_boundary_conditions(ser):
 
     # Test 4b: Write minimum values
     print(f"\nTest 4b: Write minimum values (0x00) to all registers")
-    ser.reset_input_buffer()
-    ser.reset_output_buffer()
 
     min_data = [0x00, 0x00, 0x00, 0x00]
     write_frame = i2c_slave_write_registers(0, min_data)
-    ser.write(write_frame)
-    time.sleep(0.1)
+    engine.send(write_frame)
 
     read_frame = i2c_slave_read_registers(0, 4)
-    ser.write(read_frame)
-    time.sleep(0.15)
-
-    response = ser.read(100)
-    if response:
-        parsed = parse_upload_response(response)
-        if parsed['valid'] and list(parsed['data']) == min_data:
-            print(f"  ✓ Minimum values OK: {parsed['data'].hex().upper()}")
+    data = read_registers(engine, read_frame)
+    if data is not None:
+        if list(data) == min_data:
+            print(f"  ✓ Minimum values OK: {data.hex().upper()}")
         else:
             print(f"  ✗ Minimum values failed")
             all_passed = False
@@ -273,23 +235,16 @@ def test_boundary_conditions(ser):
 
     # Test 4c: Write to last register
     print(f"\nTest 4c: Write to last register only (Reg[3])")
-    ser.reset_input_buffer()
-    ser.reset_output_buffer()
 
     last_reg_data = [0xEE]
     write_frame = i2c_slave_write_registers(3, last_reg_data)
-    ser.write(write_frame)
-    time.sleep(0.1)
+    engine.send(write_frame)
 
     read_frame = i2c_slave_read_registers(3, 1)
-    ser.write(read_frame)
-    time.sleep(0.15)
-
-    response = ser.read(100)
-    if response:
-        parsed = parse_upload_response(response)
-        if parsed['valid'] and parsed['data'][0] == 0xEE:
-            print(f"  ✓ Last register OK: 0x{parsed['data'][0]:02X}")
+    data = read_registers(engine, read_frame)
+    if data is not None:
+        if data[0] == 0xEE:
+            print(f"  ✓ Last register OK: 0x{data[0]:02X}")
         else:
             print(f"  ✗ Last register failed")
             all_passed = False
@@ -305,7 +260,7 @@ def test_boundary_conditions(ser):
         return False
 
 
-def test_sequential_pattern(ser):
+def test_sequential_pattern(engine):
     """
     Test Case 5: Sequential Pattern Test
     Write sequential values and verify
@@ -314,37 +269,25 @@ def test_sequential_pattern(ser):
     print("TEST CASE 5: Sequential Pattern Test")
     print("="*70)
 
-    ser.reset_input_buffer()
-    ser.reset_output_buffer()
-
     # Write sequential pattern
     pattern = [0x01, 0x02, 0x04, 0x08]
     print(f"\nStep 1: Writing sequential pattern: {' '.join(f'0x{b:02X}' for b in pattern)}")
 
     write_frame = i2c_slave_write_registers(0, pattern)
-    ser.write(write_frame)
-    time.sleep(0.1)
+    engine.send(write_frame)
     print("  ✓ Pattern written")
 
     # Read back
     print(f"\nStep 2: Reading back pattern")
     read_frame = i2c_slave_read_registers(0, 4)
-    ser.write(read_frame)
-    time.sleep(0.15)
-
-    response = ser.read(100)
-    if not response:
+    data = read_registers(engine, read_frame)
+    if data is None:
         print("  ✗ ERROR: No response")
         return False
 
-    parsed = parse_upload_response(response)
-    if not parsed['valid']:
-        print(f"  ✗ ERROR: Invalid response - {parsed['error']}")
-        return False
-
-    print(f"  ✓ Response received: {parsed['data'].hex().upper()}")
+    print(f"  ✓ Response received: {data.hex().upper()}")
 
-    if list(parsed['data']) == pattern:
+    if list(data) == pattern:
         print(f"\n  ✓ TEST 5 PASSED: Sequential pattern verified!")
         return True
     else:
@@ -376,7 +319,7 @@ def main():
 
     # Try to open serial port
     try:
-        ser = serial.Serial(port, baudrate, timeout=2)
+        session = DeviceSession(port, baudrate, timeout=2).open()
         print(f"\n✓ Serial port opened successfully")
     except serial.SerialException as e:
         print(f"\n✗ Failed to open serial port: {e}")
@@ -390,20 +333,12 @@ def main():
     results = {}
 
     try:
-        with ser:
-            results['test1'] = test_full_register_write_read(ser)
-            time.sleep(0.2)
-
-            results['test2'] = test_partial_register_write_read(ser)
-            time.sleep(0.2)
-
-            results['test3'] = test_single_register_operations(ser)
-            time.sleep(0.2)
-
-            results['test4'] = test_boundary_conditions(ser)
-            time.sleep(0.2)
-
-            results['test5'] = test_sequential_pattern(ser)
+        with session, CommandEngine(session, default_timeout=2.0) as engine:
+            results['test1'] = test_full_register_write_read(engine)
+            results['test2'] = test_partial_register_write_read(engine)
+            results['test3'] = test_single_register_operations(engine)
+            results['test4'] = test_boundary_conditions(engine)
+            results['test5'] = test_sequential_pattern(engine)
 
     except KeyboardInterrupt:
         print("\n\n✗ Test interrupted by user")
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+Transition (Run-Length) Storage for FPGA2025 Logic Captures
+===========================================================
+
+Digital Capture data is mostly long runs of the same byte. Instead of one
+byte per sample, a capture is stored as transition records: the sample
+index where the 8-bit value changes and the new value. A slow bus sampled
+at MHz rates shrinks by orders of magnitude, and edges, statistics and
+protocol decoders can work on the records without expanding them.
+
+In memory:
+    starts (uint64)  sample index of each record; starts[0] is the first
+                     sample, later records mark a change of value
+    values (uint8)   sample value from starts[i] up to starts[i+1]
+    total (int)      number of samples covered (end of the last record)
+
+File layout (.dtr, little-endian):
+    [0, HEADER_SIZE)   header (see HEADER_FORMAT), rest zero
+    blocks             per block: run lengths (uint32 x n), values (uint8 x n)
+    block index        per block: (first sample u64, file offset u64, n u32)
+
+    Blocks hold at most `block_records` records and are found by binary
+    search in the block index, so any sample range is decoded by reading
+    only the blocks that cover it. Runs longer than 2**32 - 1 samples are
+    split into several records with the same value.
+
+Typical usage:
+    from transitions import TransitionWriter, TransitionFile
+
+    with TransitionWriter('bus.dtr', sample_rate=10e6) as out:
+        for block in blocks:
+            out.write(block)
+
+    with TransitionFile('bus.dtr') as dtr:
+        raw = dtr.decode(1_000_000, 2_000_000)
+        edges, levels = channel_edges(*dtr.transitions(), ch=3)
+
+Command line:
+    python transitions.py capture.dcap capture.dtr    convert a recording
+    python transitions.py capture.dtr                 print file summary
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+from logic_stats import CHANNELS, ChannelStats
+
+MAGIC = b'DTRN\r\n\x1a\n'
+VERSION = 1
+HEADER_SIZE = 4096
+# magic, version, channel_mask, sample_rate, start_time, total_samples,
+# record_count, block_count, index_offset, block_records
+HEADER_FORMAT = '<8sHB x d d Q Q I Q I'
+INDEX_FORMAT = '<QQI'
+DEFAULT_BLOCK_RECORDS = 64 * 1024
+MAX_RUN = 0xFFFFFFFF
+
+_HEADER = struct.Struct(HEADER_FORMAT)
+_INDEX = struct.Struct(INDEX_FORMAT)
+
+
+# ============================================================================
+# Encoding / decoding in memory
+# ============================================================================
+def encode_transitions(samples, base=0, previous=None):
+    """
+    Turn raw samples into transition records.
+
+    Args:
+        samples (bytes-like or numpy.ndarray): uint8 samples
+        base (int): Sample index of samples[0]
+        previous (int): Value of the sample before samples[0]; if equal to
+            samples[0] no record is emitted for it (None: always emit)
+
+    Returns:
+        tuple: (starts uint64 array, values uint8 array)
+    """
+    data = np.frombuffer(samples, dtype=np.uint8) if not isinstance(samples, np.ndarray) else samples
+    if not len(data):
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint8)
+    change = np.empty(len(data), dtype=bool)
+    change[0] = previous is None or int(data[0]) != previous
+    np.not_equal(data[1:], data[:-1], out=change[1:])
+    positions = np.flatnonzero(change)
+    return positions.astype(np.uint64) + np.uint64(base), data[positions]
+
+
+def decode_transitions(starts, values, total, start=0, stop=None):
+    """
+    Expand transition records back into raw samples.
+
+    Args:
+        starts, values: Transition records (see module docstring)
+        total (int): Samples covered by the records
+        start, stop (int): Sample range to decode (default: everything)
+
+    Returns:
+        numpy.ndarray: uint8 samples [start, stop)
+    """
+    stop = total if stop is None else min(stop, total)
+    if stop <= start or not len(starts):
+        return np.zeros(0, dtype=np.uint8)
+    starts = np.asarray(starts, dtype=np.int64)
+    first = max(int(np.searchsorted(starts, start, side='right')) - 1, 0)
+    last = int(np.searchsorted(starts, stop, side='left'))
+    bounds = np.clip(starts[first:last], start, stop)
+    lengths = np.diff(np.append(bounds, stop))
+    return np.repeat(values[first:last], lengths).astype(np.uint8, copy=False)
+
+
+def channel_edges(starts, values, ch, total=None):
+    """
+    Edges of one channel, computed from transition records only.
+
+    Args:
+        starts, values: Transition records
+        ch (int): Channel number (0..7)
+
+    Returns:
+        tuple: (edge sample indices int64, level after each edge uint8);
+            the first entry is the level at starts[0], not an edge
+    """
+    bits = (np.asarray(values) >> ch) & 1
+    if not len(bits):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint8)
+    keep = np.empty(len(bits), dtype=bool)
+    keep[0] = True
+    np.not_equal(bits[1:], bits[:-1], out=keep[1:])
+    return np.asarray(starts, dtype=np.int64)[keep], bits[keep].astype(np.uint8)
+
+
+def step_points(edges, levels, stop):
+    """
+    Polyline of a digital trace built from its edges only.
+
+    Every level becomes one horizontal segment and every edge one vertical
+    segment, so the number of points follows the edges, not the samples;
+    the result is drawn as a plain line (no steps drawstyle).
+
+    Args:
+        edges: Edge positions, ascending; edges[0] is where the trace starts
+            (as returned by channel_edges)
+        levels: Level after each edge
+        stop: Position where the trace ends
+
+    Returns:
+        tuple: (xs, ys) with 2 * len(edges) points
+    """
+    count = len(edges)
+    xs = np.empty(2 * count, dtype=np.result_type(np.asarray(edges).dtype, np.int64))
+    if not count:
+        return xs, np.zeros(0, dtype=np.uint8)
+    xs[0::2] = edges
+    xs[1:-1:2] = edges[1:]
+    xs[-1] = stop
+    return xs, np.repeat(levels, 2)
+
+
+def transition_stats(starts, values, total, sample_rate=0, channels=CHANNELS):
+    """
+    Per-channel statistics straight from transition records.
+
+    Returns the same logic_stats.ChannelStats as logic_stats.analyze().
+    """
+    rate = sample_rate or 1
+    results = []
+    for ch in range(channels):
+        positions, levels = channel_edges(starts, values, ch)
+        samples = total - (int(positions[0]) if len(positions) else total)
+        ends = np.append(positions[1:], total)
+        runs = ends - positions
+        high = int(runs[levels == 1].sum())
+        edges, after = positions[1:], levels[1:]
+        widths = np.diff(edges)
+        high_w, low_w = widths[after[:-1] == 1], widths[after[:-1] == 0]
+        rises = edges[after == 1]
+        if len(rises) >= 2:
+            frequency = (len(rises) - 1) * rate / int(rises[-1] - rises[0])
+        elif len(edges) and samples:
+            frequency = len(edges) / 2 * rate / samples
+        else:
+            frequency = 0.0
+        results.append(ChannelStats(
+            channel=ch,
+            samples=samples,
+            high=high,
+            duty_cycle=high / samples if samples else 0.0,
+            transitions=len(edges),
+            rising=len(rises),
+            high_min=int(high_w.min()) if len(high_w) else None,
+            high_max=int(high_w.max()) if len(high_w) else None,
+            high_mean=float(high_w.mean()) if len(high_w) else None,
+            low_min=int(low_w.min()) if len(low_w) else None,
+            low_max=int(low_w.max()) if len(low_w) else None,
+            low_mean=float(low_w.mean()) if len(low_w) else None,
+            frequency=frequency,
+        ))
+    return results
+
+
+# ============================================================================
+# File writer
+# ============================================================================
+class TransitionWriter:
+    """
+    Encodes raw sample blocks into a .dtr file as they arrive.
+
+    Args:
+        path (str): Output file (overwritten)
+        sample_rate (float): Sample rate in Hz
+        channel_mask (int): Channels that carry signals
+        start_time (float): Unix time of the first sample (default: now)
+        block_records (int): Records per file block
+    """
+
+    def __init__(self, path, sample_rate=0, channel_mask=0xFF, start_time=None,
+                 block_records=DEFAULT_BLOCK_RECORDS):
+        if block_records <= 0:
+            raise ValueError(f"block_records must be positive, got {block_records}")
+        self.path = path
+        self.sample_rate = float(sample_rate)
+        self.channel_mask = channel_mask
+        self.start_time = time.time() if start_time is None else start_time
+        self.block_records = block_records
+
+        self.total = 0              # Samples seen
+        self.records = 0            # Records written to blocks
+        self._index = []            # (first sample, offset, count)
+        self._starts = []           # Pending record chunks (not yet in a block)
+        self._values = []
+        self._pending = 0
+        self._last = None           # Value of the last sample seen
+        self._file = open(path, 'w+b')
+        self._file.write(bytes(HEADER_SIZE))
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def write(self, samples):
+        """Encode a block of raw samples."""
+        if self._closed:
+            raise RuntimeError("Transition file is closed")
+        data = np.frombuffer(samples, dtype=np.uint8) if not isinstance(samples, np.ndarray) else samples
+        if not len(data):
+            return
+        starts, values = encode_transitions(data, self.total, self._last)
+        self.total += len(data)
+        self._last = int(data[-1])
+        if len(starts):
+            self._starts.append(starts)
+            self._values.append(values)
+            self._pending += len(starts)
+        # Keep one record back: its run length is only known at the next change
+        while self._pending > self.block_records:
+            self._write_block(self.block_records)
+
+    def _take(self, count):
+        starts = np.concatenate(self._starts)
+        values = np.concatenate(self._values)
+        self._starts, self._values = [starts[count:]], [values[count:]]
+        self._pending = len(starts) - count
+        return starts[:count + 1], values[:count]
+
+    def _write_block(self, count, end=None):
+        # starts has count + 1 entries (the next record's start ends the
+        # last run) unless this is the final block, which ends at `end`
+        starts, values = self._take(count)
+        if len(starts) == count:
+            starts = np.append(starts, np.uint64(end))
+        lengths = np.diff(starts.astype(np.int64))
+        if lengths.max(initial=0) > MAX_RUN:
+            starts, values = self._split_runs(starts, values)
+            lengths = np.diff(starts.astype(np.int64))
+        offset = self._file.tell()
+        self._file.write(lengths.astype('<u4').tobytes())
+        self._file.write(values.tobytes())
+        self._index.append((int(starts[0]), offset, len(values)))
+        self.records += len(values)
+
+    @staticmethod
+    def _split_runs(starts, values):
+        new_starts, new_values = [], []
+        for begin, end, value in zip(starts[:-1].tolist(), starts[1:].tolist(), values.tolist()):
+            for piece in range(begin, end, MAX_RUN):
+                new_starts.append(piece)
+                new_values.append(value)
+        new_starts.append(int(starts[-1]))
+        return np.array(new_starts, dtype=np.uint64), np.array(new_values, dtype=np.uint8)
+
+    def close(self):
+        """Write the remaining records, the block index and the header."""
+        if self._closed:
+            return
+        self._closed = True
+        while self._pending > self.block_records:
+            self._write_block(self.block_records)
+        if self._pending:
+            self._write_block(self._pending, end=self.total)
+        index_offset = self._file.tell()
+        for entry in self._index:
+            self._file.write(_INDEX.pack(*entry))
+        header = _HEADER.pack(MAGIC, VERSION, self.channel_mask, self.sample_rate,
+                              self.start_time, self.total, self.records, len(self._index),
+                              index_offset, self.block_records)
+        self._file.seek(0)
+        self._file.write(header)
+        self._file.close()
+
+    @property
+    def compression_ratio(self):
+        """Raw bytes per stored byte so far (records cost 5 bytes each)."""
+        stored = 5 * (self.records + self._pending) or 1
+        return self.total / stored
+
+
+# ============================================================================
+# File reader
+# ============================================================================
+class TransitionFile:
+    """
+    Memory-mapped, seekable reader for .dtr files.
+
+    Attributes:
+        sample_rate (float): Hz (0 if unknown)
+        start_time (float): Unix time of the first sample
+        total (int): Samples covered
+        records (int): Transition records stored
+        block_starts (numpy.ndarray): First sample of each block
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        head = self._map[:_HEADER.size]
+        if head[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a transition file")
+        (_, self.version, self.channel_mask, self.sample_rate, self.start_time, self.total,
+         self.records, block_count, index_offset, self.block_records) = _HEADER.unpack(head)
+        index = np.frombuffer(self._map, dtype=np.dtype([('first', '<u8'), ('offset', '<u8'),
+                                                         ('count', '<u4')]),
+                              count=block_count, offset=index_offset)
+        self.block_starts = index['first'].astype(np.int64)
+        self._offsets = index['offset'].astype(np.int64)
+        self._counts = index['count'].astype(np.int64)
+
+    def __len__(self):
+        return self.total
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    @property
+    def compression_ratio(self):
+        return self.total / max(os.path.getsize(self.path), 1)
+
+    def block(self, index):
+        """
+        Records of one block.
+
+        Returns:
+            tuple: (starts uint64, values uint8)
+        """
+        count, offset = int(self._counts[index]), int(self._offsets[index])
+        lengths = np.frombuffer(self._map, dtype='<u4', count=count, offset=offset)
+        values = np.frombuffer(self._map, dtype=np.uint8, count=count, offset=offset + 4 * count)
+        starts = np.empty(count, dtype=np.uint64)
+        starts[0] = self.block_starts[index]
+        np.cumsum(lengths[:-1], out=starts[1:])
+        starts[1:] += np.uint64(self.block_starts[index])
+        return starts, values
+
+    def transitions(self, start=0, stop=None):
+        """
+        Records covering samples [start, stop), reading only those blocks.
+
+        Returns:
+            tuple: (starts uint64, values uint8)
+        """
+        stop = self.total if stop is None else min(stop, self.total)
+        if stop <= start or not len(self.block_starts):
+            return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint8)
+        first = max(int(np.searchsorted(self.block_starts, start, side='right')) - 1, 0)
+        last = int(np.searchsorted(self.block_starts, stop, side='left'))
+        parts = [self.block(i) for i in range(first, last)]
+        starts = np.concatenate([p[0] for p in parts])
+        values = np.concatenate([p[1] for p in parts])
+        return starts, values
+
+    def decode(self, start=0, stop=None):
+        """Raw uint8 samples [start, stop)."""
+        starts, values = self.transitions(start, stop)
+        return decode_transitions(starts, values, self.total, start, stop)
+
+    def statistics(self, channels=CHANNELS):
+        """logic_stats.ChannelStats per channel, computed from the records."""
+        starts, values = self.transitions()
+        return transition_stats(starts, values, self.total, self.sample_rate, channels)
+
+    def close(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass    # Arrays from block() still alive; unmapped when released
+            self._map = None
+        self._file.close()
+
+
+def convert_capture(capture, path, block_size=4 * 1024 * 1024):
+    """
+    Encode a capture_file.CaptureFile into a .dtr file, block by block.
+
+    Returns:
+        TransitionWriter: The closed writer (for records / ratio)
+    """
+    writer = TransitionWriter(path, capture.sample_rate, capture.channel_mask, capture.start_time)
+    with writer:
+        for start in range(0, len(capture.samples), block_size):
+            writer.write(capture.samples[start:start + block_size])
+    return writer
+
+
+# ============================================================================
+# Main
+# ============================================================================
+def main():
+    parser = argparse.ArgumentParser(description="Convert / inspect transition files")
+    parser.add_argument('input', help=".dcap/.bin recording or .dtr file")
+    parser.add_argument('output', nargs='?', help="Write a .dtr file from the recording")
+    args = parser.parse_args()
+
+    if args.output:
+        from capture_file import CaptureFile
+        with CaptureFile(args.input) as capture:
+            writer = convert_capture(capture, args.output)
+        print(f"{writer.total:,} samples -> {writer.records:,} records "
+              f"({os.path.getsize(args.output):,} bytes, {writer.total / max(os.path.getsize(args.output), 1):.1f}x)")
+        return 0
+
+    with TransitionFile(args.input) as dtr:
+        print(f"{dtr.total:,} samples, {dtr.records:,} records, {len(dtr.block_starts)} blocks, "
+              f"{dtr.sample_rate:,.0f} Hz, {dtr.compression_ratio:.1f}x")
+        for stats in dtr.statistics():
+            print(f"CH{stats.channel}: duty {stats.duty_cycle * 100:5.1f}%  "
+                  f"edges {stats.transitions:<10} {stats.frequency:,.2f} Hz")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
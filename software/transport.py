@@ -0,0 +1,945 @@
+#!/usr/bin/env python3
+"""
+Transport Layer for FPGA2025
+============================
+
+One byte-pipe interface with interchangeable backends, so the tools do not
+care whether they talk to the board through the CDC serial port, directly to
+the bulk endpoints through libusb, or to an in-process loopback:
+
+    SerialTransport     USB-CDC (or any pyserial URL such as 'loop://')
+    UsbTransport        pyusb bulk: commands on EP 0x02 OUT, upload frames on
+                        EP 0x82 IN, Digital Capture stream on EP 0x83 IN
+    AsyncUsbTransport   same endpoints through python-libusb1, with several
+                        bulk transfers kept queued on EP 0x83
+    LoopbackTransport   in-memory; echoes writes or hands them to an attached
+                        device model, no hardware needed
+    SharedStreamTransport
+                        DC stream published by dc_capture_daemon.py in shared
+                        memory; several tools can read it at once
+
+Every transport has two receive channels:
+
+    read()          command responses / upload frames
+    read_stream()   Digital Capture samples
+
+On the CDC port both are the same byte stream; on raw USB they are separate
+endpoints, which is why the DC tools always use read_stream().
+
+Timeouts are in seconds everywhere. A read that times out returns b'' instead
+of raising, for every backend.
+
+Transport specs (create_transport):
+    'usb', 'usb:33AA:0000'  UsbTransport (optionally with VID:PID in hex)
+    'usb-async', 'usb-async:16:524288'
+                            AsyncUsbTransport (optionally with queue depth and
+                            transfer size in bytes)
+    'loop', 'loopback'      LoopbackTransport (echo)
+    'emu', 'emulator'       LoopbackTransport with fpga_emulator.FpgaEmulator
+    'shm', 'shm:NAME'       SharedStreamTransport (ring name of the daemon)
+    'auto'                  UsbTransport if the board is found, else the
+                            first serial port
+    anything else           SerialTransport (port name or pyserial URL)
+
+Typical usage:
+    from transport import create_transport
+
+    with create_transport('usb') as link:
+        link.write(start_frame)
+        samples = link.read_stream(65536, timeout=0.1)
+"""
+
+import array
+import threading
+import time
+
+try:
+    import serial
+    import serial.tools.list_ports
+    SERIAL_AVAILABLE = True
+except ImportError:
+    SERIAL_AVAILABLE = False
+
+try:
+    import usb.core
+    import usb.util
+    USB_AVAILABLE = True
+except ImportError:
+    USB_AVAILABLE = False
+
+try:
+    import usb1   # python-libusb1, needed for asynchronous transfers
+    USB1_AVAILABLE = True
+except ImportError:
+    USB1_AVAILABLE = False
+
+# USB 设备标识 (根据 usb_descriptor.v 配置)
+USB_VID = 0x33AA
+USB_PID = 0x0000
+
+# Endpoint 地址
+EP_CTRL_OUT = 0x02  # EP2 OUT - 命令发送
+EP_DATA_IN = 0x82   # EP2 IN  - 上传帧 / 通用数据
+EP_DC_IN = 0x83     # EP3 IN  - Digital Capture 数据
+
+DEFAULT_BAUDRATE = 115200  # Ignored by USB-CDC, kept for serial.Serial
+DEFAULT_TIMEOUT = 1.0
+USB_READ_SIZE = 16384      # Default bulk read request (multiple of 512)
+EMULATOR_STREAM_LIMIT = 16 * 1024 * 1024  # Stream FIFO of the 'emu' spec
+RESET_DRAIN_TIME = 0.05                   # reset_input() stops draining after this long ...
+RESET_DRAIN_LIMIT = 1024 * 1024           # ... or this many bytes (a running DC stream never runs dry)
+ASYNC_DEPTH = 8                           # Bulk transfers kept queued on EP 0x83
+ASYNC_TRANSFER_SIZE = 256 * 1024          # Bytes per queued transfer
+ASYNC_QUEUE_LIMIT = 64 * 1024 * 1024      # Completed samples buffered for the reader
+
+_USB_TIMEOUT_ERRNOS = (110, 116, None)  # What the pyusb backends report for a timeout
+
+
+# ============================================================================
+# Base class
+# ============================================================================
+class Transport:
+    """
+    Byte pipe to the FPGA. Subclasses implement the _open/_close/_write/
+    _read/_read_stream hooks; the public methods add statistics.
+
+    Attributes:
+        name (str): Human-readable endpoint description
+        bytes_written (int): Total bytes written
+        bytes_read (int): Total bytes received on the response channel
+        stream_bytes (int): Total bytes received on the stream channel
+    """
+
+    kind = 'base'
+
+    def __init__(self, name, timeout=DEFAULT_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self.stream_bytes = 0
+
+    def __repr__(self):
+        state = 'open' if self.is_open else 'closed'
+        return f"{type(self).__name__}({self.name!r}, {state})"
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    @property
+    def is_open(self):
+        raise NotImplementedError
+
+    def open(self):
+        """Open the link if it is not open yet. Returns self."""
+        if not self.is_open:
+            self._open()
+        return self
+
+    def close(self):
+        """Close the link. Safe to call more than once."""
+        if self.is_open:
+            self._close()
+
+    def _require_open(self):
+        if not self.is_open:
+            raise RuntimeError(f"Transport {self.name} is not open")
+
+    # ------------------------------------------------------------------
+    # I/O
+    # ------------------------------------------------------------------
+    def write(self, data):
+        """Write command bytes. Returns the number of bytes written."""
+        self._require_open()
+        written = self._write(data)
+        self.bytes_written += written
+        return written
+
+    def read(self, size=None, timeout=None):
+        """
+        Read from the response channel.
+
+        Args:
+            size (int): Maximum bytes to return; None returns whatever is
+                available once at least one byte arrived
+            timeout (float): Seconds to wait (default: transport timeout)
+
+        Returns:
+            bytes: Data read, b'' on timeout
+        """
+        self._require_open()
+        data = self._read(size, self.timeout if timeout is None else timeout)
+        self.bytes_read += len(data)
+        return data
+
+    def read_stream(self, size, timeout=None):
+        """
+        Read Digital Capture samples (EP 0x83 on raw USB).
+
+        Args:
+            size (int): Maximum bytes to return
+            timeout (float): Seconds to wait (default: transport timeout)
+
+        Returns:
+            bytes: Samples read, b'' on timeout
+        """
+        self._require_open()
+        data = self._read_stream(size, self.timeout if timeout is None else timeout)
+        self.stream_bytes += len(data)
+        return data
+
+    def read_stream_into(self, buffer, timeout=None):
+        """
+        Read Digital Capture samples into a writable buffer.
+
+        Returns:
+            int: Number of bytes stored at the start of buffer
+        """
+        view = memoryview(buffer).cast('B')
+        data = self.read_stream(len(view), timeout)
+        view[:len(data)] = data
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        """Bytes known to be waiting on the response channel (0 if unknown)."""
+        return 0
+
+    def reset_input(self):
+        """Drop unread data on both receive channels."""
+        self._require_open()
+        self._reset_input()
+
+    # ------------------------------------------------------------------
+    # Backend hooks
+    # ------------------------------------------------------------------
+    def _open(self):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+    def _write(self, data):
+        raise NotImplementedError
+
+    def _read(self, size, timeout):
+        raise NotImplementedError
+
+    def _read_stream(self, size, timeout):
+        raise NotImplementedError
+
+    def _reset_input(self):
+        raise NotImplementedError
+
+
+# ============================================================================
+# USB-CDC serial port
+# ============================================================================
+class SerialTransport(Transport):
+    """
+    USB-CDC virtual COM port. Responses and DC samples share one stream.
+
+    Args:
+        port (str): Port name ('COM3', '/dev/ttyACM0') or pyserial URL
+        baudrate (int): Passed to pyserial (ignored by CDC)
+        timeout (float): Default read timeout in seconds
+    """
+
+    kind = 'serial'
+
+    def __init__(self, port, baudrate=DEFAULT_BAUDRATE, timeout=DEFAULT_TIMEOUT):
+        super().__init__(port, timeout)
+        self.port = port
+        self.baudrate = baudrate
+        self._ser = None
+
+    @property
+    def is_open(self):
+        return self._ser is not None and self._ser.is_open
+
+    def _open(self):
+        if not SERIAL_AVAILABLE:
+            raise RuntimeError("pyserial is not installed (pip install pyserial)")
+        # serial_for_url also accepts pyserial URLs such as 'loop://' or 'socket://host:port'
+        self._ser = serial.serial_for_url(self.port, self.baudrate, timeout=self.timeout)
+
+    def _close(self):
+        self._ser.close()
+        self._ser = None
+
+    def _write(self, data):
+        return self._ser.write(data)
+
+    def _read(self, size, timeout):
+        ser = self._ser
+        if ser.timeout != timeout:
+            # Changing the timeout reconfigures the port; callers polling
+            # with a fixed timeout only pay for it once
+            ser.timeout = timeout
+        return ser.read(size if size is not None else (ser.in_waiting or 1))
+
+    def _read_stream(self, size, timeout):
+        ser = self._ser
+        if ser.timeout != timeout:
+            ser.timeout = timeout
+        # Take everything that is already buffered (up to size) in one call
+        return ser.read(min(size, max(ser.in_waiting, 1)))
+
+    @property
+    def in_waiting(self):
+        self._require_open()
+        return self._ser.in_waiting
+
+    def _reset_input(self):
+        self._ser.reset_input_buffer()
+
+
+# ============================================================================
+# Raw USB bulk endpoints (pyusb / libusb)
+# ============================================================================
+def get_usb_backends():
+    """
+    List usable pyusb backends in order of preference.
+
+    Returns:
+        list: (name, backend) pairs; libusb1 (WinUSB capable) first
+    """
+    backends = []
+    if not USB_AVAILABLE:
+        return backends
+    for name in ('libusb1', 'libusb0', 'openusb'):
+        try:
+            module = __import__(f'usb.backend.{name}', fromlist=['get_backend'])
+            backend = module.get_backend()
+            if backend:
+                backends.append((name, backend))
+        except Exception:
+            continue
+    return backends
+
+
+def list_usb_devices(vid=USB_VID, pid=USB_PID):
+    """
+    Find all boards on the first backend that sees any.
+
+    Returns:
+        tuple: (devices, backend_name); ([], None) if nothing was found
+    """
+    for name, backend in get_usb_backends():
+        try:
+            devices = list(usb.core.find(find_all=True, idVendor=vid, idProduct=pid, backend=backend))
+        except Exception:
+            continue
+        if devices:
+            return devices, name
+    return [], None
+
+
+def usb_device_strings(dev):
+    """Return (manufacturer, product, serial number), 'N/A' where unreadable."""
+    result = []
+    for index in (dev.iManufacturer, dev.iProduct, dev.iSerialNumber):
+        try:
+            result.append(usb.util.get_string(dev, index) if index else "N/A")
+        except Exception:
+            result.append("N/A")
+    return tuple(result)
+
+
+def _is_usb_timeout(exc):
+    errno = getattr(exc, 'errno', None)
+    return errno in _USB_TIMEOUT_ERRNOS or 'timed out' in str(exc).lower() \
+        or isinstance(exc, getattr(usb.core, 'USBTimeoutError', ()))
+
+
+def _drain(read, timeout=0.005):
+    """
+    Call read(timeout) until it returns nothing, RESET_DRAIN_TIME passed or
+    RESET_DRAIN_LIMIT bytes were dropped, whichever comes first.
+    """
+    deadline = time.monotonic() + RESET_DRAIN_TIME
+    dropped = 0
+    while dropped < RESET_DRAIN_LIMIT and time.monotonic() < deadline:
+        count = len(read(timeout))
+        if not count:
+            break
+        dropped += count
+    return dropped
+
+
+class UsbTransport(Transport):
+    """
+    Direct bulk transfers through libusb (needs the WinUSB driver on Windows).
+
+    Args:
+        vid (int): USB vendor ID
+        pid (int): USB product ID
+        device (usb.core.Device): Use this device instead of searching
+        timeout (float): Default read timeout in seconds
+        write_timeout (float): Timeout for bulk OUT transfers in seconds
+    """
+
+    kind = 'usb'
+
+    def __init__(self, vid=USB_VID, pid=USB_PID, device=None, timeout=DEFAULT_TIMEOUT,
+                 write_timeout=1.0):
+        super().__init__(f"usb {vid:04X}:{pid:04X}", timeout)
+        self.vid = vid
+        self.pid = pid
+        self.write_timeout = write_timeout
+        self.backend_name = None
+        self.dev = device
+        self._opened = False
+        self._scratch = None    # array('B') for read_stream_into() on other buffers
+
+    @property
+    def is_open(self):
+        return self._opened
+
+    def _open(self):
+        if not USB_AVAILABLE:
+            raise RuntimeError("pyusb is not installed (pip install pyusb)")
+        if self.dev is None:
+            devices, self.backend_name = list_usb_devices(self.vid, self.pid)
+            if not devices:
+                raise RuntimeError(f"USB device {self.vid:04X}:{self.pid:04X} not found")
+            self.dev = devices[0]
+
+        # Windows 下不支持分离内核驱动, 忽略
+        try:
+            if self.dev.is_kernel_driver_active(0):
+                self.dev.detach_kernel_driver(0)
+        except (NotImplementedError, AttributeError, usb.core.USBError):
+            pass
+        try:
+            self.dev.set_configuration()
+        except usb.core.USBError:
+            # 配置可能已经设置
+            pass
+        self._opened = True
+
+    def _close(self):
+        usb.util.dispose_resources(self.dev)
+        self._opened = False
+
+    def _write(self, data):
+        return self.dev.write(EP_CTRL_OUT, data, timeout=int(self.write_timeout * 1000))
+
+    def _bulk_read(self, endpoint, size, timeout):
+        try:
+            return bytes(self.dev.read(endpoint, size, timeout=max(1, int(timeout * 1000))))
+        except usb.core.USBError as exc:
+            if _is_usb_timeout(exc):
+                return b''
+            raise
+
+    def _read(self, size, timeout):
+        return self._bulk_read(EP_DATA_IN, size or USB_READ_SIZE, timeout)
+
+    def _read_stream(self, size, timeout):
+        return self._bulk_read(EP_DC_IN, size, timeout)
+
+    def read_stream_into(self, buffer, timeout=None):
+        # pyusb fills an array('B') directly, saving one copy; other buffers
+        # (memoryview, NumPy) go through a reused scratch array
+        self._require_open()
+        timeout = self.timeout if timeout is None else timeout
+        direct = isinstance(buffer, array.array) and buffer.typecode == 'B'
+        if direct:
+            target = buffer
+        else:
+            view = memoryview(buffer).cast('B')
+            if self._scratch is None or len(self._scratch) != len(view):
+                self._scratch = array.array('B', bytes(len(view)))
+            target = self._scratch
+        try:
+            count = self.dev.read(EP_DC_IN, target, timeout=max(1, int(timeout * 1000)))
+        except usb.core.USBError as exc:
+            if _is_usb_timeout(exc):
+                return 0
+            raise
+        if not direct:
+            view[:count] = memoryview(target)[:count]
+        self.stream_bytes += count
+        return count
+
+    def _reset_input(self):
+        for endpoint in (EP_DATA_IN, EP_DC_IN):
+            _drain(lambda timeout, endpoint=endpoint: self._bulk_read(endpoint, USB_READ_SIZE, timeout))
+
+
+# ============================================================================
+# In-memory loopback
+# ============================================================================
+class _ByteChannel:
+    """Thread-safe byte FIFO with blocking reads and an optional size cap."""
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.overruns = 0      # bytes dropped because the FIFO was full
+        self._buf = bytearray()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._buf)
+
+    def put(self, data):
+        with self._cond:
+            if self.limit is not None:
+                room = self.limit - len(self._buf)
+                if room < len(data):
+                    self.overruns += len(data) - max(room, 0)
+                    data = data[:max(room, 0)]
+            if data:
+                self._buf += data
+                self._cond.notify_all()
+
+    def get(self, size, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._buf:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return b''
+                self._cond.wait(remaining)
+            if size is None or size >= len(self._buf):
+                data = bytes(self._buf)
+                self._buf.clear()
+            else:
+                data = bytes(self._buf[:size])
+                del self._buf[:size]
+            return data
+
+    def get_into(self, view, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._buf:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return 0
+                self._cond.wait(remaining)
+            count = min(len(view), len(self._buf))
+            with memoryview(self._buf) as source:
+                view[:count] = source[:count]
+            del self._buf[:count]
+            return count
+
+    def clear(self):
+        with self._cond:
+            self._buf.clear()
+
+
+class LoopbackTransport(Transport):
+    """
+    In-process transport for tests and benchmarks.
+
+    Without a device every write is echoed back on the response channel,
+    like pyserial's 'loop://'. With a device, writes go to device.receive(data)
+    and the device answers through push() / push_stream(). A device may also
+    define attach(transport) and detach(), called on open() and close().
+
+    Args:
+        device: Object with a receive(bytes) method (e.g. a firmware model)
+        timeout (float): Default read timeout in seconds
+        stream_limit (int): Capacity of the stream FIFO in bytes; excess
+            samples are dropped and counted in stream_overruns, like the
+            FPGA FIFO when the host reads too slowly. None = unbounded
+    """
+
+    kind = 'loopback'
+
+    def __init__(self, device=None, timeout=DEFAULT_TIMEOUT, stream_limit=None):
+        super().__init__('loopback', timeout)
+        self.device = device
+        self._rx = _ByteChannel()
+        self._stream = _ByteChannel(stream_limit)
+        self._opened = False
+
+    @property
+    def is_open(self):
+        return self._opened
+
+    @property
+    def stream_overruns(self):
+        return self._stream.overruns
+
+    @property
+    def stream_backlog(self):
+        """Samples queued on the stream channel and not read yet."""
+        return len(self._stream)
+
+    @property
+    def stream_limit(self):
+        """Capacity of the stream channel in bytes (None: unbounded)."""
+        return self._stream.limit
+
+    def _open(self):
+        self._opened = True
+        if self.device is not None and hasattr(self.device, 'attach'):
+            self.device.attach(self)
+
+    def _close(self):
+        if self.device is not None and hasattr(self.device, 'detach'):
+            self.device.detach()
+        self._opened = False
+
+    # Device side -------------------------------------------------------
+    def push(self, data):
+        """Queue bytes on the response channel (called by the device model)."""
+        self._rx.put(data)
+
+    def push_stream(self, data):
+        """Queue Digital Capture samples (called by the device model)."""
+        self._stream.put(data)
+
+    # Host side ---------------------------------------------------------
+    def _write(self, data):
+        data = bytes(data)
+        if self.device is None:
+            self._rx.put(data)
+        else:
+            self.device.receive(data)
+        return len(data)
+
+    def _read(self, size, timeout):
+        return self._rx.get(size, timeout)
+
+    def _read_stream(self, size, timeout):
+        return self._stream.get(size, timeout)
+
+    def read_stream_into(self, buffer, timeout=None):
+        self._require_open()
+        count = self._stream.get_into(memoryview(buffer).cast('B'),
+                                      self.timeout if timeout is None else timeout)
+        self.stream_bytes += count
+        return count
+
+    @property
+    def in_waiting(self):
+        return len(self._rx)
+
+    def _reset_input(self):
+        self._rx.clear()
+        self._stream.clear()
+
+
+# ============================================================================
+# Asynchronous USB (python-libusb1)
+# ============================================================================
+class AsyncUsbTransport(Transport):
+    """
+    Bulk transport that keeps `depth` transfers queued on EP 0x83.
+
+    With one synchronous read at a time the endpoint has no request pending
+    between the end of one transfer and the next submit, and at 20-30 MHz the
+    FPGA FIFO overflows in that gap. Here libusb always has the next transfers
+    queued: an event thread handles completions, hands the data on and
+    resubmits the same buffer at once, so no buffers are allocated while
+    streaming.
+
+    Completed samples are buffered for read_stream() (up to queue_limit
+    bytes; beyond that they are dropped and counted in stream_overruns), or
+    passed to on_stream(memoryview) from the event thread when set. The view
+    is only valid during the call, because the buffer is resubmitted after it.
+
+    Commands and upload frames use synchronous transfers on EP 0x02/0x82.
+
+    Args:
+        vid (int): USB vendor ID
+        pid (int): USB product ID
+        depth (int): Transfers kept queued on EP 0x83
+        transfer_size (int): Bytes per transfer (multiple of 512)
+        timeout (float): Default read timeout in seconds
+        queue_limit (int): Maximum buffered stream bytes
+        on_stream (callable): Optional sink for completed stream data
+    """
+
+    kind = 'usb-async'
+
+    def __init__(self, vid=USB_VID, pid=USB_PID, depth=ASYNC_DEPTH,
+                 transfer_size=ASYNC_TRANSFER_SIZE, timeout=DEFAULT_TIMEOUT,
+                 queue_limit=ASYNC_QUEUE_LIMIT, on_stream=None):
+        if depth < 1:
+            raise ValueError(f"depth must be at least 1, got {depth}")
+        if transfer_size <= 0 or transfer_size % 512:
+            raise ValueError(f"transfer_size must be a positive multiple of 512, got {transfer_size}")
+        super().__init__(f"usb-async {vid:04X}:{pid:04X}", timeout)
+        self.vid = vid
+        self.pid = pid
+        self.depth = depth
+        self.transfer_size = transfer_size
+        self.on_stream = on_stream
+        self.write_timeout = 1.0
+
+        self._stream = _ByteChannel(queue_limit)
+        self._context = None
+        self._handle = None
+        self._transfers = []
+        self._thread = None
+        self._running = threading.Event()
+        self.error = None            # Fatal transfer status, if any
+
+        # Statistics
+        self.transfers_completed = 0
+
+    @property
+    def is_open(self):
+        return self._handle is not None
+
+    @property
+    def stream_overruns(self):
+        return self._stream.overruns
+
+    @property
+    def stream_backlog(self):
+        return len(self._stream)
+
+    def _open(self):
+        if not USB1_AVAILABLE:
+            raise RuntimeError("python-libusb1 is not installed (pip install libusb1)")
+        context = usb1.USBContext()
+        context.open()
+        handle = context.openByVendorIDAndProductID(self.vid, self.pid, skip_on_error=True)
+        if handle is None:
+            context.close()
+            raise RuntimeError(f"USB device {self.vid:04X}:{self.pid:04X} not found")
+        try:
+            handle.setAutoDetachKernelDriver(True)
+        except usb1.USBError:
+            pass    # Windows: not supported and not needed
+        handle.claimInterface(0)
+        self._context, self._handle = context, handle
+
+        self._running.set()
+        self._transfers = []
+        for _ in range(self.depth):
+            transfer = handle.getTransfer()
+            transfer.setBulk(EP_DC_IN, bytearray(self.transfer_size), callback=self._completed)
+            transfer.submit()
+            self._transfers.append(transfer)
+        self._thread = threading.Thread(target=self._event_loop, name='AsyncUsbTransport', daemon=True)
+        self._thread.start()
+
+    def _close(self):
+        self._running.clear()
+        for transfer in self._transfers:
+            try:
+                transfer.cancel()
+            except usb1.USBError:
+                pass    # Already completed
+        self._thread.join()
+        # Let libusb deliver the cancellations before freeing the transfers
+        deadline = time.monotonic() + 1.0
+        while any(t.isSubmitted() for t in self._transfers) and time.monotonic() < deadline:
+            self._context.handleEventsTimeout(0.05)
+        for transfer in self._transfers:
+            transfer.close()
+        self._transfers = []
+        self._handle.releaseInterface(0)
+        self._handle.close()
+        self._context.close()
+        self._handle = self._context = self._thread = None
+
+    def _event_loop(self):
+        context = self._context
+        while self._running.is_set():
+            context.handleEventsTimeout(0.1)
+
+    def _completed(self, transfer):
+        status = transfer.getStatus()
+        if status == usb1.TRANSFER_COMPLETED:
+            length = transfer.getActualLength()
+            if length:
+                view = memoryview(transfer.getBuffer())[:length]
+                if self.on_stream is not None:
+                    self.on_stream(view)
+                else:
+                    self._stream.put(view)
+                self.stream_bytes += length
+            self.transfers_completed += 1
+        elif status == usb1.TRANSFER_CANCELLED:
+            return
+        elif status != usb1.TRANSFER_TIMED_OUT:
+            # Device gone or endpoint error: stop resubmitting
+            self.error = status
+            self._running.clear()
+            return
+        if self._running.is_set():
+            transfer.submit()
+
+    def _write(self, data):
+        return self._handle.bulkWrite(EP_CTRL_OUT, bytes(data), timeout=int(self.write_timeout * 1000))
+
+    def _read(self, size, timeout):
+        try:
+            return bytes(self._handle.bulkRead(EP_DATA_IN, size or USB_READ_SIZE,
+                                               timeout=max(1, int(timeout * 1000))))
+        except usb1.USBErrorTimeout as exc:
+            return bytes(getattr(exc, 'received', b''))
+
+    def read_stream(self, size, timeout=None):
+        # Completion callbacks already counted stream_bytes
+        self._require_open()
+        return self._stream.get(size, self.timeout if timeout is None else timeout)
+
+    def read_stream_into(self, buffer, timeout=None):
+        self._require_open()
+        return self._stream.get_into(memoryview(buffer).cast('B'),
+                                     self.timeout if timeout is None else timeout)
+
+    def _reset_input(self):
+        self._stream.clear()
+        _drain(lambda timeout: self._read(USB_READ_SIZE, timeout))
+
+
+# ============================================================================
+# Shared-memory stream (dc_capture_daemon.py)
+# ============================================================================
+class SharedStreamTransport(Transport):
+    """
+    Reader of the DC stream that dc_capture_daemon.py publishes.
+
+    The daemon owns the board; this transport follows its shared-memory ring
+    (shared_ring.py) with a cursor of its own, so several tools can read one
+    capture at once. Writes are posted to the daemon, which forwards them to
+    the board. There is no response channel: read() always times out.
+
+    Bytes this reader lost by falling more than a ring behind are counted in
+    stream_overruns; samples lost before the daemon (device FIFO, its own
+    link) are in ring.device_lost and ring.gaps().
+
+    Args:
+        ring_name (str): Shared memory name (default shared_ring.DEFAULT_NAME)
+        timeout (float): Default read timeout in seconds
+        reader_name (str): Label in the daemon's reader statistics
+    """
+
+    kind = 'shm'
+
+    def __init__(self, ring_name=None, timeout=DEFAULT_TIMEOUT, reader_name=''):
+        from shared_ring import DEFAULT_NAME
+        super().__init__(f"shm:{ring_name or DEFAULT_NAME}", timeout)
+        self.ring_name = ring_name or DEFAULT_NAME
+        self.reader_name = reader_name
+        self.ring = None
+
+    @property
+    def is_open(self):
+        return self.ring is not None
+
+    @property
+    def stream_overruns(self):
+        return self.ring.lost if self.ring is not None else 0
+
+    @property
+    def stream_backlog(self):
+        """Bytes published by the daemon and not read by this reader yet."""
+        return len(self.ring) if self.ring is not None else 0
+
+    def _open(self):
+        from shared_ring import READER_TIMEOUT, SharedRingReader
+        self.ring = SharedRingReader(self.ring_name, self.reader_name)
+        if self.ring.heartbeat_age > READER_TIMEOUT:
+            self._close()
+            raise RuntimeError(f"Capture daemon of {self.ring_name!r} is not running")
+
+    def _close(self):
+        self.ring.close()
+        self.ring = None
+
+    def _write(self, data):
+        return self.ring.send_command(data)
+
+    def _read(self, size, timeout):
+        time.sleep(timeout)
+        return b''
+
+    def _read_stream(self, size, timeout):
+        if not self.ring.wait(timeout):
+            return b''
+        return self.ring.read(size)
+
+    def read_stream_into(self, buffer, timeout=None):
+        self._require_open()
+        if not self.ring.wait(self.timeout if timeout is None else timeout):
+            return 0
+        count = self.ring.read_into(buffer)
+        self.stream_bytes += count
+        return count
+
+    def _reset_input(self):
+        self.ring.skip()
+
+
+# ============================================================================
+# Factory
+# ============================================================================
+def list_transports():
+    """
+    List the links that could be opened right now.
+
+    Returns:
+        list: (spec, description) pairs, raw USB first
+    """
+    found = []
+    if USB_AVAILABLE:
+        devices, backend_name = list_usb_devices()
+        for dev in devices:
+            found.append(('usb', f"USB {USB_VID:04X}:{USB_PID:04X} bus {dev.bus} "
+                                 f"device {dev.address} ({backend_name})"))
+    if SERIAL_AVAILABLE:
+        for port in serial.tools.list_ports.comports():
+            found.append((port.device, port.description))
+    return found
+
+
+def create_transport(spec, baudrate=DEFAULT_BAUDRATE, timeout=DEFAULT_TIMEOUT):
+    """
+    Build (but do not open) a transport from a spec string.
+
+    Args:
+        spec (str or Transport): See module docstring; a Transport instance
+            is returned unchanged
+        baudrate (int): Used by serial transports only
+        timeout (float): Default read timeout in seconds
+
+    Returns:
+        Transport: Unopened transport
+    """
+    if isinstance(spec, Transport):
+        return spec
+    lowered = spec.lower()
+    if lowered in ('loop', 'loopback'):
+        return LoopbackTransport(timeout=timeout)
+    if lowered in ('emu', 'emulator'):
+        from fpga_emulator import FpgaEmulator
+        return LoopbackTransport(FpgaEmulator(), timeout=timeout, stream_limit=EMULATOR_STREAM_LIMIT)
+    if lowered == 'usb-async' or lowered.startswith('usb-async:'):
+        parts = lowered.split(':')[1:]
+        if len(parts) > 2:
+            raise ValueError(f"Invalid async USB spec {spec!r}, expected 'usb-async:DEPTH:SIZE'")
+        depth, size = ([int(p) for p in parts] + [ASYNC_DEPTH, ASYNC_TRANSFER_SIZE][len(parts):])
+        return AsyncUsbTransport(depth=depth, transfer_size=size, timeout=timeout)
+    if lowered == 'usb' or lowered.startswith('usb:'):
+        parts = lowered.split(':')[1:]
+        if parts and len(parts) != 2:
+            raise ValueError(f"Invalid USB spec {spec!r}, expected 'usb:VID:PID'")
+        vid, pid = (int(p, 16) for p in parts) if parts else (USB_VID, USB_PID)
+        return UsbTransport(vid, pid, timeout=timeout)
+    if lowered == 'shm' or lowered.startswith('shm:'):
+        return SharedStreamTransport(spec[4:] or None, timeout=timeout)
+    if lowered == 'auto':
+        if USB_AVAILABLE and list_usb_devices()[0]:
+            return UsbTransport(timeout=timeout)
+        ports = [s for s, _ in list_transports() if s != 'usb']
+        if not ports:
+            raise RuntimeError("No FPGA link found (neither USB nor serial)")
+        return SerialTransport(ports[0], baudrate, timeout)
+    return SerialTransport(spec, baudrate, timeout)
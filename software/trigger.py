@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Streaming Trigger Engine for FPGA2025 Digital Capture
+=====================================================
+
+Sits between the USB reader (ring_buffer / UsbStreamWorker) and consumers
+such as the viewer or a recorder, like the trigger block of a logic
+analyser: it watches every sample, and only the windows around trigger
+points are forwarded.
+
+Conditions (bit n of a sample = CH n):
+    EdgeTrigger(ch, edge)            'rising', 'falling' or 'any' edge
+    PatternTrigger(mask, value)      (sample & mask) == value becomes true
+    PulseWidthTrigger(ch, level,     a pulse at `level` ends whose width in
+                      min, max)      samples is within [min, max]
+    SequenceTrigger([c1, c2, ...])   c1, then c2 after it, ... (fires on the last)
+
+Each condition finds all its trigger points in a block with NumPy (XOR with
+the previous sample, np.flatnonzero, np.diff) and carries its state to the
+next block, so triggers spanning block boundaries are found too.
+
+Modes:
+    normal   re-arm after every window
+    single   stop after the first window
+    auto     like normal, but force a window when nothing triggers for
+             `auto_timeout` samples (forced=True), so the display never stalls
+
+A window holds `pre` samples before the trigger point and `post` samples
+from it on. Triggers that occur while a window is still being filled are
+ignored (hold-off). The engine tells the condition where the hold-off ends,
+and a sequence only starts looking for its first stage again from there,
+like a logic analyser re-arming; so the windows found do not depend on how
+the stream is split into blocks.
+
+Recording:
+    WindowRecorder appends windows to a capture_file.CaptureWriter and
+    stores the samples skipped between them as drop markers.
+
+Typical usage:
+    engine = TriggerEngine(parse_trigger('rise:3'), pre=1024, post=3072, mode='normal')
+    for window in engine.feed(block):
+        show(window.samples, trigger_at=window.trigger - window.start)
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+CHANNELS = 8
+MODES = ('normal', 'single', 'auto')
+
+TriggerWindow = namedtuple('TriggerWindow', [
+    'trigger',   # Absolute sample index of the trigger point
+    'start',     # Absolute sample index of samples[0]
+    'samples',   # uint8 numpy array (pre + post samples, less at stream start)
+    'forced',    # True if produced by the auto timeout
+])
+
+
+def _as_array(block):
+    return np.frombuffer(block, dtype=np.uint8) if not isinstance(block, np.ndarray) else block
+
+
+def _changes(data, previous):
+    """XOR of every sample with the one before it (0 for the very first)."""
+    diff = np.empty(len(data), dtype=np.uint8)
+    diff[0] = 0 if previous is None else previous ^ data[0]
+    np.bitwise_xor(data[1:], data[:-1], out=diff[1:])
+    return diff
+
+
+def _check_channel(ch):
+    if not 0 <= ch < CHANNELS:
+        raise ValueError(f"channel must be in 0..{CHANNELS - 1}, got {ch}")
+
+
+# ============================================================================
+# Conditions
+# ============================================================================
+class EdgeTrigger:
+    """Edge on one channel."""
+
+    def __init__(self, channel, edge='rising'):
+        _check_channel(channel)
+        if edge not in ('rising', 'falling', 'any'):
+            raise ValueError(f"edge must be 'rising', 'falling' or 'any', got {edge!r}")
+        self.channel = channel
+        self.edge = edge
+        self.reset()
+
+    def reset(self):
+        self._previous = None
+
+    def find(self, data, base, earliest=None, holdoff=0):
+        """
+        Trigger points in a block.
+
+        Args:
+            data (numpy.ndarray): uint8 samples
+            base (int): Absolute index of data[0]
+            earliest (int): First trigger point the caller still accepts
+                (None: any)
+            holdoff (int): Samples after each accepted trigger point the
+                caller ignores. Single conditions return every point
+                anyway; only SequenceTrigger uses these two.
+
+        Returns:
+            numpy.ndarray: Absolute sample indices (int64, ascending)
+        """
+        mask = 1 << self.channel
+        hits = _changes(data, self._previous) & mask
+        if self.edge == 'rising':
+            hits &= data
+        elif self.edge == 'falling':
+            hits &= ~data
+        self._previous = int(data[-1])
+        return np.flatnonzero(hits) + base
+
+
+class PatternTrigger:
+    """Masked pattern match, firing when the pattern starts to match."""
+
+    def __init__(self, mask, value):
+        if not 0 < mask <= 0xFF or value & ~mask & 0xFF:
+            raise ValueError(f"Invalid pattern {value:#04x}/{mask:#04x}")
+        self.mask = mask
+        self.value = value
+        self.reset()
+
+    def reset(self):
+        self._matched = None     # Did the last sample of the previous block match?
+
+    def find(self, data, base, earliest=None, holdoff=0):
+        match = (data & self.mask) == self.value
+        entering = match.copy()
+        entering[1:] &= ~match[:-1]
+        if self._matched is None:
+            entering[0] = False     # Already matching when the stream starts: no entry seen
+        else:
+            entering[0] &= not self._matched
+        self._matched = bool(match[-1])
+        return np.flatnonzero(entering) + base
+
+
+class PulseWidthTrigger:
+    """
+    Pulse of `level` on one channel with a width in [min_width, max_width]
+    samples; fires at the edge that ends the pulse.
+    """
+
+    def __init__(self, channel, level=1, min_width=1, max_width=None):
+        _check_channel(channel)
+        if max_width is not None and max_width < min_width:
+            raise ValueError(f"max_width {max_width} < min_width {min_width}")
+        self.channel = channel
+        self.level = 1 if level else 0
+        self.min_width = min_width
+        self.max_width = max_width
+        self.reset()
+
+    def reset(self):
+        self._previous = None
+        self._last_edge = None
+
+    def find(self, data, base, earliest=None, holdoff=0):
+        mask = 1 << self.channel
+        edges = np.flatnonzero(_changes(data, self._previous) & mask)
+        self._previous = int(data[-1])
+        if not len(edges):
+            return edges
+        positions = edges + base
+        # Level before each edge is the opposite of the level after it
+        ends_level = ((data[edges] & mask) == 0) if self.level else ((data[edges] & mask) != 0)
+        starts = np.empty(len(positions), dtype=np.int64)
+        starts[1:] = positions[:-1]
+        starts[0] = -1 if self._last_edge is None else self._last_edge
+        widths = positions - starts
+        ok = ends_level & (starts >= 0) & (widths >= self.min_width)
+        if self.max_width is not None:
+            ok &= widths <= self.max_width
+        self._last_edge = int(positions[-1])
+        return positions[ok]
+
+
+class SequenceTrigger:
+    """
+    Stages that must occur in order; fires at the last stage.
+
+    After a match the sequence starts again at the first stage, from
+    `holdoff` samples on, and never before `earliest`: the stages are
+    walked one match at a time, so only the matches the engine can use
+    are looked for.
+    """
+
+    def __init__(self, stages):
+        if len(stages) < 2:
+            raise ValueError("A sequence needs at least two stages")
+        self.stages = list(stages)
+        self.reset()
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+        self._stage = 0
+        self._after = -1        # Next stage must occur after this sample
+
+    def find(self, data, base, earliest=None, holdoff=0):
+        # Every stage sees every sample so its own state stays continuous
+        candidates = [stage.find(data, base) for stage in self.stages]
+        found = []
+        stage, after = self._stage, self._after
+        if earliest is not None and after < earliest - 1:
+            # Re-armed at `earliest`: stages seen before it do not count
+            stage, after = 0, earliest - 1
+        while True:
+            positions = candidates[stage]
+            index = int(np.searchsorted(positions, after, side='right'))
+            if index == len(positions):
+                break
+            after = int(positions[index])
+            stage += 1
+            if stage == len(self.stages):
+                found.append(after)
+                stage = 0
+                after += max(holdoff, 1) - 1
+        self._stage, self._after = stage, after
+        return np.array(found, dtype=np.int64)
+
+
+def parse_trigger(spec):
+    """
+    Build a condition from a short text spec.
+
+    Formats:
+        rise:CH  fall:CH  edge:CH
+        pattern:MASK=VALUE             e.g. pattern:0x0F=0x05
+        pulse:CH:LEVEL:MIN[-MAX]       e.g. pulse:2:1:100-200 (samples)
+        A;B;C                          sequence of the above
+
+    Returns:
+        Condition object
+    """
+    if ';' in spec:
+        return SequenceTrigger([parse_trigger(part) for part in spec.split(';') if part.strip()])
+    kind, _, args = spec.strip().partition(':')
+    kind = kind.lower()
+    try:
+        if kind in ('rise', 'fall', 'edge'):
+            edge = {'rise': 'rising', 'fall': 'falling', 'edge': 'any'}[kind]
+            return EdgeTrigger(int(args), edge)
+        if kind == 'pattern':
+            mask, _, value = args.partition('=')
+            return PatternTrigger(int(mask, 0), int(value, 0))
+        if kind == 'pulse':
+            channel, level, widths = args.split(':')
+            low, _, high = widths.partition('-')
+            return PulseWidthTrigger(int(channel), int(level), int(low),
+                                     int(high) if high else None)
+    except ValueError as exc:
+        raise ValueError(f"Invalid trigger spec {spec!r}: {exc}") from None
+    raise ValueError(f"Unknown trigger type {kind!r} in {spec!r}")
+
+
+# ============================================================================
+# Engine
+# ============================================================================
+class TriggerEngine:
+    """
+    Cuts pre/post-trigger windows out of a sample stream.
+
+    Args:
+        condition: Trigger condition (see module docstring)
+        pre (int): Samples kept before the trigger point
+        post (int): Samples from the trigger point on
+        mode (str): 'normal', 'single' or 'auto'
+        auto_timeout (int): Samples without trigger before 'auto' forces one
+    """
+
+    def __init__(self, condition, pre=1024, post=3072, mode='normal', auto_timeout=1_000_000):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+        if pre < 0 or post < 1:
+            raise ValueError("pre must be >= 0 and post >= 1")
+        self.condition = condition
+        self.pre = pre
+        self.post = post
+        self.mode = mode
+        self.auto_timeout = auto_timeout
+
+        self._history = np.zeros(pre, dtype=np.uint8)   # Last `pre` samples before the block
+        self._window = np.zeros(pre + post, dtype=np.uint8)
+        self.reset()
+
+    def reset(self):
+        """Re-arm and forget all history."""
+        self.condition.reset()
+        self.samples = 0            # Absolute index of the next sample
+        self._history_len = 0
+        self._collecting = None     # (trigger, start, forced) while filling a window
+        self._filled = 0
+        self._armed_at = 0
+        self.stopped = False
+        self.triggers = 0           # Windows produced
+        self.forced = 0
+
+    def arm(self):
+        """Arm again after a single-shot window."""
+        self.stopped = False
+        self._armed_at = self.samples
+
+    def _start_window(self, trigger, data, offset, forced):
+        # Pre-trigger samples: tail of the history plus the block up to the trigger
+        from_block = min(offset, self.pre)
+        from_history = min(self.pre - from_block, self._history_len)
+        count = from_history + from_block
+        window = self._window
+        if from_history:
+            window[:from_history] = self._history[self.pre - from_history:]
+        window[from_history:count] = data[offset - from_block:offset]
+        self._filled = count
+        self._collecting = (trigger, trigger - count, forced)
+
+    def feed(self, block):
+        """
+        Process a block of samples.
+
+        Returns:
+            list: TriggerWindow for every window completed in this block
+        """
+        data = _as_array(block)
+        if not len(data):
+            return []
+        base = self.samples
+        # First trigger point a window can still start at
+        if self.stopped:
+            earliest = base + len(data)
+        elif self._collecting is not None:
+            earliest = self._collecting[0] + self.post
+        else:
+            earliest = self._armed_at
+        triggers = self.condition.find(data, base, earliest, self.post)
+        windows = []
+        offset = 0
+        while True:
+            if self._collecting is not None:
+                trigger, start, forced = self._collecting
+                need = trigger + self.post - (base + offset)
+                take = min(need, len(data) - offset)
+                self._window[self._filled:self._filled + take] = data[offset:offset + take]
+                self._filled += take
+                offset += take
+                if take < need:
+                    break
+                windows.append(TriggerWindow(trigger, start, self._window[:self._filled].copy(), forced))
+                self._collecting = None
+                self.triggers += 1
+                self.forced += forced
+                self._armed_at = base + offset
+                if self.mode == 'single':
+                    self.stopped = True
+            if self.stopped:
+                break
+
+            index = int(np.searchsorted(triggers, base + offset))
+            if index < len(triggers):
+                trigger = int(triggers[index])
+                self._start_window(trigger, data, trigger - base, False)
+                offset = trigger - base
+                continue
+            if self.mode == 'auto' and base + len(data) - self._armed_at >= self.auto_timeout:
+                trigger = max(self._armed_at + self.auto_timeout, base + offset)
+                self._start_window(trigger, data, trigger - base, True)
+                offset = trigger - base
+                continue
+            break
+
+        self._remember(data)
+        self.samples = base + len(data)
+        return windows
+
+    def _remember(self, data):
+        if not self.pre:
+            return
+        if len(data) >= self.pre:
+            self._history[:] = data[-self.pre:]
+        else:
+            self._history[:-len(data)] = self._history[len(data):]
+            self._history[-len(data):] = data
+        self._history_len = min(self.pre, self._history_len + len(data))
+
+
+class WindowRecorder:
+    """
+    Sink that appends trigger windows to a capture_file.CaptureWriter.
+
+    Samples between windows are not recorded; each gap is stored as a drop
+    marker, so viewers show where the recording skips.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self._end = None        # Absolute index after the last recorded sample
+
+    def __call__(self, window):
+        samples = window.samples
+        if self._end is not None:
+            if window.start > self._end:
+                self.writer.mark_drop(window.start - self._end)
+            elif window.start < self._end:
+                # Pre-trigger part overlaps the previous window
+                samples = samples[self._end - window.start:]
+        elif window.start > 0:
+            self.writer.mark_drop(window.start)
+        self.writer.write(samples)
+        self._end = window.start + len(window.samples)
@@ -1,15 +1,18 @@
-import struct
 import argparse
 
+from frame_codec import FrameTemplate, encode_frame, checksum
+
 # Constants from the protocol
-FRAME_HEADER = b'\xAA\x55'
 CMD_UART_CONFIG = 0x07
 CMD_UART_TX = 0x08
 CMD_UART_RX = 0x09
 
+# Data Body: Baud (4 bytes), Data Bits (1), Stop Bits (1), Parity (1)
+UART_CONFIG_FRAME = FrameTemplate(CMD_UART_CONFIG, 'IBBB')
+
 def calculate_checksum(frame_bytes):
     """Calculates the checksum for a given frame (excluding the header)."""
-    return sum(frame_bytes) & 0xFF
+    return checksum(frame_bytes)
 
 def generate_uart_config_command(baud_rate, data_bits, stop_bits, parity):
     """
@@ -19,23 +22,7 @@ def generate_uart_config_command(baud_rate, data_bits, stop_bits, parity):
     - stop_bits: 8-bit integer (0 for 1, 1 for 1.5, 2 for 2)
     - parity: 8-bit integer (0 for None, 1 for Odd, 2 for Even)
     """
-    # Data Body: Baud (4 bytes), Data Bits (1), Stop Bits (1), Parity (1)
-    # struct.pack uses '>' for big-endian, 'I' for unsigned 32-bit int, 'B' for 8-bit unsigned int
-    data_body = struct.pack('>IBBB', baud_rate, data_bits, stop_bits, parity)
-    
-    # Data Length: 2 bytes, big-endian
-    data_length = len(data_body)
-    
-    # Frame without header and checksum
-    frame_core = struct.pack('>BH', CMD_UART_CONFIG, data_length) + data_body
-    
-    # Calculate checksum
-    checksum = calculate_checksum(frame_core)
-    
-    # Final frame
-    full_frame = FRAME_HEADER + frame_core + struct.pack('B', checksum)
-    
-    return full_frame
+    return UART_CONFIG_FRAME.pack(baud_rate, data_bits, stop_bits, parity)
 
 def generate_uart_tx_command(payload):
     """
@@ -44,39 +31,15 @@ def generate_uart_tx_command(payload):
     """
     if isinstance(payload, str):
         payload = payload.encode('utf-8')
-        
-    # Data Length: 2 bytes, big-endian
-    data_length = len(payload)
-    
-    # Frame without header and checksum
-    frame_core = struct.pack('>BH', CMD_UART_TX, data_length) + payload
-    
-    # Calculate checksum
-    checksum = calculate_checksum(frame_core)
-    
-    # Final frame
-    full_frame = FRAME_HEADER + frame_core + struct.pack('B', checksum)
-    
-    return full_frame
+
+    return encode_frame(CMD_UART_TX, payload)
 
 def generate_uart_rx_command():
     """
     Generates a command frame to request data from the UART.
     This command has no data body.
     """
-    # Data Length is 0
-    data_length = 0
-    
-    # Frame without header and checksum
-    frame_core = struct.pack('>BH', CMD_UART_RX, data_length)
-    
-    # Calculate checksum
-    checksum = calculate_checksum(frame_core)
-    
-    # Final frame
-    full_frame = FRAME_HEADER + frame_core + struct.pack('B', checksum)
-    
-    return full_frame
+    return encode_frame(CMD_UART_RX)
 
 def print_frame_as_hex(name, frame):
     """Helper function to print a command frame in a readable hex format."""
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Bulk Upload Frame Scanner for FPGA2025
+======================================
+
+Vectorized decoder for recorded raw CDC traffic. Where frame_codec.UploadDecoder
+walks the stream frame by frame, scan_uploads() inspects a whole buffer at once
+with NumPy and returns a structured array describing every frame.
+
+Upload Frame Format (rtl/upload_packer.v):
+    [Header(2)] [Source(1)] [Length(2)] [Data(N)] [Checksum(1)]
+    0xAA44      Source ID   Big-Endian  Data      Sum & 0xFF (from 0xAA)
+
+How it works:
+    1. Candidate headers are all offsets i with data[i:i+2] == AA 44.
+    2. Lengths, end offsets and checksums are computed for all candidates at
+       once. Checksums come from a wrapping uint8 cumulative sum, so the sum
+       of any slice is a single subtraction.
+    3. Candidates are accepted in stream order exactly like UploadDecoder:
+       a valid frame hides every candidate inside it, and an incomplete frame
+       at the end of the buffer stops the scan.
+
+The result matches UploadDecoder.feed() on the same bytes, record for record.
+
+Typical usage:
+    >>> import numpy as np
+    >>> from upload_scan import scan_uploads, iter_payloads
+    >>> raw = bytes.fromhex('00 aa 44 01 00 02 41 42 74 aa 44 03 00 01 7f 71')
+    >>> frames, consumed = scan_uploads(raw)
+    >>> frames['offset'].tolist(), frames['source'].tolist(), consumed
+    ([1, 9], [1, 3], 16)
+    >>> [(src, bytes(p)) for src, p in iter_payloads(raw, frames)]
+    [(1, b'AB'), (3, b'\\x7f')]
+"""
+
+import os
+
+import numpy as np
+
+from frame_codec import UPLOAD_HEADER, UPLOAD_PREFIX_LEN, MAX_UPLOAD_PAYLOAD, UploadFrame
+
+# ============================================================================
+# Record Layout
+# ============================================================================
+# offset: position of the 0xAA header byte in the scanned buffer
+# source: upload source ID
+# length: payload length; the payload is data[offset + 5:offset + 5 + length]
+UPLOAD_RECORD_DTYPE = np.dtype([
+    ('offset', np.int64),
+    ('source', np.uint8),
+    ('length', np.uint16),
+])
+
+
+# ============================================================================
+# Scanner
+# ============================================================================
+def _as_uint8(data):
+    """Zero-copy uint8 view over bytes, bytearray, memoryview, mmap or ndarray."""
+    if isinstance(data, np.ndarray):
+        return data.reshape(-1).view(np.uint8)
+    return np.frombuffer(data, dtype=np.uint8)
+
+
+def _resolve_chain(starts, ends):
+    """
+    Pick the candidates a sequential decoder would accept.
+
+    starts/ends are sorted by start; a candidate is taken when it begins after
+    the end of the last taken one. Candidates that cannot overlap anything
+    before them are taken without a Python-level loop; only the (rare)
+    overlapping ones are walked one by one.
+
+    Returns:
+        np.ndarray: Boolean mask of accepted candidates
+    """
+    count = len(starts)
+    accepted = np.ones(count, dtype=bool)
+    if count < 2:
+        return accepted
+
+    reach = np.maximum.accumulate(ends)
+    conflicts = np.flatnonzero(starts[1:] <= reach[:-1]) + 1
+    if conflicts.size == 0:
+        return accepted
+
+    # Anchors (non-conflicting candidates) are always accepted. For a
+    # conflicting candidate the last accepted frame is either the nearest
+    # anchor before it or a conflicting candidate accepted after that anchor.
+    is_anchor = np.ones(count, dtype=bool)
+    is_anchor[conflicts] = False
+    anchor_idx = np.flatnonzero(is_anchor)
+    prev_anchor = anchor_idx[np.searchsorted(anchor_idx, conflicts) - 1]
+
+    last_taken = -1
+    for k, anchor in zip(conflicts.tolist(), prev_anchor.tolist()):
+        prev = last_taken if last_taken > anchor else anchor
+        if starts[k] <= ends[prev]:
+            accepted[k] = False
+        else:
+            last_taken = k
+    return accepted
+
+
+def scan_uploads(data, max_payload=MAX_UPLOAD_PAYLOAD, checksum_includes_header=True):
+    """
+    Find every valid upload frame in a buffer.
+
+    Args:
+        data (bytes-like or np.ndarray): Raw captured bytes; not copied
+        max_payload (int): Largest accepted data length
+        checksum_includes_header (bool): Whether 0xAA 0x44 count towards the
+            checksum (see frame_codec.UploadDecoder)
+
+    Returns:
+        tuple: (frames, consumed)
+            frames: np.ndarray of UPLOAD_RECORD_DTYPE in stream order
+            consumed: number of leading bytes fully decoded; data[consumed:]
+                holds the start of an incomplete frame (or a lone trailing
+                0xAA) and should be prepended to the next block
+    """
+    buf = _as_uint8(data)
+    size = buf.size
+    if size < 2:
+        consumed = 0 if size and buf[-1] == UPLOAD_HEADER[0] else size
+        return np.zeros(0, dtype=UPLOAD_RECORD_DTYPE), consumed
+
+    starts = np.flatnonzero((buf[:-1] == UPLOAD_HEADER[0]) & (buf[1:] == UPLOAD_HEADER[1]))
+
+    # Headers too close to the end to read a length are incomplete
+    has_len = starts + UPLOAD_PREFIX_LEN <= size
+    lengths = np.zeros(starts.size, dtype=np.int64)
+    lengths[has_len] = (buf[starts[has_len] + 3].astype(np.int64) << 8) | buf[starts[has_len] + 4]
+    ends = starts + UPLOAD_PREFIX_LEN + lengths          # checksum position
+
+    complete = has_len & (ends < size)
+    incomplete = ~complete & ~(has_len & (lengths > max_payload))
+
+    valid = complete & (lengths <= max_payload)
+    if valid.any():
+        # Wrapping uint8 prefix sums: sum(buf[a:b]) & 0xFF == csum[b] - csum[a]
+        csum = np.empty(size + 1, dtype=np.uint8)
+        csum[0] = 0
+        np.cumsum(buf, dtype=np.uint8, out=csum[1:])
+        sum_from = starts[valid] if checksum_includes_header else starts[valid] + 2
+        calc = csum[ends[valid]] - csum[sum_from]
+        valid[valid] = calc == buf[ends[valid]]
+
+    # Incomplete frames take part in the chain with an end past the buffer,
+    # so the first reachable one stops the scan like the streaming decoder.
+    keep = valid | incomplete
+    starts, ends = starts[keep], np.where(incomplete[keep], size, ends[keep])
+    lengths, incomplete = lengths[keep], incomplete[keep]
+
+    accepted = _resolve_chain(starts, ends)
+    blocked = np.flatnonzero(accepted & incomplete)
+    if blocked.size:
+        stop = blocked[0]
+        accepted[stop:] = False
+        consumed = int(starts[stop])
+    else:
+        consumed = size - 1 if buf[-1] == UPLOAD_HEADER[0] else size
+        if consumed < size and accepted.any():
+            # The trailing 0xAA may belong to the last frame's checksum
+            last = np.flatnonzero(accepted)[-1]
+            if ends[last] == size - 1:
+                consumed = size
+
+    frames = np.empty(int(accepted.sum()), dtype=UPLOAD_RECORD_DTYPE)
+    frames['offset'] = starts[accepted]
+    frames['source'] = buf[starts[accepted] + 2]
+    frames['length'] = lengths[accepted]
+    return frames, consumed
+
+
+def iter_payloads(data, frames):
+    """
+    Yield (source, payload) for scanned frames without copying payloads.
+
+    Args:
+        data (bytes-like): The buffer passed to scan_uploads()
+        frames (np.ndarray): Records returned by scan_uploads()
+
+    Yields:
+        tuple: (source, memoryview) with the payload as a view into data
+    """
+    view = memoryview(data).cast('B')
+    for offset, source, length in zip(frames['offset'].tolist(), frames['source'].tolist(),
+                                      frames['length'].tolist()):
+        start = offset + UPLOAD_PREFIX_LEN
+        yield source, view[start:start + length]
+
+
+def to_upload_frames(data, frames):
+    """Convert scanned records to UploadFrame tuples (payloads copied to bytes)."""
+    return [UploadFrame(source, bytes(payload)) for source, payload in iter_payloads(data, frames)]
+
+
+def scan_file(path, block_size=64 * 1024 * 1024, **kwargs):
+    """
+    Scan a raw capture file block by block through a memory map.
+
+    Frames that straddle a block boundary are picked up by the next block, so
+    the records are the same as scanning the whole file in one piece.
+
+    Args:
+        path (str): Capture file
+        block_size (int): Bytes examined per step
+        **kwargs: Passed on to scan_uploads()
+
+    Yields:
+        np.ndarray: UPLOAD_RECORD_DTYPE records with offsets relative to the
+            start of the file
+    """
+    file_size = os.path.getsize(path)
+    if file_size == 0:
+        return
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    pos = 0
+    while pos < file_size:
+        stop = min(pos + block_size, file_size)
+        frames, consumed = scan_uploads(data[pos:stop], **kwargs)
+        frames['offset'] += pos
+        if frames.size:
+            yield frames
+        if stop == file_size:
+            break
+        if consumed == 0:
+            # A pending frame fills the block; widen the block instead of stalling
+            block_size *= 2
+            continue
+        pos += consumed
@@ -39,6 +39,7 @@ module digital_capture_handler_tb;
     wire [7:0]  upload_source;
     wire        upload_valid;
     reg         upload_ready;
+    reg         fifo_almost_full;
 
     integer i;
 
@@ -62,7 +63,8 @@ module digital_capture_handler_tb;
         .upload_data      (upload_data),
         .upload_source    (upload_source),
         .upload_valid     (upload_valid),
-        .upload_ready     (upload_ready)
+        .upload_ready     (upload_ready),
+        .fifo_almost_full (fifo_almost_full)
     );
 
     // ========================================================================
@@ -84,6 +86,7 @@ module digital_capture_handler_tb;
         cmd_done = 0;
         dc_signal_in = 8'h00;
         upload_ready = 1;  // Always ready to accept uploads
+        fifo_almost_full = 0;
         #(CLK_PERIOD_NS * 20);
         rst_n = 1'b1;
     end
@@ -180,6 +183,35 @@ module digital_capture_handler_tb;
         end
     endtask
 
+    // Send START command with sequence markers enabled
+    // Format: CMD=0x0B, LENGTH=3, DATA=[divider_high, divider_low, flags=0x01]
+    task automatic send_dc_start_markers_command(input [15:0] divider);
+        begin
+            $display("\n[%0t] ======= Sending DC START (markers): Divider=%0d =======",
+                     $time, divider);
+
+            cmd_type = 8'h0B;
+            cmd_length = 16'd3;
+            cmd_start = 1;
+            @(posedge clk);
+            cmd_start = 0;
+            @(posedge clk);
+
+            for (i = 0; i < 3; i = i + 1) begin
+                cmd_data = (i == 0) ? divider[15:8] : (i == 1) ? divider[7:0] : 8'h01;
+                cmd_data_index = i;
+                cmd_data_valid = 1;
+                @(posedge clk);
+                cmd_data_valid = 0;
+                @(posedge clk);
+            end
+
+            cmd_done = 1;
+            @(posedge clk);
+            cmd_done = 0;
+        end
+    endtask
+
     // Send STOP command
     // Format: CMD=0x0C, LENGTH=0
     task automatic send_dc_stop_command();
@@ -206,18 +238,83 @@ module digital_capture_handler_tb;
     // ========================================================================
     reg [7:0] captured_samples [0:1023];  // Store up to 1024 samples
     integer   sample_count;
+    reg       log_samples = 1;
 
     always @(posedge clk) begin
         if (!rst_n) begin
             sample_count <= 0;
         end else if (upload_valid && upload_ready) begin
-            $display("[%0t] 📥 CAPTURED [%0d] = 0x%02X (%08b)",
-                     $time, sample_count, upload_data, upload_data);
+            if (log_samples)
+                $display("[%0t] 📥 CAPTURED [%0d] = 0x%02X (%08b)",
+                         $time, sample_count, upload_data, upload_data);
             captured_samples[sample_count] <= upload_data;
             sample_count <= sample_count + 1;
         end
     end
 
+    // ========================================================================
+    // Marker packet checker (Tests 6 and 7)
+    // Parses A5 5A LEN IDX CHK headers and counts the samples lost between
+    // packets from the jumps in IDX. With mk_value_check set, every sample
+    // must equal mk_value.
+    // ========================================================================
+    reg        mk_check = 0;
+    reg        mk_value_check = 0;
+    reg [7:0]  mk_value;
+    integer    mk_pos;             // Byte position in the current header, -1: in data
+    integer    mk_left;
+    reg [15:0] mk_len;
+    reg [39:0] mk_idx;
+    reg [7:0]  mk_sum;
+    reg [39:0] mk_expected;
+    integer    mk_packets, mk_received, mk_lost, mk_gaps, mk_errors, mk_bad;
+
+    task automatic reset_marker_checker();
+        begin
+            mk_pos = 0; mk_left = 0; mk_expected = 0; mk_sum = 0;
+            mk_packets = 0; mk_received = 0; mk_lost = 0; mk_gaps = 0; mk_errors = 0;
+            mk_bad = 0;
+        end
+    endtask
+
+    always @(posedge clk) begin
+        if (mk_check && upload_valid && upload_ready) begin
+            if (mk_pos < 0) begin
+                mk_received = mk_received + 1;
+                if (mk_value_check && upload_data != mk_value)
+                    mk_bad = mk_bad + 1;
+                mk_left = mk_left - 1;
+                if (mk_left == 0) mk_pos = 0;
+            end else begin
+                case (mk_pos)
+                    0: if (upload_data != 8'hA5) mk_errors = mk_errors + 1;
+                    1: if (upload_data != 8'h5A) mk_errors = mk_errors + 1;
+                    2: begin mk_len[15:8] = upload_data; mk_sum = upload_data; end
+                    3: begin mk_len[7:0] = upload_data; mk_sum = mk_sum + upload_data; end
+                    4, 5, 6, 7, 8: begin
+                        mk_idx = {mk_idx[31:0], upload_data};
+                        mk_sum = mk_sum + upload_data;
+                    end
+                    9: begin
+                        if (upload_data != mk_sum || mk_len == 0 || mk_len > 1024 ||
+                            mk_idx < mk_expected)
+                            mk_errors = mk_errors + 1;
+                        if (mk_idx > mk_expected) begin
+                            $display("[%0t] GAP: %0d samples lost before index %0d",
+                                     $time, mk_idx - mk_expected, mk_idx);
+                            mk_lost = mk_lost + (mk_idx - mk_expected);
+                            mk_gaps = mk_gaps + 1;
+                        end
+                        mk_expected = mk_idx + mk_len;
+                        mk_packets = mk_packets + 1;
+                        mk_left = mk_len;
+                    end
+                endcase
+                mk_pos = (mk_pos == 9) ? -1 : mk_pos + 1;
+            end
+        end
+    end
+
     // ========================================================================
     // Verification Tasks
     // ========================================================================
@@ -386,7 +483,6 @@ module digital_capture_handler_tb;
 
     // State change monitoring
     reg [2:0] prev_handler_state = 3'b000;
-    reg [1:0] prev_upload_state = 2'b00;
 
     always @(posedge clk) begin
         // Monitor handler state changes
@@ -400,17 +496,6 @@ module digital_capture_handler_tb;
             endcase
             prev_handler_state = u_dut.handler_state;
         end
-
-        // Monitor upload sub-state
-        if (u_dut.upload_state != prev_upload_state) begin
-            case (u_dut.upload_state)
-                2'b00: $display("[%0t]   └─ Upload: IDLE", $time);
-                2'b01: $display("[%0t]   └─ Upload: SEND (data=0x%02X)",
-                               $time, u_dut.upload_data);
-                2'b10: $display("[%0t]   └─ Upload: WAIT", $time);
-            endcase
-            prev_upload_state = u_dut.upload_state;
-        end
     end
 
     // Sample tick monitoring
@@ -510,6 +595,73 @@ module digital_capture_handler_tb;
         $display("Test 5: Total samples = %0d", sample_count);
         $display("\n=== Test 5 Complete ===\n");
 
+        // Test 6: Sequence markers, with a backpressure stall long enough to
+        // overflow the sample FIFO. Every tick must be either received or
+        // reported lost by the index jumps.
+        $display("\n========================================");
+        $display("=== Test 6: Sequence Markers ===");
+        $display("========================================");
+
+        log_samples = 0;
+        reset_marker_checker();
+        mk_check = 1;
+        set_pattern(8'h3C);
+        send_dc_start_markers_command(16'd4);    // 15 MHz
+        repeat(3000) @(posedge clk);
+        fifo_almost_full = 1;                    // Stall: 2048-sample FIFO overflows
+        repeat(40000) @(posedge clk);
+        fifo_almost_full = 0;
+        repeat(6000) @(posedge clk);
+        send_dc_stop_command();
+        repeat(70000) @(posedge clk);            // Flush the last packet
+        mk_check = 0;
+        log_samples = 1;
+
+        $display("Test 6: packets=%0d received=%0d lost=%0d gaps=%0d ticks=%0d errors=%0d",
+                 mk_packets, mk_received, mk_lost, mk_gaps, mk_expected, mk_errors);
+        if (mk_errors == 0 && mk_gaps > 0 && mk_received + mk_lost == mk_expected)
+            $display("✅ PASS: every sample received or reported lost");
+        else
+            $display("❌ FAIL: marker accounting mismatch");
+        $display("\n=== Test 6 Complete ===\n");
+
+        // Test 7: Restart while the sample FIFO still holds samples of the
+        // previous capture. None of them may come out under the new
+        // capture's indices.
+        $display("\n========================================");
+        $display("=== Test 7: Restart With Non-Empty FIFO ===");
+        $display("========================================");
+
+        log_samples = 0;
+        set_pattern(8'h5A);
+        send_dc_start_markers_command(16'd4);    // 15 MHz
+        repeat(200) @(posedge clk);
+        fifo_almost_full = 1;                    // Stall: samples pile up in the FIFO
+        repeat(4000) @(posedge clk);
+        send_dc_stop_command();
+        set_pattern(8'hC3);
+        reset_marker_checker();
+        mk_value = 8'hC3;
+        mk_value_check = 1;
+        mk_check = 1;
+        send_dc_start_markers_command(16'd4);
+        repeat(10) @(posedge clk);
+        fifo_almost_full = 0;
+        repeat(6000) @(posedge clk);
+        send_dc_stop_command();
+        repeat(70000) @(posedge clk);            // Flush the last packet
+        mk_check = 0;
+        mk_value_check = 0;
+        log_samples = 1;
+
+        $display("Test 7: packets=%0d received=%0d stale=%0d lost=%0d ticks=%0d errors=%0d",
+                 mk_packets, mk_received, mk_bad, mk_lost, mk_expected, mk_errors);
+        if (mk_errors == 0 && mk_bad == 0 && mk_received > 0 && mk_received + mk_lost == mk_expected)
+            $display("✅ PASS: only samples of the new capture received");
+        else
+            $display("❌ FAIL: samples of the previous capture received after restart");
+        $display("\n=== Test 7 Complete ===\n");
+
         // Summary
         $display("\n================================================");
         $display("=== All Tests Complete ===");